@@ -18,6 +18,10 @@ if __name__ == '__main__':
     times_dimname = config["times_dimname"]
     fillval = config["fillval"]
     fillval_f = np.nan
+    # Number of tracks converted/written per block, and number of parallel workers
+    track_chunksize = config.get("trackstats_dense_track_chunksize", 1000)
+    times_chunksize = config.get("trackstats_dense_times_chunksize", None)
+    nworkers = config.get("nprocesses", 1) if config.get("run_parallel", 0) > 0 else 1
 
     # Get dimensions and indices variable names
     max_trackduration = int(max(duration_range))
@@ -43,6 +47,9 @@ if __name__ == '__main__':
         times_dimname,
         fillval,
         fillval_f,
+        track_chunksize=track_chunksize,
+        times_chunksize=times_chunksize,
+        nworkers=nworkers,
     )
     print(f"{trackstats_dense_file}")
 
@@ -3,7 +3,7 @@ Demonstrates ploting cell tracks on radar reflectivity snapshots for a single ra
 
 >python plot_subset_cell_tracks_demo.py -s STARTDATE -e ENDDATE -c CONFIG.yml --radar_lat LAT --radar_lon LON
 Optional arguments:
--p 0 (serial), 1 (parallel)
+-p 0 (serial), 1 (parallel), 2 (cached rendering engine in a process pool)
 --extent lonmin lonmax latmin latmax (subset domain boundary)
 --figsize width height (figure size in inches)
 --output output_directory (output figure directory)
@@ -33,7 +33,8 @@ from dask.distributed import Client, LocalCluster
 import warnings
 warnings.filterwarnings("ignore")
 from pyflextrkr.ft_utilities import load_config
-from pyflextrkr.ft_utilities import load_config, subset_files_timerange
+from pyflextrkr.ft_utilities import load_config, subset_files_timerange, setup_logging
+from pyflextrkr.quicklook_engine import precompute_track_segments, render_quicklooks
 
 #-----------------------------------------------------------------------
 def parse_cmd_args():
@@ -44,7 +45,7 @@ def parse_cmd_args():
     parser.add_argument("-s", "--start", help="first time in time series to plot, format=YYYY-mm-ddTHH:MM:SS", required=True)
     parser.add_argument("-e", "--end", help="last time in time series to plot, format=YYYY-mm-ddTHH:MM:SS", required=True)
     parser.add_argument("-c", "--config", help="yaml config file for tracking", required=True)
-    parser.add_argument("-p", "--parallel", help="flag to run in parallel (0:serial, 1:parallel)", type=int, default=0)
+    parser.add_argument("-p", "--parallel", help="flag to run in parallel (0:serial, 1:parallel, 2:cached rendering engine)", type=int, default=0)
     parser.add_argument("--radar_lat", help="radar latitude", type=float, required=True)
     parser.add_argument("--radar_lon", help="radar longitude", type=float, required=True)
     parser.add_argument("--extent", nargs='+', help="map extent (lonmin, lonmax, latmin, latmax)", type=float, default=None)
@@ -564,8 +565,9 @@ if __name__ == "__main__":
         figdir = out_dir
     os.makedirs(figdir, exist_ok=True)
 
-    # Get track stats data
-    track_dict = get_track_stats(trackstats_file, start_datetime, end_datetime, dt_thres)
+    # Get track stats data (the cached rendering engine reads the track stats file itself)
+    if run_parallel != 2:
+        track_dict = get_track_stats(trackstats_file, start_datetime, end_datetime, dt_thres)
 
     # Serial option
     if run_parallel == 0:
@@ -589,6 +591,68 @@ if __name__ == "__main__":
 
         # Trigger dask computation
         final_result = dask.compute(*results)
+
+    # Cached rendering engine option
+    elif run_parallel == 2:
+        setup_logging()
+        # Track overlays for all frames from one pass over the track stats file
+        frame_segments = precompute_track_segments(
+            trackstats_file,
+            datafiles_basetime,
+            dt_thres.total_seconds(),
+            lon_varname='cell_meanlon',
+            lat_varname='cell_meanlat',
+        )
+        # Range circles and azimuth lines around radar, computed once
+        radii = np.arange(20,101,20)  # radii for the range rings [km]
+        azimuths = np.arange(0,361,90)   # azimuth angles for HSRHI scans [degree]
+        range_rings = [
+            np.array([calc_latlon(radar_lon, radar_lat, irad, iangle) for iangle in np.linspace(0, 360, 100)])
+            for irad in radii
+        ]
+        azimuth_lines = [
+            np.array([calc_latlon(radar_lon, radar_lat, idist, iazimuth) for idist in np.linspace(0, 200, 50)])
+            for iazimuth in azimuths
+        ]
+        panels = [
+            {
+                'varname': 'comp_ref',
+                'cmap': 'gist_ncar',
+                'levels': np.arange(-10, 60.1, 5),
+                'cblabel': 'Composite Reflectivity (dBZ)',
+                'cbticks': np.arange(-10, 60.1, 5),
+                'mask_below_min': True,
+                'perimeter': {'varname': 'tracknumber', 'color': 'k', 'footprint_size': 3},
+                'track_points': True,
+                'static_lines': {'lines': range_rings + azimuth_lines, 'color': 'k', 'linewidth': 0.4},
+            },
+        ]
+        # Track markers colored by lifetime
+        plot_info = {
+            'figsize': figsize,
+            'figure_margins': {'left': 0.1, 'right': 0.9, 'bottom': 0.08, 'top': 0.92},
+            'fontsize': 13,
+            'map_central_lon': 0,
+            'marker_size': 30,
+            'trackpath_color': 'k',
+            'trackpath_linewidth': 3,
+            'trackpoint_cmap': 'Spectral_r',
+            'trackpoint_levels': np.arange(0.5, 4.01, 0.5),
+            'trackpoint_cblabel': 'Lifetime (hour)',
+            'trackpoint_cbticks': [1,2,3,4],
+            'label_size': 10,
+            'label_offset': 0.02,
+        }
+        map_info['draw_coastline'] = False
+        map_info['subset'] = 0 if map_extent is None else 1
+        fignames = [
+            f"{figdir}{pd.to_datetime(bt, unit='s').strftime('%Y%m%d_%H%M')}.png"
+            for bt in datafiles_basetime
+        ]
+        timestrs = [pd.to_datetime(bt, unit='s').strftime('%Y-%m-%d %H:%M UTC') for bt in datafiles_basetime]
+        render_quicklooks(
+            datafiles, frame_segments, fignames, timestrs, panels, map_info, plot_info, nprocesses=n_workers,
+        )
     
     else:
         sys.exit('Valid parallelization flag not provided')
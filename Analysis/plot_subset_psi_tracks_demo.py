@@ -3,7 +3,7 @@ Demonstrates plotting generic tracks on input variable snapshots.
 
 >python plot_subset_generic_tracks_demo.py -s STARTDATE -e ENDDATE -c CONFIG.yml
 Optional arguments:
--p 0 (serial), 1 (parallel)
+-p 0 (serial), 1 (parallel), 2 (cached rendering engine in a process pool)
 --extent lonmin lonmax latmin latmax (subset domain boundary)
 --subset 0 (no), 1 (yes) (subset data before plotting)
 --figsize width height (figure size in inches)
@@ -33,7 +33,8 @@ import dask
 from dask.distributed import Client, LocalCluster
 import warnings
 warnings.filterwarnings("ignore")
-from pyflextrkr.ft_utilities import load_config, subset_files_timerange
+from pyflextrkr.ft_utilities import load_config, subset_files_timerange, setup_logging
+from pyflextrkr.quicklook_engine import precompute_track_segments, render_quicklooks
 
 #-----------------------------------------------------------------------
 def parse_cmd_args():
@@ -44,7 +45,7 @@ def parse_cmd_args():
     parser.add_argument("-s", "--start", help="first time in time series to plot, format=YYYY-mm-ddTHH:MM:SS", required=True)
     parser.add_argument("-e", "--end", help="last time in time series to plot, format=YYYY-mm-ddTHH:MM:SS", required=True)
     parser.add_argument("-c", "--config", help="yaml config file for tracking", required=True)
-    parser.add_argument("-p", "--parallel", help="flag to run in parallel (0:serial, 1:parallel)", type=int, default=0)
+    parser.add_argument("-p", "--parallel", help="flag to run in parallel (0:serial, 1:parallel, 2:cached rendering engine)", type=int, default=0)
     parser.add_argument("--extent", nargs='+', help="map extent (lonmin, lonmax, latmin, latmax)", type=float, default=None)
     parser.add_argument("--subset", help="flag to subset data (0:no, 1:yes)", type=int, default=0)
     parser.add_argument("--figsize", nargs='+', help="figure size (width, height) in inches", type=float, default=[8,7])
@@ -520,8 +521,9 @@ if __name__ == "__main__":
     )
     print(f'Number of pixel files: {len(datafiles)}')
 
-    # Get track stats data
-    track_dict = get_track_stats(trackstats_file, start_datetime_4stats, end_datetime, dt_thres)
+    # Get track stats data (the cached rendering engine reads the track stats file itself)
+    if run_parallel != 2:
+        track_dict = get_track_stats(trackstats_file, start_datetime_4stats, end_datetime, dt_thres)
 
     # Serial option
     if run_parallel == 0:
@@ -545,6 +547,39 @@ if __name__ == "__main__":
 
         # Trigger dask computation
         final_result = dask.compute(*results)
+
+    # Cached rendering engine option
+    elif run_parallel == 2:
+        setup_logging()
+        # Track overlays for all frames from one pass over the track stats file
+        frame_segments = precompute_track_segments(
+            trackstats_file,
+            datafiles_basetime,
+            dt_thres.total_seconds(),
+        )
+        panels = [
+            {
+                'varname': config["field_varname"],
+                'cmap': plot_info['cmap'],
+                'levels': plot_info['levels'],
+                'cblabel': plot_info['cblabels'],
+                'cbticks': plot_info['cbticks'],
+                'perimeter': {'varname': 'cloudtracknumber', 'color': 'k', 'footprint_size': 3},
+                'track_points': True,
+            },
+        ]
+        plot_info['dpi'] = 200
+        plot_info['figure_margins'] = {'left': 0.1, 'right': 0.9, 'bottom': 0.08, 'top': 0.92}
+        plot_info['label_size'] = 10
+        plot_info['label_offset'] = 0.02
+        fignames = [
+            f"{figdir}{figbasename}{pd.to_datetime(bt, unit='s').strftime('%Y%m%d_%H%M')}.png"
+            for bt in datafiles_basetime
+        ]
+        timestrs = [pd.to_datetime(bt, unit='s').strftime('%Y-%m-%d %H:%M UTC') for bt in datafiles_basetime]
+        render_quicklooks(
+            datafiles, frame_segments, fignames, timestrs, panels, map_info, plot_info, nprocesses=n_workers,
+        )
     
     else:
         sys.exit('Valid parallelization flag not provided')
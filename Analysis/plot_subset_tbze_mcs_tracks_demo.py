@@ -3,7 +3,7 @@ Demonstrates ploting MCS tracks on Tb, reflectivity snapshots for a subset domai
 
 >python plot_subset_tbze_mcs_tracks_demo.py -s STARTDATE -e ENDDATE -c CONFIG.yml -o horizontal 
 Optional arguments:
--p 0 (serial), 1 (parallel)
+-p 0 (serial), 1 (parallel), 2 (cached rendering engine in a process pool)
 --extent lonmin lonmax latmin latmax (subset domain boundary)
 --subset 0 (no), 1 (yes) (subset data before plotting)
 --figsize width height (figure size in inches)
@@ -37,7 +37,8 @@ import dask
 from dask.distributed import Client, LocalCluster
 import warnings
 warnings.filterwarnings("ignore")
-from pyflextrkr.ft_utilities import load_config, subset_files_timerange
+from pyflextrkr.ft_utilities import load_config, subset_files_timerange, setup_logging
+from pyflextrkr.quicklook_engine import precompute_track_segments, render_quicklooks
 
 #-----------------------------------------------------------------------
 def parse_cmd_args():
@@ -49,7 +50,7 @@ def parse_cmd_args():
     parser.add_argument("-e", "--end", help="last time in time series to plot, format=YYYY-mm-ddTHH:MM:SS", required=True)
     parser.add_argument("-c", "--config", help="yaml config file for tracking", required=True)
     parser.add_argument("-o", "--orientation", help="panel orientation ('vertical' or 'horizontal')", required=True)
-    parser.add_argument("-p", "--parallel", help="flag to run in parallel (0:serial, 1:parallel)", type=int, default=0)
+    parser.add_argument("-p", "--parallel", help="flag to run in parallel (0:serial, 1:parallel, 2:cached rendering engine)", type=int, default=0)
     parser.add_argument("--extent", nargs='+', help="map extent (lonmin, lonmax, latmin, latmax)", type=float, default=None)
     parser.add_argument("--subset", help="flag to subset data (0:no, 1:yes)", type=int, default=0)
     parser.add_argument("--figsize", nargs='+', help="figure size (width, height) in inches", type=float, default=[10,10])
@@ -662,8 +663,9 @@ if __name__ == "__main__":
     )
     print(f'Number of pixel files: {len(datafiles)}')
 
-    # Get track stats data
-    track_dict = get_track_stats(trackstats_file, start_datetime_4stats, end_datetime, dt_thres)
+    # Get track stats data (the cached rendering engine reads the track stats file itself)
+    if run_parallel != 2:
+        track_dict = get_track_stats(trackstats_file, start_datetime_4stats, end_datetime, dt_thres)
 
     # Serial option
     if run_parallel == 0:
@@ -690,4 +692,67 @@ if __name__ == "__main__":
             results.append(result)
 
         # Trigger dask computation
-        final_result = dask.compute(*results)
\ No newline at end of file
+        final_result = dask.compute(*results)
+
+    # Cached rendering engine option
+    elif run_parallel == 2:
+        setup_logging()
+        # PF diameter circles are only drawn if PF variables exist in the track stats file
+        dss = xr.open_dataset(trackstats_file)
+        has_pf = 'pf_lon' in list(dss.data_vars)
+        dss.close()
+        # Track overlays for all frames from one pass over the track stats file
+        frame_segments = precompute_track_segments(
+            trackstats_file,
+            datafiles_basetime,
+            dt_thres.total_seconds(),
+            pf_lon_varname='pf_lon_centroid' if has_pf else None,
+            pf_lat_varname='pf_lat_centroid' if has_pf else None,
+            pf_area_varname='pf_area' if has_pf else None,
+        )
+        # Tracknumber color levels for MCS masks (limit to 256 to fit in a colormap)
+        tracknumbers = np.unique(np.concatenate([seg['tracknumber'] for seg in frame_segments]))
+        tn_nlev = np.min([len(tracknumbers), 256])
+        tn_levels = np.linspace(np.min(tracknumbers), np.max(tracknumbers), tn_nlev)
+        panels = [
+            {
+                'varname': plot_info['tb_varname'],
+                'cmap': cmaps['tb_cmap'],
+                'levels': levels['tb_levels'],
+                'title': titles['tb_title'],
+                'cblabel': cblabels['tb_label'],
+                'cbticks': cbticks['tb_ticks'],
+                'perimeter': {'varname': 'cloudtracknumber', 'color': plot_info['mcsperim_color']},
+                'legend_elements': [
+                    mpl.lines.Line2D([0], [0], color=plot_info['trackpath_color'], marker='o',
+                                     lw=plot_info['trackpath_linewidth'], label='MCS Tracks'),
+                    mpl.lines.Line2D([0], [0], marker='o', lw=0, markerfacecolor='None',
+                                     markeredgecolor=plot_info['mcsperim_color'], markersize=12, label='MCS Mask'),
+                ],
+            },
+            {
+                'varname': plot_info['dbz_varname'],
+                'cmap': cmaps['dbz_cmap'],
+                'levels': levels['dbz_levels'],
+                'title': titles['pcp_title'],
+                'cblabel': cblabels['dbz_label'],
+                'cbticks': cbticks['dbz_ticks'],
+                'mask_below_min': True,
+                'tracknumber_shade': {'varname': 'cloudtracknumber', 'cmap': cmaps['tn_cmap'], 'levels': tn_levels},
+                'pf_circles': True,
+                'legend_elements': [
+                    mpl.lines.Line2D([0], [0], color=plot_info['trackpath_color'], marker='o',
+                                     lw=plot_info['trackpath_linewidth'], label='MCS Tracks'),
+                    mpl.lines.Line2D([0], [0], marker='o', lw=0, markerfacecolor='None',
+                                     markeredgecolor=plot_info['pfdiam_color'], markersize=12, label='PF Diam (x2)'),
+                ],
+            },
+        ]
+        fignames = [
+            f"{figdir}{figbasename}{pd.to_datetime(bt, unit='s').strftime('%Y%m%d_%H%M')}.png"
+            for bt in datafiles_basetime
+        ]
+        timestrs = [pd.to_datetime(bt, unit='s').strftime('%Y-%m-%d %H:%M UTC') for bt in datafiles_basetime]
+        render_quicklooks(
+            datafiles, frame_segments, fignames, timestrs, panels, map_info, plot_info, nprocesses=n_workers,
+        )
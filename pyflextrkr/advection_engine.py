@@ -0,0 +1,194 @@
+import numpy as np
+from functools import lru_cache
+from scipy import fft
+
+
+def get_tile_slices(shape, tiles, buffer):
+    """
+    Get array slices for each advection tile, excluding a buffer at the tile edges.
+
+    Args:
+        shape: tuple
+            Field shape (ny, nx).
+        tiles: list
+            Number of tiles in [y, x] direction.
+        buffer: int
+            Number of grids excluded at each tile edge.
+
+    Returns:
+        tile_slices: list
+            List of (row, col, (slice_y, slice_x)) for each tile.
+    """
+    tiles_y, tiles_x = tiles[0], tiles[1]
+    row_skip = int(shape[0] / tiles_y)
+    col_skip = int(shape[1] / tiles_x)
+    tile_slices = []
+    for col in range(0, tiles_x):
+        for row in range(0, tiles_y):
+            tile_slices.append((
+                row, col,
+                (slice(buffer + row * row_skip, (row + 1) * row_skip - buffer),
+                 slice(buffer + col * col_skip, (col + 1) * col_skip - buffer)),
+            ))
+    return tile_slices
+
+
+@lru_cache(maxsize=8)
+def _get_fast_shape(tile_shape):
+    """
+    Get FFT shape for the full cross-correlation of two tiles.
+    """
+    return tuple(fft.next_fast_len(2 * n - 1, real=True) for n in tile_shape)
+
+
+@lru_cache(maxsize=8)
+def _get_rotation_ramp(tile_shape, fast_shape):
+    """
+    Get the phase ramp that turns the conjugate spectrum of a tile into the spectrum of the tile
+    rotated by 180 degrees (flipped on both axes, then zero padded to fast_shape).
+    """
+    ky = np.arange(fast_shape[0]).reshape(-1, 1)
+    kx = np.arange(fast_shape[1] // 2 + 1).reshape(1, -1)
+    ramp = np.exp(-2j * np.pi * (
+        (tile_shape[0] - 1) * ky / fast_shape[0] + (tile_shape[1] - 1) * kx / fast_shape[1]
+    ))
+    ramp.flags.writeable = False
+    return ramp
+
+
+def frame_spectra(field, mask, tile_slices):
+    """
+    Calculate the spectra of a frame needed for masked cross-correlation, for each tile.
+
+    Each frame is transformed once and the spectra are used both as the reference (t=0)
+    and the moving (t=1) frame of the two adjacent file pairs.
+
+    Args:
+        field: np.array
+            2D field.
+        mask: np.array(bool)
+            2D mask of valid values.
+        tile_slices: list
+            Output from get_tile_slices.
+
+    Returns:
+        spectra: list
+            Spectra for each tile, dictionary with keys:
+            'image', 'mask', 'image2' (real FFTs of masked field, mask, masked field squared),
+            'npix' (number of valid pixels).
+    """
+    spectra = []
+    for row, col, tslice in tile_slices:
+        tmask = mask[tslice]
+        tfield = np.where(tmask, field[tslice], 0).astype(np.float64)
+        fast_shape = _get_fast_shape(tfield.shape)
+        spectra.append({
+            "image": fft.rfft2(tfield, s=fast_shape),
+            "mask": fft.rfft2(tmask.astype(np.float64), s=fast_shape),
+            "image2": fft.rfft2(tfield * tfield, s=fast_shape),
+            "npix": np.count_nonzero(tmask),
+        })
+    return spectra
+
+
+def masked_shift(ref_spec, mov_spec, tile_shape, overlap_ratio=0.7):
+    """
+    Calculate the translation between two masked tiles from their spectra.
+
+    Same masked normalized cross-correlation (Padfield 2012) as
+    skimage.registration.phase_cross_correlation with reference/moving masks.
+
+    Args:
+        ref_spec: dictionary
+            Tile spectra of the reference frame (t=0), from frame_spectra.
+        mov_spec: dictionary
+            Tile spectra of the moving frame (t=1), from frame_spectra.
+        tile_shape: tuple
+            Tile shape (ny, nx).
+        overlap_ratio: float, default=0.7
+            Minimum allowed overlap ratio between the masked tiles.
+
+    Returns:
+        shift: np.array
+            Movement (y, x) [number of grids] from the reference to the moving tile,
+            i.e., -1 * phase_cross_correlation(reference, moving, ...).
+    """
+    fast_shape = _get_fast_shape(tuple(tile_shape))
+    ramp = _get_rotation_ramp(tuple(tile_shape), fast_shape)
+    eps = np.finfo(np.float64).eps
+
+    def ifft(x):
+        return fft.irfft2(x, s=fast_shape)
+
+    # Reference frame is rotated, moving frame is fixed (same order as skimage)
+    rot_image = ramp * np.conj(ref_spec["image"])
+    rot_mask = ramp * np.conj(ref_spec["mask"])
+    rot_image2 = ramp * np.conj(ref_spec["image2"])
+    fix_image = mov_spec["image"]
+    fix_mask = mov_spec["mask"]
+    fix_image2 = mov_spec["image2"]
+
+    # Number of overlapping masked pixels at each translation
+    noverlap = np.fmax(np.round(ifft(rot_mask * fix_mask)), eps)
+    masked_corr_fixed = ifft(rot_mask * fix_image)
+    masked_corr_rotated = ifft(fix_mask * rot_image)
+    numerator = ifft(rot_image * fix_image) - masked_corr_fixed * masked_corr_rotated / noverlap
+    fixed_denom = np.fmax(ifft(rot_mask * fix_image2) - masked_corr_fixed**2 / noverlap, 0.0)
+    moving_denom = np.fmax(ifft(fix_mask * rot_image2) - masked_corr_rotated**2 / noverlap, 0.0)
+    denom = np.sqrt(fixed_denom * moving_denom)
+
+    # Crop to the full correlation shape
+    final_slice = tuple(slice(0, 2 * n - 1) for n in tile_shape)
+    numerator = numerator[final_slice]
+    denom = denom[final_slice]
+    noverlap = noverlap[final_slice]
+
+    # Zero out translations with very small denominator or not enough overlap
+    tol = 1e3 * eps * np.max(np.abs(denom))
+    xcorr = np.zeros(denom.shape, dtype=np.float64)
+    nonzero = denom > tol
+    xcorr[nonzero] = numerator[nonzero] / denom[nonzero]
+    np.clip(xcorr, -1, 1, out=xcorr)
+    xcorr[noverlap < overlap_ratio * np.max(noverlap)] = 0.0
+
+    # Average of multiple equal maxima
+    maxima = np.stack(np.nonzero(xcorr == xcorr.max()), axis=1)
+    center = np.mean(maxima, axis=0)
+    return center - np.array(tile_shape) + 1
+
+
+def frame_pair_shifts(ref_spectra, mov_spectra, tile_slices, tiles, size_threshold, overlap_ratio=0.7):
+    """
+    Calculate the movement for all tiles between two frames.
+
+    Args:
+        ref_spectra: list
+            Spectra of the reference frame (t=0), from frame_spectra.
+        mov_spectra: list
+            Spectra of the moving frame (t=1), from frame_spectra.
+        tile_slices: list
+            Output from get_tile_slices.
+        tiles: list
+            Number of tiles in [y, x] direction.
+        size_threshold: int
+            Minimum number of valid points in the reference tile to calculate advection.
+        overlap_ratio: float, default=0.7
+            Minimum allowed overlap ratio between the masked tiles.
+
+    Returns:
+        y_lag: np.array
+            Movement in y-direction for each tile [number of grids], NaN if not enough valid points.
+        x_lag: np.array
+            Movement in x-direction for each tile [number of grids], NaN if not enough valid points.
+    """
+    y_lag = np.full((tiles[0], tiles[1]), np.nan, dtype=np.float32)
+    x_lag = np.full((tiles[0], tiles[1]), np.nan, dtype=np.float32)
+    for (row, col, tslice), ref_spec, mov_spec in zip(tile_slices, ref_spectra, mov_spectra):
+        if ref_spec["npix"] < size_threshold:
+            continue
+        tile_shape = (tslice[0].stop - tslice[0].start, tslice[1].stop - tslice[1].start)
+        y, x = masked_shift(ref_spec, mov_spec, tile_shape, overlap_ratio=overlap_ratio)
+        y_lag[row, col] = y
+        x_lag[row, col] = x
+    return y_lag, x_lag
+
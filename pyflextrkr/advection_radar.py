@@ -1,13 +1,13 @@
-import sys
 import numpy as np
 import xarray as xr
 from netCDF4 import Dataset
 from scipy.signal import medfilt
-from skimage.registration import phase_cross_correlation
-from scipy import ndimage as ndi
 import logging
-import dask
+from functools import partial
 from pyflextrkr.ft_utilities import subset_files_timerange
+from pyflextrkr.ft_executor import get_executor
+from pyflextrkr.ft_framepairs import map_frame_pairs
+from pyflextrkr.advection_engine import get_tile_slices, frame_spectra, frame_pair_shifts
 
 
 def offset_to_speed(x, y, time_lag, dx, dy):
@@ -95,63 +95,25 @@ def movement_of_storm_fft(
     field_1 = np.squeeze(dset_1[ref_varname].values)
     field_2 = np.squeeze(dset_2[ref_varname].values)
 
-    y_lag = np.zeros((cuts, cuts))
-    x_lag = np.zeros((cuts, cuts))
-
-    mask_1 = field_1 > threshold
-    mask_2 = field_2 > threshold
-
-    dimensions = field_1.shape
-    x_skip = int(dimensions[0] / cuts)
-    y_skip = int(dimensions[1] / cuts)
-
-    # Mask each region into a cut
-    for col in range(0, cuts):
-        for row in range(0, cuts):
-            mask = np.zeros(field_1.shape)
-            mask[
-                buffer + row * x_skip : (row + 1) * x_skip - buffer,
-                buffer + col * y_skip : (col + 1) * y_skip - buffer,
-            ] = 1
-            mask = mask * mask_1
-            mask[field_1 < -100] = 0
-            mask_2[field_2 < -100] = 0
-
-            num_points = np.sum(mask > 0)
-            # Updated to use phase_cross_correlation to replace masked_register_translation
-            y, x = -1 * phase_cross_correlation(
-                field_1, field_2, reference_mask=mask_1, moving_mask=mask_2, overlap_ratio=0.7
-            )
-
-            if plot_subplots:
-                plt.figure(figsize=(10, 5))
-                plt.subplot(1, 2, 1)
-                plt.pcolormesh(field_1 * mask, vmin=-20, vmax=50, cmap="jet")
-                plt.colorbar()
-                plt.arrow(100, 100, x, y, head_width=5)
-                plt.subplot(1, 2, 2)
-                plt.pcolormesh(field_2 * mask_2, vmin=-20, vmax=50, cmap="jet")
-                plt.colorbar()
-
-                plt.figure(figsize=(10, 10))
-                plt.pcolormesh(field_2 * mask_2, vmin=-20, vmax=50, cmap="jet")
-                shifted_field_1 = ndi.shift(mask_1, [int(y), int(x)])
-                plt.contour(shifted_field_1, vmin=-1, vmax=1, cmap="seismic", levels=3)
-                plt.contour(-1 * mask_1, vmin=-1, vmax=1, cmap="seismic", levels=3)
-
-                plt.arrow(100, 100, x, y, head_width=15)
-
-                plt.colorbar()
-
-            if num_points < size_threshold:
-                x_lag[row, col] = np.nan
-                y_lag[row, col] = np.nan
-                continue
-
-            y_lag[row, col] = y
-            x_lag[row, col] = x
-
-    # mag_movement, mag_dir, mag_movement_mps = offset_to_speed(x_lag, y_lag, 15 * 60)
+    # Masked cross-correlation within each tile (excluding the buffer at tile edges)
+    tile_slices = get_tile_slices(field_1.shape, [cuts, cuts], buffer)
+    y_lag, x_lag = frame_pair_shifts(
+        frame_spectra(field_1, get_advection_mask(field_1, threshold), tile_slices),
+        frame_spectra(field_2, get_advection_mask(field_2, threshold), tile_slices),
+        tile_slices, [cuts, cuts], size_threshold,
+    )
+
+    y_lag, x_lag = limit_movement(y_lag, x_lag, dx, dy, TIME_RES_SECOND, MAX_MOVEMENT_MPS)
+    return y_lag[0, 0], x_lag[0, 0]
+
+
+def get_advection_mask(field, threshold):
+    """Return mask of valid values above threshold."""
+    return (field > threshold) & (field >= -100)
+
+
+def limit_movement(y_lag, x_lag, dx, dy, TIME_RES_SECOND, MAX_MOVEMENT_MPS):
+    """Remove movement faster than MAX_MOVEMENT_MPS and replace missing values with 0."""
     mag_movement, mag_dir, mag_movement_mps = offset_to_speed(
         x_lag, y_lag, TIME_RES_SECOND, dx, dy
     )
@@ -159,29 +121,37 @@ def movement_of_storm_fft(
     x_lag[mag_movement_mps > MAX_MOVEMENT_MPS] = np.nan
     y_lag[mag_movement_mps > MAX_MOVEMENT_MPS] = np.nan
 
-    x_lag[np.isnan(x_lag)] = np.nanmedian(0)
-    y_lag[np.isnan(y_lag)] = np.nanmedian(0)
+    x_lag[np.isnan(x_lag)] = 0
+    y_lag[np.isnan(y_lag)] = 0
+    return y_lag, x_lag
 
-    return y_lag[0, 0], x_lag[0, 0]
 
-def movement_of_storm_fft_l(
-    filenames, dx, dy, DBZ_THRESHOLD, TIME_RES_SECOND, MAX_MOVEMENT_MPS, config,
+def load_advection_frame(filename, DBZ_THRESHOLD, config, cuts=1, buffer=30):
+    """
+    Read a file and calculate the spectra of each advection tile.
+    """
+    ref_varname = config["ref_varname"]
+    ds = xr.open_dataset(filename)
+    field = np.squeeze(ds[ref_varname].values)
+    ds.close()
+    tile_slices = get_tile_slices(field.shape, [cuts, cuts], buffer)
+    return {
+        "spectra": frame_spectra(field, get_advection_mask(field, DBZ_THRESHOLD), tile_slices),
+        "tile_slices": tile_slices,
+    }
+
+
+def movement_of_storm_frames(
+    frame_1, frame_2, dx, dy, TIME_RES_SECOND, MAX_MOVEMENT_MPS, cuts=1, size_threshold=10,
 ):
-    """This just exists to make parallelism easier"""
-    dset_1 = xr.open_dataset(filenames[0])
-    dset_2 = xr.open_dataset(filenames[1])
-
-    y1, x1 = movement_of_storm_fft(
-        dset_1,
-        dset_2,
-        dx=dx,
-        dy=dy,
-        config=config,
-        threshold=DBZ_THRESHOLD,
-        TIME_RES_SECOND=TIME_RES_SECOND,
-        MAX_MOVEMENT_MPS=MAX_MOVEMENT_MPS,
+    """
+    Calculate movement between two frames from load_advection_frame.
+    """
+    y_lag, x_lag = frame_pair_shifts(
+        frame_1["spectra"], frame_2["spectra"], frame_1["tile_slices"], [cuts, cuts], size_threshold,
     )
-    return y1, x1
+    y_lag, x_lag = limit_movement(y_lag, x_lag, dx, dy, TIME_RES_SECOND, MAX_MOVEMENT_MPS)
+    return y_lag[0, 0], x_lag[0, 0]
 
 
 def calc_mean_advection(config):
@@ -205,7 +175,6 @@ def calc_mean_advection(config):
     MED_FILT_LEN = config["MED_FILT_LEN"]
     MAX_MOVEMENT_MPS = config["MAX_MOVEMENT_MPS"]
     datatimeresolution = config["datatimeresolution"]
-    run_parallel = config["run_parallel"]
 
     output_filename = (
         config["stats_outpath"] +
@@ -231,41 +200,17 @@ def calc_mean_advection(config):
     # Convert data time resolution from [hour] to [second]
     TIME_RES_SECOND = datatimeresolution * 3600
 
-    # Run advection calculation
-    if run_parallel == 0:
-        # Serial version
-        final_results = []
-        for ii in zip(filelist[:-1], filelist[1:]):
-            x_y = movement_of_storm_fft_l(
-                ii,
-                dx=dx,
-                dy=dy,
-                config=config,
-                DBZ_THRESHOLD=DBZ_THRESHOLD,
-                TIME_RES_SECOND=TIME_RES_SECOND,
-                MAX_MOVEMENT_MPS=MAX_MOVEMENT_MPS,
-            )
-            final_results.append(x_y)
-
-    elif run_parallel >= 1:
-        # Parallel version
-        results = []
-        for ii in zip(filelist[:-1], filelist[1:]):
-            x_y = dask.delayed(movement_of_storm_fft_l)(
-                ii,
-                dx=dx,
-                dy=dy,
-                config=config,
-                DBZ_THRESHOLD=DBZ_THRESHOLD,
-                TIME_RES_SECOND=TIME_RES_SECOND,
-                MAX_MOVEMENT_MPS=MAX_MOVEMENT_MPS,
-            )
-            results.append(x_y)
-        final_results = dask.compute(*results)
-        dask.distributed.wait(final_results)
-
-    else:
-        sys.exit('Valid parallelization flag not provided')
+    # Run advection calculation with the executor selected by config,
+    # each file is read and transformed once and used for both pairs it belongs to
+    loader = partial(load_advection_frame, DBZ_THRESHOLD=DBZ_THRESHOLD, config=config)
+    shared_kwargs = {
+        "dx": dx,
+        "dy": dy,
+        "TIME_RES_SECOND": TIME_RES_SECOND,
+        "MAX_MOVEMENT_MPS": MAX_MOVEMENT_MPS,
+    }
+    with get_executor(config, shared_kwargs=shared_kwargs) as executor:
+        final_results = map_frame_pairs(executor, movement_of_storm_frames, loader, filelist, config)
 
     # Zip the (x, y) and convert them into numpy array
     x_and_y = np.array(tuple(zip(*final_results)))
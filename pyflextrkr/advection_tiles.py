@@ -3,11 +3,12 @@ import numpy as np
 import xarray as xr
 from netCDF4 import Dataset
 from scipy.signal import medfilt
-from skimage.registration import phase_cross_correlation
-from scipy import ndimage as ndi
 import logging
-import dask
+from functools import partial
 from pyflextrkr.ft_utilities import subset_files_timerange
+from pyflextrkr.ft_executor import get_executor
+from pyflextrkr.ft_framepairs import map_frame_pairs
+from pyflextrkr.advection_engine import get_tile_slices, frame_spectra, frame_pair_shifts
 
 
 def offset_to_speed(x, y, time_lag, dx, dy):
@@ -65,6 +66,71 @@ def get_pixel_size_of_clouds(dataset, total_tracks, track_variable="pcptracknumb
     return storm_sizes
 
 
+def get_advection_mask(field, field_threshold, advection_mask_method):
+    """
+    Get mask of valid values to calculate advection.
+
+    Args:
+        field: np.array
+            2D field.
+        field_threshold: float
+            Threshold value for the field.
+        advection_mask_method: string
+            'greater' or 'smaller' than field_threshold.
+
+    Returns:
+        mask: np.array(bool)
+            Mask of valid values.
+    """
+    logger = logging.getLogger(__name__)
+    if advection_mask_method == 'greater':
+        mask = field > field_threshold
+    elif advection_mask_method == 'smaller':
+        mask = field < field_threshold
+    else:
+        logger.error(f'Error: Undefined advection_mask_method: {advection_mask_method}')
+        logger.error("Tracking will now exit.")
+        sys.exit()
+    return mask
+
+
+def limit_movement(y_lag, x_lag, dx, dy, TIME_RES_SECOND, advection_max_movement_mps):
+    """
+    Remove movement faster than the max speed allowed and replace missing values with 0.
+
+    Args:
+        y_lag: np.array
+            Movement in y-direction for each tile [number of grids]
+        x_lag: np.array
+            Movement in x-direction for each tile [number of grids]
+        dx: float
+            Grid spacing in x-direction [km]
+        dy: float
+            Grid spacing in y-direction [km]
+        TIME_RES_SECOND: float
+            Time resolution of data [seconds]
+        advection_max_movement_mps: float
+            Maximum movement speed allowed [m/s]
+
+    Returns:
+        y_lag: np.array
+            Advection in y-direction [number of grids]
+        x_lag: np.array
+            Advection in x-direction [number of grids]
+    """
+    # Calculate movement speed
+    mag_movement, mag_dir, mag_movement_mps = offset_to_speed(
+        x_lag, y_lag, TIME_RES_SECOND, dx, dy,
+    )
+    # Remove movement values larger than max speed allowed
+    x_lag[mag_movement_mps > advection_max_movement_mps] = np.nan
+    y_lag[mag_movement_mps > advection_max_movement_mps] = np.nan
+    # Replace NaN values with 0
+    x_lag[np.isnan(x_lag)] = 0
+    y_lag[np.isnan(y_lag)] = 0
+    return y_lag, x_lag
+
+
 def movement_of_storm_fft(
         dset_1,
         dset_2,
@@ -94,8 +160,6 @@ def movement_of_storm_fft(
         x_lag: int
             Advection in y-direction [number of grids]
     """
-    logger = logging.getLogger(__name__)
-
     ref_varname = config['ref_varname']
     field_threshold = config['advection_field_threshold']
     datatimeresolution = config["datatimeresolution"]
@@ -111,113 +175,98 @@ def movement_of_storm_fft(
     field_1 = np.squeeze(dset_1[ref_varname].values)
     field_2 = np.squeeze(dset_2[ref_varname].values)
 
-    # Make arrays for advection
-    tiles_y, tiles_x = tiles[0], tiles[1]
-    y_lag = np.zeros((tiles_y, tiles_x), dtype=np.float32)
-    x_lag = np.zeros((tiles_y, tiles_x), dtype=np.float32)
-
     # Mask data by thresholds
-    if advection_mask_method == 'greater':
-        mask_1 = field_1 > field_threshold
-        mask_2 = field_2 > field_threshold
-    elif advection_mask_method == 'smaller':
-        mask_1 = field_1 < field_threshold
-        mask_2 = field_2 < field_threshold
-    else:
-        logger.error(f'Error: Undefined advection_mask_method: {advection_mask_method}')
-        logger.error("Tracking will now exit.")
-        sys.exit()
+    mask_1 = get_advection_mask(field_1, field_threshold, advection_mask_method)
+    mask_2 = get_advection_mask(field_2, field_threshold, advection_mask_method)
+
+    # Masked cross-correlation within each tile (excluding the buffer at tile edges)
+    tile_slices = get_tile_slices(field_1.shape, tiles, buffer)
+    y_lag, x_lag = frame_pair_shifts(
+        frame_spectra(field_1, mask_1, tile_slices),
+        frame_spectra(field_2, mask_2, tile_slices),
+        tile_slices, tiles, size_threshold,
+    )
 
-    dimensions = field_1.shape
-    row_skip = int(dimensions[0] / tiles_y)
-    col_skip = int(dimensions[1] / tiles_x)
-
-    # Mask each region into a cut
-    for col in range(0, tiles_x):
-        for row in range(0, tiles_y):
-            # Buffer the edge
-            mask = np.zeros(field_1.shape)
-            mask[
-                buffer + row * row_skip : (row + 1) * row_skip - buffer,
-                buffer + col * col_skip : (col + 1) * col_skip - buffer,
-            ] = 1
-            # Separate mask by tiles
-            mask_1t = mask * mask_1
-            mask_2t = mask * mask_2
-            # Set mask to 0 for areas not used
-            if advection_mask_method == 'greater':
-                mask_1t[field_1 < field_threshold] = 0
-                mask_2t[field_2 < field_threshold] = 0
-            elif advection_mask_method == 'smaller':
-                mask_1t[field_1 > field_threshold] = 0
-                mask_2t[field_2 > field_threshold] = 0
-            # mask[field_1 < -100] = 0
-            # mask_2[field_2 < -100] = 0
-
-            num_points = np.sum(mask > 0)
-            # Updated to use phase_cross_correlation to replace masked_register_translation
-            y, x = -1 * phase_cross_correlation(
-                field_1, field_2, reference_mask=mask_1t, moving_mask=mask_2t, overlap_ratio=0.7
-            )
-
-            # plot_subplots = True
-            if plot_subplots:
-                import matplotlib.pyplot as plt
-                plt.figure(figsize=(10, 5))
-                plt.subplot(1, 2, 1)
-                plt.pcolormesh(field_1 * mask_1t, vmin=0, vmax=50, cmap="gist_ncar")
-                plt.colorbar()
-                plt.arrow(100, 100, x, y, head_width=5)
-                plt.subplot(1, 2, 2)
-                plt.pcolormesh(field_2 * mask_2t, vmin=0, vmax=50, cmap="gist_ncar")
-                plt.colorbar()
-
-                plt.figure(figsize=(10, 10))
-                plt.pcolormesh(field_2 * mask_2t, vmin=0, vmax=50, cmap="gist_ncar")
-                plt.colorbar()
-                shifted_field_1 = ndi.shift(mask_1t, [int(y), int(x)])
-                plt.contour(shifted_field_1, vmin=-1, vmax=1, cmap="seismic", levels=3)
-                plt.contour(-1 * mask_1t, vmin=-1, vmax=1, cmap="seismic", levels=3)
-                plt.arrow(100, 100, x, y, head_width=15)
-                plt.show()
-
-            if num_points < size_threshold:
-                x_lag[row, col] = np.nan
-                y_lag[row, col] = np.nan
-                continue
-            # Save movement values
-            y_lag[row, col] = y
-            x_lag[row, col] = x
+    if plot_subplots:
+        import matplotlib.pyplot as plt
+        for row, col, tslice in tile_slices:
+            plt.figure(figsize=(10, 5))
+            plt.subplot(1, 2, 1)
+            plt.pcolormesh(field_1[tslice] * mask_1[tslice], vmin=0, vmax=50, cmap="gist_ncar")
+            plt.colorbar()
+            plt.arrow(100, 100, x_lag[row, col], y_lag[row, col], head_width=5)
+            plt.subplot(1, 2, 2)
+            plt.pcolormesh(field_2[tslice] * mask_2[tslice], vmin=0, vmax=50, cmap="gist_ncar")
+            plt.colorbar()
+            plt.show()
 
-    # Calculate movement speed
-    mag_movement, mag_dir, mag_movement_mps = offset_to_speed(
-        x_lag, y_lag, TIME_RES_SECOND, dx, dy,
-    )
     # Remove movement values larger than max speed allowed
-    x_lag[mag_movement_mps > advection_max_movement_mps] = np.nan
-    y_lag[mag_movement_mps > advection_max_movement_mps] = np.nan
-    # Replace NaN values with 0
-    x_lag[np.isnan(x_lag)] = np.nanmedian(0)
-    y_lag[np.isnan(y_lag)] = np.nanmedian(0)
-
+    y_lag, x_lag = limit_movement(y_lag, x_lag, dx, dy, TIME_RES_SECOND, advection_max_movement_mps)
     return y_lag, x_lag
-    # return y_lag[0, 0], x_lag[0, 0]
 
-def movement_of_storm_fft_l(
-    filenames, dx, dy, config,
-):
-    """This just exists to make parallelism easier"""
-    dset_1 = xr.open_dataset(filenames[0])
-    dset_2 = xr.open_dataset(filenames[1])
 
-    y1, x1 = movement_of_storm_fft(
-        dset_1,
-        dset_2,
-        dx=dx,
-        dy=dy,
-        config=config,
+def load_advection_frame(filename, config):
+    """
+    Read a file and calculate the spectra of each advection tile.
+
+    Args:
+        filename: string
+            File name.
+        config: dictionary
+            Dictionary containing config parameters
+
+    Returns:
+        frame: dictionary
+            Keys: 'spectra' (from frame_spectra), 'tile_slices' (from get_tile_slices).
+    """
+    ref_varname = config['ref_varname']
+    field_threshold = config['advection_field_threshold']
+    advection_mask_method = config.get('advection_mask_method', 'greater')
+    buffer = config.get('advection_buffer', 30)
+    tiles = config.get('advection_tiles', [1,1])
+
+    ds = xr.open_dataset(filename)
+    field = np.squeeze(ds[ref_varname].values)
+    ds.close()
+    mask = get_advection_mask(field, field_threshold, advection_mask_method)
+    tile_slices = get_tile_slices(field.shape, tiles, buffer)
+    return {"spectra": frame_spectra(field, mask, tile_slices), "tile_slices": tile_slices}
+
+
+def movement_of_storm_frames(frame_1, frame_2, dx, dy, config):
+    """
+    Calculate movement between two frames from load_advection_frame.
+
+    Args:
+        frame_1: dictionary
+            Frame at current time (t=0)
+        frame_2: dictionary
+            Frame at next time (t=1)
+        dx: float
+            Grid spacing in x-direction [km]
+        dy: float
+            Grid spacing in y-direction [km]
+        config: dictionary
+            Dictionary containing config parameters
+
+    Returns:
+        y_lag: np.array
+            Advection in y-direction for each tile [number of grids]
+        x_lag: np.array
+            Advection in x-direction for each tile [number of grids]
+    """
+    datatimeresolution = config["datatimeresolution"]
+    size_threshold = config.get('advection_size_threshold', 10)
+    tiles = config.get('advection_tiles', [1,1])
+    advection_max_movement_mps = config.get('advection_max_movement_mps', 60)
+
+    # Convert data time resolution from [hour] to [second]
+    TIME_RES_SECOND = datatimeresolution * 3600
+
+    y_lag, x_lag = frame_pair_shifts(
+        frame_1["spectra"], frame_2["spectra"], frame_1["tile_slices"], tiles, size_threshold,
     )
-    return y1, x1
+    return limit_movement(y_lag, x_lag, dx, dy, TIME_RES_SECOND, advection_max_movement_mps)
 
 
 def calc_mean_advection(config):
@@ -242,7 +291,6 @@ def calc_mean_advection(config):
     advection_med_filt_len = config["advection_med_filt_len"]
     advection_max_movement_mps = config["advection_max_movement_mps"]
     datatimeresolution = config["datatimeresolution"]
-    run_parallel = config["run_parallel"]
 
     output_filename = (
         config["stats_outpath"] +
@@ -269,35 +317,12 @@ def calc_mean_advection(config):
     # Number of tiles in y, x direction
     tiles_y, tiles_x = advection_tiles[0], advection_tiles[1]
 
-    # Run advection calculation
-    if run_parallel == 0:
-        # Serial version
-        final_results = []
-        for ii in zip(filelist[:-1], filelist[1:]):
-            x_y = movement_of_storm_fft_l(
-                ii,
-                dx=dx,
-                dy=dy,
-                config=config,
-            )
-            final_results.append(x_y)
-
-    elif run_parallel >= 1:
-        # Parallel version
-        results = []
-        for ii in zip(filelist[:-1], filelist[1:]):
-            x_y = dask.delayed(movement_of_storm_fft_l)(
-                ii,
-                dx=dx,
-                dy=dy,
-                config=config,
-            )
-            results.append(x_y)
-        final_results = dask.compute(*results)
-        dask.distributed.wait(final_results)
-
-    else:
-        sys.exit('Valid parallelization flag not provided')
+    # Run advection calculation with the executor selected by config,
+    # each file is read and transformed once and used for both pairs it belongs to
+    loader = partial(load_advection_frame, config=config)
+    shared_kwargs = {"dx": dx, "dy": dy, "config": config}
+    with get_executor(config, shared_kwargs=shared_kwargs) as executor:
+        final_results = map_frame_pairs(executor, movement_of_storm_frames, loader, filelist, config)
 
     # Zip the (x, y) and convert them into numpy array
     x_and_y = np.array(tuple(zip(*final_results)))
@@ -0,0 +1,558 @@
+"""
+Compare all output files of a small end-to-end tracking run against stored golden outputs.
+
+Golden outputs are created once from a synthetic storm case (see synthetic_storms) with a
+trusted version of the code. A check regenerates the same inputs, runs all pipeline steps
+(optionally with config parameters changed, e.g. to switch on a fast code path), and
+compares every netCDF output file (cloudid, track pairs, tracknumbers, sparse and dense
+track statistics, MCS statistics, pixel files, speed) variable by variable:
+
+    python -m pyflextrkr.benchmark.golden_outputs create --golden-dir golden/
+    python -m pyflextrkr.benchmark.golden_outputs check --golden-dir golden/ \\
+        --set run_pipeline=true --set parallel_backend=process --set nprocesses=4
+
+Integer, label, status and time variables must be identical, floating point variables must
+be within a tolerance. Rules can be changed with a YAML file (--rules), a list of:
+
+    - {file: 'trackstats_*', variable: 'meanlat', rtol: 1.0e-4, atol: 1.0e-3}
+    - {file: 'cloudid_*', variable: 'tb', ignore: true}
+
+Global and variable attributes (e.g. creation time) are not compared.
+
+The synthetic inputs are bit-reproducible across numpy versions. Their checksum is stored in
+the manifest and checked before the outputs are compared, and the checksums of the default
+golden cases are pinned below (golden_input_checksums), so a changed input generator is
+reported instead of showing up as output differences.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import fnmatch
+import hashlib
+import logging
+import argparse
+import numpy as np
+import xarray as xr
+import yaml
+from pyflextrkr.benchmark.run_benchmark import (
+    make_case_inputs,
+    run_case_process,
+    get_git_info,
+)
+
+# Synthetic case of each pipeline (small, but with merges/splits and MCSs)
+golden_cases = {
+    "tbpf": {"grid_size": 256, "nfiles": 12, "nstorms": 6},
+    "cells": {"grid_size": 160, "nfiles": 12, "nstorms": 10},
+    "generic": {"grid_size": 160, "nfiles": 12, "nstorms": 10},
+}
+case_defaults = {
+    "seed": 0,
+    "merge_fraction": 0.2,
+    "split_fraction": 0.2,
+    "parallel_backend": "serial",
+    "nprocesses": 1,
+}
+# Checksum (get_input_checksum) of the synthetic inputs of each golden case
+golden_input_checksums = {
+    "tbpf": "562eb90b3cf73ad170c47cccfc53bb723aa45a2ac31f61259adfac8c5b559dcc",
+    "cells": "014e34b15eba3dd0afa7c0e531e1af1fc4eb4724a9fcae00944939041cb59b45",
+    "generic": "930eee1aa16178f4c5fb8c61df5269e7069bc0f3ad37623c14745d12f9189241",
+}
+
+# Default comparison rules, the first rule matching the file name and variable name is used.
+# Rules not matching any of these use exact comparison for integer/string variables and the
+# float tolerance for floating point variables.
+default_rules = [
+    {"file": "*", "variable": "*time*", "exact": True},
+    {"file": "*", "variable": "*number*", "exact": True},
+    {"file": "*", "variable": "*status*", "exact": True},
+    {"file": "*", "variable": "*duration*", "exact": True},
+    {"file": "*", "variable": "*npix*", "exact": True},
+]
+float_tolerance = {"rtol": 1e-5, "atol": 1e-6}
+
+# Output file kinds in the report, matched in this order on the file name
+file_kinds = [
+    ("cloudid", "cloudid_*"),
+    ("track pairs", "track_*"),
+    ("tracknumbers", "tracknumbers_*"),
+    ("trackstats sparse", "trackstats_sparse_*"),
+    ("trackstats final", "trackstats_final_*"),
+    ("trackstats dense", "trackstats_*"),
+    ("advection", "advection_*"),
+    ("mcs speed", "mcs_tracks_final_*"),
+    ("mcs stats", "mcs_tracks_*"),
+]
+
+
+def get_file_kind(relpath, pixel_path_name):
+    """
+    Get the output kind of a file (relative path to the output directory) for the report.
+    """
+    if relpath.split("/")[0] == pixel_path_name:
+        return "pixel files"
+    filename = os.path.basename(relpath)
+    for kind, pattern in file_kinds:
+        if fnmatch.fnmatch(filename, pattern):
+            return kind
+    return "other"
+
+
+def get_rule(filename, varname, dtype, rules):
+    """
+    Get the comparison rule of a variable.
+
+    Args:
+        filename: string
+            File name (without path).
+        varname: string
+            Variable name.
+        dtype: np.dtype
+            Variable data type.
+        rules: list
+            Rules (dictionary with 'file', 'variable' patterns and 'exact', 'rtol', 'atol' or 'ignore').
+
+    Returns:
+        rule: dictionary
+            Rule with 'exact' (bool), 'rtol', 'atol' and 'ignore' (bool).
+    """
+    for rule in rules:
+        if fnmatch.fnmatch(filename, rule.get("file", "*")) and fnmatch.fnmatch(varname, rule.get("variable", "*")):
+            if rule.get("ignore", False):
+                return {"ignore": True}
+            if ("rtol" in rule) or ("atol" in rule):
+                return {"exact": False, "rtol": rule.get("rtol", 0.0), "atol": rule.get("atol", 0.0)}
+            return {"exact": bool(rule.get("exact", True))}
+    if np.issubdtype(dtype, np.floating):
+        return dict(float_tolerance, exact=False)
+    return {"exact": True}
+
+
+def compare_variable(golden, new, rule):
+    """
+    Compare values of a variable.
+
+    Args:
+        golden: np.array
+            Golden values.
+        new: np.array
+            New values.
+        rule: dictionary
+            Comparison rule (from get_rule).
+
+    Returns:
+        result: dictionary
+            'status' ('identical', 'close' or 'different') and mismatch details.
+    """
+    if golden.shape != new.shape:
+        return {"status": "different", "message": f"shape {golden.shape} -> {new.shape}"}
+    is_float = np.issubdtype(golden.dtype, np.floating) and np.issubdtype(new.dtype, np.floating)
+    if is_float:
+        identical = np.array_equal(golden, new, equal_nan=True)
+    else:
+        identical = np.array_equal(golden, new)
+    if identical:
+        return {"status": "identical"}
+    if is_float:
+        equal = (golden == new) | (np.isnan(golden) & np.isnan(new))
+        with np.errstate(invalid="ignore"):
+            absdiff = np.abs(new.astype(np.float64) - golden.astype(np.float64))
+            reldiff = absdiff / np.maximum(np.abs(golden.astype(np.float64)), np.finfo(np.float64).tiny)
+        if rule["exact"]:
+            mismatch = ~equal
+        else:
+            mismatch = ~(equal | np.isclose(new, golden, rtol=rule["rtol"], atol=rule["atol"]))
+        both_valid = ~np.isnan(absdiff)
+        details = {
+            "max_abs_diff": float(np.max(absdiff[both_valid])) if np.any(both_valid & ~equal) else None,
+            "max_rel_diff": float(np.max(reldiff[both_valid])) if np.any(both_valid & ~equal) else None,
+            "nan_mismatch": int(np.count_nonzero(np.isnan(golden) != np.isnan(new))),
+        }
+    else:
+        mismatch = golden != new
+        details = {}
+    nmismatch = int(np.count_nonzero(mismatch))
+    if nmismatch == 0:
+        return dict(details, status="close")
+    first = np.unravel_index(np.flatnonzero(mismatch)[0], mismatch.shape) if mismatch.ndim > 0 else ()
+    return dict(
+        details,
+        status="different",
+        nmismatch=nmismatch,
+        size=int(mismatch.size),
+        first_index=[int(i) for i in first],
+        first_golden=golden[first].item(),
+        first_new=new[first].item(),
+    )
+
+
+def compare_files(golden_file, new_file, rules):
+    """
+    Compare all variables of two netCDF files.
+
+    Args:
+        golden_file: string
+            Golden file name.
+        new_file: string
+            New file name.
+        rules: list
+            Comparison rules.
+
+    Returns:
+        status: string
+            'identical', 'close' or 'different'.
+        variables: dictionary
+            Comparison result of each variable not identical.
+    """
+    filename = os.path.basename(golden_file)
+    # Raw values: no decoding of times, fill values or scaling
+    with xr.open_dataset(golden_file, decode_cf=False) as dsg, xr.open_dataset(new_file, decode_cf=False) as dsn:
+        variables = {}
+        for varname in sorted(set(dsg.variables) | set(dsn.variables)):
+            if varname not in dsn.variables:
+                variables[varname] = {"status": "different", "message": "missing in new output"}
+                continue
+            if varname not in dsg.variables:
+                variables[varname] = {"status": "different", "message": "not in golden output"}
+                continue
+            vg, vn = dsg[varname], dsn[varname]
+            rule = get_rule(filename, varname, vg.dtype, rules)
+            if rule.get("ignore", False):
+                continue
+            if vg.dims != vn.dims:
+                variables[varname] = {"status": "different", "message": f"dimensions {vg.dims} -> {vn.dims}"}
+                continue
+            result = compare_variable(vg.values, vn.values, rule)
+            if vg.dtype != vn.dtype:
+                result = dict(result, message=f"dtype {vg.dtype} -> {vn.dtype}")
+                if result["status"] == "identical":
+                    result["status"] = "close"
+            if result["status"] != "identical":
+                variables[varname] = dict(result, rule=rule)
+    statuses = [v["status"] for v in variables.values()]
+    status = "different" if "different" in statuses else "close" if "close" in statuses else "identical"
+    return status, variables
+
+
+def list_output_files(output_path):
+    """
+    List netCDF output files (relative paths) under an output directory.
+    """
+    files = []
+    for root, _, names in os.walk(output_path):
+        for name in names:
+            if name.endswith(".nc"):
+                files.append(os.path.relpath(os.path.join(root, name), output_path))
+    return sorted(files)
+
+
+def get_input_checksum(input_path):
+    """
+    Get a checksum of the values of all variables in the netCDF input files (attributes are not used).
+
+    Args:
+        input_path: string
+            Input data directory.
+
+    Returns:
+        checksum: string
+            SHA-256 hex digest.
+    """
+    sha = hashlib.sha256()
+    for relpath in list_output_files(input_path):
+        sha.update(relpath.encode())
+        with xr.open_dataset(os.path.join(input_path, relpath), decode_times=False) as ds:
+            for varname in sorted(ds.variables):
+                values = np.ascontiguousarray(ds[varname].values)
+                sha.update(f"{varname}:{values.dtype.str}:{values.shape}".encode())
+                sha.update(values.tobytes())
+    return sha.hexdigest()
+
+
+def run_golden_case(pipeline, workdir, case, config_updates=None, timeout=None, verbose=False):
+    """
+    Write the synthetic inputs of a golden case and run all pipeline steps.
+
+    Returns:
+        steps: list
+            Dictionary of each step (name, status, message, telemetry).
+        config: dictionary
+            Config parameters written for the case, with the checksum of the inputs (input_checksum).
+    """
+    if os.path.isdir(workdir):
+        shutil.rmtree(workdir)
+    os.makedirs(workdir)
+    config_file = make_case_inputs(dict(case, pipeline=pipeline), workdir, config_updates=config_updates)
+    with open(config_file) as f:
+        config = yaml.safe_load(f)
+    config["input_checksum"] = get_input_checksum(config["clouddata_path"])
+    steps = run_case_process(pipeline, config_file, workdir, timeout=timeout, verbose=verbose)
+    return steps, config
+
+
+def create_golden(pipeline, golden_dir, workdir, config_updates=None, timeout=None, verbose=False):
+    """
+    Run a golden case and save its output files and manifest in golden_dir.
+
+    Args:
+        pipeline: string
+            Pipeline name.
+        golden_dir: string
+            Golden output directory of the pipeline.
+        workdir: string
+            Work directory.
+        config_updates: dictionary, optional, default=None
+            Config parameters replacing the pipeline defaults.
+        timeout: float, optional, default=None
+            Time limit of the run [s].
+        verbose: bool, optional, default=False
+            Show the pipeline log.
+
+    Returns:
+        manifest: dictionary
+            Golden case description, None if a step failed.
+    """
+    logger = logging.getLogger(__name__)
+    case = dict(case_defaults, **golden_cases[pipeline])
+    steps, config = run_golden_case(pipeline, workdir, case, config_updates=config_updates,
+                                    timeout=timeout, verbose=verbose)
+    if (case == dict(case_defaults, **golden_cases[pipeline])) and \
+            (config["input_checksum"] != golden_input_checksums[pipeline]):
+        logger.warning(f"Synthetic inputs of {pipeline} differ from the pinned inputs "
+                       f"(checksum {config['input_checksum']}), the input generator has changed.")
+    failed = [step for step in steps if step["status"] != "ok"]
+    if (len(steps) == 0) or (len(failed) > 0):
+        for step in failed:
+            logger.error(f"Step {step['name']} {step['status']}: {step['message']}")
+        logger.error(f"Golden outputs not created for {pipeline}.")
+        return None
+
+    output_path = os.path.join(workdir, "output")
+    files = list_output_files(output_path)
+    if os.path.isdir(golden_dir):
+        shutil.rmtree(golden_dir)
+    for relpath in files:
+        os.makedirs(os.path.dirname(os.path.join(golden_dir, "outputs", relpath)), exist_ok=True)
+        shutil.copy2(os.path.join(output_path, relpath), os.path.join(golden_dir, "outputs", relpath))
+    manifest = dict(
+        get_git_info(),
+        pipeline=pipeline,
+        case=case,
+        config_updates=config_updates or {},
+        created_on=time.ctime(time.time()),
+        input_checksum=config["input_checksum"],
+        files={relpath: get_file_kind(relpath, config["pixel_path_name"]) for relpath in files},
+    )
+    with open(os.path.join(golden_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=1)
+    logger.info(f"Golden outputs for {pipeline}: {len(files)} files in {golden_dir}")
+    shutil.rmtree(workdir)
+    return manifest
+
+
+def check_golden(golden_dir, workdir, config_updates=None, rules=None, timeout=None, verbose=False):
+    """
+    Run the golden case of golden_dir again and compare all output files.
+
+    Args:
+        golden_dir: string
+            Golden output directory of a pipeline (with manifest.json).
+        workdir: string
+            Work directory.
+        config_updates: dictionary, optional, default=None
+            Config parameters changed for the check (in addition to those of the golden run).
+        rules: list, optional, default=None
+            Comparison rules checked before the default rules.
+        timeout: float, optional, default=None
+            Time limit of the run [s].
+        verbose: bool, optional, default=False
+            Show the pipeline log.
+
+    Returns:
+        result: dictionary
+            Input checksum status, steps, comparison result of each file and overall status
+            ('identical', 'close', 'different').
+    """
+    with open(os.path.join(golden_dir, "manifest.json")) as f:
+        manifest = json.load(f)
+    pipeline = manifest["pipeline"]
+    updates = dict(manifest["config_updates"], **(config_updates or {}))
+    rules = (rules or []) + default_rules
+    steps, config = run_golden_case(pipeline, workdir, manifest["case"], config_updates=updates,
+                                    timeout=timeout, verbose=verbose)
+
+    output_path = os.path.join(workdir, "output")
+    new_files = list_output_files(output_path) if os.path.isdir(output_path) else []
+    files = {}
+    for relpath, kind in manifest["files"].items():
+        if relpath not in new_files:
+            files[relpath] = {"kind": kind, "status": "missing", "variables": {}}
+            continue
+        status, variables = compare_files(
+            os.path.join(golden_dir, "outputs", relpath), os.path.join(output_path, relpath), rules,
+        )
+        files[relpath] = {"kind": kind, "status": status, "variables": variables}
+    for relpath in new_files:
+        if relpath not in manifest["files"]:
+            files[relpath] = {"kind": get_file_kind(relpath, config["pixel_path_name"]),
+                              "status": "extra", "variables": {}}
+
+    # Inputs regenerated differently (e.g. a changed generator) make the comparison meaningless
+    golden_checksum = manifest.get("input_checksum", None)
+    if golden_checksum is None:
+        inputs = "unknown"
+    else:
+        inputs = "identical" if config["input_checksum"] == golden_checksum else "different"
+
+    steps_ok = (len(steps) > 0) and all(step["status"] == "ok" for step in steps)
+    statuses = [f["status"] for f in files.values()]
+    if (not steps_ok) or (inputs == "different") or any(s in ("different", "missing", "extra") for s in statuses):
+        status = "different"
+    else:
+        status = "close" if "close" in statuses else "identical"
+    return dict(
+        get_git_info(),
+        pipeline=pipeline,
+        golden_commit=manifest["commit"],
+        config_updates=updates,
+        inputs=inputs,
+        steps=steps,
+        files=files,
+        status=status,
+    )
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    return str(value)
+
+
+def format_report(result):
+    """
+    Format a readable report of a golden output check.
+
+    Args:
+        result: dictionary
+            Result from check_golden.
+
+    Returns:
+        report: string
+            Report text.
+    """
+    commit = (result["commit"] or "unknown")[:10] + (" (modified)" if result["dirty"] else "")
+    lines = [
+        f"Golden output check: {result['pipeline']}: {result['status'].upper()}",
+        f"  golden commit: {(result['golden_commit'] or 'unknown')[:10]}, new commit: {commit}",
+        f"  config changes: {result['config_updates'] or 'none'}",
+        f"  inputs: {result['inputs']}" + (" (synthetic inputs differ from the golden run)"
+                                           if result["inputs"] == "different" else ""),
+        "  steps: " + (", ".join(f"{step['name']} {step['status']}" for step in result["steps"]) or "not run"),
+    ]
+    for step in result["steps"]:
+        if step["status"] == "failed":
+            lines.append(f"    {step['name']}: {step['message']}")
+
+    # Summary by output kind
+    kinds = {}
+    for f in result["files"].values():
+        counts = kinds.setdefault(f["kind"], {})
+        counts[f["status"]] = counts.get(f["status"], 0) + 1
+    columns = ["identical", "close", "different", "missing", "extra"]
+    lines.append("")
+    lines.append(f"  {'Output':<20s}{'Files':>7s}" + "".join(f"{c:>11s}" for c in columns))
+    for kind, counts in kinds.items():
+        lines.append(f"  {kind:<20s}{sum(counts.values()):>7d}" + "".join(f"{counts.get(c, 0):>11d}" for c in columns))
+
+    # Details of files not identical
+    for relpath, f in result["files"].items():
+        if f["status"] == "identical":
+            continue
+        lines.append("")
+        lines.append(f"  {f['status'].upper():<10s}{relpath}")
+        for varname, v in f["variables"].items():
+            rule = v.get("rule", {})
+            rule_text = "exact" if rule.get("exact", True) else f"rtol={rule['rtol']:g}, atol={rule['atol']:g}"
+            text = f"    {varname} [{rule_text}]: {v['status']}"
+            if "nmismatch" in v:
+                text += f", {v['nmismatch']}/{v['size']} values differ, first at {tuple(v['first_index'])}: " \
+                        f"golden {_format_value(v['first_golden'])}, new {_format_value(v['first_new'])}"
+            if v.get("max_abs_diff", None) is not None:
+                text += f", max abs diff {v['max_abs_diff']:.3g}, max rel diff {v['max_rel_diff']:.3g}"
+            if v.get("nan_mismatch", 0) > 0:
+                text += f", {v['nan_mismatch']} NaN mismatches"
+            if "message" in v:
+                text += f", {v['message']}"
+            lines.append(text)
+    return "\n".join(lines)
+
+
+def _parse_updates(items):
+    """
+    Parse config changes given as key=value (values in YAML syntax).
+    """
+    updates = {}
+    for item in items or []:
+        key, _, value = item.partition("=")
+        updates[key.strip()] = yaml.safe_load(value)
+    return updates
+
+
+def main():
+    from pyflextrkr.ft_utilities import setup_logging
+    parser = argparse.ArgumentParser(description="PyFLEXTRKR golden output regression check.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for command in ["create", "check"]:
+        sub = subparsers.add_parser(command, help=f"{command.capitalize()} golden outputs.")
+        sub.add_argument("--golden-dir", required=True, help="Golden outputs directory (one subdirectory per pipeline).")
+        sub.add_argument("--pipelines", nargs="+", default=list(golden_cases), choices=list(golden_cases))
+        sub.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                         help="Change a config parameter (value in YAML syntax), may be repeated.")
+        sub.add_argument("--workdir", default="./golden_work")
+        sub.add_argument("--timeout", type=float, default=3600, help="Time limit of each run [s].")
+        sub.add_argument("--verbose", action="store_true", help="Show the pipeline log.")
+        if command == "check":
+            sub.add_argument("--rules", default=None, help="YAML file with comparison rules.")
+            sub.add_argument("--report", default=None, help="Write the report (and a .json result) to this file.")
+
+    args = parser.parse_args()
+    setup_logging()
+    logger = logging.getLogger(__name__)
+    updates = _parse_updates(args.set)
+    if args.command == "create":
+        manifests = [
+            create_golden(pipeline, os.path.join(args.golden_dir, pipeline), os.path.join(args.workdir, pipeline),
+                          config_updates=updates, timeout=args.timeout, verbose=args.verbose)
+            for pipeline in args.pipelines
+        ]
+        sys.exit(0 if all(m is not None for m in manifests) else 1)
+
+    rules = []
+    if args.rules is not None:
+        with open(args.rules) as f:
+            rules = yaml.safe_load(f) or []
+    reports, results = [], []
+    for pipeline in args.pipelines:
+        golden_dir = os.path.join(args.golden_dir, pipeline)
+        if not os.path.isfile(os.path.join(golden_dir, "manifest.json")):
+            logger.warning(f"No golden outputs for {pipeline} in {golden_dir}")
+            continue
+        result = check_golden(golden_dir, os.path.join(args.workdir, pipeline), config_updates=updates,
+                              rules=rules, timeout=args.timeout, verbose=args.verbose)
+        results.append(result)
+        reports.append(format_report(result))
+    report = "\n\n".join(reports)
+    print(report)
+    if args.report is not None:
+        with open(args.report, "w") as f:
+            f.write(report + "\n")
+        with open(os.path.splitext(args.report)[0] + ".json", "w") as f:
+            json.dump(results, f, indent=1, default=str)
+    sys.exit(0 if all(r["status"] != "different" for r in results) and len(results) > 0 else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,685 @@
+"""
+Run the tracking pipelines on synthetic storms and record the time of each step.
+
+Each case (pipeline x grid size x number of files x storms per frame) writes synthetic
+input files, runs all pipeline steps with telemetry enabled in a separate process,
+and appends one record to a JSON-lines results file. Records contain the git commit,
+so results of different commits can be compared:
+
+    python -m pyflextrkr.benchmark.run_benchmark run --pipelines tbpf cells generic \\
+        --grid-sizes 256 512 --nfiles 12 24 --storms 5 20 --results benchmark_results.jsonl
+    python -m pyflextrkr.benchmark.run_benchmark compare benchmark_results.jsonl \\
+        --base <commit> --new <commit>
+
+Pipelined identification and linking (run_pipeline) is compared with the steps run in turn:
+
+    python -m pyflextrkr.benchmark.run_benchmark run --pipelines tbpf generic --run-pipeline 0 1 \\
+        --backend process --nprocesses 4 --results benchmark_results.jsonl
+    python -m pyflextrkr.benchmark.run_benchmark compare-pipeline benchmark_results.jsonl
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import logging
+import argparse
+import itertools
+import platform
+import subprocess
+import numpy as np
+import yaml
+from pyflextrkr.benchmark.synthetic_storms import (
+    make_storm_catalog,
+    get_frame_times,
+    write_tbpf_files,
+    write_reflectivity_files,
+    write_generic_files,
+)
+
+# Common config parameters of all pipelines
+common_config = {
+    "run_parallel": 0,
+    "nprocesses": 1,
+    "timeout": 360,
+    "tracking_path_name": "tracking",
+    "stats_path_name": "stats",
+    "time_dimname": "time",
+    "othresh": 0.3,
+    "remove_shorttracks": 1,
+    "trackstats_dense_netcdf": 1,
+    "match_pixel_dt_thresh": 60.0,
+    "feature_varname": "feature_number",
+    "nfeature_varname": "nfeatures",
+    "featuresize_varname": "npix_feature",
+    "tracks_dimname": "tracks",
+    "times_dimname": "times",
+    "fillval": -9999,
+    "telemetry": True,
+}
+
+# Tb/precipitation MCS tracking (idclouds_tbpf), parameters follow config_wrf4km_mcs_tbpf_example.yml
+tbpf_config = {
+    "databasename": "tb_rainrate_",
+    "time_format": "yyyymodd_hhmm",
+    "pixel_path_name": "mcstracking",
+    "pixel_radius": 4.0,
+    "datatimeresolution": 1.0,
+    "tb_varname": "tb",
+    "pcp_varname": "rainrate",
+    "clouddatasource": "model",
+    "pfdatasource": "wrf",
+    "x_dimname": "lon",
+    "y_dimname": "lat",
+    "x_coordname": "lon2d",
+    "y_coordname": "lat2d",
+    "landmask_filename": "",
+    "feature_type": "tb_pf",
+    "mincoldcorepix": 4,
+    "smoothwindowdimensions": 15,
+    "medfiltsize": 5,
+    "area_thresh": 800,
+    "miss_thresh": 0.35,
+    "cloudtb_core": 225.0,
+    "cloudtb_cold": 241.0,
+    "cloudtb_warm": 261.0,
+    "cloudtb_cloud": 261.0,
+    "absolutetb_threshs": [160, 330],
+    "warmanvilexpansion": 0,
+    "cloudidmethod": "label_grow",
+    "linkpf": 1,
+    "pf_smooth_window": 5,
+    "pf_dbz_thresh": 3,
+    "pf_link_area_thresh": 648.0,
+    "timegap": 3.1,
+    "nmaxlinks": 50,
+    "maxnclouds": 2000,
+    "duration_range": [2, 300],
+    "mcs_tb_area_thresh": 40000,
+    "mcs_tb_duration_thresh": 4,
+    "mcs_tb_split_duration": 12,
+    "mcs_tb_merge_duration": 12,
+    "mcs_tb_gap": 1,
+    "mcs_pf_majoraxis_thresh": 100,
+    "max_pf_majoraxis_thresh": 1800,
+    "mcs_pf_durationthresh": 4,
+    "mcs_pf_majoraxis_for_lifetime": 20,
+    "mcs_pf_gap": 1,
+    "landfrac_thresh": 90,
+    "pf_rr_thres": 2.0,
+    "nmaxpf": 3,
+    "nmaxcore": 20,
+    "pcp_thresh": 1.0,
+    "heavy_rainrate_thresh": 10.0,
+    "coefs_pf_area": [2874.05, 89.825],
+    "coefs_pf_rr": [3.01657, 0.0144461],
+    "coefs_pf_skew": [0.194462, 0.0100072],
+    "coefs_pf_heavyratio": [3.419024, 0.4387090],
+    "pf_dimname": "nmaxpf",
+    "mcstbstats_filebase": "mcs_tracks_",
+    "mcspfstats_filebase": "mcs_tracks_pf_",
+    "mcsrobust_filebase": "mcs_tracks_robust_",
+    "pixeltracking_filebase": "mcstrack_",
+    "mcsfinal_filebase": "mcs_tracks_final_",
+    "lag_for_speed": 1,
+    "track_number_for_speed": "pcptracknumber",
+    "track_field_for_speed": "precipitation",
+    "min_size_thresh_for_speed": 20,
+    "max_speed_thresh": 50,
+}
+
+# Radar convective cell tracking (idcells_reflectivity), parameters follow config_nexrad500m_example.yml
+cells_config = {
+    "databasename": "synradar_",
+    "time_format": "yyyymodd.hhmmss",
+    "pixel_path_name": "celltracking",
+    "feature_type": "radar_cells",
+    "advection_field_threshold": 10,
+    "advection_med_filt_len": 9,
+    "advection_max_movement_mps": 60,
+    "advection_mask_method": "greater",
+    "advection_buffer": 30,
+    "advection_size_threshold": 10,
+    "advection_tiles": [1, 1],
+    "advection_filename": "advection_",
+    "absConvThres": 60,
+    "minZdiff": 10,
+    "truncZconvThres": 55,
+    "mindBZuse": 25,
+    "dBZforMaxConvRadius": 60,
+    "conv_rad_increment": 0.5,
+    "conv_rad_start": 1.0,
+    "bkg_refl_increment": 5,
+    "convolve_method": "ndimage",
+    "maxConvRadius": 5,
+    "radii_expand": [1, 2, 3, 4, 5],
+    "weakEchoThres": 15,
+    "bkgrndRadius": 11,
+    "min_corearea": 4,
+    "echotop_gap": 4,
+    "sfc_dz_min": 1000,
+    "sfc_dz_max": 3000,
+    "radar_sensitivity": 0.0,
+    "return_diag": True,
+    "dx": 500,
+    "dy": 500,
+    "x_dimname": "x",
+    "y_dimname": "y",
+    "z_dimname": "z",
+    "x_varname": "x",
+    "y_varname": "y",
+    "z_varname": "z",
+    "lon_varname": "point_longitude",
+    "lat_varname": "point_latitude",
+    "reflectivity_varname": "reflectivity",
+    "input_source": "radar",
+    "datatimeresolution": 0.0833,
+    "pixel_radius": 0.5,
+    "ref_varname": "dbz_comp",
+    "timegap": 0.25,
+    "maxnclouds": 1000,
+    "nmaxlinks": 10,
+    "duration_range": [2, 100],
+    "pixeltracking_filebase": "celltracks_",
+}
+
+# Generic feature tracking (idfeature_generic), parameters follow config_era5_z500_example.yml
+generic_config = {
+    "databasename": "synfield_",
+    "time_format": "yyyymodd.hhmmss",
+    "pixel_path_name": "generictracking",
+    "feature_type": "generic",
+    "datatimeresolution": 6.0,
+    "pixel_radius": 25.0,
+    "x_dimname": "lon",
+    "y_dimname": "lat",
+    "field_varname": "field",
+    "label_method": "ndimage.label",
+    "field_thresh": [1.6, 1000],
+    "min_size": 20000.0,
+    "R_earth": 6378.0,
+    "timegap": 12.0,
+    "maxnclouds": 1000,
+    "nmaxlinks": 10,
+    "duration_range": [2, 100],
+    "maintrack_area_thresh": 50000,
+    "maintrack_lifetime_thresh": 24,
+    "split_duration": 24,
+    "merge_duration": 24,
+    "finalstats_filebase": "trackstats_final_",
+    "pixeltracking_filebase": "generictracks_",
+}
+
+# Pipeline definitions: config, storm parameters in grid units (pixels, frames), input file writer
+pipelines = {
+    "tbpf": {
+        "config": tbpf_config,
+        "time_step_minutes": 60,
+        "storms": {"lifetime_range": (6, 20), "radius_range": (15, 45), "speed_range": (1.0, 4.0)},
+        "writer": write_tbpf_files,
+    },
+    "cells": {
+        "config": cells_config,
+        "time_step_minutes": 5,
+        "storms": {"lifetime_range": (3, 18), "radius_range": (4, 16), "speed_range": (1.0, 6.0)},
+        "writer": write_reflectivity_files,
+    },
+    "generic": {
+        "config": generic_config,
+        "time_step_minutes": 360,
+        "storms": {"lifetime_range": (3, 16), "radius_range": (6, 16), "speed_range": (0.5, 2.0)},
+        "writer": write_generic_files,
+    },
+}
+
+
+def get_steps(pipeline, config):
+    """
+    Get the steps of a pipeline in run order, same as the run scripts.
+
+    Args:
+        pipeline: string
+            Pipeline name.
+        config: dictionary
+            Dictionary containing config parameters.
+
+    Returns:
+        steps: list
+            List of (step name, function without arguments).
+    """
+    from pyflextrkr.idfeature_driver import idfeature_driver
+    from pyflextrkr.tracksingle_driver import tracksingle_driver
+    from pyflextrkr.gettracks import gettracknumbers
+    from pyflextrkr.trackstats_driver import trackstats_driver
+    from pyflextrkr.mapfeature_driver import mapfeature_driver
+    from pyflextrkr.pipeline_driver import idfeature_tracksingle_pipeline
+
+    steps = [("idfeature", lambda: idfeature_driver(config))]
+    link_steps = [("tracksingle", lambda: tracksingle_driver(config))]
+    # Cell tracking links with drift from the cloudid files, so it always runs the steps in turn
+    if config.get("run_pipeline", False) and (pipeline != "cells"):
+        # Identify features and link them in one pipeline
+        steps = [("pipeline", lambda: idfeature_tracksingle_pipeline(config))]
+        link_steps = []
+    if pipeline == "tbpf":
+        from pyflextrkr.identifymcs import identifymcs_tb
+        from pyflextrkr.matchtbpf_driver import match_tbpf_tracks
+        from pyflextrkr.robustmcspf import define_robust_mcs_pf
+        from pyflextrkr.movement_speed import movement_speed
+        steps += link_steps + [
+            ("gettracks", lambda: gettracknumbers(config)),
+            ("trackstats", lambda: trackstats_driver(config)),
+            ("identifymcs", lambda: identifymcs_tb(config)),
+            ("matchpf", lambda: match_tbpf_tracks(config)),
+            ("robustmcs", lambda: define_robust_mcs_pf(config)),
+            ("mapfeature", lambda: mapfeature_driver(config, trackstats_filebase=config["mcsrobust_filebase"])),
+            ("speed", lambda: movement_speed(config)),
+        ]
+    elif pipeline == "cells":
+        from pyflextrkr.advection_tiles import calc_mean_advection
+
+        def run_advection():
+            driftfile = calc_mean_advection(config)
+            config.update({"driftfile": driftfile})
+        steps += [
+            ("advection", run_advection),
+            ("tracksingle", lambda: tracksingle_driver(config)),
+            ("gettracks", lambda: gettracknumbers(config)),
+            ("trackstats", lambda: trackstats_driver(config)),
+            ("mapfeature", lambda: mapfeature_driver(config)),
+        ]
+    elif pipeline == "generic":
+        from pyflextrkr.link_mergesplit_tracks import link_mergesplit_tracks
+        steps += link_steps + [
+            ("gettracks", lambda: gettracknumbers(config)),
+            ("trackstats", lambda: trackstats_driver(config)),
+            ("mergesplit", lambda: link_mergesplit_tracks(config)),
+            ("mapfeature", lambda: mapfeature_driver(config, trackstats_filebase=config["finalstats_filebase"])),
+        ]
+    return steps
+
+
+def _format_date(value):
+    """
+    Format a datetime64 as a config date string (yyyymodd.hhmm).
+    """
+    timestamp = value.astype("datetime64[s]").item()
+    return timestamp.strftime("%Y%m%d.%H%M")
+
+
+def make_case_inputs(case, workdir, config_updates=None):
+    """
+    Write the synthetic input files and the config file of a benchmark case.
+
+    Args:
+        case: dictionary
+            Case parameters: pipeline, grid_size, nfiles, nstorms, seed, merge_fraction,
+            split_fraction, parallel_backend, nprocesses.
+        workdir: string
+            Case work directory.
+        config_updates: dictionary, optional, default=None
+            Config parameters replacing the pipeline defaults.
+
+    Returns:
+        config_file: string
+            Config file name.
+    """
+    pipeline = pipelines[case["pipeline"]]
+    ny = nx = case["grid_size"]
+    nfiles = case["nfiles"]
+    catalog = make_storm_catalog(
+        ny, nx, nfiles, case["nstorms"],
+        merge_fraction=case["merge_fraction"],
+        split_fraction=case["split_fraction"],
+        seed=case["seed"],
+        **pipeline["storms"],
+    )
+    input_path = os.path.join(workdir, "input") + "/"
+    config = dict(common_config, **pipeline["config"])
+    pipeline["writer"](
+        input_path, catalog, ny, nx, nfiles,
+        basename=config["databasename"],
+        time_format=config["time_format"],
+        time_step_minutes=pipeline["time_step_minutes"],
+        seed=case["seed"],
+    )
+    times = get_frame_times(nfiles, pipeline["time_step_minutes"])
+    config.update({
+        "startdate": _format_date(times[0]),
+        "enddate": _format_date(times[-1]),
+        "clouddata_path": input_path,
+        "root_path": os.path.join(workdir, "output"),
+        "dask_tmp_dir": workdir,
+        "nprocesses": case["nprocesses"],
+    })
+    if case["parallel_backend"] is not None:
+        config["parallel_backend"] = case["parallel_backend"]
+        config["run_parallel"] = 0 if case["parallel_backend"] == "serial" else 1
+    config.update(config_updates or {})
+    config_file = os.path.join(workdir, "config.yml")
+    with open(config_file, "w") as f:
+        yaml.safe_dump(config, f, sort_keys=False)
+    return config_file
+
+
+def run_case_steps(pipeline, config_file):
+    """
+    Run all steps of a pipeline with telemetry, steps after a failed step are skipped.
+
+    Args:
+        pipeline: string
+            Pipeline name.
+        config_file: string
+            Config file name.
+
+    Returns:
+        steps: list
+            Dictionary of each step: name, status, message and telemetry stage summary.
+    """
+    from pyflextrkr import ft_telemetry
+    from pyflextrkr.ft_utilities import load_config
+    from pyflextrkr.ft_executor import get_backend_name
+    logger = logging.getLogger(__name__)
+
+    config = load_config(config_file)
+    client = None
+    if get_backend_name(config) == "dask":
+        from dask.distributed import Client, LocalCluster
+        cluster = LocalCluster(n_workers=config["nprocesses"], threads_per_worker=1)
+        client = Client(cluster)
+
+    results = []
+    failed = False
+    for name, func in get_steps(pipeline, config):
+        if failed:
+            results.append({"name": name, "status": "skipped", "message": ""})
+            continue
+        status, message = "ok", ""
+        try:
+            with ft_telemetry.stage(config, name):
+                func()
+        except (Exception, SystemExit) as e:
+            status, message = "failed", f"{type(e).__name__}: {e}"
+            logger.error(f"Benchmark step {name} failed: {message}")
+            failed = True
+        results.append({"name": name, "status": status, "message": message})
+
+    # Add the telemetry of each step (top level stages) and of the driver stages within it
+    stages = ft_telemetry.get_stage_summary()
+    summary = {s["name"]: s for s in stages if s["parent"] == ""}
+    for step in results:
+        step.update({key: value for key, value in summary.get(step["name"], {}).items()
+                     if key not in ("name", "parent")})
+        step["stages"] = [s for s in stages if s["parent"] == step["name"]]
+    if client is not None:
+        client.close()
+    return results
+
+
+def run_case_process(pipeline, config_file, workdir, timeout=None, verbose=False):
+    """
+    Run the steps of a case in a new process.
+
+    Args:
+        pipeline: string
+            Pipeline name.
+        config_file: string
+            Config file name.
+        workdir: string
+            Case work directory, the step results are written here.
+        timeout: float, optional, default=None
+            Time limit [s].
+        verbose: bool, optional, default=False
+            Show the pipeline log.
+
+    Returns:
+        steps: list
+            Dictionary of each step (see run_case_steps), empty if the process did not finish.
+    """
+    logger = logging.getLogger(__name__)
+    result_file = os.path.join(workdir, "steps.json")
+    if os.path.isfile(result_file):
+        os.remove(result_file)
+    try:
+        proc = subprocess.run(
+            [sys.executable, "-m", "pyflextrkr.benchmark.run_benchmark", "case",
+             pipeline, config_file, result_file],
+            capture_output=not verbose, text=True, timeout=timeout,
+        )
+        returncode, stderr = proc.returncode, proc.stderr
+    except subprocess.TimeoutExpired as e:
+        returncode, stderr = "timeout", e.stderr
+    if os.path.isfile(result_file):
+        with open(result_file) as f:
+            return json.load(f)
+    logger.error(f"Case {workdir} did not finish (exit code {returncode})")
+    if stderr:
+        logger.error(stderr[-2000:] if isinstance(stderr, str) else stderr[-2000:].decode(errors="replace"))
+    return []
+
+
+def get_git_info():
+    """
+    Get the git commit of the pyflextrkr source tree and if it has uncommitted changes.
+    """
+    source_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=source_dir, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=source_dir,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": len(status) > 0}
+
+
+def get_environment():
+    """
+    Get the environment information saved with each record.
+    """
+    import xarray as xr
+    import scipy
+    return dict(
+        get_git_info(),
+        host=socket.gethostname(),
+        platform=platform.platform(),
+        cpu_count=os.cpu_count(),
+        python=platform.python_version(),
+        numpy=np.__version__,
+        scipy=scipy.__version__,
+        xarray=xr.__version__,
+    )
+
+
+def run_benchmark(args):
+    """
+    Run all benchmark cases and append a record of each to the results file.
+    """
+    logger = logging.getLogger(__name__)
+    environment = get_environment()
+    cases = itertools.product(args.pipelines, args.grid_sizes, args.nfiles, args.storms, args.run_pipeline,
+                              range(args.repeat))
+    for pipeline, grid_size, nfiles, nstorms, run_pipeline, irepeat in cases:
+        case = {
+            "pipeline": pipeline,
+            "grid_size": grid_size,
+            "nfiles": nfiles,
+            "nstorms": nstorms,
+            "seed": args.seed,
+            "merge_fraction": args.merge_fraction,
+            "split_fraction": args.split_fraction,
+            "parallel_backend": args.backend,
+            "nprocesses": args.nprocesses,
+            "run_pipeline": bool(run_pipeline),
+        }
+        case_name = f"{pipeline}_g{grid_size}_f{nfiles}_s{nstorms}" + ("_pipe" if run_pipeline else "")
+        workdir = os.path.join(args.workdir, case_name)
+        if os.path.isdir(workdir):
+            shutil.rmtree(workdir)
+        os.makedirs(workdir)
+        logger.info(f"Benchmark case: {case_name} ({irepeat + 1}/{args.repeat})")
+
+        # Synthetic inputs are written in this process, only the pipeline run is timed
+        t0 = time.perf_counter()
+        config_file = make_case_inputs(case, workdir, config_updates={"run_pipeline": bool(run_pipeline)})
+        generate_time = time.perf_counter() - t0
+
+        # Run the pipeline in a new process, so memory peaks and caches are not shared between cases
+        t0 = time.perf_counter()
+        steps = run_case_process(pipeline, config_file, workdir, timeout=args.timeout, verbose=args.verbose)
+        wall_time = time.perf_counter() - t0
+        status = "ok" if (len(steps) > 0) and all(step["status"] == "ok" for step in steps) else "failed"
+
+        record = dict(
+            environment,
+            timestamp=time.strftime("%Y-%m-%dT%H:%M:%S"),
+            case=case_name,
+            repeat=irepeat,
+            status=status,
+            generate_time=generate_time,
+            wall_time=wall_time,
+            steps=steps,
+            **case,
+        )
+        with open(args.results, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        step_times = ", ".join(f"{step['name']} {step.get('wall_time') or 0:.2f}s" for step in steps)
+        logger.info(f"{case_name}: {status}, total {wall_time:.2f}s ({step_times})")
+        if not args.keep:
+            shutil.rmtree(workdir)
+
+
+def load_results(filename):
+    """
+    Load benchmark records from a results file.
+    """
+    with open(filename) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _get_step_times(records, commit):
+    """
+    Get the median wall time of each case/step of a commit (commit may be a prefix).
+    """
+    times = {}
+    for record in records:
+        if (record["commit"] is None) or (not record["commit"].startswith(commit)):
+            continue
+        key = (record["case"], record["parallel_backend"] or "", record["nprocesses"])
+        for step in record["steps"] + [{"name": "total", "status": record["status"], "wall_time": record["wall_time"]}]:
+            if step["status"] == "ok":
+                times.setdefault(key + (step["name"],), []).append(step["wall_time"])
+    return {key: float(np.median(values)) for key, values in times.items()}
+
+
+def compare_results(args):
+    """
+    Print the wall time of each case/step of two commits and their ratio (new/base).
+    """
+    records = load_results(args.results)
+    base = _get_step_times(records, args.base)
+    new = _get_step_times(records, args.new)
+    if (len(base) == 0) or (len(new) == 0):
+        print(f"No results for commit: {args.base if len(base) == 0 else args.new}")
+        return
+    header = f"{'Case':<28s}{'Backend':<10s}{'Step':<14s}{'Base[s]':>10s}{'New[s]':>10s}{'New/Base':>10s}"
+    print(header)
+    print("-" * len(header))
+    # Cases in sorted order, steps in run order
+    keys = list(base) + [key for key in new if key not in base]
+    for key in sorted(keys, key=lambda key: key[:3]):
+        case, backend, nprocesses, step = key
+        tbase, tnew = base.get(key, None), new.get(key, None)
+        ratio = f"{tnew / tbase:.2f}" if (tbase is not None) and (tnew is not None) and (tbase > 0) else "-"
+        print(f"{case:<28s}{f'{backend}x{nprocesses}':<10s}{step:<14s}"
+              f"{'-' if tbase is None else f'{tbase:.2f}':>10s}"
+              f"{'-' if tnew is None else f'{tnew:.2f}':>10s}{ratio:>10s}")
+
+
+def compare_pipeline(args):
+    """
+    Print the pipeline step time of each case and the sum of the idfeature and tracksingle
+    step times of the same case run in turn (cases run with --run-pipeline 0 1).
+    """
+    records = load_results(args.results)
+    times = {}
+    for record in records:
+        if (args.commit is not None) and ((record["commit"] is None) or (not record["commit"].startswith(args.commit))):
+            continue
+        case = record["case"][:-len("_pipe")] if record.get("run_pipeline", False) else record["case"]
+        key = (case, record["parallel_backend"] or "", record["nprocesses"])
+        step_times = {step["name"]: step["wall_time"] for step in record["steps"] if step["status"] == "ok"}
+        for name in ["idfeature", "tracksingle", "pipeline"]:
+            if name in step_times:
+                times.setdefault(key, {}).setdefault(name, []).append(step_times[name])
+    header = f"{'Case':<28s}{'Backend':<10s}{'idfeature[s]':>14s}{'tracksingle[s]':>16s}" \
+             f"{'Sum[s]':>10s}{'Pipeline[s]':>13s}{'Pipeline/Sum':>14s}"
+    print(header)
+    print("-" * len(header))
+    for key in sorted(times):
+        case, backend, nprocesses = key
+        median = {name: float(np.median(values)) for name, values in times[key].items()}
+        if ("pipeline" not in median) or ("idfeature" not in median) or ("tracksingle" not in median):
+            continue
+        tsum = median["idfeature"] + median["tracksingle"]
+        print(f"{case:<28s}{f'{backend}x{nprocesses}':<10s}{median['idfeature']:>14.2f}"
+              f"{median['tracksingle']:>16.2f}{tsum:>10.2f}{median['pipeline']:>13.2f}"
+              f"{median['pipeline'] / tsum:>14.2f}")
+
+
+def main():
+    from pyflextrkr.ft_utilities import setup_logging
+    parser = argparse.ArgumentParser(description="PyFLEXTRKR benchmark with synthetic storms.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run benchmark cases.")
+    run_parser.add_argument("--pipelines", nargs="+", default=list(pipelines), choices=list(pipelines))
+    run_parser.add_argument("--grid-sizes", nargs="+", type=int, default=[256, 512])
+    run_parser.add_argument("--nfiles", nargs="+", type=int, default=[12, 24])
+    run_parser.add_argument("--storms", nargs="+", type=int, default=[5, 20], help="Mean storms per frame.")
+    run_parser.add_argument("--merge-fraction", type=float, default=0.1)
+    run_parser.add_argument("--split-fraction", type=float, default=0.1)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--repeat", type=int, default=1)
+    run_parser.add_argument("--backend", default=None, help="Parallel backend (default: serial).")
+    run_parser.add_argument("--nprocesses", type=int, default=1)
+    run_parser.add_argument("--run-pipeline", nargs="+", type=int, default=[0], choices=[0, 1],
+                            help="Run idfeature and tracksingle in turn (0) and/or pipelined (1).")
+    run_parser.add_argument("--timeout", type=float, default=3600, help="Time limit of each case [s].")
+    run_parser.add_argument("--workdir", default="./benchmark_work")
+    run_parser.add_argument("--results", default="./benchmark_results.jsonl")
+    run_parser.add_argument("--keep", action="store_true", help="Keep the case input/output files.")
+    run_parser.add_argument("--verbose", action="store_true", help="Show the pipeline log.")
+
+    compare_parser = subparsers.add_parser("compare", help="Compare the results of two commits.")
+    compare_parser.add_argument("results")
+    compare_parser.add_argument("--base", required=True, help="Base commit (or prefix).")
+    compare_parser.add_argument("--new", required=True, help="New commit (or prefix).")
+
+    pipeline_parser = subparsers.add_parser(
+        "compare-pipeline", help="Compare pipelined and sequential idfeature + tracksingle.")
+    pipeline_parser.add_argument("results")
+    pipeline_parser.add_argument("--commit", default=None, help="Only use results of this commit (or prefix).")
+
+    case_parser = subparsers.add_parser("case", help="Run the steps of one case (used by run).")
+    case_parser.add_argument("pipeline", choices=list(pipelines))
+    case_parser.add_argument("config_file")
+    case_parser.add_argument("result_file")
+
+    args = parser.parse_args()
+    setup_logging()
+    if args.command == "run":
+        run_benchmark(args)
+    elif args.command == "compare":
+        compare_results(args)
+    elif args.command == "compare-pipeline":
+        compare_pipeline(args)
+    elif args.command == "case":
+        steps = run_case_steps(args.pipeline, args.config_file)
+        with open(args.result_file, "w") as f:
+            json.dump(steps, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""
+Compare the Dask scheduler overhead and peak client memory of per-file task submission.
+
+Two approaches run the same per-file tasks on a Dask LocalCluster:
+    compute: one dask.delayed task per file and a single dask.compute(*results),
+             the results are reduced after the last file finishes.
+    executor: DaskExecutor (ft_executor) with batched chunks, a bounded number of chunks
+              in flight, and results streamed into the reducer as they arrive.
+
+Each per-file task waits for a fixed time (the stand-in for reading a file) and returns
+an array (the stand-in for its per-file statistics), which the reducer folds into a running sum.
+Each approach runs in a new process, whose resident memory is sampled during the run.
+The client process also runs the scheduler, so its memory includes the task graph.
+
+    python -m pyflextrkr.benchmark.scheduler_overhead run --ntasks 8760 26280 \\
+        --nworkers 4 --task-time 0.001 --result-kb 64 --results scheduler_results.jsonl
+"""
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+import subprocess
+import numpy as np
+try:
+    import psutil
+except ImportError:
+    psutil = None
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Memory sampling interval [s]
+sample_interval = 0.005
+
+
+def get_rss():
+    """
+    Get the resident memory of the current process.
+
+    Without psutil, the peak resident memory so far is returned, which is the same
+    for a peak measurement since each approach runs in a new process.
+
+    Returns:
+        rss: int
+            [bytes] Resident memory, 0 if it cannot be measured.
+    """
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    return 0
+
+
+def file_task(ifile, task_time, result_size):
+    """
+    Stand-in for a per-file task.
+
+    Args:
+        ifile: int
+            File index.
+        task_time: float
+            [s] Time spent on the file.
+        result_size: int
+            Number of float32 values returned.
+
+    Returns:
+        result: np.ndarray
+            Per-file result.
+    """
+    if task_time > 0:
+        time.sleep(task_time)
+    return np.full(result_size, ifile, dtype=np.float32)
+
+
+class MemorySampler(object):
+    """
+    Sample the resident memory of the current process in a background thread.
+    """
+
+    def __init__(self, interval=sample_interval):
+        self.interval = interval
+        self.baseline = get_rss()
+        self.peak = self.baseline
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, get_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, get_rss())
+        return False
+
+
+def run_compute(client, ntasks, task_time, result_size):
+    """
+    One delayed task per file and a single dask.compute, then reduce.
+
+    Returns:
+        total: float
+            Reduced result.
+        first_result_time: float
+            [s] Time until the reducer received the first result.
+    """
+    import dask
+    t0 = time.perf_counter()
+    results = [dask.delayed(file_task)(ifile, task_time, result_size) for ifile in range(ntasks)]
+    results = dask.compute(*results, scheduler=client)
+    first_result_time = time.perf_counter() - t0
+    total = 0.0
+    for result in results:
+        total += float(result.sum(dtype=np.float64))
+    return total, first_result_time
+
+
+def run_executor(config, ntasks, task_time, result_size):
+    """
+    Batched DaskExecutor tasks with results streamed into the reducer.
+
+    Returns:
+        total: float
+            Reduced result.
+        first_result_time: float
+            [s] Time until the reducer received the first result.
+    """
+    from pyflextrkr.ft_executor import get_executor
+    t0 = time.perf_counter()
+    first_result_time = None
+    total = 0.0
+    args_list = [(ifile, task_time, result_size) for ifile in range(ntasks)]
+    with get_executor(config) as executor:
+        for result in executor.imap(file_task, args_list):
+            if first_result_time is None:
+                first_result_time = time.perf_counter() - t0
+            total += float(result.sum(dtype=np.float64))
+    return total, first_result_time
+
+
+def run_approach(approach, ntasks, nworkers, task_time, result_kb, chunksize="auto", max_inflight=None):
+    """
+    Run one approach on a new LocalCluster and measure it.
+
+    Args:
+        approach: string
+            'compute' or 'executor'.
+        ntasks: int
+            Number of per-file tasks.
+        nworkers: int
+            Number of Dask worker processes.
+        task_time: float
+            [s] Time spent on each file.
+        result_kb: float
+            [KB] Size of each per-file result.
+        chunksize: int or 'auto', default='auto'
+            Executor parallel_chunksize.
+        max_inflight: int, default=None
+            Executor parallel_max_inflight.
+
+    Returns:
+        record: dictionary
+            Measurements of the run.
+    """
+    from dask.distributed import Client, LocalCluster
+    result_size = max(int(result_kb * 1024 / 4), 1)
+    cluster = LocalCluster(n_workers=nworkers, threads_per_worker=1, processes=True, dashboard_address=None)
+    client = Client(cluster)
+    config = {
+        "parallel_backend": "dask",
+        "nprocesses": nworkers,
+        "parallel_chunksize": chunksize,
+        "parallel_max_inflight": max_inflight,
+    }
+    # Warm up the workers so both approaches start from imported modules
+    client.run(lambda: None)
+    client.submit(file_task, 0, 0, 1, pure=False).result()
+    with MemorySampler() as sampler:
+        t0 = time.perf_counter()
+        if approach == "compute":
+            total, first_result_time = run_compute(client, ntasks, task_time, result_size)
+        else:
+            total, first_result_time = run_executor(config, ntasks, task_time, result_size)
+        wall_time = time.perf_counter() - t0
+    client.close()
+    cluster.close()
+
+    # Expected sum of all per-file results
+    expected = result_size * ntasks * (ntasks - 1) / 2
+    ideal_time = ntasks * task_time / nworkers
+    return {
+        "approach": approach,
+        "ntasks": ntasks,
+        "nworkers": nworkers,
+        "task_time": task_time,
+        "result_kb": result_kb,
+        "chunksize": chunksize,
+        "max_inflight": max_inflight,
+        "wall_time": wall_time,
+        "ideal_time": ideal_time,
+        "overhead_time": wall_time - ideal_time,
+        "overhead_per_task_ms": 1000 * (wall_time - ideal_time) / ntasks,
+        "first_result_time": first_result_time,
+        "peak_client_mb": (sampler.peak - sampler.baseline) / 1024**2,
+        "correct": bool(np.isclose(total, expected)),
+    }
+
+
+def run_approach_process(args_dict, timeout=None):
+    """
+    Run one approach in a new process, so memory peaks are not shared between runs.
+
+    Returns:
+        record: dictionary
+            Measurements of the run (see run_approach), None if the process did not finish.
+    """
+    logger = logging.getLogger(__name__)
+    try:
+        proc = subprocess.run(
+            [sys.executable, "-m", "pyflextrkr.benchmark.scheduler_overhead", "case", json.dumps(args_dict)],
+            capture_output=True, text=True, timeout=timeout,
+        )
+    except subprocess.TimeoutExpired:
+        logger.error(f"Run did not finish in {timeout} s: {args_dict}")
+        return None
+    if proc.returncode != 0:
+        logger.error(f"Run failed (exit code {proc.returncode}): {args_dict}")
+        logger.error(proc.stderr[-2000:])
+        return None
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def run_benchmark(args):
+    """
+    Run both approaches for each number of tasks and append a record of each to the results file.
+    """
+    from pyflextrkr.benchmark.run_benchmark import get_environment
+    environment = get_environment()
+    chunksize = args.chunksize if args.chunksize == "auto" else int(args.chunksize)
+    header = f"{'Approach':<10s}{'Tasks':>8s}{'Wall[s]':>10s}{'Overhead[s]':>13s}" \
+             f"{'ms/task':>9s}{'First[s]':>10s}{'PeakMB':>9s}{'OK':>4s}"
+    print(header)
+    print("-" * len(header))
+    for ntasks in args.ntasks:
+        for approach in ["compute", "executor"]:
+            args_dict = dict(
+                approach=approach, ntasks=ntasks, nworkers=args.nworkers, task_time=args.task_time,
+                result_kb=args.result_kb, chunksize=chunksize, max_inflight=args.max_inflight,
+            )
+            record = run_approach_process(args_dict, timeout=args.timeout)
+            if record is None:
+                print(f"{approach:<10s}{ntasks:>8d}  failed")
+                continue
+            with open(args.results, "a") as f:
+                f.write(json.dumps(dict(environment, timestamp=time.strftime("%Y-%m-%dT%H:%M:%S"),
+                                        **record)) + "\n")
+            print(f"{approach:<10s}{ntasks:>8d}{record['wall_time']:>10.2f}{record['overhead_time']:>13.2f}"
+                  f"{record['overhead_per_task_ms']:>9.2f}{record['first_result_time']:>10.2f}"
+                  f"{record['peak_client_mb']:>9.1f}{'y' if record['correct'] else 'n':>4s}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dask scheduler overhead of per-file task submission.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run both approaches.")
+    run_parser.add_argument("--ntasks", nargs="+", type=int, default=[8760, 26280],
+                            help="Number of files (8760: one year of hourly files).")
+    run_parser.add_argument("--nworkers", type=int, default=4)
+    run_parser.add_argument("--task-time", type=float, default=0.001, help="Time spent on each file [s].")
+    run_parser.add_argument("--result-kb", type=float, default=64, help="Size of each per-file result [KB].")
+    run_parser.add_argument("--chunksize", default="auto", help="Executor parallel_chunksize.")
+    run_parser.add_argument("--max-inflight", type=int, default=None, help="Executor parallel_max_inflight.")
+    run_parser.add_argument("--timeout", type=float, default=3600, help="Time limit of each run [s].")
+    run_parser.add_argument("--results", default="./scheduler_results.jsonl")
+
+    case_parser = subparsers.add_parser("case", help="Run one approach (used by run).")
+    case_parser.add_argument("args_json")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        from pyflextrkr.ft_utilities import setup_logging
+        setup_logging()
+        run_benchmark(args)
+    elif args.command == "case":
+        # Only the record goes to stdout
+        logging.basicConfig(level=logging.WARNING)
+        record = run_approach(**json.loads(args.args_json))
+        print(json.dumps(record))
+
+
+if __name__ == "__main__":
+    main()
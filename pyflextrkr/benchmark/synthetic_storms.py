@@ -0,0 +1,430 @@
+import os
+import numpy as np
+import xarray as xr
+
+# Start time of the synthetic data
+synthetic_start = np.datetime64("2020-06-01T00:00:00")
+
+
+def make_storm_catalog(
+        ny,
+        nx,
+        nframes,
+        nstorms,
+        lifetime_range=(4, 24),
+        radius_range=(6, 30),
+        speed_range=(0.5, 3.0),
+        merge_fraction=0.1,
+        split_fraction=0.1,
+        separation=0.6,
+        seed=0,
+):
+    """
+    Make a catalog of synthetic storms moving across a grid.
+
+    Storms are defined in grid units: positions and radius in pixels, velocity in pixels per frame.
+    Each storm grows and decays over its lifetime. Merging storms end at the position of another
+    storm, splitting storms start at the position of another storm, so the tracking sees
+    overlapping features merge and split.
+
+    Args:
+        ny, nx: int
+            Grid size.
+        nframes: int
+            Number of frames (files).
+        nstorms: int
+            Mean number of storms present in each frame.
+        lifetime_range: tuple, optional, default=(4, 24)
+            Min/max storm lifetime [frames].
+        radius_range: tuple, optional, default=(6, 30)
+            Min/max storm radius at peak intensity [pixels].
+        speed_range: tuple, optional, default=(0.5, 3.0)
+            Min/max storm speed [pixels per frame].
+        merge_fraction: float, optional, default=0.1
+            Fraction of storms ending by merging into another storm.
+        split_fraction: float, optional, default=0.1
+            Fraction of storms starting by splitting from another storm.
+        separation: float, optional, default=0.6
+            Speed of merging/splitting storms relative to their partner, in units of the sum of their radius.
+        seed: int, optional, default=0
+            Random seed.
+
+    Returns:
+        catalog: dictionary
+            Storm arrays: 't_start', 'lifetime', 'y0', 'x0' (position at t_start), 'v', 'u',
+            'radius', 'peak', 'aspect', 'angle', 'merge_into', 'split_from' (storm index, -1 if none).
+    """
+    rng = np.random.default_rng(seed)
+    mean_lifetime = 0.5 * (lifetime_range[0] + lifetime_range[1])
+    # Number of storms so that about nstorms are present in each frame
+    ntotal = max(int(round(nstorms * (nframes + lifetime_range[1] - 1) / mean_lifetime)), 1)
+
+    lifetime = rng.integers(lifetime_range[0], lifetime_range[1] + 1, ntotal)
+    # Storms are born before the first frame too, so the first frames are populated
+    t_start = rng.integers(-lifetime_range[1] + 1, nframes, ntotal)
+    speed = rng.uniform(speed_range[0], speed_range[1], ntotal)
+    direction = rng.uniform(0, 2 * np.pi, ntotal)
+    catalog = {
+        "t_start": t_start,
+        "lifetime": lifetime,
+        "y0": rng.uniform(0, ny, ntotal),
+        "x0": rng.uniform(0, nx, ntotal),
+        "v": speed * np.sin(direction),
+        "u": speed * np.cos(direction),
+        "radius": rng.uniform(radius_range[0], radius_range[1], ntotal),
+        "peak": rng.uniform(0.7, 1.0, ntotal),
+        "aspect": rng.uniform(1.0, 2.0, ntotal),
+        "angle": rng.uniform(0, np.pi, ntotal),
+        "merge_into": np.full(ntotal, -1, dtype=int),
+        "split_from": np.full(ntotal, -1, dtype=int),
+    }
+
+    # Pick merging/splitting storms and their partners (partners are regular storms living >= 3 frames)
+    order = rng.permutation(ntotal)
+    nmerge = int(round(merge_fraction * ntotal))
+    nsplit = int(round(split_fraction * ntotal))
+    mergers = order[:nmerge]
+    splitters = order[nmerge:nmerge + nsplit]
+    partners = order[nmerge + nsplit:]
+    partners = partners[lifetime[partners] >= 3]
+    partner = np.full(ntotal, -1, dtype=int)
+    if len(partners) > 0:
+        for istorm in np.concatenate([mergers, splitters]):
+            # Move relative to the partner, so the storms separate within one frame,
+            # lifetime is limited so they stay close to the partner
+            ipartner = rng.choice(partners)
+            lifetime[istorm] = min(lifetime[istorm], 4)
+            relspeed = separation * (catalog["radius"][istorm] + catalog["radius"][ipartner])
+            reldirection = rng.uniform(0, 2 * np.pi)
+            catalog["v"][istorm] = catalog["v"][ipartner] + relspeed * np.sin(reldirection)
+            catalog["u"][istorm] = catalog["u"][ipartner] + relspeed * np.cos(reldirection)
+            partner[istorm] = ipartner
+        for istorm in mergers:
+            ipartner = partner[istorm]
+            # Merge at a time within the partner lifetime (not the first frame)
+            t_end = catalog["t_start"][ipartner] + rng.integers(1, lifetime[ipartner])
+            yend, xend = get_storm_position(catalog, ipartner, t_end)
+            catalog["t_start"][istorm] = t_end - lifetime[istorm] + 1
+            catalog["y0"][istorm] = yend - catalog["v"][istorm] * (lifetime[istorm] - 1)
+            catalog["x0"][istorm] = xend - catalog["u"][istorm] * (lifetime[istorm] - 1)
+            catalog["merge_into"][istorm] = ipartner
+        for istorm in splitters:
+            ipartner = partner[istorm]
+            # Split at a time within the partner lifetime (not the first frame)
+            t_split = catalog["t_start"][ipartner] + rng.integers(1, lifetime[ipartner])
+            catalog["t_start"][istorm] = t_split
+            catalog["y0"][istorm], catalog["x0"][istorm] = get_storm_position(catalog, ipartner, t_split)
+            catalog["split_from"][istorm] = ipartner
+    return catalog
+
+
+def get_storm_position(catalog, istorm, itime):
+    """
+    Get the position (y, x) [pixels] of a storm at a frame.
+    """
+    age = itime - catalog["t_start"][istorm]
+    return catalog["y0"][istorm] + catalog["v"][istorm] * age, \
+           catalog["x0"][istorm] + catalog["u"][istorm] * age
+
+
+def render_frame(catalog, itime, ny, nx, shape=4.0):
+    """
+    Render the normalized storm intensity field (0-1) of one frame.
+
+    Each storm is an elliptical profile exp(-rho**shape), with rho the distance from the
+    storm center in units of the current radius. Radius and peak intensity grow and decay
+    over the storm lifetime. Overlapping storms take the maximum intensity.
+
+    The field is computed in float64 throughout, the writers cast to float32 only when
+    writing: float32 arithmetic with float64 scalars is promoted differently by numpy 1 and
+    numpy 2 (NEP 50), which would make the synthetic inputs depend on the numpy version.
+
+    Args:
+        catalog: dictionary
+            Storm catalog from make_storm_catalog.
+        itime: int
+            Frame index.
+        ny, nx: int
+            Grid size.
+        shape: float, optional, default=4.0
+            Profile exponent: 2 is Gaussian (peaked cells), larger values give flatter storms.
+
+    Returns:
+        field: np.array(float64)
+            Normalized intensity [ny, nx].
+    """
+    field = np.zeros((ny, nx), dtype=np.float64)
+    age = itime - catalog["t_start"]
+    active = np.flatnonzero((age >= 0) & (age < catalog["lifetime"]))
+    for istorm in active:
+        # Life cycle envelope: grows then decays
+        envelope = np.sin(np.pi * (age[istorm] + 0.5) / catalog["lifetime"][istorm])
+        radius = catalog["radius"][istorm] * (0.4 + 0.6 * envelope)
+        peak = catalog["peak"][istorm] * (0.5 + 0.5 * envelope)
+        aspect = catalog["aspect"][istorm]
+        yc, xc = get_storm_position(catalog, istorm, itime)
+        # Bounding box of the storm within the grid
+        half = 2.0 * radius * aspect
+        y0, y1 = max(int(yc - half), 0), min(int(yc + half) + 1, ny)
+        x0, x1 = max(int(xc - half), 0), min(int(xc + half) + 1, nx)
+        if (y0 >= y1) or (x0 >= x1):
+            continue
+        dy = np.arange(y0, y1, dtype=np.float64)[:, None] - yc
+        dx = np.arange(x0, x1, dtype=np.float64)[None, :] - xc
+        cosa, sina = np.cos(catalog["angle"][istorm]), np.sin(catalog["angle"][istorm])
+        along = (dx * cosa + dy * sina) / (radius * aspect)
+        across = (-dx * sina + dy * cosa) / radius
+        rho2 = along**2 + across**2
+        storm = peak * np.exp(-rho2**(0.5 * shape))
+        np.maximum(field[y0:y1, x0:x1], storm, out=field[y0:y1, x0:x1])
+    return field
+
+
+def get_frame_times(nframes, time_step_minutes):
+    """
+    Get the times of the synthetic frames.
+    """
+    return synthetic_start + np.arange(nframes) * np.timedelta64(int(time_step_minutes * 60), "s")
+
+
+def _get_noise(seed, itime, shape, scale):
+    """
+    Get reproducible noise (float64) for one frame.
+    """
+    rng = np.random.default_rng([seed, itime])
+    return scale * rng.standard_normal(shape)
+
+
+def _get_filename(outdir, basename, itime_value, time_format):
+    """
+    Get the file name of a frame time, time_format uses the config time_format keywords.
+    """
+    timestamp = itime_value.astype("datetime64[s]").item()
+    timestring = time_format.replace("yyyy", f"{timestamp.year:04d}").replace("mo", f"{timestamp.month:02d}") \
+        .replace("dd", f"{timestamp.day:02d}").replace("hh", f"{timestamp.hour:02d}") \
+        .replace("mm", f"{timestamp.minute:02d}").replace("ss", f"{timestamp.second:02d}")
+    return os.path.join(outdir, f"{basename}{timestring}.nc")
+
+
+def write_tbpf_files(
+        outdir,
+        catalog,
+        ny,
+        nx,
+        nframes,
+        basename="tb_rainrate_",
+        time_format="yyyymodd_hhmm",
+        time_step_minutes=60,
+        dlatlon=0.04,
+        seed=0,
+):
+    """
+    Write synthetic Tb and rain rate files for idclouds_tbpf (same format as the WRF
+    preprocessed Tb/rain rate files: variables tb, rainrate, lat2d, lon2d).
+
+    Args:
+        outdir: string
+            Output directory.
+        catalog: dictionary
+            Storm catalog from make_storm_catalog.
+        ny, nx: int
+            Grid size.
+        nframes: int
+            Number of files.
+        basename: string, optional, default='tb_rainrate_'
+            File base name (databasename).
+        time_format: string, optional, default='yyyymodd_hhmm'
+            File time format.
+        time_step_minutes: float, optional, default=60
+            Time between files [minute].
+        dlatlon: float, optional, default=0.04
+            Grid spacing [degree].
+        seed: int, optional, default=0
+            Random seed for noise.
+
+    Returns:
+        filenames: list
+            Written file names.
+    """
+    os.makedirs(outdir, exist_ok=True)
+    lat = (np.arange(ny) - ny / 2) * dlatlon
+    lon = (np.arange(nx) - nx / 2) * dlatlon
+    lon2d, lat2d = np.meshgrid(lon.astype(np.float32), lat.astype(np.float32))
+    times = get_frame_times(nframes, time_step_minutes)
+    filenames = []
+    for itime in range(nframes):
+        # Flat cold cloud shield, rain peaked in the storm center (positively skewed rain rate)
+        field = render_frame(catalog, itime, ny, nx, shape=4.0)
+        tb = 300.0 - 110.0 * field + _get_noise(seed, itime, (ny, nx), 0.5)
+        rainrate = 60.0 * render_frame(catalog, itime, ny, nx, shape=2.0)**4
+        basetime = (times[itime] - np.datetime64("1970-01-01T00:00:00")) / np.timedelta64(1, "s")
+        dsout = xr.Dataset(
+            {
+                "lon2d": (["lat", "lon"], lon2d, {"long_name": "Longitude", "units": "degrees_east"}),
+                "lat2d": (["lat", "lon"], lat2d, {"long_name": "Latitude", "units": "degrees_north"}),
+                "tb": (["time", "lat", "lon"], tb[None, :, :].astype(np.float32),
+                       {"long_name": "Brightness temperature", "units": "K"}),
+                "rainrate": (["time", "lat", "lon"], rainrate[None, :, :].astype(np.float32),
+                             {"long_name": "Rain rate", "units": "mm hr-1"}),
+            },
+            coords={"time": (["time"], [basetime], {"units": "seconds since 1970-01-01 00:00:00"})},
+            attrs={"Title": "Synthetic Tb and rain rate for benchmarks"},
+        )
+        filename = _get_filename(outdir, basename, times[itime], time_format)
+        dsout.to_netcdf(filename, mode="w", format="NETCDF4")
+        filenames.append(filename)
+    return filenames
+
+
+def write_reflectivity_files(
+        outdir,
+        catalog,
+        ny,
+        nx,
+        nframes,
+        basename="synradar_",
+        time_format="yyyymodd.hhmmss",
+        time_step_minutes=5,
+        dxy=500.0,
+        nz=16,
+        dz=1000.0,
+        seed=0,
+):
+    """
+    Write synthetic 3D radar reflectivity files for idcells_reflectivity (input_source='radar',
+    same variables as PyART gridded radar files).
+
+    Args:
+        outdir: string
+            Output directory.
+        catalog: dictionary
+            Storm catalog from make_storm_catalog.
+        ny, nx: int
+            Grid size.
+        nframes: int
+            Number of files.
+        basename: string, optional, default='synradar_'
+            File base name (databasename).
+        time_format: string, optional, default='yyyymodd.hhmmss'
+            File time format.
+        time_step_minutes: float, optional, default=5
+            Time between files [minute].
+        dxy: float, optional, default=500.0
+            Grid spacing [m].
+        nz: int, optional, default=16
+            Number of vertical levels.
+        dz: float, optional, default=1000.0
+            Vertical grid spacing [m].
+        seed: int, optional, default=0
+            Random seed for noise.
+
+    Returns:
+        filenames: list
+            Written file names.
+    """
+    os.makedirs(outdir, exist_ok=True)
+    x = (np.arange(nx) - nx / 2) * dxy
+    y = (np.arange(ny) - ny / 2) * dxy
+    z = np.arange(nz) * dz
+    radar_lat, radar_lon = 30.0, -95.0
+    lat2d = (radar_lat + y[:, None] / 111.0e3 + 0 * x[None, :]).astype(np.float32)
+    lon2d = (radar_lon + x[None, :] / (111.0e3 * np.cos(np.deg2rad(radar_lat))) + 0 * y[:, None]).astype(np.float32)
+    point_lat = np.broadcast_to(lat2d, (nz, ny, nx))
+    point_lon = np.broadcast_to(lon2d, (nz, ny, nx))
+    times = get_frame_times(nframes, time_step_minutes)
+    filenames = []
+    for itime in range(nframes):
+        field = render_frame(catalog, itime, ny, nx, shape=2.0)
+        # Composite reflectivity: convective cells over a weak background
+        dbz_comp = 10.0 + 50.0 * field + _get_noise(seed, itime, (ny, nx), 1.0)
+        # Echo top height increases with intensity, reflectivity decreases above half the echo top
+        echotop = 3000.0 + 12000.0 * field
+        frac = np.clip((z[:, None, None] - 0.5 * echotop) / (0.5 * echotop), 0, None)
+        dbz3d = dbz_comp[None, :, :] - 30.0 * frac
+        dbz3d = np.where(dbz3d >= 0, dbz3d, np.nan).astype(np.float32)
+        dsout = xr.Dataset(
+            {
+                "reflectivity": (["time", "z", "y", "x"], dbz3d[None], {"long_name": "Reflectivity", "units": "dBZ"}),
+                "point_latitude": (["z", "y", "x"], point_lat, {"long_name": "Latitude of grid points", "units": "degrees_north"}),
+                "point_longitude": (["z", "y", "x"], point_lon, {"long_name": "Longitude of grid points", "units": "degrees_east"}),
+                "origin_latitude": ([], radar_lat, {"units": "degrees_north"}),
+                "origin_longitude": ([], radar_lon, {"units": "degrees_east"}),
+                "alt": ([], 0.0, {"units": "m"}),
+            },
+            coords={
+                "time": (["time"], times[itime:itime+1]),
+                "z": (["z"], z, {"units": "m"}),
+                "y": (["y"], y, {"units": "m"}),
+                "x": (["x"], x, {"units": "m"}),
+            },
+            attrs={"Title": "Synthetic radar reflectivity for benchmarks"},
+        )
+        filename = _get_filename(outdir, basename, times[itime], time_format)
+        dsout.to_netcdf(filename, mode="w", format="NETCDF4")
+        filenames.append(filename)
+    return filenames
+
+
+def write_generic_files(
+        outdir,
+        catalog,
+        ny,
+        nx,
+        nframes,
+        basename="synfield_",
+        time_format="yyyymodd.hhmmss",
+        time_step_minutes=60,
+        dlatlon=0.25,
+        field_varname="field",
+        seed=0,
+):
+    """
+    Write synthetic 2D field files on a latitude/longitude grid for idfeature_generic.
+
+    Args:
+        outdir: string
+            Output directory.
+        catalog: dictionary
+            Storm catalog from make_storm_catalog.
+        ny, nx: int
+            Grid size.
+        nframes: int
+            Number of files.
+        basename: string, optional, default='synfield_'
+            File base name (databasename).
+        time_format: string, optional, default='yyyymodd.hhmmss'
+            File time format.
+        time_step_minutes: float, optional, default=60
+            Time between files [minute].
+        dlatlon: float, optional, default=0.25
+            Grid spacing [degree].
+        field_varname: string, optional, default='field'
+            Field variable name.
+        seed: int, optional, default=0
+            Random seed for noise.
+
+    Returns:
+        filenames: list
+            Written file names.
+    """
+    os.makedirs(outdir, exist_ok=True)
+    lat = ((np.arange(ny) - ny / 2) * dlatlon).astype(np.float32)
+    lon = (np.arange(nx) * dlatlon).astype(np.float32)
+    times = get_frame_times(nframes, time_step_minutes)
+    filenames = []
+    for itime in range(nframes):
+        # Standardized anomaly-like field
+        field = 4.0 * render_frame(catalog, itime, ny, nx, shape=2.0) + _get_noise(seed, itime, (ny, nx), 0.1)
+        dsout = xr.Dataset(
+            {field_varname: (["time", "lat", "lon"], field[None].astype(np.float32), {"long_name": "Synthetic field"})},
+            coords={
+                "time": (["time"], times[itime:itime+1]),
+                "lat": (["lat"], lat, {"units": "degrees_north"}),
+                "lon": (["lon"], lon, {"units": "degrees_east"}),
+            },
+            attrs={"Title": "Synthetic field for benchmarks"},
+        )
+        filename = _get_filename(outdir, basename, times[itime], time_format)
+        dsout.to_netcdf(filename, mode="w", format="NETCDF4")
+        filenames.append(filename)
+    return filenames
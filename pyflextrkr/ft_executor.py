@@ -0,0 +1,460 @@
+import os
+import sys
+import math
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import Pool
+from pyflextrkr.ft_telemetry import is_enabled, wrap_task, collect_tasks
+
+# Keyword arguments shared by all tasks in a worker process, set by _init_process_worker
+_shared_kwargs = {}
+
+# Valid parallel_backend names
+backend_names = ["serial", "thread", "process", "dask", "dask_mpi"]
+
+# The netCDF-C and HDF5 libraries are not thread-safe. Helper threads that read or write
+# netCDF files while other threads in the same process do the same must hold this lock.
+netcdf_lock = threading.RLock()
+
+
+def get_backend_name(config):
+    """
+    Get parallel backend name from config.
+
+    If "parallel_backend" is not set, it is derived from "run_parallel":
+        0: serial, 1: dask (local cluster), 2: dask_mpi.
+
+    Args:
+        config: dictionary
+            Dictionary containing config parameters.
+
+    Returns:
+        backend: string
+            Parallel backend name.
+    """
+    backend = config.get("parallel_backend", None)
+    if backend is None:
+        run_parallel = config.get("run_parallel", 0)
+        if run_parallel == 0:
+            backend = "serial"
+        elif run_parallel == 2:
+            backend = "dask_mpi"
+        elif run_parallel >= 1:
+            backend = "dask"
+        else:
+            sys.exit('Valid parallelization flag not provided.')
+    if backend not in backend_names:
+        sys.exit(f'Unknown parallel_backend: {backend}, valid options: {backend_names}')
+    return backend
+
+
+def use_dask_client(config):
+    """
+    Check if a Dask client needs to be started for the config.
+
+    Args:
+        config: dictionary
+            Dictionary containing config parameters.
+
+    Returns:
+        True if the parallel backend is dask or dask_mpi.
+    """
+    return get_backend_name(config) in ["dask", "dask_mpi"]
+
+
+def get_dask_compute_kwargs(config):
+    """
+    Get dask.compute keyword arguments matching the parallel backend in config.
+
+    For drivers that build Dask task graphs (e.g., lazy Xarray reductions) instead of
+    mapping tasks with an executor.
+
+    Args:
+        config: dictionary
+            Dictionary containing config parameters.
+
+    Returns:
+        compute_kwargs: dictionary
+            Keyword arguments for dask.compute.
+    """
+    logger = logging.getLogger(__name__)
+    backend = get_backend_name(config)
+    nworkers = config.get("nprocesses", os.cpu_count())
+    if backend == "serial":
+        return {"scheduler": "synchronous"}
+    elif backend == "thread":
+        # Tasks read and write netCDF files, which is not thread-safe
+        logger.warning("The thread backend does not support netCDF I/O, tasks will run in a process pool.")
+        return {"scheduler": "processes", "num_workers": nworkers}
+    elif backend == "process":
+        return {"scheduler": "processes", "num_workers": nworkers}
+    # Dask backends use the client started by the runscript (or processes if there is none)
+    from dask.distributed import get_client
+    try:
+        return {"scheduler": get_client()}
+    except ValueError:
+        logger.warning("No Dask client found, tasks will run in a process pool.")
+        return {"scheduler": "processes", "num_workers": nworkers}
+
+
+def get_executor(config, shared_kwargs=None, initializer=None, initargs=(), thread_safe=False):
+    """
+    Create a task executor selected by config.
+
+    The netCDF-C and HDF5 libraries are not thread-safe, so tasks that read or write
+    netCDF files (all PyFLEXTRKR steps) run in a process pool when the thread backend
+    is selected. Only tasks declared thread_safe run in a thread pool.
+
+    Config parameters:
+        parallel_backend: string, optional
+            'serial', 'thread', 'process', 'dask', 'dask_mpi'.
+            Defaults to the backend matching run_parallel.
+        nprocesses: int
+            Number of workers for thread/process backends.
+        parallel_chunksize: int or 'auto', optional, default='auto'
+            Number of tasks sent to a worker at a time.
+            'auto' splits the tasks into about 4 chunks per worker.
+        parallel_max_inflight: int, optional, default=4*nprocesses
+            Maximum number of chunks submitted but not yet collected.
+            Bounds the scheduler graph size and results held in memory.
+        telemetry: bool, optional, default=False
+            Record wall time, CPU time, peak memory and I/O of each task (see ft_telemetry).
+
+    Args:
+        config: dictionary
+            Dictionary containing config parameters.
+        shared_kwargs: dictionary, default=None
+            Keyword arguments passed to every task (e.g., config, static fields).
+            These are sent to each worker once instead of once per task.
+        initializer: function, default=None
+            Function called once in each worker before running tasks (e.g., to preload static fields).
+        initargs: tuple, default=()
+            Arguments for initializer.
+        thread_safe: bool, default=False
+            Tasks do no netCDF I/O and can run in threads.
+
+    Returns:
+        executor: object
+            Executor with map() and imap_unordered() methods.
+    """
+    logger = logging.getLogger(__name__)
+    backend = get_backend_name(config)
+    if (backend == "thread") and (not thread_safe):
+        logger.warning("The thread backend does not support netCDF I/O, tasks will run in a process pool.")
+        backend = "process"
+    nworkers = config.get("nprocesses", os.cpu_count())
+    chunksize = config.get("parallel_chunksize", "auto")
+    max_inflight = config.get("parallel_max_inflight", None)
+    kwargs = dict(
+        nworkers=nworkers,
+        chunksize=chunksize,
+        max_inflight=max_inflight,
+        shared_kwargs=shared_kwargs,
+        initializer=initializer,
+        initargs=initargs,
+        telemetry=config if is_enabled(config) else None,
+    )
+    if backend == "serial":
+        return SerialExecutor(**kwargs)
+    elif backend == "thread":
+        return ThreadExecutor(**kwargs)
+    elif backend == "process":
+        return ProcessExecutor(**kwargs)
+    else:
+        return DaskExecutor(thread_safe=thread_safe, **kwargs)
+
+
+def _chunk_tasks(args_list, chunksize):
+    """
+    Split a list of task arguments into chunks of (index, args).
+    """
+    indexed = list(enumerate(args_list))
+    return [indexed[ii:ii+chunksize] for ii in range(0, len(indexed), chunksize)]
+
+
+def _get_chunksize(chunksize, ntasks, nworkers):
+    """
+    Get the number of tasks per chunk, 'auto' gives about 4 chunks per worker.
+    """
+    if chunksize == "auto":
+        return max(int(math.ceil(ntasks / (4 * max(nworkers, 1)))), 1)
+    return max(int(chunksize), 1)
+
+
+def _run_chunk(func, chunk, shared_kwargs):
+    """
+    Run a chunk of tasks, return a list of (index, result).
+    """
+    return [(idx, func(*args, **shared_kwargs)) for idx, args in chunk]
+
+
+def _init_process_worker(shared_kwargs, initializer, initargs):
+    """
+    Store shared keyword arguments and run the user initializer in a worker process.
+    """
+    global _shared_kwargs
+    _shared_kwargs = shared_kwargs
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def _run_chunk_process(func_chunk):
+    """
+    Run a chunk of tasks in a worker process using the preloaded shared keyword arguments.
+    """
+    func, chunk = func_chunk
+    return _run_chunk(func, chunk, _shared_kwargs)
+
+
+class BaseExecutor(object):
+    """
+    Base class for task executors.
+
+    Each task is called as func(*args, **shared_kwargs), where args is one item of args_list.
+    If telemetry is set (config with telemetry enabled), tasks are timed in the workers
+    and their records are collected into the current telemetry stage.
+    """
+
+    def __init__(self, nworkers=1, chunksize=1, max_inflight=None, shared_kwargs=None,
+                 initializer=None, initargs=(), telemetry=None):
+        self.nworkers = nworkers
+        self.chunksize = chunksize
+        self.max_inflight = 4 * max(nworkers, 1) if max_inflight is None else max(int(max_inflight), 1)
+        self.shared_kwargs = {} if shared_kwargs is None else shared_kwargs
+        self.initializer = initializer
+        self.initargs = initargs
+        self.telemetry = telemetry
+
+    def map(self, func, args_list, chunksize=None):
+        """
+        Run func for all task arguments and return results in the order of args_list.
+
+        Args:
+            func: function
+                Task function.
+            args_list: list
+                List of tuples with positional arguments for each task.
+            chunksize: int or 'auto', default=None
+                Number of tasks sent to a worker at a time. Defaults to the executor chunksize.
+
+        Returns:
+            results: list
+                Task results.
+        """
+        results = [None] * len(args_list)
+        for idx, result in self.imap_unordered(func, args_list, chunksize=chunksize):
+            results[idx] = result
+        return results
+
+    def imap(self, func, args_list, chunksize=None):
+        """
+        Run func for all task arguments and yield results in the order of args_list.
+
+        Results are yielded as soon as all earlier tasks have completed,
+        so an order-dependent reducer can consume them while later tasks are still running.
+        """
+        pending = {}
+        next_idx = 0
+        for idx, result in self.imap_unordered(func, args_list, chunksize=chunksize):
+            pending[idx] = result
+            while next_idx in pending:
+                yield pending.pop(next_idx)
+                next_idx += 1
+
+    def imap_unordered(self, func, args_list, chunksize=None):
+        """
+        Run func for all task arguments and yield (index, result) as tasks complete.
+
+        At most max_inflight chunks are submitted at a time, new chunks are
+        submitted as earlier ones are collected.
+        """
+        if self.telemetry is None:
+            return self._imap_unordered(func, args_list, chunksize=chunksize)
+        results = self._imap_unordered(wrap_task(self.telemetry, func), args_list, chunksize=chunksize)
+        return collect_tasks(results, self.telemetry)
+
+    def _imap_unordered(self, func, args_list, chunksize=None):
+        raise NotImplementedError
+
+    def _get_chunks(self, args_list, chunksize):
+        chunksize = self.chunksize if chunksize is None else chunksize
+        chunksize = _get_chunksize(chunksize, len(args_list), self.nworkers)
+        return _chunk_tasks(args_list, chunksize)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class SerialExecutor(BaseExecutor):
+    """
+    Run tasks one at a time in the current process.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        if self.initializer is not None:
+            self.initializer(*self.initargs)
+
+    def _imap_unordered(self, func, args_list, chunksize=None):
+        for idx, args in enumerate(args_list):
+            yield idx, func(*args, **self.shared_kwargs)
+
+
+class ThreadExecutor(BaseExecutor):
+    """
+    Run tasks in a thread pool. Shared arguments are not copied.
+
+    Only used for tasks without netCDF I/O (see get_executor).
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        if self.initializer is not None:
+            self.initializer(*self.initargs)
+        self.pool = ThreadPoolExecutor(max_workers=self.nworkers)
+
+    def _imap_unordered(self, func, args_list, chunksize=None):
+        chunks = iter(self._get_chunks(args_list, chunksize))
+        futures = set()
+        for chunk in chunks:
+            futures.add(self.pool.submit(_run_chunk, func, chunk, self.shared_kwargs))
+            if len(futures) >= self.max_inflight:
+                break
+        while futures:
+            done, futures = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                # Keep the pool busy before handing results to the caller
+                chunk = next(chunks, None)
+                if chunk is not None:
+                    futures.add(self.pool.submit(_run_chunk, func, chunk, self.shared_kwargs))
+                for idx_result in future.result():
+                    yield idx_result
+
+    def close(self):
+        self.pool.shutdown()
+
+
+class ProcessExecutor(BaseExecutor):
+    """
+    Run tasks in a multiprocessing pool.
+
+    Shared arguments and the initializer are sent to each worker process once when the pool starts.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.pool = Pool(
+            self.nworkers,
+            initializer=_init_process_worker,
+            initargs=(self.shared_kwargs, self.initializer, self.initargs),
+        )
+
+    def _imap_unordered(self, func, args_list, chunksize=None):
+        chunks = iter(self._get_chunks(args_list, chunksize))
+        done_queue = queue.Queue()
+
+        def submit(chunk):
+            self.pool.apply_async(
+                _run_chunk_process, ((func, chunk),),
+                callback=done_queue.put, error_callback=done_queue.put,
+            )
+
+        ninflight = 0
+        for chunk in chunks:
+            submit(chunk)
+            ninflight += 1
+            if ninflight >= self.max_inflight:
+                break
+        while ninflight > 0:
+            result = done_queue.get()
+            ninflight -= 1
+            if isinstance(result, BaseException):
+                raise result
+            chunk = next(chunks, None)
+            if chunk is not None:
+                submit(chunk)
+                ninflight += 1
+            for idx_result in result:
+                yield idx_result
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+
+class DaskExecutor(BaseExecutor):
+    """
+    Run tasks on a Dask distributed cluster (LocalCluster or Dask-MPI).
+
+    Uses the Dask client started by the runscript. Shared arguments are scattered
+    to all workers once, and the initializer is run once on each worker.
+    Without a client, tasks run in a process pool (or a thread pool if thread_safe).
+    """
+
+    def __init__(self, thread_safe=False, **kwargs):
+        super().__init__(**kwargs)
+        from dask.distributed import get_client
+        logger = logging.getLogger(__name__)
+        try:
+            self.client = get_client()
+        except ValueError:
+            self.client = None
+            if thread_safe:
+                logger.warning("No Dask client found, tasks will run in a thread pool.")
+                self._fallback = ThreadExecutor(**kwargs)
+            else:
+                logger.warning("No Dask client found, tasks will run in a process pool.")
+                self._fallback = ProcessExecutor(**kwargs)
+            return
+        if self.initializer is not None:
+            self.client.run(self.initializer, *self.initargs)
+        self.shared_future = {}
+        if len(self.shared_kwargs) > 0:
+            # Scatter the values under unique keys (not the argument names),
+            # so that data from an earlier executor on the same client is never reused
+            names = list(self.shared_kwargs.keys())
+            futures = self.client.scatter(
+                [self.shared_kwargs[name] for name in names], broadcast=True, hash=False,
+            )
+            self.shared_future = dict(zip(names, futures))
+
+    def _imap_unordered(self, func, args_list, chunksize=None):
+        if self.client is None:
+            for idx_result in self._fallback._imap_unordered(func, args_list, chunksize=chunksize):
+                yield idx_result
+            return
+        from dask.distributed import as_completed as dask_as_completed
+        chunks = iter(self._get_chunks(args_list, chunksize))
+        futures = []
+        for chunk in chunks:
+            futures.append(self.client.submit(_run_chunk, func, chunk, self.shared_future, pure=False))
+            if len(futures) >= self.max_inflight:
+                break
+        completed = dask_as_completed(futures)
+        for future in completed:
+            # Submit the next chunk so the number of tasks on the scheduler stays bounded
+            chunk = next(chunks, None)
+            if chunk is not None:
+                completed.add(self.client.submit(_run_chunk, func, chunk, self.shared_future, pure=False))
+            for idx_result in future.result():
+                yield idx_result
+            # Release the result on the cluster once it is consumed
+            future.release()
+
+    def close(self):
+        if self.client is None:
+            self._fallback.close()
+            return
+        # Release the scattered shared arguments on the cluster
+        for future in self.shared_future.values():
+            future.release()
+        self.shared_future = {}
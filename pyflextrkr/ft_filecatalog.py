@@ -0,0 +1,246 @@
+import os
+import time
+import fnmatch
+import hashlib
+import sqlite3
+import logging
+import numpy as np
+
+# Directory of the catalog databases, None keeps the listings in memory only (see set_catalog_path)
+_catalog_path = None
+# A listing is only trusted if it was taken this long after the last directory change,
+# so changes within the file system time stamp resolution are not missed [ns]
+MTIME_MARGIN_NS = 2_000_000_000
+# Directory listings loaded in this process, keyed by directory name
+_catalog_cache = {}
+
+
+def set_catalog_path(catalog_path):
+    """
+    Set the directory where the catalog databases of the listed directories are saved.
+
+    Catalogs are never written into the listed (e.g., input data) directories.
+    SQLite file locking is unreliable on some parallel/network file systems (e.g., Lustre, NFS),
+    so the catalog directory should be on a local or otherwise lock-safe file system.
+
+    Args:
+        catalog_path: string
+            Catalog directory name, None to keep directory listings in memory only.
+
+    Returns:
+        None.
+    """
+    global _catalog_path
+    _catalog_path = catalog_path
+
+
+def _open_catalog(data_path):
+    """
+    Open (create if needed) the catalog database of a directory in the catalog directory.
+    Returns None if no catalog directory is set or the database can not be used.
+    """
+    if _catalog_path is None:
+        return None
+    # One database per listed directory, named by a hash of its absolute path
+    dirhash = hashlib.sha1(os.path.abspath(data_path).encode()).hexdigest()[:16]
+    catalog_file = os.path.join(_catalog_path, f"catalog_{dirhash}.sqlite")
+    try:
+        os.makedirs(_catalog_path, exist_ok=True)
+        con = sqlite3.connect(catalog_file, timeout=30)
+        with con:
+            con.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+            con.execute("CREATE TABLE IF NOT EXISTS files (name TEXT PRIMARY KEY)")
+    except (OSError, sqlite3.Error):
+        return None
+    return con
+
+
+def _read_catalog(con, mtime_ns):
+    """
+    Read file names from the catalog if it is valid for the directory modification time.
+    """
+    meta = dict(con.execute("SELECT key, value FROM meta").fetchall())
+    if (meta.get("mtime_ns", None) != mtime_ns) or \
+            (meta.get("scan_ns", 0) - mtime_ns <= MTIME_MARGIN_NS):
+        return None, meta.get("mtime_ns", None) is not None
+    names = [row[0] for row in con.execute("SELECT name FROM files")]
+    return np.sort(np.array(names, dtype=str)), True
+
+
+def _update_catalog(con, names, mtime_ns, scan_ns, has_files):
+    """
+    Update the catalog with a new directory listing: only added/removed names are written.
+    """
+    with con:
+        if has_files:
+            old_names = set(row[0] for row in con.execute("SELECT name FROM files"))
+            new_names = set(names.tolist())
+            removed = old_names - new_names
+            added = new_names - old_names
+        else:
+            removed = set()
+            added = names.tolist()
+        con.executemany("DELETE FROM files WHERE name = ?", ((name,) for name in removed))
+        con.executemany("INSERT OR IGNORE INTO files (name) VALUES (?)", ((name,) for name in added))
+        con.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                        [("mtime_ns", mtime_ns), ("scan_ns", scan_ns)])
+
+
+def list_directory(data_path):
+    """
+    List file names in a directory using the directory catalog.
+
+    The directory is only listed again if it has changed since the catalog was written
+    (checked with the directory modification time), then the catalog is updated with the
+    added/removed names. The listing is kept in memory for this process. If a catalog
+    directory is set (see set_catalog_path), it is also saved there as a small SQLite database,
+    so it is reused by other steps and runs.
+
+    Args:
+        data_path: string
+            Data directory name.
+
+    Returns:
+        names: np.array
+            Sorted file names (without path).
+    """
+    logger = logging.getLogger(__name__)
+    key = os.path.abspath(data_path)
+
+    # Listing in memory
+    cached = _catalog_cache.get(key, None)
+    if (cached is not None) and (cached["mtime_ns"] == os.stat(data_path).st_mtime_ns) and \
+            (cached["scan_ns"] - cached["mtime_ns"] > MTIME_MARGIN_NS):
+        return cached["names"]
+
+    # Listing saved in the catalog database
+    con = _open_catalog(data_path)
+    mtime_ns = os.stat(data_path).st_mtime_ns
+    names = None
+    has_files = False
+    if con is not None:
+        try:
+            names, has_files = _read_catalog(con, mtime_ns)
+        except sqlite3.Error as e:
+            logger.debug(f"File catalog not readable in {data_path}: {e}")
+            con.close()
+            con = None
+
+    if names is None:
+        # List the directory, the time is taken before listing so changes during listing are not missed
+        scan_ns = time.time_ns()
+        mtime_ns = os.stat(data_path).st_mtime_ns
+        names = np.sort(np.array(os.listdir(data_path), dtype=str))
+        if con is not None:
+            try:
+                _update_catalog(con, names, mtime_ns, scan_ns, has_files)
+            except sqlite3.Error as e:
+                logger.debug(f"File catalog not updated in {data_path}: {e}")
+    else:
+        scan_ns = mtime_ns + MTIME_MARGIN_NS + 1
+    if con is not None:
+        con.close()
+
+    _catalog_cache[key] = {"mtime_ns": mtime_ns, "scan_ns": scan_ns, "names": names}
+    return names
+
+
+def list_files(data_path, data_basename):
+    """
+    Get sorted file names in a directory starting with (matching) data_basename.
+
+    Args:
+        data_path: string
+            Data directory name.
+        data_basename: string
+            Data base name, may contain wildcards as in fnmatch.
+
+    Returns:
+        names: np.array
+            Sorted file names (without path).
+    """
+    names = list_directory(data_path)
+    if any(char in data_basename for char in "*?["):
+        return np.array(fnmatch.filter(names.tolist(), data_basename + '*'), dtype=str)
+    # Names starting with the base name are a contiguous range of the sorted names
+    istart = np.searchsorted(names, data_basename, side="left")
+    iend = np.searchsorted(names, data_basename + chr(0x10FFFF), side="left")
+    return names[istart:iend]
+
+
+def _get_field(codes, idx, nchar):
+    """
+    Get integer values of a fixed-width digit field in character codes [nfiles, nchar_max].
+    Returns values and a flag of valid digits.
+    """
+    digits = codes[:, idx:idx+nchar].astype(np.int64) - ord('0')
+    valid = np.all((digits >= 0) & (digits <= 9), axis=1)
+    values = np.sum(digits * (10 ** np.arange(nchar - 1, -1, -1)), axis=1)
+    return np.where(valid, values, 0), valid
+
+
+def get_basetime_from_names(filenames, nleadingchar, time_format="yyyymodd_hhmm"):
+    """
+    Calculate base time (Epoch time) from file names, vectorized over all names.
+
+    Args:
+        filenames: np.array
+            File names (without path).
+        nleadingchar: int
+            Number of characters before the date/time string.
+        time_format: string (optional, default="yyyymodd_hhmm")
+            Specify file time format to extract date/time.
+
+    Returns:
+        files_basetime: np.array
+            Array of file base time, -9999 for invalid date/time.
+        files_datestring: np.array
+            File date string (yyyymodd).
+        files_timestring: np.array
+            File time string (hhmm).
+    """
+    logger = logging.getLogger(__name__)
+    filenames = np.asarray(filenames, dtype=str)
+    nfiles = len(filenames)
+    if nfiles == 0:
+        return np.full(0, -9999, dtype=int), np.array([], dtype=str), np.array([], dtype=str)
+
+    # Character codes [nfiles, nchar], padded so that all fields are within the array
+    nchar = filenames.dtype.itemsize // 4
+    codes = filenames.view(np.uint32).reshape(nfiles, nchar)
+    codes = np.pad(codes, ((0, 0), (0, nleadingchar + len(time_format) + 4)))
+
+    fields = {}
+    valid = np.ones(nfiles, dtype=bool)
+    for name, nchar_field in [("yyyy", 4), ("mo", 2), ("dd", 2), ("hh", 2), ("mm", 2), ("ss", 2)]:
+        idx = time_format.find(name)
+        # If hour, minute, second is not in time_format, assume 0
+        if (idx == -1) and (name in ["hh", "mm", "ss"]):
+            fields[name] = (np.zeros(nfiles, dtype=np.int64), np.full((nfiles, 2), ord('0'), dtype=np.uint32))
+            continue
+        idx = nleadingchar + idx
+        values, ivalid = _get_field(codes, idx, nchar_field)
+        fields[name] = (values, codes[:, idx:idx+nchar_field])
+        valid &= ivalid
+
+    year, month, day = fields["yyyy"][0], fields["mo"][0], fields["dd"][0]
+    hour, minute, second = fields["hh"][0], fields["mm"][0], fields["ss"][0]
+    # Check month, day, hour, minute, second valid values
+    valid &= (month >= 1) & (month <= 12) & (day >= 1) & (day <= 31) & \
+             (hour <= 23) & (minute <= 59) & (second <= 59)
+    year = np.where(valid, year, 1970)
+    month = np.where(valid, month, 1)
+    day = np.where(valid, day, 1)
+    # Days since Epoch, days beyond the end of the month are invalid
+    months = (year - 1970) * 12 + (month - 1)
+    days = months.astype("datetime64[M]").astype("datetime64[D]").astype(np.int64) + (day - 1)
+    valid &= (days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64) == months)
+    files_basetime = np.where(valid, days * 86400 + hour * 3600 + minute * 60 + second, -9999).astype(int)
+
+    for ifile in filenames[~valid]:
+        logger.warning(f'File has invalid date/time, will not be included in processing: {ifile}')
+
+    # Date/time strings from the character codes of the fields
+    files_datestring = np.hstack([fields[name][1] for name in ["yyyy", "mo", "dd"]]).view("U8").ravel()
+    files_timestring = np.hstack([fields[name][1] for name in ["hh", "mm"]]).view("U4").ravel()
+    return files_basetime, files_datestring, files_timestring
@@ -0,0 +1,184 @@
+from collections import OrderedDict
+from functools import partial
+import numpy as np
+from pyflextrkr.ft_executor import get_backend_name
+
+
+class FrameCache(object):
+    """
+    Small least-recently-used cache of decoded frames, keyed by filename.
+
+    Each worker streaming a run of consecutive files keeps the last few decoded
+    frames, so a frame shared by two adjacent pairs is read and decoded once.
+    """
+
+    def __init__(self, loader, maxsize=2):
+        """
+        Args:
+            loader: function
+                Function called as loader(filename) that returns a decoded frame.
+            maxsize: int, default=2
+                Maximum number of frames kept in the cache.
+        """
+        self.loader = loader
+        self.maxsize = max(int(maxsize), 1)
+        self.frames = OrderedDict()
+
+    def get(self, filename):
+        """
+        Get a decoded frame, loading it if it is not in the cache.
+        """
+        if filename in self.frames:
+            self.frames.move_to_end(filename)
+            return self.frames[filename]
+        frame = self.loader(filename)
+        self.frames[filename] = frame
+        while len(self.frames) > self.maxsize:
+            self.frames.popitem(last=False)
+        return frame
+
+
+def iter_frame_pairs(filenames, loader, lag=1):
+    """
+    Iterate over pairs of frames (filenames[i], filenames[i+lag]) in a sliding window.
+
+    Each file is loaded once, the window keeps the last lag+1 decoded frames.
+
+    Args:
+        filenames: list
+            List of consecutive filenames.
+        loader: function
+            Function called as loader(filename) that returns a decoded frame.
+        lag: int, default=1
+            Number of files between the two frames of a pair.
+
+    Returns:
+        Generator of (pair index, frame 1, frame 2).
+    """
+    cache = FrameCache(loader, maxsize=lag + 1)
+    for ii in range(0, len(filenames) - lag):
+        yield ii, cache.get(filenames[ii]), cache.get(filenames[ii + lag])
+
+
+def get_segments(npairs, nsegments):
+    """
+    Split a sequence of pairs into contiguous segments.
+
+    Args:
+        npairs: int
+            Number of pairs.
+        nsegments: int
+            Number of segments.
+
+    Returns:
+        segments: list
+            List of (start, end) pair indices, end is exclusive.
+    """
+    nsegments = max(min(nsegments, npairs), 1)
+    bounds = np.linspace(0, npairs, nsegments + 1).astype(int)
+    return [(bounds[ii], bounds[ii+1]) for ii in range(nsegments) if bounds[ii+1] > bounds[ii]]
+
+
+def _run_pair_segment(pair_func, loader, filenames, pair_args, lag=1, **shared_kwargs):
+    """
+    Run pair_func for all pairs in a segment of consecutive files.
+    """
+    results = []
+    for ii, frame1, frame2 in iter_frame_pairs(filenames, loader, lag=lag):
+        results.append(pair_func(frame1, frame2, *pair_args[ii], **shared_kwargs))
+    return results
+
+
+def map_file_segments(executor, segment_func, filenames, config, overlap=1, segment_args=None):
+    """
+    Run a function on contiguous segments of consecutive files with an executor.
+
+    Consecutive segments overlap by overlap files, so a function working on pairs of
+    files (i, i+overlap) gets every pair exactly once.
+
+    Config parameters:
+        pair_nsegments: int, optional, default=4*nprocesses
+            Number of segments to split the files into (1 for the serial backend).
+
+    Args:
+        executor: object
+            Executor from get_executor. Its shared_kwargs are passed to segment_func.
+        segment_func: function
+            Function called as segment_func(filenames_segment, *segment_args[i], **shared_kwargs)
+            that returns a list of results.
+        filenames: list
+            List of consecutive filenames.
+        config: dictionary
+            Dictionary containing config parameters.
+        overlap: int, default=1
+            Number of files shared by consecutive segments.
+        segment_args: function, default=None
+            Function called as segment_args(istart, iend) that returns a tuple of extra
+            positional arguments for the segment of pairs [istart, iend).
+
+    Returns:
+        results: list
+            Concatenated results of segment_func, in order.
+    """
+    npairs = max(len(filenames) - overlap, 0)
+    if npairs == 0:
+        return []
+    if get_backend_name(config) == "serial":
+        nsegments = 1
+    else:
+        nsegments = config.get("pair_nsegments", 4 * config.get("nprocesses", 1))
+    segments = get_segments(npairs, nsegments)
+
+    task_args = [
+        (filenames[istart:iend+overlap],) + (segment_args(istart, iend) if segment_args else ())
+        for istart, iend in segments
+    ]
+    segment_results = executor.map(segment_func, task_args, chunksize=1)
+    return [result for iresults in segment_results for result in iresults]
+
+
+def map_frame_pairs(executor, pair_func, loader, filenames, config, pair_args=None, lag=1):
+    """
+    Run a function on all pairs of frames (filenames[i], filenames[i+lag]) with an executor.
+
+    The pairs are split into contiguous segments and each segment is sent to a worker
+    as one task. The worker streams its files through a sliding window, so each interior
+    frame is read and decoded once instead of once per pair. Only the lag files at each
+    segment boundary are read by two workers.
+
+    Config parameters:
+        pair_nsegments: int, optional, default=4*nprocesses
+            Number of segments to split the pairs into (1 for the serial backend).
+
+    Args:
+        executor: object
+            Executor from get_executor. Its shared_kwargs are passed to pair_func.
+        pair_func: function
+            Function called as pair_func(frame1, frame2, *pair_args[i], **shared_kwargs).
+        loader: function
+            Function called as loader(filename) that returns a decoded frame.
+            Use functools.partial for extra arguments.
+        filenames: list
+            List of consecutive filenames.
+        config: dictionary
+            Dictionary containing config parameters.
+        pair_args: list, default=None
+            List of tuples with extra positional arguments for each pair.
+        lag: int, default=1
+            Number of files between the two frames of a pair.
+
+    Returns:
+        results: list
+            Results of pair_func for each pair, in order.
+    """
+    npairs = max(len(filenames) - lag, 0)
+    if pair_args is None:
+        pair_args = [()] * npairs
+    return map_file_segments(
+        executor,
+        partial(_run_pair_segment, pair_func, loader, lag=lag),
+        filenames,
+        config,
+        overlap=lag,
+        segment_args=lambda istart, iend: (pair_args[istart:iend],),
+    )
@@ -0,0 +1,180 @@
+import os
+import logging
+import numpy as np
+import xarray as xr
+
+# Grid metrics loaded in this process, keyed by metrics file name
+_grid_metrics_cache = {}
+
+
+def get_distance_km(lat1, lon1, lat2, lon2, R_earth=6371.0):
+    """
+    Great-circle distance between two sets of points (haversine formula).
+
+    Args:
+        lat1, lon1: np.array
+            Latitude/longitude of the first points [degree].
+        lat2, lon2: np.array
+            Latitude/longitude of the second points [degree].
+        R_earth: float, default=6371.0
+            Earth radius [km].
+
+    Returns:
+        distance: np.array
+            Distance [km].
+    """
+    lat1, lon1, lat2, lon2 = map(np.deg2rad, (lat1, lon1, lat2, lon2))
+    hav = np.sin((lat2 - lat1) / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2)**2
+    return 2 * R_earth * np.arcsin(np.sqrt(np.clip(hav, 0, 1)))
+
+
+def _get_spacing(distance, axis):
+    """
+    Convert distances between neighboring points along an axis to grid spacing at each point:
+    average of the two sides for interior points, one side at the edges.
+    """
+    distance = np.moveaxis(distance, axis, 0)
+    spacing = np.empty((distance.shape[0] + 1,) + distance.shape[1:], dtype=np.float64)
+    spacing[0] = distance[0]
+    spacing[-1] = distance[-1]
+    spacing[1:-1] = 0.5 * (distance[:-1] + distance[1:])
+    return np.moveaxis(spacing, 0, axis)
+
+
+def calc_grid_metrics(lat2d, lon2d, R_earth=6371.0):
+    """
+    Calculate grid spacing and area of each grid cell on a sphere.
+
+    For regular latitude/longitude grids, the area is the exact area of the
+    spherical cell bounded by the mid-points between grid points.
+    For other grids (e.g., projected model/radar grids), the area is dx * dy
+    from great-circle distances between neighboring points.
+
+    Args:
+        lat2d: np.array
+            2D latitude [degree].
+        lon2d: np.array
+            2D longitude [degree].
+        R_earth: float, default=6371.0
+            Earth radius [km].
+
+    Returns:
+        grid_metrics: dictionary
+            Keys: 'dx', 'dy' (grid spacing [km]), 'area' (grid cell area [km^2]).
+    """
+    lat2d = np.asarray(lat2d, dtype=np.float64)
+    lon2d = np.asarray(lon2d, dtype=np.float64)
+    ny, nx = lat2d.shape
+
+    # Grid spacing from distances between neighboring points
+    if nx > 1:
+        dx = _get_spacing(get_distance_km(lat2d[:,:-1], lon2d[:,:-1], lat2d[:,1:], lon2d[:,1:], R_earth), 1)
+    else:
+        dx = np.zeros((ny, nx))
+    if ny > 1:
+        dy = _get_spacing(get_distance_km(lat2d[:-1,:], lon2d[:-1,:], lat2d[1:,:], lon2d[1:,:], R_earth), 0)
+    else:
+        dy = np.zeros((ny, nx))
+
+    # Check if the grid is a regular latitude/longitude grid
+    regular = (ny > 1) and (nx > 1) and \
+        np.allclose(lat2d, lat2d[:,:1]) and np.allclose(lon2d, lon2d[:1,:])
+    if regular:
+        lat1d = np.deg2rad(lat2d[:,0])
+        lon1d = np.deg2rad(np.unwrap(lon2d[0,:], period=360.))
+        # Cell edges are mid-points between grid points, limited to the poles
+        lat_edges = np.empty(ny + 1)
+        lat_edges[1:-1] = 0.5 * (lat1d[:-1] + lat1d[1:])
+        lat_edges[0] = lat1d[0] - 0.5 * (lat1d[1] - lat1d[0])
+        lat_edges[-1] = lat1d[-1] + 0.5 * (lat1d[-1] - lat1d[-2])
+        lat_edges = np.clip(lat_edges, -np.pi / 2, np.pi / 2)
+        dlon = np.abs(_get_spacing(np.diff(lon1d), 0))
+        dsinlat = np.abs(np.diff(np.sin(lat_edges)))
+        area = (R_earth**2) * dsinlat[:,None] * dlon[None,:]
+    else:
+        area = dx * dy
+
+    return {"dx": dx, "dy": dy, "area": area}
+
+
+def get_grid_metrics_filename(config):
+    """
+    Get the grid metrics file name for a run.
+
+    Config parameters:
+        grid_metrics_file: string, optional
+            Default: {tracking_outpath}grid_metrics.nc
+    """
+    filename = config.get("grid_metrics_file", None)
+    if filename is None:
+        filename = f"{config['tracking_outpath']}grid_metrics.nc"
+    return filename
+
+
+def get_grid_metrics(config, lat2d=None, lon2d=None):
+    """
+    Get grid metrics for a run, computed once per grid and cached on disk.
+
+    The metrics are read from the grid metrics file if it exists and matches the grid shape.
+    Otherwise they are computed from lat2d/lon2d and written to the file, so following
+    files and steps of the run reuse them. Metrics are also kept in memory in each process.
+
+    Config parameters:
+        grid_metrics_file: string, optional
+            Default: {tracking_outpath}grid_metrics.nc
+        R_earth: float, optional, default=6371.0
+            Earth radius [km].
+
+    Args:
+        config: dictionary
+            Dictionary containing config parameters.
+        lat2d: np.array, optional, default=None
+            2D latitude [degree], needed if the metrics file does not exist.
+        lon2d: np.array, optional, default=None
+            2D longitude [degree], needed if the metrics file does not exist.
+
+    Returns:
+        grid_metrics: dictionary
+            Keys: 'dx', 'dy' (grid spacing [km]), 'area' (grid cell area [km^2]).
+    """
+    logger = logging.getLogger(__name__)
+    filename = get_grid_metrics_filename(config)
+    shape = None if lat2d is None else np.shape(lat2d)
+
+    grid_metrics = _grid_metrics_cache.get(filename, None)
+    if (grid_metrics is not None) and (shape is None or grid_metrics["area"].shape == shape):
+        return grid_metrics
+
+    if os.path.isfile(filename):
+        with xr.open_dataset(filename) as ds:
+            grid_metrics = {key: ds[key].values for key in ["dx", "dy", "area"]}
+        if (shape is None) or (grid_metrics["area"].shape == shape):
+            _grid_metrics_cache[filename] = grid_metrics
+            return grid_metrics
+        logger.warning(f"Grid metrics file {filename} does not match the grid shape {shape}, recomputing.")
+
+    if lat2d is None:
+        logger.error(f"Grid metrics file not found: {filename}, latitude/longitude must be provided.")
+        return None
+
+    R_earth = config.get("R_earth", 6371.0)
+    grid_metrics = calc_grid_metrics(lat2d, lon2d, R_earth=R_earth)
+
+    # Write to a temporary file then rename, so parallel workers never read a partial file
+    dims = ["lat", "lon"]
+    dsout = xr.Dataset(
+        {
+            "dx": (dims, grid_metrics["dx"], {"long_name": "Grid spacing in x-direction", "units": "km"}),
+            "dy": (dims, grid_metrics["dy"], {"long_name": "Grid spacing in y-direction", "units": "km"}),
+            "area": (dims, grid_metrics["area"], {"long_name": "Grid cell area", "units": "km2"}),
+        },
+        attrs={"R_earth": R_earth},
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+    tmpfile = f"{filename}.{os.getpid()}.tmp"
+    dsout.to_netcdf(tmpfile, mode="w", format="NETCDF4")
+    os.replace(tmpfile, filename)
+    logger.info(f"Grid metrics saved: {filename}")
+
+    _grid_metrics_cache[filename] = grid_metrics
+    return grid_metrics
@@ -0,0 +1,406 @@
+"""
+Ragged-array access to sparse track statistics.
+
+A sparse track statistics file stores every (track, time) element of the 2D
+variables along a flat 'sparse_index' dimension, grouped by track and ordered by
+time within each track. RaggedTracks keeps these flat arrays as they are and adds
+the per-track offsets, so that:
+- the elements of one track are a zero-copy slice of the flat arrays,
+- per-track reductions (max, first/last, duration over threshold) are single
+  vectorized calls over all tracks (np.ufunc.reduceat),
+- a subset of tracks is gathered with one fancy-index per variable,
+- dense [tracks, times] arrays are built block by block of tracks, each block
+  reading only its own contiguous range of elements (ragged_to_dataset with
+  track_chunksize), so memory use is bounded by the block size.
+
+The number of elements of each track is written to the sparse file as
+'{tracks_dimname}_rowsize' (CF contiguous ragged array convention), and is
+rebuilt from the tracks indices for files written without it.
+"""
+import numpy as np
+import xarray as xr
+import dask
+import dask.array as da
+
+sparse_dimname = "sparse_index"
+
+
+def get_rowsize_varname(tracks_dimname):
+    """
+    Get the name of the per-track element count variable in a sparse trackstats file.
+    """
+    return f"{tracks_dimname}_rowsize"
+
+
+def get_rowsize_attrs():
+    """
+    Get the attributes of the per-track element count variable.
+    """
+    return {
+        "long_name": "Number of sparse array elements of each track",
+        "sample_dimension": sparse_dimname,
+    }
+
+
+class RaggedTracks(object):
+    """
+    Track statistics as flat per-element arrays plus per-track offsets.
+
+    Elements of track i are data[name][offsets[i]:offsets[i+1]], at times indices
+    times_idx[offsets[i]:offsets[i+1]].
+    """
+
+    def __init__(self, data, times_idx, rowsize, max_trackduration, attrs=None):
+        """
+        Args:
+            data: dictionary
+                Flat arrays [nelements] of each variable, grouped by track.
+                Can be lazily loaded Xarray Variables (only to_dense supports these).
+            times_idx: np.array
+                Times index of each element.
+            rowsize: np.array
+                Number of elements of each track.
+            max_trackduration: int
+                Maximum track duration (size of the times dimension of dense arrays).
+            attrs: dictionary, default=None
+                Attributes of each variable.
+        """
+        self.data = data
+        self.times_idx = np.asarray(times_idx)
+        self.rowsize = np.asarray(rowsize, dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(self.rowsize)])
+        self.max_trackduration = max_trackduration
+        self.attrs = attrs if attrs is not None else {}
+
+    @property
+    def ntracks(self):
+        return len(self.rowsize)
+
+    @property
+    def nelements(self):
+        return int(self.offsets[-1])
+
+    def __getitem__(self, name):
+        return self.data[name]
+
+    def __contains__(self, name):
+        return name in self.data
+
+    def keys(self):
+        return self.data.keys()
+
+    def get_track_ids(self):
+        """
+        Get the track index of each element.
+        """
+        return np.repeat(np.arange(self.ntracks), self.rowsize)
+
+    def get_track(self, name, itrack):
+        """
+        Get the elements of a track (a view of the flat array).
+        """
+        return self.data[name][self.offsets[itrack]:self.offsets[itrack + 1]]
+
+    def get_element_index(self, trackidx):
+        """
+        Get the flat element indices of a list of tracks, in the order of trackidx.
+        """
+        trackidx = np.asarray(trackidx, dtype=np.int64)
+        counts = self.rowsize[trackidx]
+        # Start of each track repeated over its elements, plus the position within the track
+        starts = np.repeat(self.offsets[trackidx], counts)
+        pos = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return starts + pos
+
+    def gather(self, name, trackidx):
+        """
+        Get the elements of a list of tracks concatenated, in the order of trackidx.
+        """
+        return self.data[name][self.get_element_index(trackidx)]
+
+    def reduce(self, name_or_values, ufunc, fillval):
+        """
+        Reduce the elements of each track with a numpy ufunc.
+
+        Args:
+            name_or_values: string or np.array
+                Variable name, or flat array [nelements] to reduce.
+            ufunc: np.ufunc
+                Reduction function (e.g., np.maximum, np.add, np.logical_or).
+            fillval: scalar
+                Value for tracks without elements.
+
+        Returns:
+            out: np.array
+                Reduced value of each track [ntracks].
+        """
+        values = self.data[name_or_values] if isinstance(name_or_values, str) else np.asarray(name_or_values)
+        nonempty = self.rowsize > 0
+        out = np.full(self.ntracks, fillval, dtype=np.result_type(values.dtype, np.min_scalar_type(fillval)))
+        if np.any(nonempty):
+            out[nonempty] = ufunc.reduceat(values, self.offsets[:-1][nonempty])
+        return out
+
+    def max(self, name_or_values, fillval=np.nan):
+        """
+        Get the maximum value of each track.
+        """
+        return self.reduce(name_or_values, np.maximum, fillval)
+
+    def sum(self, name_or_values, fillval=0):
+        """
+        Get the sum of each track.
+        """
+        return self.reduce(name_or_values, np.add, fillval)
+
+    def any(self, mask):
+        """
+        Get if any element of each track is True.
+        """
+        return self.reduce(np.asarray(mask, dtype=bool), np.logical_or, False).astype(bool)
+
+    def first(self, name, fillval):
+        """
+        Get the first value of each track.
+        """
+        values = self.data[name]
+        out = np.full(self.ntracks, fillval, dtype=values.dtype)
+        nonempty = self.rowsize > 0
+        out[nonempty] = values[self.offsets[:-1][nonempty]]
+        return out
+
+    def last(self, name, fillval):
+        """
+        Get the last value of each track.
+        """
+        values = self.data[name]
+        out = np.full(self.ntracks, fillval, dtype=values.dtype)
+        nonempty = self.rowsize > 0
+        out[nonempty] = values[self.offsets[1:][nonempty] - 1]
+        return out
+
+    def get_runs(self, mask, maxgap=1):
+        """
+        Find runs of elements meeting a condition within each track.
+
+        Elements with mask True belong to the same run if they are in the same track
+        and their times indices differ by no more than maxgap.
+
+        Args:
+            mask: np.array
+                Condition of each element [nelements].
+            maxgap: int, default=1
+                Maximum times index difference between consecutive elements of a run.
+
+        Returns:
+            run_id: np.array
+                Run index of each element [nelements], -1 where mask is False.
+            run_track: np.array
+                Track index of each run.
+            run_start: np.array
+                Times index of the first element of each run.
+            run_end: np.array
+                Times index of the last element of each run.
+        """
+        idx = np.nonzero(mask)[0]
+        run_id = np.full(self.nelements, -1, dtype=np.int64)
+        if len(idx) == 0:
+            empty = np.array([], dtype=np.int64)
+            return run_id, empty, empty, empty
+        track = self.get_track_ids()[idx]
+        times = self.times_idx[idx]
+        # A new run starts at a new track or after a gap
+        newrun = np.ones(len(idx), dtype=bool)
+        newrun[1:] = (track[1:] != track[:-1]) | (np.diff(times) > maxgap)
+        run_id[idx] = np.cumsum(newrun) - 1
+        start_idx = np.nonzero(newrun)[0]
+        end_idx = np.append(start_idx[1:], len(idx)) - 1
+        return run_id, track[start_idx], times[start_idx], times[end_idx]
+
+    def duration_over_threshold(self, name_or_values, threshold, maxgap=1):
+        """
+        Get the longest duration (number of times) each track stays above a threshold.
+
+        Args:
+            name_or_values: string or np.array
+                Variable name, or flat array [nelements].
+            threshold: float
+                Threshold value (values > threshold count).
+            maxgap: int, default=1
+                Maximum times gap allowed within a period above threshold.
+
+        Returns:
+            duration: np.array
+                Longest duration of each track [ntracks], 0 if never above threshold.
+        """
+        values = self.data[name_or_values] if isinstance(name_or_values, str) else np.asarray(name_or_values)
+        _, run_track, run_start, run_end = self.get_runs(values > threshold, maxgap=maxgap)
+        duration = np.zeros(self.ntracks, dtype=np.int64)
+        np.maximum.at(duration, run_track, run_end - run_start + 1)
+        return duration
+
+    def subset(self, trackidx):
+        """
+        Get a new RaggedTracks with a subset of tracks, in the order of trackidx.
+        """
+        eidx = self.get_element_index(trackidx)
+        data = {key: value[eidx] for key, value in self.data.items()}
+        return RaggedTracks(
+            data, self.times_idx[eidx], self.rowsize[np.asarray(trackidx, dtype=np.int64)],
+            self.max_trackduration, attrs=self.attrs,
+        )
+
+    def to_dense(self, name, fillval, track_slice=None):
+        """
+        Convert a variable to a dense array [ntracks, max_trackduration].
+
+        Args:
+            name: string
+                Variable name.
+            fillval: scalar
+                Value where tracks have no element.
+            track_slice: slice, default=None
+                Only convert this contiguous range of tracks.
+
+        Returns:
+            dense: np.array
+                Dense array.
+        """
+        values = self.data[name]
+        itrack0, itrack1 = (0, self.ntracks) if track_slice is None else \
+            track_slice.indices(self.ntracks)[:2]
+        e0, e1 = self.offsets[itrack0], self.offsets[itrack1]
+        dense = np.full((itrack1 - itrack0, self.max_trackduration), fillval, dtype=values.dtype)
+        rows = np.repeat(np.arange(itrack1 - itrack0), self.rowsize[itrack0:itrack1])
+        # Only read the elements of these tracks (lazily loaded variables)
+        dense[rows, self.times_idx[e0:e1]] = np.asarray(values[e0:e1])
+        return dense
+
+
+def get_dense_fillval(dtype, fillval, fillval_f):
+    """
+    Get the fill value of a dense array by variable type.
+    """
+    return fillval_f if np.issubdtype(dtype, np.floating) else fillval
+
+
+def load_ragged_trackstats(
+        statistics_file,
+        max_trackduration,
+        tracks_dimname,
+        tracks_idx_varname,
+        times_idx_varname,
+        lazy=False,
+):
+    """
+    Load a sparse trackstats file as 1D variables plus ragged 2D variables.
+
+    Args:
+        statistics_file: string
+            Sparse trackstats file name.
+        max_trackduration: int
+            Maximum track duration.
+        tracks_dimname: string
+            Tracks dimension name.
+        tracks_idx_varname: string
+            Tracks indices variable name.
+        times_idx_varname: string
+            Times indices variable name.
+        lazy: bool, default=False
+            If True, keep the 2D variables in the file until read by to_dense.
+            Only the tracks/times indices are loaded.
+
+    Returns:
+        ds_1d: Xarray Dataset
+            Dataset containing 1D track stats variables.
+        ragged: RaggedTracks
+            Sparse track stats variables (excluding the tracks/times indices).
+    """
+    ds_all = xr.open_dataset(statistics_file,
+                             mask_and_scale=False,
+                             decode_times=False)
+    ntracks = ds_all.sizes[tracks_dimname]
+    rowsize_varname = get_rowsize_varname(tracks_dimname)
+    tracks_idx = ds_all[tracks_idx_varname].values
+    times_idx = ds_all[times_idx_varname].values
+    if rowsize_varname in ds_all:
+        rowsize = ds_all[rowsize_varname].values
+        order = None
+    else:
+        # Files written without the row sizes: group elements by track if needed
+        rowsize = np.bincount(tracks_idx, minlength=ntracks)
+        order = None
+        if np.any(np.diff(tracks_idx) < 0):
+            order = np.lexsort((times_idx, tracks_idx))
+            times_idx = times_idx[order]
+    data = {}
+    attrs = {}
+    for ivar in ds_all.data_vars.keys():
+        if ds_all[ivar].dims[0] == sparse_dimname and ivar not in (tracks_idx_varname, times_idx_varname):
+            if lazy and order is None:
+                data[ivar] = ds_all[ivar].variable
+            else:
+                values = ds_all[ivar].values
+                data[ivar] = values if order is None else values[order]
+            attrs[ivar] = ds_all[ivar].attrs
+    ragged = RaggedTracks(data, times_idx, rowsize, max_trackduration, attrs=attrs)
+    # Drop all sparse variables and dimension
+    ds_1d = ds_all.drop_dims(sparse_dimname).drop_vars(rowsize_varname, errors="ignore")
+    ds_all.close()
+    return ds_1d, ragged
+
+
+def ragged_to_dataset(ragged, tracks_dimname, times_dimname, fillval, fillval_f, track_chunksize=None):
+    """
+    Convert ragged track stats variables to a dense [tracks, times] Dataset.
+
+    With track_chunksize, each variable is a Dask array with one block per
+    track_chunksize tracks; blocks are only built when computed (e.g., written).
+
+    Args:
+        ragged: RaggedTracks
+            Ragged track stats variables.
+        tracks_dimname: string
+            Tracks dimension name.
+        times_dimname: string
+            Times dimension name.
+        fillval: int
+            Missing value for int type variables.
+        fillval_f: float
+            Missing value for float type variables.
+        track_chunksize: int, default=None
+            Number of tracks in each Dask block. None builds in-memory Numpy arrays.
+
+    Returns:
+        ds_2d: Xarray Dataset
+            Dataset containing dense 2D track stats variables.
+    """
+    if track_chunksize is not None:
+        # Pass the ragged arrays to the tasks as is
+        ragged_delayed = dask.delayed(ragged, traverse=False)
+        track_bounds = [(itrack0, min(itrack0 + track_chunksize, ragged.ntracks))
+                        for itrack0 in range(0, ragged.ntracks, track_chunksize)]
+    varlist = {}
+    for key in ragged.keys():
+        dtype = ragged[key].dtype
+        fillval_var = get_dense_fillval(dtype, fillval, fillval_f)
+        if track_chunksize is None:
+            dense_array = ragged.to_dense(key, fillval_var)
+        elif len(track_bounds) == 0:
+            dense_array = np.full((0, ragged.max_trackduration), fillval_var, dtype=dtype)
+        else:
+            blocks = [
+                da.from_delayed(
+                    ragged_delayed.to_dense(key, fillval_var, slice(itrack0, itrack1)),
+                    shape=(itrack1 - itrack0, ragged.max_trackduration),
+                    dtype=dtype,
+                )
+                for itrack0, itrack1 in track_bounds
+            ]
+            dense_array = da.concatenate(blocks, axis=0)
+        varlist[key] = ([tracks_dimname, times_dimname], dense_array, ragged.attrs.get(key, {}))
+    coordlist = {
+        tracks_dimname: ([tracks_dimname], np.arange(0, ragged.ntracks)),
+        times_dimname: ([times_dimname], np.arange(0, ragged.max_trackduration)),
+    }
+    return xr.Dataset(varlist, coords=coordlist)
@@ -0,0 +1,437 @@
+import os
+import sys
+import io
+import csv
+import json
+import time
+import heapq
+import cProfile
+import pstats
+import logging
+import functools
+from contextlib import contextmanager
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Stages and task records of this run (main process), None until telemetry is used
+_run = None
+# Stack of stages currently running, tasks are added to the innermost stage
+_stage_stack = []
+
+
+def is_enabled(config):
+    """
+    Check if telemetry is enabled in config.
+
+    Config parameters:
+        telemetry: bool, optional, default=False
+            Record wall time, CPU time, peak memory and I/O per stage and per task.
+    """
+    return bool(config.get("telemetry", False))
+
+
+def _get_func_name(func):
+    """
+    Get the name of a task function (also for functools.partial).
+    """
+    while isinstance(func, functools.partial):
+        func = func.func
+    return getattr(func, "__name__", type(func).__name__)
+
+
+def _get_peak_rss_mb(who="self"):
+    """
+    Get peak resident memory [MB] of this process (who='self') or its finished child processes.
+    """
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == "self" else resource.RUSAGE_CHILDREN)
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1024.**2 if sys.platform == "darwin" else 1024.
+    return usage.ru_maxrss / scale
+
+
+def _get_process_cpu():
+    """
+    Get CPU time [s] of this process and its finished child processes.
+    """
+    if resource is None:
+        return time.process_time()
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    child_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return self_usage.ru_utime + self_usage.ru_stime + child_usage.ru_utime + child_usage.ru_stime
+
+
+def _read_io(path):
+    """
+    Read bytes read/written through system calls from a /proc io file (Linux only).
+    Returns (None, None) if not available.
+    """
+    try:
+        with open(path, "rb") as f:
+            fields = dict(line.split(b":", 1) for line in f.read().splitlines())
+        return int(fields[b"rchar"]), int(fields[b"wchar"])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def _get_task_files(args):
+    """
+    Get file names in task arguments (strings, or lists of strings, in the positional arguments).
+    """
+    files = []
+    for arg in args:
+        if isinstance(arg, str):
+            files.append(arg)
+        elif isinstance(arg, (list, tuple)):
+            files.extend(item for item in arg if isinstance(item, str))
+    return files
+
+
+class TimedTask(object):
+    """
+    Task function wrapper recording wall time, CPU time, peak memory and I/O of each call.
+
+    Called in the worker as the task function, returns (result, record).
+    The task is optionally run under cProfile and the profile summary is added to the record.
+    """
+
+    def __init__(self, func, profile=False):
+        self.func = func
+        self.profile = profile
+        self.name = _get_func_name(func)
+
+    def __call__(self, *args, **kwargs):
+        io_path = "/proc/thread-self/io"
+        read0, write0 = _read_io(io_path)
+        cpu0 = time.thread_time()
+        wall0 = time.perf_counter()
+        if self.profile:
+            profiler = cProfile.Profile()
+            result = profiler.runcall(self.func, *args, **kwargs)
+        else:
+            result = self.func(*args, **kwargs)
+        wall_time = time.perf_counter() - wall0
+        cpu_time = time.thread_time() - cpu0
+        read1, write1 = _read_io(io_path)
+
+        files = _get_task_files(args)
+        record = {
+            "task": self.name,
+            "file": files[0] if len(files) > 0 else "",
+            "nfiles": len(files),
+            "wall_time": wall_time,
+            "cpu_time": cpu_time,
+            "peak_rss_mb": _get_peak_rss_mb(),
+            "read_bytes": None if read0 is None or read1 is None else read1 - read0,
+            "write_bytes": None if write0 is None or write1 is None else write1 - write0,
+            "pid": os.getpid(),
+            "ppid": os.getppid(),
+        }
+        if self.profile:
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(30)
+            record["profile"] = stream.getvalue()
+        return result, record
+
+
+def _get_run():
+    """
+    Get the telemetry records of this run, created at first use.
+    """
+    global _run
+    if _run is None:
+        _run = {"start_time": time.time(), "stages": []}
+    return _run
+
+
+def _new_stage(name):
+    """
+    Create a stage record.
+    """
+    return {
+        "name": name,
+        "parent": _stage_stack[-1]["name"] if len(_stage_stack) > 0 else "",
+        "start_time": time.time(),
+        "tasks": [],
+        "profiles": [],
+    }
+
+
+def _get_current_stage():
+    """
+    Get the innermost running stage, tasks outside of stages are added to an 'other' stage.
+    """
+    if len(_stage_stack) > 0:
+        return _stage_stack[-1]
+    run = _get_run()
+    for istage in run["stages"]:
+        if istage["name"] == "other" and istage.get("wall_time", None) is None:
+            return istage
+    istage = _new_stage("other")
+    run["stages"].append(istage)
+    return istage
+
+
+def wrap_task(config, func):
+    """
+    Wrap a task function for telemetry if enabled.
+
+    Config parameters:
+        telemetry_profile_top: int, optional, default=0
+            Run each task under cProfile and keep the profiles of the N slowest tasks of each stage.
+
+    Returns:
+        func: function
+            TimedTask if telemetry is enabled, otherwise func itself.
+    """
+    if not is_enabled(config):
+        return func
+    return TimedTask(func, profile=config.get("telemetry_profile_top", 0) > 0)
+
+
+def collect_tasks(results, config):
+    """
+    Collect task records from the (index, (result, record)) results of wrapped tasks,
+    and yield (index, result).
+    """
+    istage = _get_current_stage()
+    nprofile = config.get("telemetry_profile_top", 0)
+    for idx, (result, record) in results:
+        record["index"] = idx
+        profile = record.pop("profile", None)
+        if profile is not None:
+            # Keep profiles of the N slowest tasks (min-heap on wall time)
+            item = (record["wall_time"], len(istage["tasks"]), record["task"], record["file"], profile)
+            if len(istage["profiles"]) < nprofile:
+                heapq.heappush(istage["profiles"], item)
+            else:
+                heapq.heappushpop(istage["profiles"], item)
+        istage["tasks"].append(record)
+        yield idx, result
+
+
+def _sum_records(records, key):
+    values = [record[key] for record in records if record[key] is not None]
+    return sum(values) if len(values) > 0 else None
+
+
+def _summarize_tasks(istage):
+    """
+    Add task totals to a stage record. I/O of tasks run in this process (threads) and
+    in child processes (process pool, counted when the pool exits) is already in the I/O of
+    this process, I/O of tasks run in other processes (dask workers) is added to it.
+    """
+    tasks = istage["tasks"]
+    pid = os.getpid()
+    other_tasks = [record for record in tasks if pid not in (record["pid"], record["ppid"])]
+    for key in ["read_bytes", "write_bytes"]:
+        process_bytes = istage.get(key, None)
+        other_bytes = _sum_records(other_tasks, key)
+        if process_bytes is None:
+            total = _sum_records(tasks, key)
+        else:
+            total = process_bytes + (other_bytes or 0)
+        istage[f"task_{key}"] = _sum_records(tasks, key)
+        istage[f"total_{key}"] = total
+    peak_rss = [istage.get("peak_rss_mb", None)] + [record["peak_rss_mb"] for record in tasks]
+    peak_rss = [value for value in peak_rss if value is not None]
+    istage["peak_rss_mb"] = max(peak_rss) if len(peak_rss) > 0 else None
+    istage["task_cpu_time"] = _sum_records(tasks, "cpu_time")
+    istage["ntasks"] = len(tasks)
+    istage["nfiles"] = sum(record["nfiles"] for record in tasks)
+
+
+@contextmanager
+def stage(config, name):
+    """
+    Record wall time, CPU time, peak memory, I/O and tasks of a pipeline stage.
+
+    Does nothing if telemetry is disabled. Stages can be nested.
+
+    Args:
+        config: dictionary
+            Dictionary containing config parameters.
+        name: string
+            Stage name.
+    """
+    if not is_enabled(config):
+        yield
+        return
+    run = _get_run()
+    istage = _new_stage(name)
+    run["stages"].append(istage)
+    _stage_stack.append(istage)
+    read0, write0 = _read_io("/proc/self/io")
+    cpu0 = _get_process_cpu()
+    wall0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        _stage_stack.pop()
+        read1, write1 = _read_io("/proc/self/io")
+        peak_rss = [value for value in [_get_peak_rss_mb("self"), _get_peak_rss_mb("children")] if value is not None]
+        istage.update({
+            "wall_time": time.perf_counter() - wall0,
+            "cpu_time": _get_process_cpu() - cpu0,
+            "peak_rss_mb": max(peak_rss) if len(peak_rss) > 0 else None,
+            "read_bytes": None if read0 is None or read1 is None else read1 - read0,
+            "write_bytes": None if write0 is None or write1 is None else write1 - write0,
+        })
+        _summarize_tasks(istage)
+
+
+def telemetry_stage(name):
+    """
+    Decorator recording a driver function as a telemetry stage.
+    The driver must take config as its first argument.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(config, *args, **kwargs):
+            if not is_enabled(config):
+                return func(config, *args, **kwargs)
+            with stage(config, name):
+                return func(config, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+_stage_columns = [
+    "name", "parent", "wall_time", "cpu_time", "task_cpu_time", "peak_rss_mb",
+    "read_bytes", "write_bytes", "task_read_bytes", "task_write_bytes",
+    "total_read_bytes", "total_write_bytes", "ntasks", "nfiles",
+]
+_task_columns = [
+    "stage", "task", "index", "file", "nfiles", "wall_time", "cpu_time", "peak_rss_mb",
+    "read_bytes", "write_bytes", "pid", "ppid",
+]
+
+
+def write_report(config):
+    """
+    Write the telemetry report of this run to stats_outpath.
+
+    Writes {telemetry_filebase}{startdate}_{enddate}.json with all stages and tasks,
+    _stages.csv and _tasks.csv tables, and _profiles.txt with the profiles of the slowest tasks.
+
+    Config parameters:
+        telemetry_filebase: string, optional, default='telemetry_'
+            Report file base name.
+
+    Args:
+        config: dictionary
+            Dictionary containing config parameters.
+
+    Returns:
+        report_file: string
+            JSON report file name, None if telemetry is disabled.
+    """
+    logger = logging.getLogger(__name__)
+    if not is_enabled(config) or _run is None:
+        return None
+    stats_path = config["stats_outpath"]
+    filebase = config.get("telemetry_filebase", "telemetry_")
+    report_base = f"{stats_path}{filebase}{config['startdate']}_{config['enddate']}"
+    os.makedirs(stats_path, exist_ok=True)
+
+    stages = _get_report_stages()
+    report = {
+        "startdate": config["startdate"],
+        "enddate": config["enddate"],
+        "parallel_backend": config.get("parallel_backend", None),
+        "run_parallel": config.get("run_parallel", None),
+        "nprocesses": config.get("nprocesses", None),
+        "created_on": time.ctime(time.time()),
+        "stages": [{key: s.get(key, None) for key in _stage_columns + ["start_time"]} for s in stages],
+        "tasks": [dict(record, stage=s["name"]) for s in stages for record in s["tasks"]],
+    }
+    with open(f"{report_base}.json", "w") as f:
+        json.dump(report, f, indent=1)
+
+    with open(f"{report_base}_stages.csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=_stage_columns, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(report["stages"])
+    with open(f"{report_base}_tasks.csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=_task_columns, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(report["tasks"])
+
+    profiles = [(s["name"], item) for s in stages for item in sorted(s["profiles"], reverse=True)]
+    if len(profiles) > 0:
+        with open(f"{report_base}_profiles.txt", "w") as f:
+            for stage_name, (wall_time, _, task, filename, profile) in profiles:
+                f.write(f"==== Stage: {stage_name}, task: {task}, file: {filename}, wall time: {wall_time:.3f} s\n")
+                f.write(profile)
+                f.write("\n")
+    logger.info(f"Telemetry report: {report_base}.json")
+    return f"{report_base}.json"
+
+
+def _get_report_stages():
+    """
+    Get stages with records, tasks run outside of stages are summarized here.
+    """
+    stages = []
+    for istage in _run["stages"]:
+        if istage.get("wall_time", None) is None:
+            if len(istage["tasks"]) == 0:
+                continue
+            _summarize_tasks(istage)
+        stages.append(istage)
+    return stages
+
+
+def get_stage_summary():
+    """
+    Get the summary of the telemetry stages of this run (same columns as the _stages.csv report).
+
+    Returns:
+        stages: list
+            Dictionary of each stage, empty if telemetry has not been used.
+    """
+    if _run is None:
+        return []
+    return [{key: s.get(key, None) for key in _stage_columns} for s in _get_report_stages()]
+
+
+def _format_mb(value):
+    return "-" if value is None else f"{value / 1024.**2:.1f}"
+
+
+def log_summary(config):
+    """
+    Log a summary table of the telemetry stages of this run.
+
+    Args:
+        config: dictionary
+            Dictionary containing config parameters.
+    """
+    logger = logging.getLogger(__name__)
+    if not is_enabled(config) or _run is None:
+        return
+    header = f"{'Stage':<24s}{'Wall[s]':>10s}{'CPU[s]':>10s}{'TaskCPU[s]':>12s}{'PeakRSS[MB]':>13s}" \
+             f"{'Read[MB]':>10s}{'Write[MB]':>11s}{'Tasks':>8s}  Slowest task"
+    lines = ["Telemetry summary:", header, "-" * len(header)]
+    for s in _get_report_stages():
+        name = s["name"] if s["parent"] == "" else f"  {s['name']}"
+        slowest = max(s["tasks"], key=lambda record: record["wall_time"]) if len(s["tasks"]) > 0 else None
+        slowest = "" if slowest is None else \
+            f"{os.path.basename(slowest['file']) or slowest['task']} ({slowest['wall_time']:.2f} s)"
+        wall_time = s.get("wall_time", None)
+        cpu_time = s.get("cpu_time", None)
+        task_cpu_time = s["task_cpu_time"]
+        peak_rss = s["peak_rss_mb"]
+        lines.append(
+            f"{name:<24s}"
+            f"{'-' if wall_time is None else f'{wall_time:.2f}':>10s}"
+            f"{'-' if cpu_time is None else f'{cpu_time:.2f}':>10s}"
+            f"{'-' if task_cpu_time is None else f'{task_cpu_time:.2f}':>12s}"
+            f"{'-' if peak_rss is None else f'{peak_rss:.1f}':>13s}"
+            f"{_format_mb(s['total_read_bytes']):>10s}{_format_mb(s['total_write_bytes']):>11s}"
+            f"{len(s['tasks']):>8d}  {slowest}"
+        )
+    logger.info("\n".join(lines))
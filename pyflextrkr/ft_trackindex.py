@@ -0,0 +1,440 @@
+"""
+Spatio-temporal index over track statistics for fast region/time queries.
+
+Each valid (track, time) element of a track statistics file is put into a
+latitude/longitude/time bucket. Elements are stored sorted by bucket, so the
+elements of a bounding box and time window are found with a binary search per
+(time bucket, latitude bucket) row and an exact check on the candidates only.
+
+Usage:
+>python -m pyflextrkr.ft_trackindex build TRACKSTATS.nc
+>python -m pyflextrkr.ft_trackindex query TRACKSTATS.nc --extent lonmin lonmax latmin latmax \
+    -s 2020-01-01T00 -e 2020-01-31T23 [--output SUBSET.nc]
+"""
+import os
+import sys
+import time
+import argparse
+import logging
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+
+def get_track_index_filename(trackstats_file):
+    """
+    Get the index file name of a track statistics file: {trackstats_file without .nc}_index.nc
+    """
+    return f"{os.path.splitext(trackstats_file)[0]}_index.nc"
+
+
+def _to_epoch_seconds(datetime_in):
+    """
+    Convert a datetime (string, datetime64, or epoch seconds) to seconds since 1970-01-01.
+    """
+    if isinstance(datetime_in, (int, float, np.integer, np.floating)):
+        return float(datetime_in)
+    return (pd.Timestamp(datetime_in) - pd.Timestamp("1970-01-01")).total_seconds()
+
+
+def build_track_index(
+        tracks_idx,
+        times_idx,
+        lat,
+        lon,
+        base_time,
+        lat_bin=1.0,
+        lon_bin=1.0,
+        time_bin=24.0,
+):
+    """
+    Build the spatio-temporal index from track statistics elements.
+
+    Args:
+        tracks_idx: np.array
+            Track index of each element.
+        times_idx: np.array
+            Time index (within the track) of each element.
+        lat: np.array
+            Latitude of each element [degree].
+        lon: np.array
+            Longitude of each element [degree].
+        base_time: np.array
+            Time of each element [seconds since 1970-01-01].
+        lat_bin: float, default=1.0
+            Latitude bucket size [degree].
+        lon_bin: float, default=1.0
+            Longitude bucket size [degree].
+        time_bin: float, default=24.0
+            Time bucket size [hour].
+
+    Returns:
+        index: dictionary
+            Index arrays and bucket parameters.
+    """
+    tracks_idx = np.asarray(tracks_idx).ravel()
+    times_idx = np.asarray(times_idx).ravel()
+    lat = np.asarray(lat, dtype=np.float32).ravel()
+    lon = np.asarray(lon, dtype=np.float32).ravel()
+    base_time = np.asarray(base_time, dtype=np.float64).ravel()
+
+    # Only keep elements with valid location and time
+    valid = np.isfinite(lat) & np.isfinite(lon) & np.isfinite(base_time) & (base_time > 0)
+    tracks_idx = tracks_idx[valid].astype(np.int32)
+    times_idx = times_idx[valid].astype(np.int32)
+    lat = lat[valid]
+    lon = lon[valid]
+    base_time = base_time[valid]
+
+    time_bin_sec = time_bin * 3600.
+    if len(lat) > 0:
+        lon0 = np.floor(np.min(lon) / lon_bin) * lon_bin
+        time0 = np.floor(np.min(base_time) / time_bin_sec) * time_bin_sec
+        nlon_bins = int(np.floor((np.max(lon) - lon0) / lon_bin)) + 1
+        ntime_bins = int(np.floor((np.max(base_time) - time0) / time_bin_sec)) + 1
+    else:
+        lon0, time0, nlon_bins, ntime_bins = 0., 0., 1, 1
+    lat0 = -90.
+    nlat_bins = int(np.ceil(180. / lat_bin)) + 1
+
+    # Bucket key in the order of (time, lat, lon)
+    itime = np.floor((base_time - time0) / time_bin_sec).astype(np.int64)
+    ilat = np.clip(np.floor((lat - lat0) / lat_bin).astype(np.int64), 0, nlat_bins - 1)
+    ilon = np.floor((lon - lon0) / lon_bin).astype(np.int64)
+    key = (itime * nlat_bins + ilat) * nlon_bins + ilon
+    order = np.argsort(key, kind="stable")
+    key = key[order]
+
+    # Bucket table: unique keys and the start of their elements
+    bucket_key, bucket_start = np.unique(key, return_index=True)
+    bucket_start = np.append(bucket_start, len(key)).astype(np.int64)
+
+    index = {
+        "bucket_key": bucket_key,
+        "bucket_start": bucket_start,
+        "tracks": tracks_idx[order],
+        "times": times_idx[order],
+        "lat": lat[order],
+        "lon": lon[order],
+        "base_time": base_time[order],
+        "lat0": lat0,
+        "lon0": lon0,
+        "time0": time0,
+        "lat_bin": float(lat_bin),
+        "lon_bin": float(lon_bin),
+        "time_bin": float(time_bin),
+        "nlat_bins": nlat_bins,
+        "nlon_bins": nlon_bins,
+        "ntime_bins": ntime_bins,
+    }
+    return index
+
+
+def build_track_index_from_file(
+        trackstats_file,
+        lat_varname="meanlat",
+        lon_varname="meanlon",
+        tracks_dimname="tracks",
+        times_dimname="times",
+        **kwargs,
+):
+    """
+    Build the spatio-temporal index from a dense or sparse track statistics file.
+
+    Args:
+        trackstats_file: string
+            Track statistics file name.
+        lat_varname: string, default='meanlat'
+            Latitude variable name.
+        lon_varname: string, default='meanlon'
+            Longitude variable name.
+        tracks_dimname: string, default='tracks'
+            Tracks dimension name.
+        times_dimname: string, default='times'
+            Times dimension name.
+        **kwargs:
+            Bucket sizes passed to build_track_index.
+
+    Returns:
+        index: dictionary
+            Index arrays and bucket parameters.
+    """
+    ds = xr.open_dataset(trackstats_file, decode_times=False)
+    lat = ds[lat_varname].values
+    lon = ds[lon_varname].values
+    base_time = ds["base_time"].values
+    if ds[lat_varname].ndim == 2:
+        # Dense arrays [tracks, times]
+        tracks_idx, times_idx = np.indices(lat.shape)
+    else:
+        # Sparse arrays
+        tracks_idx = ds[f"{tracks_dimname}_indices"].values
+        times_idx = ds[f"{times_dimname}_indices"].values
+    ds.close()
+    index = build_track_index(tracks_idx, times_idx, lat, lon, base_time, **kwargs)
+    index["source_file"] = os.path.basename(trackstats_file)
+    return index
+
+
+def write_track_index(index, index_file):
+    """
+    Write the spatio-temporal index to a netCDF file.
+
+    Args:
+        index: dictionary
+            Index from build_track_index.
+        index_file: string
+            Output index file name.
+
+    Returns:
+        None.
+    """
+    logger = logging.getLogger(__name__)
+    attrs_keys = ["lat0", "lon0", "time0", "lat_bin", "lon_bin", "time_bin",
+                  "nlat_bins", "nlon_bins", "ntime_bins", "source_file"]
+    gattrlist = {key: index[key] for key in attrs_keys if key in index}
+    gattrlist["Title"] = "Spatio-temporal index of track statistics"
+    gattrlist["Created_on"] = time.ctime(time.time())
+    dsout = xr.Dataset(
+        {
+            "bucket_key": (["nbuckets"], index["bucket_key"]),
+            "bucket_start": (["nbuckets_edges"], index["bucket_start"]),
+            "tracks": (["nelements"], index["tracks"], {"long_name": "Track index"}),
+            "times": (["nelements"], index["times"], {"long_name": "Time index within the track"}),
+            "lat": (["nelements"], index["lat"], {"units": "degrees_north"}),
+            "lon": (["nelements"], index["lon"], {"units": "degrees_east"}),
+            "base_time": (["nelements"], index["base_time"],
+                          {"units": "seconds since 1970-01-01 00:00:00"}),
+        },
+        attrs=gattrlist,
+    )
+    # Write to a temporary file then rename, so readers never see a partial file
+    tmpfile = f"{index_file}.{os.getpid()}.tmp"
+    encoding = {var: dict(zlib=True) for var in dsout.data_vars}
+    dsout.to_netcdf(tmpfile, mode="w", format="NETCDF4", encoding=encoding)
+    os.replace(tmpfile, index_file)
+    logger.info(index_file)
+    return
+
+
+def load_track_index(index_file):
+    """
+    Load the spatio-temporal index from a netCDF file.
+
+    Args:
+        index_file: string
+            Index file name.
+
+    Returns:
+        index: dictionary
+            Index arrays and bucket parameters.
+    """
+    with xr.open_dataset(index_file, decode_times=False) as ds:
+        index = {var: ds[var].values for var in ds.data_vars}
+        index.update(ds.attrs)
+    return index
+
+
+def _get_ranges(start, end):
+    """
+    Concatenate integer ranges [start, end) into one index array.
+    """
+    counts = end - start
+    keep = counts > 0
+    start, counts = start[keep], counts[keep]
+    if len(counts) == 0:
+        return np.zeros(0, dtype=np.int64)
+    # Position within each range, added to the start of the range
+    offsets = np.repeat(start - np.cumsum(counts) + counts, counts)
+    return np.arange(np.sum(counts)) + offsets
+
+
+def query_track_index(index, extent=None, start_time=None, end_time=None):
+    """
+    Find track elements within a bounding box and time window.
+
+    Args:
+        index: dictionary
+            Index from build_track_index or load_track_index.
+        extent: list, optional, default=None
+            Bounding box [lonmin, lonmax, latmin, latmax] in the longitude convention of the
+            track statistics. If lonmin > lonmax, the box crosses the longitude wrap-around.
+            If None, all locations are included.
+        start_time: string/datetime64/float, optional, default=None
+            Start of the time window (inclusive). Float values are seconds since 1970-01-01.
+        end_time: string/datetime64/float, optional, default=None
+            End of the time window (inclusive).
+
+    Returns:
+        tracks: np.array
+            Track index of the matching elements, sorted by track and time.
+        times: np.array
+            Time index (within the track) of the matching elements.
+    """
+    lat0, lon0, time0 = index["lat0"], index["lon0"], index["time0"]
+    lat_bin, lon_bin = index["lat_bin"], index["lon_bin"]
+    time_bin_sec = index["time_bin"] * 3600.
+    nlat_bins = int(index["nlat_bins"])
+    nlon_bins = int(index["nlon_bins"])
+    ntime_bins = int(index["ntime_bins"])
+
+    if extent is None:
+        extent = [-np.inf, np.inf, -90., 90.]
+    lonmin, lonmax, latmin, latmax = extent
+    tstart = -np.inf if start_time is None else _to_epoch_seconds(start_time)
+    tend = np.inf if end_time is None else _to_epoch_seconds(end_time)
+
+    def _bin_range(vmin, vmax, v0, vbin, nbins):
+        i0 = 0 if np.isinf(vmin) else int(np.floor((vmin - v0) / vbin))
+        i1 = nbins - 1 if np.isinf(vmax) else int(np.floor((vmax - v0) / vbin))
+        return max(i0, 0), min(i1, nbins - 1)
+
+    it0, it1 = _bin_range(tstart, tend, time0, time_bin_sec, ntime_bins)
+    ilat0, ilat1 = _bin_range(latmin, latmax, lat0, lat_bin, nlat_bins)
+    if lonmin > lonmax:
+        lon_ranges = [(lonmin, np.inf), (-np.inf, lonmax)]
+    else:
+        lon_ranges = [(lonmin, lonmax)]
+
+    # Rows of (time, lat) buckets, each row has a contiguous range of lon bucket keys
+    itime, ilat = np.meshgrid(np.arange(it0, it1 + 1), np.arange(ilat0, ilat1 + 1), indexing="ij")
+    row_key = (itime.ravel().astype(np.int64) * nlat_bins + ilat.ravel()) * nlon_bins
+    bucket_key = index["bucket_key"]
+    bucket_start = index["bucket_start"]
+    candidates = []
+    for vmin, vmax in lon_ranges:
+        ilon0, ilon1 = _bin_range(vmin, vmax, lon0, lon_bin, nlon_bins)
+        if (ilon0 > ilon1) or (it0 > it1) or (ilat0 > ilat1):
+            continue
+        ib0 = np.searchsorted(bucket_key, row_key + ilon0, side="left")
+        ib1 = np.searchsorted(bucket_key, row_key + ilon1, side="right")
+        candidates.append(_get_ranges(bucket_start[ib0], bucket_start[ib1]))
+    if len(candidates) == 0:
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+    candidates = np.concatenate(candidates)
+
+    # Exact check on the candidate elements
+    lat = index["lat"][candidates]
+    lon = index["lon"][candidates]
+    base_time = index["base_time"][candidates]
+    if lonmin > lonmax:
+        in_lon = (lon >= lonmin) | (lon <= lonmax)
+    else:
+        in_lon = (lon >= lonmin) & (lon <= lonmax)
+    match = in_lon & (lat >= latmin) & (lat <= latmax) & (base_time >= tstart) & (base_time <= tend)
+    candidates = candidates[match]
+
+    tracks = index["tracks"][candidates]
+    times = index["times"][candidates]
+    order = np.lexsort((times, tracks))
+    return tracks[order], times[order]
+
+
+def subset_trackstats(
+        trackstats_file,
+        extent=None,
+        start_time=None,
+        end_time=None,
+        index_file=None,
+        tracks_dimname="tracks",
+        times_dimname="times",
+):
+    """
+    Subset the tracks of a track statistics file that are within a bounding box and time window.
+
+    The index file is built and saved first if it does not exist.
+
+    Args:
+        trackstats_file: string
+            Track statistics file name (dense or sparse).
+        extent: list, optional, default=None
+            Bounding box [lonmin, lonmax, latmin, latmax].
+        start_time: string/datetime64/float, optional, default=None
+            Start of the time window.
+        end_time: string/datetime64/float, optional, default=None
+            End of the time window.
+        index_file: string, optional, default=None
+            Index file name. Default from get_track_index_filename.
+        tracks_dimname: string, default='tracks'
+            Tracks dimension name.
+        times_dimname: string, default='times'
+            Times dimension name.
+
+    Returns:
+        dsout: Xarray Dataset
+            Track statistics of tracks with at least one element in the region/time window.
+            Variable 'track_index' is the track index in the original file.
+    """
+    if index_file is None:
+        index_file = get_track_index_filename(trackstats_file)
+    if os.path.isfile(index_file):
+        index = load_track_index(index_file)
+    else:
+        index = build_track_index_from_file(
+            trackstats_file, tracks_dimname=tracks_dimname, times_dimname=times_dimname,
+        )
+        write_track_index(index, index_file)
+    tracks, _ = query_track_index(index, extent=extent, start_time=start_time, end_time=end_time)
+    track_list = np.unique(tracks)
+
+    ds = xr.open_dataset(trackstats_file)
+    sparse_dimname = "sparse_index"
+    if sparse_dimname in ds.dims:
+        # Keep sparse elements of the matching tracks and renumber their track indices
+        tracks_idx_varname = f"{tracks_dimname}_indices"
+        tracks_idx = ds[tracks_idx_varname].values
+        keep = np.isin(tracks_idx, track_list)
+        dsout = ds.isel({tracks_dimname: track_list, sparse_dimname: np.nonzero(keep)[0]})
+        dsout[tracks_idx_varname].values = np.searchsorted(track_list, tracks_idx[keep])
+    else:
+        dsout = ds.isel({tracks_dimname: track_list})
+    dsout = dsout.assign({"track_index": ([tracks_dimname], track_list)})
+    dsout = dsout.assign_coords({tracks_dimname: np.arange(len(track_list))})
+    return dsout
+
+
+def parse_cmd_args():
+    # Define and retrieve the command-line arguments...
+    parser = argparse.ArgumentParser(
+        description="Build or query the spatio-temporal index of a track statistics file."
+    )
+    parser.add_argument("action", choices=["build", "query"], help="build index or query tracks")
+    parser.add_argument("trackstats_file", help="track statistics file (dense or sparse)")
+    parser.add_argument("--index", help="index file name (default: {trackstats_file}_index.nc)", default=None)
+    parser.add_argument("--extent", nargs=4, help="region (lonmin, lonmax, latmin, latmax)", type=float, default=None)
+    parser.add_argument("-s", "--start", help="start time, format=YYYY-mm-ddTHH:MM:SS", default=None)
+    parser.add_argument("-e", "--end", help="end time, format=YYYY-mm-ddTHH:MM:SS", default=None)
+    parser.add_argument("--output", help="output subset track statistics file", default=None)
+    parser.add_argument("--latbin", help="latitude bucket size [degree]", type=float, default=1.0)
+    parser.add_argument("--lonbin", help="longitude bucket size [degree]", type=float, default=1.0)
+    parser.add_argument("--timebin", help="time bucket size [hour]", type=float, default=24.0)
+    args = parser.parse_args()
+    return args
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    args = parse_cmd_args()
+    index_file = args.index if args.index is not None else get_track_index_filename(args.trackstats_file)
+
+    if args.action == "build":
+        index = build_track_index_from_file(
+            args.trackstats_file, lat_bin=args.latbin, lon_bin=args.lonbin, time_bin=args.timebin,
+        )
+        write_track_index(index, index_file)
+        print(f"Number of indexed elements: {len(index['tracks'])}")
+        sys.exit(0)
+
+    if args.output is not None:
+        dsout = subset_trackstats(args.trackstats_file, extent=args.extent,
+                                  start_time=args.start, end_time=args.end, index_file=index_file)
+        dsout.to_netcdf(args.output, mode="w", format="NETCDF4")
+        print(f"Number of tracks: {dsout.sizes['tracks']}, saved: {args.output}")
+    else:
+        if not os.path.isfile(index_file):
+            write_track_index(build_track_index_from_file(args.trackstats_file), index_file)
+        index = load_track_index(index_file)
+        tracks, times = query_track_index(index, extent=args.extent, start_time=args.start, end_time=args.end)
+        track_list = np.unique(tracks)
+        print(f"Number of tracks: {len(track_list)}, number of track times: {len(tracks)}")
+        print(" ".join(str(itrack) for itrack in track_list))
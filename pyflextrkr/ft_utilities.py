@@ -1,11 +1,15 @@
 import numpy as np
-import os, fnmatch, sys, glob
+import os, sys
 import datetime, calendar, time
 from pytz import utc
 import yaml
 import xarray as xr
 import logging
+import netCDF4
+import dask.array as da
 from scipy.sparse import csr_matrix
+from pyflextrkr.ft_filecatalog import list_files, get_basetime_from_names, set_catalog_path
+from pyflextrkr.ft_ragged import get_rowsize_varname, load_ragged_trackstats, ragged_to_dataset
 
 def setup_logging():
     """
@@ -23,6 +27,14 @@ def load_config(config_file):
     """
     Load configuration file, set paths and update the configuration dictionary.
 
+    Config parameters:
+        file_catalog: bool, optional, default=False
+            Save directory listings in SQLite catalogs reused by other steps and runs
+            (see ft_filecatalog). Otherwise listings are only kept in memory.
+        file_catalog_path: string, optional, default=stats_outpath + "file_catalog/"
+            Directory of the catalogs. SQLite locking is unreliable on Lustre/NFS,
+            use a local file system there.
+
     Args:
         config_file: string
             Path to a config file.
@@ -58,6 +70,12 @@ def load_config(config_file):
     os.makedirs(stats_outpath, exist_ok=True)
     os.makedirs(pixeltracking_outpath, exist_ok=True)
 
+    # File listing catalogs are kept out of the data directories, and only saved if requested
+    if config.get("file_catalog", False):
+        set_catalog_path(config.get("file_catalog_path", stats_outpath + "file_catalog/"))
+    else:
+        set_catalog_path(None)
+
     # Calculate basetime for start and end date
     start_basetime = get_basetime_from_string(startdate)
     end_basetime = get_basetime_from_string(enddate)
@@ -110,6 +128,9 @@ def get_basetime_from_filename(
     """
     Calculate base time (Epoch time) from filenames.
 
+    File names are read from the directory listing cache (see ft_filecatalog.list_directory),
+    so the directory is only listed again when it has changed.
+
     Args:
         data_path: string
             Data directory name.
@@ -128,60 +149,20 @@ def get_basetime_from_filename(
             List of file time string.
 
     """
-    logger = logging.getLogger(__name__)
-    # Isolate all possible files
-    filenames = sorted(fnmatch.filter(os.listdir(data_path), data_basename + '*'))
+    # Isolate all possible files from the directory catalog
+    filenames = list_files(data_path, data_basename)
 
-    # Loop through files, identifying files within the startdate - enddate interval
+    # Parse date/time from all file names at once
     nleadingchar = len(data_basename)
-
-    data_filenames = [None]*len(filenames)
-    files_timestring = [None]*len(filenames)
-    files_datestring = [None]*len(filenames)
-    files_basetime = np.full(len(filenames), -9999, dtype=int)
-
-    yyyy_idx = time_format.find("yyyy")
-    mo_idx = time_format.find("mo")
-    dd_idx = time_format.find("dd")
-    hh_idx = time_format.find("hh")
-    mm_idx = time_format.find("mm")
-    ss_idx = time_format.find("ss")
-
-    # Add basetime character counts to get the actual date/time string positions
-    yyyy_idx = nleadingchar + yyyy_idx
-    mo_idx = nleadingchar + mo_idx
-    dd_idx = nleadingchar + dd_idx
-    hh_idx = nleadingchar + hh_idx if (hh_idx != -1) else None
-    mm_idx = nleadingchar + mm_idx if (mm_idx != -1) else None
-    ss_idx = nleadingchar + ss_idx if (ss_idx != -1) else None
-
-    # Loop over each file
-    for ii, ifile in enumerate(filenames):
-        year = ifile[yyyy_idx:yyyy_idx+4]
-        month = ifile[mo_idx:mo_idx+2]
-        day = ifile[dd_idx:dd_idx+2]
-        # If hour, minute, second is not in time_format, assume 0
-        hour = ifile[hh_idx:hh_idx+2] if (hh_idx is not None) else '00'
-        minute = ifile[mm_idx:mm_idx+2] if (mm_idx is not None) else '00'
-        second = ifile[ss_idx:ss_idx+2] if (ss_idx is not None) else '00'
-
-        # Check month, day, hour, minute, second valid values
-        if (0 <= int(month) <= 12) & (0 <= int(day) <= 31) & \
-           (0 <= int(hour) <= 23) & (0 <= int(minute) <= 59) & (0 <= int(second) <= 59):
-            TEMP_filetime = datetime.datetime(int(year), int(month), int(day),
-                                            int(hour), int(minute), int(second), tzinfo=utc)
-            files_basetime[ii] = calendar.timegm(TEMP_filetime.timetuple())
-        else:
-            logger.warning(f'File has invalid date/time, will not be included in processing: {ifile}')
-            pass
-        files_datestring[ii] = year + month + day
-        files_timestring[ii] = hour + minute
-        data_filenames[ii] = data_path + ifile
+    files_basetime, files_datestring, files_timestring = get_basetime_from_names(
+        filenames, nleadingchar, time_format=time_format,
+    )
+    data_filenames = np.char.add(data_path, filenames).tolist()
     return (
         data_filenames,
         files_basetime,
-        files_datestring,
-        files_timestring,
+        files_datestring.tolist(),
+        files_timestring.tolist(),
     )
 
 def subset_files_timerange(
@@ -216,20 +197,22 @@ def subset_files_timerange(
         files_timestring: list
             List of file time string.
     """
-    logger = logging.getLogger(__name__)
-    # Get basetime for all files
-    data_filenames, files_basetime, \
-    files_datestring, files_timestring = get_basetime_from_filename(
-        data_path, data_basename, time_format=time_format,
+    # Get all file names from the directory catalog
+    filenames = list_files(data_path, data_basename)
+
+    # Parse date/time from all file names at once
+    nleadingchar = len(data_basename)
+    files_basetime, files_datestring, files_timestring = get_basetime_from_names(
+        filenames, nleadingchar, time_format=time_format,
     )
 
     # Find basetime within the given range
     fidx = np.where((files_basetime >= start_basetime) & (files_basetime <= end_basetime))[0]
     # Subset filenames, dates, times
-    data_filenames = np.array(data_filenames)[fidx].tolist()
+    data_filenames = np.char.add(data_path, filenames[fidx]).tolist()
     files_basetime = files_basetime[fidx]
-    files_datestring = np.array(files_datestring)[fidx].tolist()
-    files_timestring = np.array(files_timestring)[fidx].tolist()
+    files_datestring = files_datestring[fidx].tolist()
+    files_timestring = files_timestring[fidx].tolist()
 
     return (
         data_filenames,
@@ -360,8 +343,8 @@ def match_drift_times(
             idx = np.where(datetime_drift == cloudid_datetime)[0]
             if (len(idx) == 1):
                 datetime_drift_match[itime] = datetime_drift[idx[0]]
-                xdrifts_match[itime] = xdrifts[idx]
-                ydrifts_match[itime] = ydrifts[idx]
+                xdrifts_match[itime] = xdrifts[idx[0]]
+                ydrifts_match[itime] = ydrifts[idx[0]]
     return (
         datetime_drift_match,
         xdrifts_match,
@@ -421,7 +404,7 @@ def load_sparse_trackstats(
             # Collect variable attributes
             sparse_attrs_dict[ivar] = ds_all[ivar].attrs
     # Drop all sparse variables and dimension
-    ds_1d = ds_all.drop_dims(sparse_dimname)
+    ds_1d = ds_all.drop_dims(sparse_dimname).drop_vars(get_rowsize_varname(tracks_dimname), errors="ignore")
     ds_all.close()
     return ds_1d, sparse_attrs_dict, sparse_dict
 
@@ -436,10 +419,18 @@ def convert_trackstats_sparse2dense(
         times_dimname,
         fillval,
         fillval_f,
+        track_chunksize=1000,
+        times_chunksize=None,
+        nworkers=1,
 ):
     """
     Convert sparse trackstats netCDF file to dense trackstats netCDF file.
 
+    The dense variables are built and written in blocks of track_chunksize tracks,
+    each block scattered from its own range of sparse elements, so memory use is
+    bounded by the block size rather than by the full dense arrays.
+    Blocks of all variables are built in parallel by nworkers threads.
+
     Args:
         filename_sparse: string
             Filename for sparse trackstats netCDF file.
@@ -459,54 +450,35 @@ def convert_trackstats_sparse2dense(
             Missing value for int type variables.
         fillval_f: float
             Missing value for float type variables.
+        track_chunksize: int, default=1000
+            Number of tracks in each block, also the tracks chunk size of the output file.
+            None converts all tracks at once in memory.
+        times_chunksize: int, default=None
+            Times chunk size of the output file. None is max_trackduration,
+            so that reading a track reads a single chunk.
+        nworkers: int, default=1
+            Number of threads building the blocks.
 
     Returns:
         True.
     """
-    # Read sparse netCDF file
-    ds_all = xr.open_dataset(
-        filename_sparse,
-        mask_and_scale=False,
-        decode_times=False
+    # Read sparse netCDF file as ragged arrays
+    # With blocks, the sparse variables are only read block by block
+    ds_1d, ragged = load_ragged_trackstats(
+        filename_sparse, max_trackduration, tracks_dimname, tracks_idx_varname, times_idx_varname,
+        lazy=track_chunksize is not None,
     )
-    # Get sparse array info
-    sparse_dimname = 'sparse_index'
-    nsparse_data = ds_all.dims[sparse_dimname]
-    ntracks = ds_all.dims[tracks_dimname]
-    # Sparse array indices
-    tracks_idx = ds_all[tracks_idx_varname].values
-    times_idx = ds_all[times_idx_varname].values
-    row_col_ind = (tracks_idx, times_idx)
-    # Sparse array shapes
-    shape_2d = (ntracks, max_trackduration)
-
-    # Create a dense mask for no feature
-    mask = csr_matrix(
-        (ds_all['base_time'].data, row_col_ind),
-        shape=shape_2d,
-        dtype=ds_all['base_time'].dtype,
-    ).toarray() == 0
+    # Scatter each variable directly into a dense array filled with missing values
+    ds_2d = ragged_to_dataset(ragged, tracks_dimname, times_dimname, fillval, fillval_f,
+                              track_chunksize=track_chunksize)
+    ntracks = ragged.ntracks
 
     # Create variable dictionary
     var_dict = {}
-    for key, value in ds_all.data_vars.items():
-        # Check dimension name for sparse arrays
-        if ds_all[key].dims[0] == sparse_dimname:
-            # Convert to sparse array, then to dense array
-            var_dense = csr_matrix(
-                (ds_all[key].data, row_col_ind), shape=shape_2d, dtype=ds_all[key].dtype,
-            ).toarray()
-            # Replace missing values based on variable type
-            if isinstance(var_dense[0, 0], np.floating):
-                var_dense[mask] = fillval_f
-            else:
-                var_dense[mask] = fillval
-            var_dict[key] = ([tracks_dimname, times_dimname], var_dense, ds_all[key].attrs)
-        else:
-            var_dict[key] = ([tracks_dimname], value.data, ds_all[key].attrs)
-    # Remove the tracks/times indices variables
-    var_dict.pop(tracks_idx_varname, None)
-    var_dict.pop(times_idx_varname, None)
+    for key in ds_1d.data_vars.keys():
+        var_dict[key] = ([tracks_dimname], ds_1d[key].data, ds_1d[key].attrs)
+    for key in ds_2d.data_vars.keys():
+        var_dict[key] = ([tracks_dimname, times_dimname], ds_2d[key].data, ds_2d[key].attrs)
 
     # Define coordinate dictionary
     coord_dict = {
@@ -515,20 +487,98 @@ def convert_trackstats_sparse2dense(
     }
 
     # Update file creation time in global attribute
-    gattr_dict = ds_all.attrs
+    gattr_dict = ds_1d.attrs
     gattr_dict["Created_on"] = time.ctime(time.time())
 
     # Define output Xarray dataset
     dsout = xr.Dataset(var_dict, coords=coord_dict, attrs=gattr_dict)
-    # Set encoding/compression for all variables
-    comp = dict(zlib=True)
-    encoding = {var: comp for var in dsout.data_vars}
-    # Write to netcdf file
+    # Set encoding/compression/chunking for all variables
+    chunked = (track_chunksize is not None) and (ntracks > 0)
+    if chunked:
+        chunks = (min(track_chunksize, ntracks), min(times_chunksize or max_trackduration, max_trackduration))
+    else:
+        chunks = None
+    # Write to netcdf file, dense blocks are written as they are built
+    write_dense_netcdf(dsout, filename_dense, tracks_dimname, chunks=chunks, nworkers=nworkers)
+    return True
+
+
+def write_dense_netcdf(dsout, filename, unlimited_dimname, chunks=None, nworkers=1):
+    """
+    Write a Dataset with Dask-backed variables to a netCDF file block by block.
+
+    Each chunk is written once, so the default netCDF chunk cache of each variable (64 MB)
+    is not needed. The cache of each data variable only keeps about one chunk.
+    Xarray encoding cannot set the chunk cache of a variable, so the file is written with netCDF4.
+
+    Args:
+        dsout: Xarray Dataset
+            Dataset to write, data variables are compressed.
+        filename: string
+            Output netCDF file name.
+        unlimited_dimname: string
+            Unlimited dimension name.
+        chunks: tuple, default=None
+            Chunk sizes of 2D data variables (first element for 1D data variables).
+            None uses the netCDF default chunking.
+        nworkers: int, default=1
+            Number of threads building the Dask blocks.
+
+    Returns:
+        None.
+    """
+    from xarray.backends.locks import HDF5_LOCK
+    # Encode variables/attributes as Xarray would (e.g., default _FillValue)
+    variables, attrs = xr.conventions.cf_encoder(dict(dsout.variables), dict(dsout.attrs))
+    sources = []
+    targets = []
+    with netCDF4.Dataset(filename, mode='w', format='NETCDF4') as ncfile:
+        ncfile.setncatts(attrs)
+        for dimname, size in dsout.sizes.items():
+            ncfile.createDimension(dimname, None if dimname == unlimited_dimname else size)
+        for name, var in variables.items():
+            var_attrs = dict(var.attrs)
+            kwargs = dict(fill_value=var_attrs.pop('_FillValue', None))
+            if name in dsout.data_vars:
+                kwargs['zlib'] = True
+                if chunks is not None:
+                    kwargs['chunksizes'] = chunks[:var.ndim]
+                    kwargs['chunk_cache'] = int(np.prod(chunks[:var.ndim])) * var.dtype.itemsize
+            ncvar = ncfile.createVariable(name, var.dtype, var.dims, **kwargs)
+            ncvar.setncatts(var_attrs)
+            if isinstance(var.data, da.Array):
+                sources.append(var.data)
+                targets.append(ncvar)
+            else:
+                ncvar[...] = var.values
+        # Blocks are built in parallel, writes hold the same lock as Xarray reads
+        # of the sparse file, since the netCDF/HDF5 libraries are not thread-safe
+        da.store(sources, targets, lock=HDF5_LOCK, scheduler="threads", num_workers=nworkers)
+    return
+
+
+def write_cloudid_file(dsout, cloudid_outfile, encoding):
+    """
+    Write a cloudid Dataset to a netCDF file.
+
+    Args:
+        dsout: xarray.Dataset
+            Cloudid dataset.
+        cloudid_outfile: string
+            Cloudid file name.
+        encoding: dictionary
+            Encoding for each variable.
+
+    Returns:
+        cloudid_outfile: string
+            Cloudid file name.
+    """
+    logger = logging.getLogger(__name__)
     dsout.to_netcdf(
-        path=filename_dense,
+        path=cloudid_outfile,
         mode='w',
         format='NETCDF4',
-        unlimited_dims=tracks_dimname,
         encoding=encoding
     )
-    return True
\ No newline at end of file
+    logger.info(f"{cloudid_outfile}")
+    return cloudid_outfile
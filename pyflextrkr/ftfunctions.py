@@ -1,5 +1,8 @@
 import numpy as np
 from collections import deque
+from scipy.ndimage import generate_binary_structure
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
 from skimage.segmentation import watershed
 from skimage.feature import peak_local_max
 
@@ -27,88 +30,239 @@ def sort_renumber(
         sortedcell_npix: np.ndarray(int)
             Number of pixels for each labeled cell in 1D.
     """
+    sortedlabelcell_number, sortedcell_npix = sort_renumber_batch(
+        np.expand_dims(labelcell_number2d, 0), min_size, grid_area=grid_area,
+    )
+    return (
+        sortedlabelcell_number[0],
+        sortedcell_npix[0],
+    )
 
-    # Create output arrays
-    sortedlabelcell_number2d = np.zeros(np.shape(labelcell_number2d), dtype=int)
-
-    # Get number of labeled cells
-    nlabelcells = np.nanmax(labelcell_number2d)
-
-    # Check if there is any cells identified
-    if nlabelcells > 0:
 
-        labelcell_npix = np.full(nlabelcells, -999, dtype=int)
-        # Loop over each labeled cell
-        for ilabelcell in range(1, nlabelcells + 1):
-            # Count number of pixels for the cell
-            ilabelcell_npix = np.count_nonzero(labelcell_number2d == ilabelcell)
-            # Check if grid_area is supplied
-            if grid_area is None:
-                # If cell npix > min size threshold
-                if ilabelcell_npix > min_size:
-                    labelcell_npix[ilabelcell - 1] = ilabelcell_npix
-            else:
-                # If grid_area is supplied, sum grid area for the cell
-                ilabelcell_area = np.sum(grid_area[labelcell_number2d == ilabelcell])
-                # If cell area > min size threshold
-                if ilabelcell_area > min_size:
-                    labelcell_npix[ilabelcell - 1] = ilabelcell_npix
+def sort_renumber_batch(
+    labelcell_number,
+    min_size,
+    grid_area=None,
+):
+    """
+    Sorts labeled cells by size separately for each time, and removes cells smaller than min_size.
 
+    Cell sizes are counted for all times at once, and cells are renumbered with one lookup.
+    Each cell must be within a single time (e.g., labeled without connectivity in time).
+    Results for each time are the same as sort_renumber on that time.
 
-        # # This faster approach does not work
-        # # Because when labelcell_number2d is not sequentially numbered (e.g., when some cells are removed)
-        # # This approach does not get the same sequence with the above one
-        # # Count number of pixels for each unique cells
-        # cellnum, labelcell_npix = np.unique(labelcell_number2d, return_counts=True)
-        # # Remove background and cells below size threshold
-        # labelcell_npix = labelcell_npix[(cellnum > 0)]
-        # labelcell_npix[(labelcell_npix <= min_size)] = -999
+    Args:
+        labelcell_number: np.ndarray()
+            Labeled cell number array in 3D [time, y, x], cell numbers are unique across times.
+        min_size: float
+            Minimum size to count as a cell.
+            If grid_area is None, this should be the minimum number of pixels.
+            If grid_area is supplied, this should be the minimum area.
+        grid_area: np.ndarray(), optional, default=None
+            Area of each grid in 2D [y, x].
 
-        # Check if any of the cells passes the size threshold test
-        ivalidcells = np.where(labelcell_npix > 0)[0]
-        # ivalidcells = np.array(np.where(labelcell_npix > 0))[0, :]
+    Returns:
+        sortedlabelcell_number: np.ndarray(int)
+            Sorted labeled cell number array in 3D, numbered from 1 at each time.
+        sortedcell_npix: list
+            Number of pixels for each labeled cell in 1D, for each time.
+    """
+    ntimes = labelcell_number.shape[0]
+    labelcell_number = np.nan_to_num(labelcell_number).astype(int, copy=False)
+    # Get number of labeled cells
+    nlabelcells = np.max(labelcell_number, initial=0)
+
+    if nlabelcells == 0:
+        sortedcell_npix = [np.zeros(0) for tt in range(ntimes)]
+        return np.zeros(labelcell_number.shape, dtype=int), sortedcell_npix
+
+    # Count number of pixels (and sum grid area) for all cells
+    flat_number = labelcell_number.ravel()
+    labelcell_npix_all = np.bincount(flat_number, minlength=nlabelcells + 1)
+    if grid_area is not None:
+        weights = np.broadcast_to(grid_area, labelcell_number.shape).ravel()
+        labelcell_area_all = np.bincount(flat_number, weights=weights, minlength=nlabelcells + 1)
+
+    # Find the time of each cell
+    labelcell_time = np.full(nlabelcells + 1, -1, dtype=int)
+    labelcell_time[flat_number] = np.repeat(np.arange(ntimes), flat_number.size // ntimes)
+    labelcell_time[0] = -1
+
+    # Lookup table from cell number to the sorted cell number at its time
+    sorted_lut = np.zeros(nlabelcells + 1, dtype=int)
+    sortedcell_npix = []
+    for tt in range(0, ntimes):
+        # Cell numbers at this time, in increasing order
+        labelcell_number1d = np.nonzero(labelcell_time == tt)[0]
+        labelcell_npix = labelcell_npix_all[labelcell_number1d]
+        # Check if cell satisfies size threshold
+        if grid_area is None:
+            ivalidcells = np.where(labelcell_npix > min_size)[0]
+        else:
+            ivalidcells = np.where(labelcell_area_all[labelcell_number1d] > min_size)[0]
         ncells = len(ivalidcells)
 
         if ncells > 0:
-            # Isolate cells that satisfy size threshold
-            # Add one since label numbers start at 1 and indices, which validcells reports starts at 0
-            labelcell_number1d = np.copy(ivalidcells) + 1
+            labelcell_number1d = labelcell_number1d[ivalidcells]
             labelcell_npix = labelcell_npix[ivalidcells]
-
             # Sort cells from largest to smallest and get the sorted index
             order = np.argsort(labelcell_npix)[::-1]
-            # order = order[::-1]  # Reverses the order
+            # Renumber the cells by size
+            sorted_lut[labelcell_number1d[order]] = np.arange(1, ncells + 1)
+            sortedcell_npix.append(np.copy(labelcell_npix[order]))
+        else:
+            # Return an empty array
+            sortedcell_npix.append(np.zeros(0))
 
-            # Sort the cells by size
-            sortedcell_npix = np.copy(labelcell_npix[order])
-            sortedcell_number1d = np.copy(labelcell_number1d[order])
+    sortedlabelcell_number = sorted_lut[labelcell_number]
+    return sortedlabelcell_number, sortedcell_npix
 
-            # Loop over the 2D cell number to re-number them by size
-            cellstep = 0
-            for icell in range(0, ncells):
-                # Find 2D indices that match the cell number
-                sortedcell_indices = np.where(
-                    labelcell_number2d == sortedcell_number1d[icell]
-                )
-                # Get one of the dimensions from the 2D indices to count the size
-                nsortedcellindices = len(sortedcell_indices[1])
-                # Check if the size matches the sorted cell size
-                if nsortedcellindices == sortedcell_npix[icell]:
-                    # Renumber the cell in 2D
-                    cellstep += 1
-                    sortedlabelcell_number2d[sortedcell_indices] = np.copy(cellstep)
 
-        else:
-            # Return an empty array
-            sortedcell_npix = np.zeros(0)
-    else:
-        # Return an empty array
-        sortedcell_npix = np.zeros(0)
+def get_time_indices(ntimes, time_chunk=None):
+    """
+    Get the time indices in a chunk of the times in a file.
 
-    return (
-        sortedlabelcell_number2d,
-        sortedcell_npix,
+    Args:
+        ntimes: int
+            Number of times in the file.
+        time_chunk: tuple, optional, default=None
+            (chunk index, number of chunks). If None, all times are returned.
+
+    Returns:
+        time_indices: np.array
+            Time indices in the chunk.
+    """
+    time_indices = np.arange(0, ntimes)
+    if time_chunk is None:
+        return time_indices
+    ichunk, nchunks = time_chunk
+    return np.array_split(time_indices, nchunks)[ichunk]
+
+
+def get_time_structure():
+    """
+    Get the structuring element to label features in [time, y, x] data without connectivity in time.
+    """
+    structure = np.zeros((3,3,3), dtype=bool)
+    structure[1,:,:] = generate_binary_structure(2, 1)
+    return structure
+
+
+def merge_periodic_labels(label_number, diagonal=False):
+    """
+    Merge labels connected across the periodic x boundary (e.g., longitude wrap-around of a global grid).
+
+    Labels touching in the first and last columns are joined with a union-find
+    (connected components of the label pairs) and renumbered consecutively,
+    keeping the order of the smallest label in each group. Only the two edge
+    columns are searched, the array is not padded.
+
+    Args:
+        label_number: np.ndarray(int)
+            Labeled array [..., y, x], e.g., 2D [y, x] or 3D [time, y, x].
+            Labels must be unique across the leading dimensions.
+        diagonal: bool, optional, default=False
+            If True, pixels touching diagonally across the boundary are also connected
+            (8-connectivity). Default is 4-connectivity (same as ndimage.label default).
+
+    Returns:
+        label_number: np.ndarray(int)
+            Labeled array with labels across the boundary merged.
+        nlabels: int
+            Number of labels.
+    """
+    label_number = np.asarray(label_number)
+    nlabels = int(np.max(label_number, initial=0))
+    left = label_number[..., 0]
+    right = label_number[..., -1]
+    # Pairs of labels touching across the boundary
+    pairs_a = [left.ravel()]
+    pairs_b = [right.ravel()]
+    if diagonal:
+        pairs_a += [left[..., 1:].ravel(), left[..., :-1].ravel()]
+        pairs_b += [right[..., :-1].ravel(), right[..., 1:].ravel()]
+    pairs_a = np.concatenate(pairs_a)
+    pairs_b = np.concatenate(pairs_b)
+    connected = (pairs_a > 0) & (pairs_b > 0) & (pairs_a != pairs_b)
+    if not np.any(connected):
+        return label_number, nlabels
+
+    # Group labels connected across the boundary
+    pairs_a = pairs_a[connected]
+    pairs_b = pairs_b[connected]
+    graph = coo_matrix(
+        (np.ones(len(pairs_a), dtype=np.int8), (pairs_a, pairs_b)),
+        shape=(nlabels + 1, nlabels + 1),
     )
+    ngroups, group = connected_components(graph, directed=False)
+    # Smallest label in each group
+    group_min = np.full(ngroups, nlabels + 1, dtype=int)
+    np.minimum.at(group_min, group, np.arange(nlabels + 1))
+    # Renumber groups consecutively by their smallest label
+    is_first = group_min[group] == np.arange(nlabels + 1)
+    is_first[0] = False
+    new_number = np.cumsum(is_first)
+    lut = new_number[group_min[group]]
+    lut[0] = 0
+    return lut[label_number], int(new_number[-1])
+
+
+def get_mean_lon(lon, periodic_x=False):
+    """
+    Calculate mean longitude, wrap-aware for features crossing the periodic x boundary.
+
+    Args:
+        lon: np.ndarray
+            Longitude [degree].
+        periodic_x: bool, optional, default=False
+            If True, use the circular mean so that features crossing the
+            longitude wrap-around get the correct center.
+
+    Returns:
+        mean_lon: float
+            Mean longitude [degree], in [0, 360) if all longitudes are >= 0,
+            otherwise in [-180, 180).
+    """
+    if not periodic_x:
+        return np.nanmean(lon)
+    lon_rad = np.deg2rad(lon)
+    mean_lon = np.rad2deg(np.arctan2(np.nanmean(np.sin(lon_rad)), np.nanmean(np.cos(lon_rad))))
+    if (mean_lon < 0) and (np.nanmin(lon) >= 0):
+        mean_lon += 360.
+    return mean_lon
+
+
+def get_mean_x(x, x0, period, periodic_x=False):
+    """
+    Calculate mean x coordinate, wrap-aware for features crossing the periodic x boundary.
+
+    Args:
+        x: np.ndarray
+            X coordinate of the feature pixels.
+        x0: float
+            X coordinate of the first column of the domain.
+        period: float
+            Domain width in x (number of columns times grid spacing).
+        periodic_x: bool, optional, default=False
+            If True, pixels are unwrapped around their circular mean before averaging,
+            so that features crossing the boundary get the correct center.
+
+    Returns:
+        mean_x: float
+            Mean x coordinate, in [x0, x0 + period) if periodic_x is True.
+    """
+    if not periodic_x:
+        return np.nanmean(x)
+    x = np.asarray(x, dtype=float)
+    angle = 2 * np.pi * (x - x0) / period
+    center = np.arctan2(np.nanmean(np.sin(angle)), np.nanmean(np.cos(angle))) * period / (2 * np.pi)
+    # Distance of each pixel to the circular mean, within half a period
+    dx = np.mod(x - x0 - center + period / 2, period) - period / 2
+    mean_x = np.mod(center + np.nanmean(dx), period)
+    # Rounding of a small negative value can give the period itself
+    if mean_x >= period:
+        mean_x = 0.
+    return x0 + mean_x
 
 
 def sort_renumber2vars(
@@ -381,7 +535,7 @@ def olr_to_tb(OLR):
     tb = (-a + np.sqrt(a**2 + 4*b*tf))/(2*b)
     return tb
 
-def get_neighborhood(point, grid):
+def get_neighborhood(point, grid, periodic_x=False):
     """
     Given a grid of labeled points with 0=unlabeled, -1 to be processed, other # to be proccesed.
 
@@ -390,6 +544,8 @@ def get_neighborhood(point, grid):
             Array containing seed points for growing
         grid: np.array
             Array containing labels.
+        periodic_x: bool, optional, default=False
+            If True, the first and last columns are neighbors.
     
     Returns:
         next_points: np.array
@@ -404,7 +560,9 @@ def get_neighborhood(point, grid):
     for idx, i_point in enumerate(point_grid):
         if i_point[0] < 0 or i_point[0] >= shape[0]:
             continue
-        if i_point[1] < 0 or i_point[1] >= shape[1]:
+        if periodic_x:
+            i_point[1] = i_point[1] % shape[1]
+        elif i_point[1] < 0 or i_point[1] >= shape[1]:
             continue
         if i_point[0] == point[0] and i_point[1] == point[1]:
             continue
@@ -414,7 +572,7 @@ def get_neighborhood(point, grid):
     return next_points  # Would probably be faster to pass in deque and directly add rather than a sublist.
 
 
-def grow_cells(grid):
+def grow_cells(grid, periodic_x=False):
     """
     Fast algorithm to grow and label areas based on nearest distance to the seeded regions.
 
@@ -422,6 +580,8 @@ def grow_cells(grid):
         grid: np.array
             Array containing labeled seeded regions (values > 0).
             Areas for growing = 0, areas excluded = -1.
+        periodic_x: bool, optional, default=False
+            If True, regions grow across the first and last columns.
 
     Returns:
         grid: np.array
@@ -436,11 +596,15 @@ def grow_cells(grid):
     )
     while len(point_que) > 0:
         current_pt = point_que.popleft()
-        neighbor_values = grid[
-            max(current_pt[0] - 1, 0) : current_pt[0] + 2,
-            max(0, current_pt[1] - 1) : current_pt[1] + 2,
-        ]
-        neighbors = get_neighborhood(current_pt, grid)
+        if periodic_x:
+            neighbor_cols = np.arange(current_pt[1] - 1, current_pt[1] + 2) % grid.shape[1]
+            neighbor_values = grid[max(current_pt[0] - 1, 0) : current_pt[0] + 2][:, neighbor_cols]
+        else:
+            neighbor_values = grid[
+                max(current_pt[0] - 1, 0) : current_pt[0] + 2,
+                max(0, current_pt[1] - 1) : current_pt[1] + 2,
+            ]
+        neighbors = get_neighborhood(current_pt, grid, periodic_x=periodic_x)
 
         for point in neighbors:
             grid[point[0], point[1]] = -1
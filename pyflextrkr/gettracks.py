@@ -6,7 +6,9 @@ from netCDF4 import Dataset
 import xarray as xr
 import logging
 from pyflextrkr.ft_utilities import subset_files_timerange
+from pyflextrkr.ft_telemetry import telemetry_stage
 
+@telemetry_stage("gettracks")
 def gettracknumbers(config):
     """
     Track features sequentially from the single track files.
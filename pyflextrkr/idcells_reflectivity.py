@@ -13,6 +13,7 @@ from pyflextrkr.netcdf_io import write_radar_cellid
 def idcells_reflectivity(
     input_filename,
     config,
+    return_frame=False,
 ):
     """
     Identifies convective cells using composite radar reflectivity.
@@ -22,10 +23,14 @@ def idcells_reflectivity(
             Input data filename
         config: dictionary
             Dictionary containing config parameters
+        return_frame: bool, optional, default=False
+            Also return the labeled frame, so it can be linked without reading the cloudid file.
 
     Returns:
         cloudid_outfile: string
             Cloudid file name.
+        frame: dictionary
+            Only if return_frame=True. Keys: 'labels', 'nfeatures', 'base_time'.
     """
     np.set_printoptions(threshold=np.inf)
     logger = logging.getLogger(__name__)
@@ -325,6 +330,13 @@ def idcells_reflectivity(
         )
     logger.info(f"{cloudid_outfile}")
 
+    if return_frame:
+        frame = {
+            "labels": np.expand_dims(feature_mask, 0).astype(np.int32),
+            "nfeatures": out_nfeatures,
+            "base_time": out_basetime,
+        }
+        return cloudid_outfile, frame
     return cloudid_outfile
 
 #--------------------------------------------------------------------------------
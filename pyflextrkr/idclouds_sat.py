@@ -166,6 +166,7 @@ def idclouds_gpmmergir(
                                 config['mincoldcorepix'],
                                 config['smoothwindowdimensions'],
                                 config['warmanvilexpansion'],
+                                periodic_x=config.get('periodic_x', False),
                             )
 
                         ######################################################
@@ -11,12 +11,13 @@ from pyflextrkr import netcdf_io as net
 from pyflextrkr.ftfunctions import olr_to_tb
 from pyflextrkr.futyan3 import futyan3
 from pyflextrkr.label_and_grow_cold_clouds import label_and_grow_cold_clouds
-from pyflextrkr.ftfunctions import sort_renumber, sort_renumber2vars, link_pf_tb
+from pyflextrkr.ftfunctions import sort_renumber, sort_renumber2vars, link_pf_tb, merge_periodic_labels
 from pyflextrkr.sl3d_func import run_sl3d
 
 def idclouds_tbpf(
     filename,
     config,
+    return_frame=False,
 ):
     """
     Identifies convective cloud objects from infrared brightness temperature and precipitation data.
@@ -26,10 +27,15 @@ def idclouds_tbpf(
             Input data filename
         config: dictionary
             Dictionary containing config parameters
+        return_frame: bool, optional, default=False
+            If True, also return the labeled feature frame for tracking.
 
     Returns:
         cloudid_outfile: string
             Cloudid file name.
+        frame: dictionary
+            Only if return_frame=True. Keys: 'labels', 'nfeatures', 'base_time'.
+            None if no cloudid file is written.
     """
     np.set_printoptions(threshold=np.inf)
     logger = logging.getLogger(__name__)
@@ -39,6 +45,7 @@ def idclouds_tbpf(
     clouddatasource = config['clouddatasource']
     # Set medfilt2d kernel_size, this determines the filter window dimension
     medfiltsize = config.get('medfiltsize', 5)
+    periodic_x = config.get('periodic_x', False)
     idclouds_hourly = config.get('idclouds_hourly', 0)
     idclouds_minute = config.get('idclouds_minute', 0)
     # Default idclouds minute difference allowed
@@ -85,6 +92,7 @@ def idclouds_tbpf(
     z_dimname = config.get('z_dimname', None)
 
     cloudid_outfile = None
+    frame = None
     logger.debug(filename)
 
     # Initialize optional variables
@@ -220,6 +228,7 @@ def idclouds_tbpf(
                             mincoldcorepix,
                             smoothwindowdimensions,
                             warmanvilexpansion,
+                            periodic_x=periodic_x,
                         )
                     elif cloudidmethod == "futyan3":
                         clouddata = futyan3(
@@ -288,6 +297,8 @@ def idclouds_tbpf(
                             #     mode="nearest",
                             # )
                             pf_number, npf = label(pcp_s >= pf_dbz_thresh)
+                            if periodic_x:
+                                pf_number, npf = merge_periodic_labels(pf_number)
 
                             # Convert PF area threshold to number of pixels
                             min_npix = np.ceil(
@@ -415,6 +426,12 @@ def idclouds_tbpf(
                             sl3d_attrs=sl3d_attrs,
                         )
                         logger.info(f"{cloudid_outfile}")
+                        if return_frame:
+                            frame = {
+                                "labels": final_convcold_cloudnumber.astype(np.int32),
+                                "nfeatures": final_nclouds,
+                                "base_time": file_basetime,
+                            }
 
                     else:
                         logger.info(filename)
@@ -428,4 +445,6 @@ def idclouds_tbpf(
                 logger.info(
                     "No data within specified geolimit range."
                 )
+    if return_frame:
+        return cloudid_outfile, frame
     return cloudid_outfile
\ No newline at end of file
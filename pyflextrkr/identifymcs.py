@@ -4,8 +4,10 @@ import os
 import sys
 import xarray as xr
 import logging
-from pyflextrkr.ft_utilities import load_sparse_trackstats
+from pyflextrkr.ft_ragged import load_ragged_trackstats, ragged_to_dataset
+from pyflextrkr.ft_telemetry import telemetry_stage
 
+@telemetry_stage("identifymcs")
 def identifymcs_tb(config):
     """
     Identify MCS using track Tb features.
@@ -52,12 +54,9 @@ def identifymcs_tb(config):
     statistics_file = f"{stats_path}{trackstats_sparse_filebase}{startdate}_{enddate}.nc"
     logger.debug(statistics_file)
 
-    # Load sparse tracks statistics file and convert to sparse arrays
-    ds_1d, \
-    sparse_attrs_dict, \
-    sparse_dict = load_sparse_trackstats(max_trackduration, statistics_file,
-                                         times_idx_varname, tracks_dimname,
-                                         tracks_idx_varname)
+    # Load sparse tracks statistics file as ragged arrays
+    ds_1d, ragged = load_ragged_trackstats(statistics_file, max_trackduration, tracks_dimname,
+                                           tracks_idx_varname, times_idx_varname)
 
     # Get necessary variables
     ntracks_all = ds_1d.dims[tracks_dimname]
@@ -65,13 +64,9 @@ def identifymcs_tb(config):
     track_duration = ds_1d["track_duration"].values
     end_merge_tracknumber = ds_1d["end_merge_tracknumber"].values
     start_split_tracknumber = ds_1d["start_split_tracknumber"].values
-    trackstat_corearea = sparse_dict["core_area"]
-    trackstat_coldarea = sparse_dict["cold_area"]
-    basetime = sparse_dict["base_time"]
-    cloudnumbers = sparse_dict["cloudnumber"]
-    track_status = sparse_dict["track_status"]
-
-    # import pdb; pdb.set_trace()
+    trackstat_corearea = ragged["core_area"]
+    # Get CCS area
+    trackstat_ccsarea = ragged["core_area"] + ragged["cold_area"]
 
     logger.info(f"Number of tracks to process: {ntracks_all}")
     logger.debug(f"MCS CCS area threshold: {mcs_tb_area_thresh}")
@@ -82,75 +77,38 @@ def identifymcs_tb(config):
 
     ###################################################################
     # Identify MCSs
-    trackidx_mcs = []
-    trackid_nonmcs = []
-
-    mcstype = np.zeros(ntracks_all, dtype=np.int16)
-    mcsstatus = np.full((ntracks_all, max_trackduration), fillval, dtype=np.int16)
-
     logger.debug(f"Total number of tracks to check: {ntracks_all}")
-    for nt in range(0, ntracks_all):
-        # Get data for a given track
-        track_corearea = trackstat_corearea[nt, :].data
-        # Get CCS area
-        track_ccsarea = trackstat_corearea[nt, :].data + trackstat_coldarea[nt, :].data
-
-        # Remove fill values
-        track_corearea = track_corearea[
-            (~np.isnan(track_corearea)) & (track_corearea != 0)
-        ]
-        track_ccsarea = track_ccsarea[~np.isnan(track_ccsarea)]
-
-        # Must have a cold core
-        if np.shape(track_corearea)[0] != 0 and np.nanmax(track_corearea > 0):
-
-            # Cold cloud shield area requirement
-            iccs = np.array(np.where(track_ccsarea > mcs_tb_area_thresh))[0, :]
-            nccs = len(iccs)
-
-            # Find continuous times
-            groups = np.split(iccs, np.where(np.diff(iccs) > timegap)[0] + 1)
-            nbreaks = len(groups)
-
-            # System may have multiple periods satisfying area and duration requirements
-            # Loop over each period
-            if iccs != []:
-                for t in range(0, nbreaks):
-                    # Duration requirement
-                    # Duration length should be group's last index - first index + 1
-                    duration_group = np.multiply(
-                        (groups[t][-1] - groups[t][0] + 1), time_resolution
-                    )
-                    if duration_group >= duration_thresh:
-                        mcstype[nt] = 1
-                        mcsstatus[nt, groups[t][:]] = 1
-                        trackidx_mcs = np.append(trackidx_mcs, nt)
-                    else:
-                        # Size requirement met but too short of a period
-                        trackid_nonmcs = np.append(trackid_nonmcs, nt)
-
-            else:
-                # Size requirement not met
-                trackid_nonmcs = np.append(trackid_nonmcs, nt)
+    # Must have a cold core
+    has_core = ragged.any(trackstat_corearea > 0)
+    # Cold cloud shield area requirement
+    # Continuous periods satisfying the area requirement (gaps up to timegap)
+    ccs_mask = (trackstat_ccsarea > mcs_tb_area_thresh) & has_core[ragged.get_track_ids()]
+    run_id, run_track, run_start, run_end = ragged.get_runs(ccs_mask, maxgap=timegap)
+    # System may have multiple periods satisfying area and duration requirements
+    # Duration length should be period's last index - first index + 1
+    run_duration = np.multiply(run_end - run_start + 1, time_resolution)
+    run_ismcs = run_duration >= duration_thresh
 
     ################################################################
     # Get unique track indices
-    trackidx_mcs = np.unique(trackidx_mcs.astype(int))
+    trackidx_mcs = np.unique(run_track[run_ismcs])
     # Provide warning message and exit if no MCS identified
-    if trackidx_mcs == []:
+    if len(trackidx_mcs) == 0:
         logger.critical("WARNING: No MCS identified.")
         logger.critical(f"Tracking will now exit.")
         sys.exit()
 
     ################################################################
     # Subset MCS track index
-    # trackid = np.array(np.where(mcstype > 0))[0, :]
     nmcs = len(trackidx_mcs)
     logger.info(f"Number of Tb defined MCS: {nmcs}")
 
     if nmcs > 0:
-        mcsstatus = mcsstatus[trackidx_mcs, :]
-        mcstype = mcstype[trackidx_mcs]
+        # MCS status is met at times within periods satisfying the duration requirement
+        mcsstatus = np.full((nmcs, max_trackduration), fillval, dtype=np.int16)
+        eidx = np.nonzero(run_id >= 0)[0]
+        eidx = eidx[run_ismcs[run_id[eidx]]]
+        mcsstatus[np.searchsorted(trackidx_mcs, ragged.get_track_ids()[eidx]), ragged.times_idx[eidx]] = 1
 
         # Get duration when MCS status is met
         mcs_duration = np.nansum(mcsstatus > 0, axis=1)
@@ -181,14 +139,14 @@ def identifymcs_tb(config):
             mergetrack_idx = mergetrack_idx[np.isin(mergetrack_idx, mcstracknumbers, invert=True)]
             if len(mergetrack_idx) > 0:
                 # Get data for merging tracks
-                mergingcloudnumber = cloudnumbers[mergetrack_idx, :].data
-                mergingbasetime = basetime[mergetrack_idx, :].data
-                mergingstatus = track_status[mergetrack_idx, :].data
-                mergingccsarea = trackstat_corearea[mergetrack_idx, :].data +\
-                                 trackstat_coldarea[mergetrack_idx, :].data
+                merge_eidx = ragged.get_element_index(mergetrack_idx)
+                mergingcloudnumber = ragged["cloudnumber"][merge_eidx]
+                mergingbasetime = ragged["base_time"][merge_eidx]
+                mergingstatus = ragged["track_status"][merge_eidx]
+                mergingccsarea = trackstat_ccsarea[merge_eidx]
 
                 # Get MCS basetime
-                imcsbasetime = basetime[int(mcstracknumbers[imcs])-1, :].data
+                imcsbasetime = ragged.get_track("base_time", int(mcstracknumbers[imcs]) - 1)
 
                 # Loop through each timestep in the MCS track
                 for t in np.arange(0, len(imcsbasetime)):
@@ -219,14 +177,14 @@ def identifymcs_tb(config):
             splittrack_idx = splittrack_idx[np.isin(splittrack_idx, mcstracknumbers, invert=True)]
             if len(splittrack_idx) > 0:
                 # Get data for split tracks
-                splittingcloudnumber = cloudnumbers[splittrack_idx, :].data
-                splittingbasetime = basetime[splittrack_idx, :].data
-                splittingstatus = track_status[splittrack_idx, :].data
-                splittingccsarea = trackstat_corearea[splittrack_idx, :].data +\
-                                   trackstat_coldarea[splittrack_idx, :].data
+                split_eidx = ragged.get_element_index(splittrack_idx)
+                splittingcloudnumber = ragged["cloudnumber"][split_eidx]
+                splittingbasetime = ragged["base_time"][split_eidx]
+                splittingstatus = ragged["track_status"][split_eidx]
+                splittingccsarea = trackstat_ccsarea[split_eidx]
 
                 # Get MCS basetime
-                imcsbasetime = basetime[int(mcstracknumbers[imcs]) - 1, :].data
+                imcsbasetime = ragged.get_track("base_time", int(mcstracknumbers[imcs]) - 1)
 
                 # Loop through each timestep in the MCS track
                 for t in np.arange(0, len(imcsbasetime)):
@@ -250,35 +208,10 @@ def identifymcs_tb(config):
     ###########################################################################
     # Prepare output dataset
 
-    # Subset tracks in sparse array dictionary
-    for ivar in sparse_dict.keys():
-        sparse_dict[ivar] = sparse_dict[ivar][trackidx_mcs, :]
-    # Remove the tracks/times indices variables
-    sparse_dict.pop(tracks_idx_varname, None)
-    sparse_dict.pop(times_idx_varname, None)
-
-    # Create a dense mask for no clouds
-    mask = sparse_dict['base_time'].toarray() == 0
-    # Convert sparse dictionary to dataset
-    varlist = {}
-    # Define output variable dictionary
-    for key, value in sparse_dict.items():
-        dense_array = value.toarray()
-        # Replace missing values based on variable type
-        if isinstance(dense_array[0, 0], np.floating):
-            dense_array[mask] = fillval_f
-        else:
-            dense_array[mask] = fillval
-        varlist[key] = ([tracks_dimname, times_dimname], dense_array, sparse_attrs_dict[key])
-    # Define coordinate
+    # Subset MCS tracks and convert to dense arrays
     tracks_coord = np.arange(0, nmcs)
     times_coord = np.arange(0, max_trackduration)
-    coordlist = {
-        tracks_dimname: ([tracks_dimname], tracks_coord),
-        times_dimname: ([times_dimname], times_coord),
-    }
-    # Define 2D Xarray dataset
-    ds_2d = xr.Dataset(varlist, coords=coordlist)
+    ds_2d = ragged_to_dataset(ragged.subset(trackidx_mcs), tracks_dimname, times_dimname, fillval, fillval_f)
     # Subset MCS tracks from 1D dataset
     # Note: the tracks_dimname cannot be used here as Xarray does not seem to have
     # a method to select data with a string variable
@@ -1,9 +1,10 @@
 import sys
 import logging
-import dask
-from dask.distributed import wait
 from pyflextrkr.ft_utilities import subset_files_timerange
+from pyflextrkr.ft_executor import get_executor
+from pyflextrkr.ft_telemetry import telemetry_stage
 
+@telemetry_stage("idfeature")
 def idfeature_driver(config):
     """
     Driver for feature identification.
@@ -24,16 +25,10 @@ def idfeature_driver(config):
     start_basetime = config["start_basetime"]
     end_basetime = config["end_basetime"]
     time_format = config["time_format"]
-    run_parallel = config["run_parallel"]
     feature_type = config["feature_type"]
     # Load function depending on feature_type
-    if feature_type == "generic":
-        from pyflextrkr.idfeature_generic import idfeature_generic as id_feature
-    elif feature_type == "radar_cells":
-        from pyflextrkr.idcells_reflectivity import idcells_reflectivity as id_feature
-    elif "tb_pf" in feature_type:
-        from pyflextrkr.idclouds_tbpf import idclouds_tbpf as id_feature
-    else:
+    id_feature = _get_id_feature(feature_type)
+    if id_feature is None:
         logger.critical(f"ERROR: Unknown feature_type: {feature_type}")
         logger.critical("Tracking will now exit.")
         sys.exit()
@@ -51,20 +46,44 @@ def idfeature_driver(config):
     nfiles = len(rawdatafiles)
     logger.info(f"Total number of files to process: {nfiles}")
 
-    # Serial
-    if run_parallel == 0:
-        for ifile in range(0, nfiles):
-            id_feature(rawdatafiles[ifile], config)
-    # Parallel
-    elif run_parallel >= 1:
-        results = []
-        for ifile in range(0, nfiles):
-            result = dask.delayed(id_feature)(rawdatafiles[ifile], config)
-            results.append(result)
-        final_result = dask.compute(*results)
-        wait(final_result)
+    # Create tasks, files with multiple times can be split into time chunks
+    # that are processed in parallel (generic and vorticity features)
+    ntime_chunks = config.get("idfeature_time_chunks", 1)
+    if (ntime_chunks > 1) and (feature_type in ["generic", "vorticity"]):
+        task_func = _id_feature_time_chunk
+        task_args = [(ifile, (ichunk, ntime_chunks)) for ifile in rawdatafiles for ichunk in range(ntime_chunks)]
     else:
-        sys.exit('Valid parallelization flag not provided')
+        task_func = id_feature
+        task_args = [(ifile,) for ifile in rawdatafiles]
+
+    # Run feature identification with the executor selected by config
+    with get_executor(config, shared_kwargs={"config": config}) as executor:
+        executor.map(task_func, task_args)
 
     logger.info('Done with features from raw data.')
-    return
\ No newline at end of file
+    return
+
+
+def _get_id_feature(feature_type):
+    """
+    Get the feature identification function for a feature_type, None if it is unknown.
+    """
+    if feature_type == "generic":
+        from pyflextrkr.idfeature_generic import idfeature_generic as id_feature
+    elif feature_type == "vorticity":
+        from pyflextrkr.idvorticity_era5 import idvorticity_era5 as id_feature
+    elif feature_type == "radar_cells":
+        from pyflextrkr.idcells_reflectivity import idcells_reflectivity as id_feature
+    elif "tb_pf" in feature_type:
+        from pyflextrkr.idclouds_tbpf import idclouds_tbpf as id_feature
+    else:
+        id_feature = None
+    return id_feature
+
+
+def _id_feature_time_chunk(filename, time_chunk, config=None):
+    """
+    Identify features in a chunk of the times in a file.
+    """
+    id_feature = _get_id_feature(config["feature_type"])
+    return id_feature(filename, config, time_chunk=time_chunk)
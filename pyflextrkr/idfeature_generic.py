@@ -5,25 +5,44 @@ import time
 import xarray as xr
 import logging
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from scipy.ndimage import label
-from pyflextrkr.ftfunctions import sort_renumber, skimage_watershed
+from pyflextrkr.ft_gridmetrics import get_grid_metrics
+from pyflextrkr.ftfunctions import sort_renumber_batch, skimage_watershed, get_time_indices, get_time_structure, \
+    merge_periodic_labels
+from pyflextrkr.ft_utilities import write_cloudid_file
 
 def idfeature_generic(
     input_filename,
     config,
+    time_chunk=None,
+    return_all=False,
+    return_frame=False,
 ):
     """
     Identify generic features.
 
+    All times in the file (or time chunk) are labeled and renumbered at once,
+    and the cloudid file for each time is written by a writer thread.
+
     Arguments:
         input_filename: string
             Input data filename
         config: dictionary
             Dictionary containing config parameters
+        time_chunk: tuple, optional, default=None
+            (chunk index, number of chunks) to only process a chunk of the times in the file.
+        return_all: bool, optional, default=False
+            Return the names of all cloudid files written (one per time) instead of the last one.
+        return_frame: bool, optional, default=False
+            Also return the labeled frame, so it can be linked without reading the cloudid file.
 
     Returns:
         cloudid_outfile: string
-            Cloudid file name.
+            Cloudid file name (list of file names if return_all).
+        frame: dictionary
+            Only if return_frame=True (list of frames if return_all).
+            Keys: 'labels', 'nfeatures', 'base_time'.
     """
     np.set_printoptions(threshold=np.inf)
     logger = logging.getLogger(__name__)
@@ -39,6 +58,7 @@ def idfeature_generic(
     min_size = config.get("min_size")
     label_method = config.get("label_method", "ndimage.label")
     R_earth = config.get("R_earth")
+    periodic_x = config.get("periodic_x", False)
     fillval = config["fillval"]
 
     # Get min/max field thresholds
@@ -89,8 +109,12 @@ def idfeature_generic(
     dlon = np.mean(np.abs(np.diff(x_coord)))
     dlat = np.mean(np.abs(np.diff(y_coord)))
 
-    # Calculate grid cell area (simple cosine adjustment)
-    grid_area = (R_earth**2) * np.cos(np.deg2rad(lat2d)) * np.deg2rad(dlat) * np.deg2rad(dlon)
+    if config.get("use_grid_metrics", False):
+        # Use spherical grid cell area, computed once per grid and cached on disk
+        grid_area = get_grid_metrics(config, lat2d=lat2d, lon2d=lon2d)["area"]
+    else:
+        # Calculate grid cell area (simple cosine adjustment)
+        grid_area = (R_earth**2) * np.cos(np.deg2rad(lat2d)) * np.deg2rad(dlat) * np.deg2rad(dlon)
 
     # Alternatively, use Metpy to calculate grid_area. Need to add Metpy to library requirement.
     # Calculate dx, dy using Metpy function
@@ -106,24 +130,54 @@ def idfeature_generic(
     # Compute grid_area
     # grid_area = dx_ * dy_
 
-    # Loop over each time
-    for tt in range(0, ntimes):
-        # Get data at this time
-        iTime = ds.indexes['time'][tt]
-        fvar = field_var.data[tt,:,:]
+    # Get the times to process
+    time_indices = get_time_indices(ntimes, time_chunk)
+    if len(time_indices) == 0:
+        if return_frame:
+            return ([], []) if return_all else (None, None)
+        return [] if return_all else None
+    fvar_all = field_var.data[time_indices,:,:]
+
+    # Label feature with simple threshold & connectivity method
+    if label_method == 'ndimage.label':
+        # Label all times at once, features are not connected across times
+        var_number, nblobs = label(
+            (field_thresh_min < fvar_all) & (fvar_all < field_thresh_max),
+            structure=get_time_structure(),
+        )
+        param_dict = {
+            'field_thresh': field_thresh,
+        }
 
-        # Label feature with simple threshold & connectivity method
-        if label_method == 'ndimage.label':
-            var_number, nblobs = label((field_thresh_min < fvar) & (fvar < field_thresh_max))
-            param_dict = {
-                'field_thresh': field_thresh,
-            }
+    if label_method == 'skimage.watershed':
+        var_number = np.zeros(fvar_all.shape, dtype=int)
+        nblobs = 0
+        for itime in range(0, len(time_indices)):
+            ivar_number, param_dict = skimage_watershed(fvar_all[itime,:,:], config)
+            # Offset labels to make them unique across times
+            var_number[itime,:,:] = np.where(ivar_number > 0, ivar_number + nblobs, 0)
+            nblobs = max(nblobs, np.max(var_number[itime,:,:]))
 
-        if label_method == 'skimage.watershed':
-            var_number, param_dict = skimage_watershed(fvar, config)
+    if periodic_x:
+        # Join features crossing the longitude boundary
+        var_number, nblobs = merge_periodic_labels(var_number)
 
-        # Sort and renumber features, filter features < min_size or grid_area
-        feature_mask, npix_feature = sort_renumber(var_number, min_size, grid_area=grid_area)
+    # Sort and renumber features, filter features < min_size or grid_area
+    feature_mask_all, npix_feature_all = sort_renumber_batch(var_number, min_size, grid_area=grid_area)
+
+    # Write output files with a writer thread
+    writer = ThreadPoolExecutor(max_workers=1)
+    write_futures = []
+    cloudid_outfiles = []
+    frames = []
+
+    # Loop over each time
+    for itime, tt in enumerate(time_indices):
+        # Get data at this time
+        iTime = ds.indexes['time'][tt]
+        fvar = fvar_all[itime,:,:]
+        feature_mask = feature_mask_all[itime,:,:]
+        npix_feature = npix_feature_all[itime]
 
         # Get number of features
         nfeatures = np.nanmax(feature_mask)
@@ -143,7 +197,7 @@ def idfeature_generic(
 
         # Put time and nfeatures in a numpy array so that they can be set with a time dimension
         out_basetime = np.zeros(1, dtype=float)
-        out_basetime[0] = file_basetime
+        out_basetime[0] = file_basetime[0]
 
         out_nfeatures = np.zeros(1, dtype=int)
         out_nfeatures[0] = nfeatures
@@ -205,12 +259,27 @@ def idfeature_generic(
         comp = dict(zlib=True)
         encoding = {var: comp for var in dsout.data_vars}
         # Write to netcdf file
-        dsout.to_netcdf(
-            path=cloudid_outfile,
-            mode='w',
-            format='NETCDF4',
-            encoding=encoding
-        )
-        logger.info(f"{cloudid_outfile}")
+        write_futures.append(writer.submit(
+            write_cloudid_file, dsout, cloudid_outfile, encoding,
+        ))
+        cloudid_outfiles.append(cloudid_outfile)
+        if return_frame:
+            frames.append({
+                "labels": np.expand_dims(feature_mask, 0).astype(np.int32),
+                "nfeatures": out_nfeatures,
+                "base_time": out_basetime,
+            })
+
+    # Wait for all files to be written
+    for future in write_futures:
+        future.result()
+    writer.shutdown()
+
+    if return_frame:
+        if return_all:
+            return cloudid_outfiles, frames
+        return cloudid_outfile, frames[-1]
+    if return_all:
+        return cloudid_outfiles
+    return cloudid_outfile
 
-    return cloudid_outfile
\ No newline at end of file
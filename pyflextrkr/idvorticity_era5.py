@@ -2,26 +2,42 @@ import os
 import numpy as np
 import time
 import xarray as xr
-import logging
+from concurrent.futures import ThreadPoolExecutor
 from scipy.ndimage import label
-from pyflextrkr.ftfunctions import sort_renumber
+from pyflextrkr.ftfunctions import sort_renumber_batch, get_time_indices, get_time_structure, merge_periodic_labels
+from pyflextrkr.ft_utilities import write_cloudid_file
 
 def idvorticity_era5(
     input_filename,
     config,
+    time_chunk=None,
+    return_all=False,
+    return_frame=False,
 ):
     """
     Identifies vorticity features from ERA5 data.
 
+    All times in the file (or time chunk) are labeled and renumbered at once,
+    and the cloudid file for each time is written by a writer thread.
+
     Arguments:
         input_filename: string
             Input data filename
         config: dictionary
             Dictionary containing config parameters
+        time_chunk: tuple, optional, default=None
+            (chunk index, number of chunks) to only process a chunk of the times in the file.
+        return_all: bool, optional, default=False
+            Return the names of all cloudid files written (one per time) instead of the last one.
+        return_frame: bool, optional, default=False
+            Also return the labeled frame, so it can be linked without reading the cloudid file.
 
     Returns:
         cloudid_outfile: string
-            Cloudid file name.
+            Cloudid file name (list of file names if return_all).
+        frame: dictionary
+            Only if return_frame=True (list of frames if return_all).
+            Keys: 'labels', 'nfeatures', 'base_time'.
     """
     feature_varname = config.get("feature_varname", "feature_number")
     nfeature_varname = config.get("nfeature_varname", "nfeatures")
@@ -32,9 +48,9 @@ def idvorticity_era5(
     field_varname = config.get("field_varname")
     vor_thresh = config.get("vor_thresh")
     min_npix = config.get("min_npix")
+    periodic_x = config.get("periodic_x", False)
 
     np.set_printoptions(threshold=np.inf)
-    logger = logging.getLogger(__name__)
 
     fillval = config["fillval"]
 
@@ -52,20 +68,36 @@ def idvorticity_era5(
     lon2d = lon2d.astype(np.float32)
     lat2d = lat2d.astype(np.float32)
 
-    # Loop over each time
-    for tt in range(0, ntimes):
-        fvar = field_var.data[:,:,tt]
-
-        # Label vorticity feature > vor_thresh
-        vor_number, nvor = label(fvar > vor_thresh)
+    # Get the times to process, move time to the first dimension
+    time_indices = get_time_indices(ntimes, time_chunk)
+    if len(time_indices) == 0:
+        if return_frame:
+            return ([], []) if return_all else (None, None)
+        return [] if return_all else None
+    fvar_all = np.moveaxis(field_var.data[:,:,time_indices], -1, 0)
+
+    # Label vorticity feature > vor_thresh for all times at once,
+    # features are not connected across times
+    vor_number, nvor = label(fvar_all > vor_thresh, structure=get_time_structure())
+    if periodic_x:
+        # Join features crossing the longitude boundary
+        vor_number, nvor = merge_periodic_labels(vor_number)
+
+    # Sort and renumber features, filter features < min_npix
+    feature_mask_all, npix_feature_all = sort_renumber_batch(vor_number, min_npix)
+
+    # Write output files with a writer thread
+    writer = ThreadPoolExecutor(max_workers=1)
+    write_futures = []
+    cloudid_outfiles = []
+    frames = []
 
-        # Sort and renumber features, filter features < min_npix
-        feature_mask, npix_feature = sort_renumber(vor_number, min_npix)
-
-        # Count number of pixels for each feature
-        unique_num, npix_feature = np.unique(feature_mask, return_counts=True)
-        # Remove background (unique_num = 0)
-        npix_feature = npix_feature[(unique_num > 0)]
+    # Loop over each time
+    for itime, tt in enumerate(time_indices):
+        fvar = fvar_all[itime,:,:]
+        feature_mask = feature_mask_all[itime,:,:]
+        # Number of pixels for each feature (features are numbered by size)
+        npix_feature = npix_feature_all[itime].astype(int)
 
         # Get number of features
         nfeatures = np.nanmax(feature_mask)
@@ -144,11 +176,26 @@ def idvorticity_era5(
         comp = dict(zlib=True)
         encoding = {var: comp for var in dsout.data_vars}
         # Write to netcdf file
-        dsout.to_netcdf(path=cloudid_outfile,
-                        mode='w',
-                        format='NETCDF4',
-                        encoding=encoding)
-        logger.info(f"{cloudid_outfile}")
-        # import pdb; pdb.set_trace()
-
+        write_futures.append(writer.submit(
+            write_cloudid_file, dsout, cloudid_outfile, encoding,
+        ))
+        cloudid_outfiles.append(cloudid_outfile)
+        if return_frame:
+            frames.append({
+                "labels": np.expand_dims(feature_mask, 0).astype(np.int32),
+                "nfeatures": out_nfeatures,
+                "base_time": out_basetime,
+            })
+
+    # Wait for all files to be written
+    for future in write_futures:
+        future.result()
+    writer.shutdown()
+
+    if return_frame:
+        if return_all:
+            return cloudid_outfiles, frames
+        return cloudid_outfile, frames[-1]
+    if return_all:
+        return cloudid_outfiles
     return cloudid_outfile
@@ -2,7 +2,7 @@ import logging
 import numpy as np
 from scipy.ndimage import label, binary_dilation, generate_binary_structure
 from astropy.convolution import Box2DKernel, convolve
-from pyflextrkr.ftfunctions import sort_renumber, grow_cells
+from pyflextrkr.ftfunctions import sort_renumber, grow_cells, merge_periodic_labels
 
 
 def label_and_grow_cold_clouds(
@@ -13,6 +13,7 @@ def label_and_grow_cold_clouds(
     mincoldcorepix,
     smoothsize,
     warmanvilexpansion,
+    periodic_x=False,
 ):
     """
     Label and growth cold clouds using infrared Tb.
@@ -32,6 +33,9 @@ def label_and_grow_cold_clouds(
             Window size to smooth Tb data using Box2DKernel.
         warmanvilexpansion: int
             Flag to expand cloud to include warm anvil.
+        periodic_x: bool, optional, default=False
+            If True, clouds are labeled and grown across the first and last columns
+            (longitude wrap-around of a global grid).
 
     Returns:
         Dictionary: 
@@ -72,6 +76,8 @@ def label_and_grow_cold_clouds(
     smoothir = smooth_tb(ir, smoothsize)
     # Label cold cores
     labelcore_number2d, nlabelcores = find_and_label_cold_cores(smoothir, thresh_core)
+    if periodic_x:
+        labelcore_number2d, nlabelcores = merge_periodic_labels(labelcore_number2d)
 
     # Create empty arrays
     labelcorecold_number2d = np.zeros((ny, nx), dtype=int)
@@ -106,7 +112,7 @@ def label_and_grow_cold_clouds(
             labelcorecold_number2d[cold_threshold_map] = -1
 
             # Then we grow out seed points
-            labelcorecold_number2d = grow_cells(labelcorecold_number2d)
+            labelcorecold_number2d = grow_cells(labelcorecold_number2d, periodic_x=periodic_x)
 
             # Then just to match before we put back old labels.
             labelcorecold_number2d[
@@ -138,6 +144,8 @@ def label_and_grow_cold_clouds(
 
         # Label isolated cold cores or cold anvils
         labelisolated_number2d, nlabelisolated = label(isolated_flag)
+        if periodic_x:
+            labelisolated_number2d, nlabelisolated = merge_periodic_labels(labelisolated_number2d)
 
         # Sort isolated cold cores/anvils by size and remove small ones
         sortedisolated_number2d, sortedisolated_npix = sort_renumber(labelisolated_number2d, nthresh)
@@ -212,6 +220,8 @@ def label_and_grow_cold_clouds(
         # Label regions with cold anvils and cores
         corecold_flag = core_flag + coldanvil_flag
         corecold_number2d, ncorecold = label(coldanvil_flag)
+        if periodic_x:
+            corecold_number2d, ncorecold = merge_periodic_labels(corecold_number2d)
 
         ##########################################################
         # Loop through clouds and only keep those where core + cold anvil exceed threshold
@@ -4,7 +4,89 @@ import os
 import sys
 import xarray as xr
 import logging
-from pyflextrkr.ft_utilities import load_sparse_trackstats
+from pyflextrkr.ft_ragged import load_ragged_trackstats, ragged_to_dataset
+
+def link_tracks_to_main(ragged, maintrack_idx, linktrack_idx, parent_idx, link_vars, nmaxmerge, link_name):
+    """
+    Put the values of tracks merging into/splitting from main tracks at the matching main track times.
+
+    The elements of all linked tracks are joined to the main track elements on
+    (main track, base_time) at once. Linked elements at the same main track time
+    fill the nmaxmerge slots in the order of linked track index, then time.
+
+    Args:
+        ragged: RaggedTracks
+            Ragged track stats variables of all tracks.
+        maintrack_idx: np.array
+            Main track indices (sorted).
+        linktrack_idx: np.array
+            Indices of tracks to link (sorted).
+        parent_idx: np.array
+            Main track index each linked track merges into/splits from.
+        link_vars: dictionary
+            Variables to link, {name: (fill value, dtype)}.
+        nmaxmerge: int
+            Maximum number of linked tracks at a time.
+        link_name: string
+            'merge' or 'split', for log messages.
+
+    Returns:
+        out_dict: dictionary
+            Linked variables [nmain, max_trackduration, nmaxmerge] for each name in link_vars.
+    """
+    logger = logging.getLogger(__name__)
+    ntracks_main = len(maintrack_idx)
+    max_trackduration = ragged.max_trackduration
+    out_dict = {}
+    for key, (fill, dtype) in link_vars.items():
+        out_dict[key] = np.full((ntracks_main, max_trackduration, nmaxmerge), fill, dtype=dtype)
+    if len(linktrack_idx) == 0:
+        return out_dict
+
+    # Main track elements: row in the output and position within the track
+    main_eidx = ragged.get_element_index(maintrack_idx)
+    main_row = np.repeat(np.arange(ntracks_main), ragged.rowsize[maintrack_idx])
+    main_pos = np.arange(len(main_eidx)) - np.repeat(
+        np.cumsum(ragged.rowsize[maintrack_idx]) - ragged.rowsize[maintrack_idx], ragged.rowsize[maintrack_idx])
+    # Linked track elements and the output row of their main track
+    link_eidx = ragged.get_element_index(linktrack_idx)
+    link_row = np.repeat(np.searchsorted(maintrack_idx, parent_idx), ragged.rowsize[linktrack_idx])
+
+    # Join on (row, base_time): number the times, then match integer keys
+    basetime = ragged["base_time"]
+    _, time_num = np.unique(np.concatenate([basetime[main_eidx], basetime[link_eidx]]), return_inverse=True)
+    ntimes = time_num.max() + 1
+    main_key = main_row * ntimes + time_num[:len(main_eidx)]
+    link_key = link_row * ntimes + time_num[len(main_eidx):]
+    main_order = np.argsort(main_key, kind="stable")
+    iloc = np.searchsorted(main_key[main_order], link_key)
+    iloc[iloc == len(main_key)] = 0
+    matched = main_key[main_order][iloc] == link_key
+    link_eidx = link_eidx[matched]
+    link_row = link_row[matched]
+    link_pos = main_pos[main_order][iloc[matched]]
+
+    # Slot of each linked element among those at the same main track time
+    link_order = np.lexsort((np.arange(len(link_eidx)), link_pos, link_row))
+    group_key = (link_row * max_trackduration + link_pos)[link_order]
+    newgroup = np.ones(len(group_key), dtype=bool)
+    newgroup[1:] = group_key[1:] != group_key[:-1]
+    group_start = np.nonzero(newgroup)[0]
+    group_size = np.diff(np.append(group_start, len(group_key)))
+    slot = np.arange(len(group_key)) - np.repeat(group_start, group_size)
+    # Find the smaller value between the two to make sure it fits into the array
+    keep = slot < nmaxmerge
+    isel = link_order[keep]
+    for key in link_vars.keys():
+        out_dict[key][link_row[isel], link_pos[isel], slot[keep]] = ragged[key][link_eidx[isel]]
+
+    for igroup in np.nonzero(group_size > nmaxmerge)[0]:
+        logger.warning(f'WARNING: number of {link_name} clouds ({group_size[igroup]}) > nmaxmerge ({nmaxmerge}), ' + \
+                       f'only partial {link_name} clouds are saved.')
+        logger.warning(f'Main track index: {group_key[group_start[igroup]] // max_trackduration}')
+        logger.warning(f'Increase nmaxmerge to avoid this WARNING.')
+    return out_dict
+
 
 def link_mergesplit_tracks(config):
     """
@@ -51,12 +133,9 @@ def link_mergesplit_tracks(config):
     statistics_file = f"{stats_path}{trackstats_sparse_filebase}{startdate}_{enddate}.nc"
     logger.debug(statistics_file)
 
-    # Load sparse tracks statistics file and convert to sparse arrays
-    ds_1d, \
-    sparse_attrs_dict, \
-    sparse_dict = load_sparse_trackstats(max_trackduration, statistics_file,
-                                         times_idx_varname, tracks_dimname,
-                                         tracks_idx_varname)
+    # Load sparse tracks statistics file as ragged arrays
+    ds_1d, ragged = load_ragged_trackstats(statistics_file, max_trackduration, tracks_dimname,
+                                           tracks_idx_varname, times_idx_varname)
 
     # Get necessary variables
     ntracks_all = ds_1d.dims[tracks_dimname]
@@ -64,10 +143,6 @@ def link_mergesplit_tracks(config):
     track_duration = ds_1d["track_duration"].values
     end_merge_tracknumber = ds_1d["end_merge_tracknumber"].values
     start_split_tracknumber = ds_1d["start_split_tracknumber"].values
-    trackstat_area = sparse_dict["area"]
-    basetime = sparse_dict["base_time"]
-    cloudnumbers = sparse_dict["cloudnumber"]
-    track_status = sparse_dict["track_status"]
 
     logger.info(f"Number of tracks to process: {ntracks_all}")
 
@@ -78,14 +153,14 @@ def link_mergesplit_tracks(config):
     # Identify main tracks (using simple lifetime & max area thresholds)
 
     # Get track lifetime maximum area
-    trackstat_maxarea = trackstat_area.max(axis=1).toarray().squeeze()
+    trackstat_maxarea = ragged.max("area", fillval=0)
 
     maintrack_idx = np.array(np.where(
         (trackstat_lifetime >= maintrack_lifetime_thresh) &
         (trackstat_maxarea >= maintrack_area_thresh)
     ))[0]
     # Provide warning message and exit if no main track identified
-    if maintrack_idx == []:
+    if len(maintrack_idx) == 0:
         logger.critical("WARNING: No main track identified.")
         logger.critical(f"Tracking will now exit.")
         sys.exit()
@@ -99,128 +174,48 @@ def link_mergesplit_tracks(config):
 
     ###################################################################################
     # Find small merge or split tracks and link to main tracks
-    merge_cloudnumber = np.full((ntracks_main, max_trackduration, nmaxmerge), fillval, dtype=np.int32)
-    merge_status = np.full((ntracks_main, max_trackduration, nmaxmerge), fillval, dtype=np.int32)
-    merge_area = np.full((ntracks_main, max_trackduration, nmaxmerge), fillval_f, dtype=np.float32)
-    split_cloudnumber = np.full((ntracks_main, max_trackduration, nmaxmerge), fillval, dtype=np.int32)
-    split_status = np.full((ntracks_main, max_trackduration, nmaxmerge), fillval, dtype=np.int32)
-    split_area = np.full((ntracks_main, max_trackduration, nmaxmerge), fillval_f, dtype=np.float32)
-
-    # Loop through each main track and link small clouds merging in
-    for itrack in np.arange(0, ntracks_main):
-        ###################################################################################
-        # Find tracks that end as merging with the main track
-        mergetrack_idx = np.where(end_merge_tracknumber == maintracknumbers[itrack])[0]
-        if len(mergetrack_idx) > 0:
-            # Isolate merge tracks that have short duration
-            mergetrack_idx = mergetrack_idx[trackstat_lifetime[mergetrack_idx] < merge_duration]
-
-            # Make sure the merge tracks are not main track
-            mergetrack_idx = mergetrack_idx[np.isin(mergetrack_idx, maintracknumbers, invert=True)]
-            if len(mergetrack_idx) > 0:
-                # Get data for merging tracks
-                mergingcloudnumber = cloudnumbers[mergetrack_idx, :].data
-                mergingbasetime = basetime[mergetrack_idx, :].data
-                mergingstatus = track_status[mergetrack_idx, :].data
-                mergingarea = trackstat_area[mergetrack_idx, :].data
-
-                # Get main track basetime
-                itrack_bt = basetime[int(maintracknumbers[itrack]) - 1, :].data
-
-                # Loop through each timestep in the main track
-                for t in np.arange(0, len(itrack_bt)):
-                    # Find merging cloud times that match current main track time
-                    timematch = np.where(mergingbasetime == itrack_bt[int(t)])[0]
-                    nmergers = len(timematch)
-                    if nmergers > 0:
-                        # Find the smaller value between the two
-                        # to make sure it fits into the array
-                        nmergers_sav = np.min([nmergers, nmaxmerge])
-                        merge_cloudnumber[itrack, int(t), 0:nmergers_sav] = mergingcloudnumber[
-                            timematch[0:nmergers_sav]]
-                        merge_status[itrack, int(t), 0:nmergers_sav] = mergingstatus[timematch[0:nmergers_sav]]
-                        merge_area[itrack, int(t), 0:nmergers_sav] = mergingarea[timematch[0:nmergers_sav]]
-                        if (nmergers > nmaxmerge):
-                            logger.warning(f'WARNING: nmergers ({nmergers}) > nmaxmerge ({nmaxmerge}), ' + \
-                                           'only partial merge clouds are saved.')
-                            logger.warning(f'Main track index: {itrack}')
-                            logger.warning(f'Increase nmaxmerge to avoid this WARNING.')
-
-        ###################################################################################
-        # Find tracks that split from the main track
-        splittrack_idx = np.where(start_split_tracknumber == maintracknumbers[itrack])[0]
-        if len(splittrack_idx) > 0:
-            # Isolate split tracks that have short duration
-            splittrack_idx = splittrack_idx[trackstat_lifetime[splittrack_idx] < split_duration]
-
-            # Make sure the split tracks are not main track
-            splittrack_idx = splittrack_idx[np.isin(splittrack_idx, maintracknumbers, invert=True)]
-            if len(splittrack_idx) > 0:
-                # Get data for split tracks
-                splittingcloudnumber = cloudnumbers[splittrack_idx, :].data
-                splittingbasetime = basetime[splittrack_idx, :].data
-                splittingstatus = track_status[splittrack_idx, :].data
-                splittingarea = trackstat_area[splittrack_idx, :].data
-
-                # Get main track basetime
-                itrack_bt = basetime[int(maintracknumbers[itrack]) - 1, :].data
-
-                # Loop through each timestep in the main track
-                for t in np.arange(0, len(itrack_bt)):
-                    # Find splitting cloud times that match current main track time
-                    timematch = np.where(splittingbasetime == itrack_bt[int(t)])[0]
-                    nspliters = len(timematch)
-                    if nspliters > 0:
-                        # Find the smaller value between the two
-                        # to make sure it fits into the array
-                        nspliters_sav = np.min([nspliters, nmaxmerge])
-                        split_cloudnumber[itrack, int(t), 0:nspliters_sav] = splittingcloudnumber[
-                            timematch[0:nspliters_sav]]
-                        split_status[itrack, int(t), 0:nspliters_sav] = splittingstatus[timematch[0:nspliters_sav]]
-                        split_area[itrack, int(t), 0:nspliters_sav] = splittingarea[timematch[0:nspliters_sav]]
-                        if (nspliters > nmaxmerge):
-                            logger.warning(f'WARNING: nspliters ({nspliters}) > nmaxmerge ({nmaxmerge}), ' + \
-                                           'only partial split clouds are saved.')
-                            logger.warning(f'Main track index: {itrack}')
-                            logger.warning(f'Increase nmaxmerge to avoid this WARNING.')
+    trackidx_all = np.arange(0, ntracks_all)
+    # Make sure the merge/split tracks are not main track
+    notmain = np.isin(trackidx_all, maintracknumbers, invert=True)
+    # Tracks that end as merging with a main track and have short duration
+    mergetrack_idx = trackidx_all[
+        np.isin(end_merge_tracknumber, maintracknumbers) &
+        (trackstat_lifetime < merge_duration) & notmain
+    ]
+    # Tracks that split from a main track and have short duration
+    splittrack_idx = trackidx_all[
+        np.isin(start_split_tracknumber, maintracknumbers) &
+        (trackstat_lifetime < split_duration) & notmain
+    ]
+    logger.info(f"Number of merge/split tracks linked: {len(mergetrack_idx)}/{len(splittrack_idx)}")
+
+    link_vars = {
+        "cloudnumber": (fillval, np.int32),
+        "area": (fillval_f, np.float32),
+    }
+    merge_vars = link_tracks_to_main(ragged, maintrack_idx, mergetrack_idx,
+                                     end_merge_tracknumber[mergetrack_idx] - 1,
+                                     link_vars, nmaxmerge, "merge")
+    split_vars = link_tracks_to_main(ragged, maintrack_idx, splittrack_idx,
+                                     start_split_tracknumber[splittrack_idx] - 1,
+                                     link_vars, nmaxmerge, "split")
+    merge_cloudnumber = merge_vars["cloudnumber"]
+    merge_area = merge_vars["area"]
+    split_cloudnumber = split_vars["cloudnumber"]
+    split_area = split_vars["area"]
 
 
     ###########################################################################
     # Prepare output dataset
 
-    # Subset tracks in sparse array dictionary
-    for ivar in sparse_dict.keys():
-        sparse_dict[ivar] = sparse_dict[ivar][maintrack_idx, :]
-    # Remove the tracks/times indices variables
-    sparse_dict.pop(tracks_idx_varname, None)
-    sparse_dict.pop(times_idx_varname, None)
-
-    # Create a dense mask for no clouds
-    mask = sparse_dict['base_time'].toarray() == 0
-    # Convert sparse dictionary to dataset
-    varlist = {}
-    # Define output variable dictionary
-    for key, value in sparse_dict.items():
-        dense_array = value.toarray()
-        # Replace missing values based on variable type
-        if isinstance(dense_array[0, 0], np.floating):
-            dense_array[mask] = fillval_f
-        else:
-            dense_array[mask] = fillval
-        varlist[key] = ([tracks_dimname, times_dimname], dense_array, sparse_attrs_dict[key])
-    # Define coordinate
+    # Subset main tracks and convert to dense arrays
     tracks_coord = np.arange(0, ntracks_main)
     times_coord = np.arange(0, max_trackduration)
-    coordlist = {
-        tracks_dimname: ([tracks_dimname], tracks_coord),
-        times_dimname: ([times_dimname], times_coord),
-    }
-    # Define 2D Xarray dataset
-    ds_2d = xr.Dataset(varlist, coords=coordlist)
+    ds_2d = ragged_to_dataset(ragged.subset(maintrack_idx), tracks_dimname, times_dimname, fillval, fillval_f)
     # Subset main tracks from 1D dataset
-    # Note: the tracks_dimname cannot be used here as Xarray does not seem to have
-    # a method to select data with a string variable
-    ds_1d = ds_1d.sel(tracks=maintrack_idx)
+    # Read the 1D variables at once, so that the subset is a single in-memory gather
+    # rather than a fancy-indexed read of each variable from the file
+    ds_1d = ds_1d.load().isel({tracks_dimname: maintrack_idx})
     # Replace tracks coordinate
     ds_1d[tracks_dimname] = tracks_coord
     # Merge 1D & 2D datasets
@@ -1,14 +1,14 @@
 import numpy as np
 import os
-import sys
 import xarray as xr
 import time
 import logging
-import dask
-from dask.distributed import wait
 from pyflextrkr.ft_utilities import subset_files_timerange
+from pyflextrkr.ft_executor import get_executor
+from pyflextrkr.ft_telemetry import telemetry_stage
 # from pyflextrkr.matchtbpf_func import matchtbpf_singlefile
 
+@telemetry_stage("matchpf")
 def match_tbpf_tracks(config):
     """
     Match Tb tracked MCS with precipitation to calculate PF statistics.
@@ -34,7 +34,6 @@ def match_tbpf_tracks(config):
     tracks_dimname = config["tracks_dimname"]
     times_dimname = config["times_dimname"]
     pf_dimname = config["pf_dimname"]
-    run_parallel = config["run_parallel"]
     fillval = config["fillval"]
     # Minimum time difference threshold [second] to match track stats and cloudid pixel files
     match_pixel_dt_thresh = config["match_pixel_dt_thresh"]
@@ -92,7 +91,7 @@ def match_tbpf_tracks(config):
     # Create a list to store matchindices for each pixel file
     trackindices_all = []
     timeindices_all = []
-    results = []
+    task_args = []
 
     # Loop over each pixel file to calculate PF statistics
     for ifile in range(nfiles):
@@ -113,75 +112,44 @@ def match_tbpf_tracks(config):
         trackindices_all.append(idx_track)
         timeindices_all.append(idx_time)
 
-        # Call function to calculate PF stats
-        # Serial
-        if run_parallel == 0:
-            result = matchtbpf_singlefile(
-                filename,
-                file_cloudnumber,
-                file_mergecloudnumber,
-                file_splitcloudnumber,
-                config,
-            )
-            results.append(result)
-        # Parallel
-        elif run_parallel >= 1:
-            result = dask.delayed(matchtbpf_singlefile)(
-                filename,
-                file_cloudnumber,
-                file_mergecloudnumber,
-                file_splitcloudnumber,
-                config,
-            )
-            results.append(result)
-        else:
-            sys.exit('Valid parallelization flag not provided.')
-
-    if run_parallel == 0:
-        final_result = results
-    elif run_parallel >= 1:
-        # Trigger dask computation
-        final_result = dask.compute(*results)
-        wait(final_result)
-    else:
-        sys.exit('Valid parallelization flag not provided.')
-
+        # Task arguments to calculate PF stats
+        task_args.append((
+            filename,
+            file_cloudnumber,
+            file_mergecloudnumber,
+            file_splitcloudnumber,
+        ))
 
     #########################################################################################
     # Create arrays to store output
-    logger.debug("Collecting track PF statistics.")
-
     maxtracklength = ir_nmaxlength
     numtracks = ir_ntracks
 
-    # Make a variable list and get attributes from one of the returned dictionaries
-    # Loop over each return results till one that is not None
-    counter = 0
-    while counter < nfiles:
-        if final_result[counter] is not None:
-            var_names = list(final_result[counter][0].keys())
-            # Get variable attributes
-            var_attrs = final_result[counter][1]
-            var_names_2d = final_result[counter][2]
-            break
-        counter += 1
-
-    # Loop over variable list to create the dictionary entry
-    pf_dict = {}
+    # Output arrays are created from the first returned result
+    pf_dict = None
     pf_dict_attrs = {}
-    for ivar in var_names:
-        pf_dict[ivar] = np.full((numtracks, maxtracklength, nmaxpf), np.nan, dtype=np.float32)
-        pf_dict_attrs[ivar] = var_attrs[ivar]
-    for ivar in var_names_2d:
-        pf_dict[ivar] = np.full((numtracks, maxtracklength), np.nan, dtype=np.float32)
-
-    # Collect results
-    for ifile in range(0, nfiles):
-        if final_result[ifile] is not None:
-            # Get the return results for this pixel file
-            # The result is a tuple: (out_dict, out_dict_attrs)
+
+    # Run with the executor selected by config
+    # Results are written into the output arrays as each file completes
+    logger.debug("Collecting track PF statistics.")
+    with get_executor(config, shared_kwargs={"config": config}) as executor:
+        for ifile, iresult in executor.imap_unordered(matchtbpf_singlefile, task_args):
+            if iresult is None:
+                continue
+            # The result is a tuple: (out_dict, out_dict_attrs, var_names_2d)
             # The first entry is the dictionary containing the variables
-            iResult = final_result[ifile][0]
+            iResult = iresult[0]
+            if pf_dict is None:
+                # Make a variable list and get attributes from the returned dictionaries
+                var_names = list(iResult.keys())
+                var_attrs = iresult[1]
+                var_names_2d = iresult[2]
+                pf_dict = {}
+                for ivar in var_names:
+                    pf_dict[ivar] = np.full((numtracks, maxtracklength, nmaxpf), np.nan, dtype=np.float32)
+                    pf_dict_attrs[ivar] = var_attrs[ivar]
+                for ivar in var_names_2d:
+                    pf_dict[ivar] = np.full((numtracks, maxtracklength), np.nan, dtype=np.float32)
 
             # Get trackindices and timeindices for this file
             trackindices = trackindices_all[ifile]
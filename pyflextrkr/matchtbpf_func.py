@@ -8,7 +8,8 @@ from skimage.measure import regionprops
 from math import pi
 from scipy.stats import skew
 import warnings
-from pyflextrkr.ftfunctions import sort_renumber
+from pyflextrkr.ftfunctions import sort_renumber, get_mean_lon
+from pyflextrkr.ft_gridmetrics import get_grid_metrics
 from pyflextrkr.ft_utilities import subset_ds_geolimit
 
 def matchtbpf_singlefile(
@@ -55,6 +56,8 @@ def matchtbpf_singlefile(
     landmask_y_dimname = config.get("landmask_y_dimname", None)
     landmask_x_coordname = config.get("landmask_x_coordname", None)
     landmask_y_coordname = config.get("landmask_y_coordname", None)
+    use_grid_metrics = config.get("use_grid_metrics", False)
+    periodic_x = config.get("periodic_x", False)
 
     fillval = config["fillval"]
     fillval_f = np.nan
@@ -97,6 +100,12 @@ def matchtbpf_singlefile(
         # Get dimensions of data
         ydim, xdim = np.shape(lat)
 
+        # Per-pixel area from grid metrics, otherwise a constant pixel_radius**2
+        if use_grid_metrics:
+            pixel_area = get_grid_metrics(config, lat2d=lat, lon2d=lon)["area"]
+        else:
+            pixel_area = None
+
         # Number of clouds
         nmatchcloud = len(ir_cloudnumber)
 
@@ -245,11 +254,16 @@ def matchtbpf_singlefile(
                         # Label precipitation features
                         pfnumberlabelmap, numpf = label(binarypfmap)
 
-                        # Sort numpf then calculate stats
-                        min_npix = np.ceil(pf_link_area_thresh / (pixel_radius ** 2)).astype(int)
-
                         # Sort and renumber PFs, and remove small PFs
-                        pf_number, pf_npix = sort_renumber(pfnumberlabelmap, min_npix)
+                        if pixel_area is None:
+                            sub_pixel_area = None
+                            min_npix = np.ceil(pf_link_area_thresh / (pixel_radius ** 2)).astype(int)
+                            pf_number, pf_npix = sort_renumber(pfnumberlabelmap, min_npix)
+                        else:
+                            sub_pixel_area = pixel_area[miny:maxy, minx:maxx]
+                            pf_number, pf_npix = sort_renumber(
+                                pfnumberlabelmap, pf_link_area_thresh, grid_area=sub_pixel_area,
+                            )
                         # Update number of PFs after sorting and renumbering
                         npf_new = np.nanmax(pf_number)
                         numpf = npf_new
@@ -265,6 +279,8 @@ def matchtbpf_singlefile(
                                 lat, lon, minx, miny, nmaxpf, numpf,
                                 pf_npix, pfnumberlabelmap, pixel_radius,
                                 subdimx, subdimy, sub_rainrate_map,
+                                pixel_area=sub_pixel_area,
+                                periodic_x=periodic_x,
                             )
 
                             # Save precipitation feature statisitcs
@@ -275,7 +291,7 @@ def matchtbpf_singlefile(
                             pf_lat[imatchcloud, 0:npf_save] = \
                                 pf_stats_dict["pflat"][0:npf_save]
                             pf_area[imatchcloud, 0:npf_save] = \
-                                pf_stats_dict["pfnpix"][0:npf_save] * pixel_radius**2
+                                pf_stats_dict["pfarea"][0:npf_save]
                             pf_rainrate[imatchcloud, 0:npf_save] = \
                                 pf_stats_dict["pfrainrate"][0:npf_save]
                             pf_maxrainrate[imatchcloud, 0:npf_save] = \
@@ -485,6 +501,8 @@ def matchtbpf_singlefile(
 def calc_pf_stats(
         fillval, fillval_f, heavy_rainrate_thresh, lat, lon, minx, miny, nmaxpf, numpf, pf_npix,
         pfnumberlabelmap, pixel_radius, subdimx, subdimy, sub_rainrate_map,
+        pixel_area=None,
+        periodic_x=False,
 ):
     """
     Calculate individual PF statistics.
@@ -505,6 +523,11 @@ def calc_pf_stats(
         subdimx:
         subdimy:
         sub_rainrate_map:
+        pixel_area: np.array, optional, default=None
+            Area of each pixel [km^2] in the subset region, from grid metrics.
+            If None, each pixel has a constant area of pixel_radius**2.
+        periodic_x: bool, optional, default=False
+            If True, PF mean longitudes are wrap-aware for PFs crossing the periodic x boundary.
 
     Returns:
         pf_stats_dict: dictionary
@@ -514,6 +537,7 @@ def calc_pf_stats(
     # Initialize arrays
     npf_save = np.nanmin([nmaxpf, numpf])
     pfnpix = np.zeros(npf_save, dtype=float)
+    pfarea = np.zeros(npf_save, dtype=float)
     pfid = np.full(npf_save, fillval, dtype=int)
     pflon = np.full(npf_save, fillval_f, dtype=float)
     pflat = np.full(npf_save, fillval_f, dtype=float)
@@ -574,8 +598,15 @@ def calc_pf_stats(
 
             # Basic statistics
             pfnpix[ipf - 1] = np.copy(iipfnpix)
+            if pixel_area is None:
+                pfarea[ipf - 1] = iipfnpix * pixel_radius**2
+                pixel_length = pixel_radius
+            else:
+                pfarea[ipf - 1] = np.sum(pixel_area[iipfy, iipfx])
+                # Local pixel size to convert lengths from number of pixels
+                pixel_length = np.sqrt(pfarea[ipf - 1] / iipfnpix)
             pfid[ipf - 1] = np.copy(int(ipf))
-            pflon[ipf - 1] = np.nanmean(lon[iipfy[:] + miny, iipfx[:] + minx])
+            pflon[ipf - 1] = get_mean_lon(lon[iipfy[:] + miny, iipfx[:] + minx], periodic_x=periodic_x)
             pflat[ipf - 1] = np.nanmean(lat[iipfy[:] + miny, iipfx[:] + minx])
 
             pfrainrate[ipf - 1] = np.nanmean(sub_rainrate_map[iipfy[:], iipfx[:]])
@@ -600,7 +631,7 @@ def calc_pf_stats(
             )
             pfeccentricity[ipf - 1] = pfproperties[0].eccentricity
             pfmajoraxis[ipf - 1] = (
-                    pfproperties[0].major_axis_length * pixel_radius
+                    pfproperties[0].major_axis_length * pixel_length
             )
 
             # Need to treat minor axis length with an error except
@@ -608,7 +639,7 @@ def calc_pf_stats(
             try:
                 pfminoraxis[ipf - 1] = (
                         pfproperties[0].minor_axis_length
-                        * pixel_radius
+                        * pixel_length
                 )
             except ValueError:
                 pass
@@ -621,7 +652,7 @@ def calc_pf_stats(
                                          pfproperties[0].orientation
                                      ) * (180 / float(pi))
             pfperimeter[ipf - 1] = (
-                    pfproperties[0].perimeter * pixel_radius
+                    pfproperties[0].perimeter * pixel_length
             )
             [
                 ycentroid,
@@ -671,6 +702,7 @@ def calc_pf_stats(
         "pforientation": pforientation,
         "pfperimeter": pfperimeter,
         "pfnpix": pfnpix,
+        "pfarea": pfarea,
         "pfrainrate": pfrainrate,
         "pfskewness": pfskewness,
         "pflon_centroid": pflon_centroid,
@@ -0,0 +1,595 @@
+import os
+import time
+import calendar
+import datetime
+import logging
+import numpy as np
+import xarray as xr
+import dask
+from pytz import utc
+from pyflextrkr.ft_utilities import get_basetime_from_filename
+from pyflextrkr.ft_executor import get_dask_compute_kwargs
+
+# Default per-time track statistics mapped onto the pixel grid by calc_mcs_statsmap.
+# Key: output variable name, value: (track stats variable name, pixel mask name)
+default_statsmap_vars = {
+    "ccs_area": ("ccs_area", "cloudtracknumber"),
+    "pf_area": ("pf_area", "pcptracknumber"),
+    "totalrain": ("total_rain", "pcptracknumber"),
+    "totalrainheavy": ("total_heavyrain", "pcptracknumber"),
+    "rainrateheavy": ("rainrate_heavyrain", "pcptracknumber"),
+    "pf_speed": ("movement_speed", "pcptracknumber"),
+}
+
+
+def get_month_pixelfiles(pixel_dir, pixel_filebase, year, month):
+    """
+    Find pixel-level files within a month.
+
+    Args:
+        pixel_dir: string
+            Pixel-level file directory.
+        pixel_filebase: string
+            Pixel-level file basename.
+        year: int
+            Year.
+        month: int
+            Month.
+
+    Returns:
+        pixel_files: list
+            Sorted pixel-level filenames within the month.
+        files_basetime: numpy array
+            Epoch time of each pixel-level file.
+    """
+    filenames, files_basetime, files_datestring, _ = get_basetime_from_filename(
+        pixel_dir, pixel_filebase,
+    )
+    yearmonth = f"{year:04d}{month:02d}"
+    idx = [ii for ii, ds in enumerate(files_datestring) if ds[0:6] == yearmonth]
+    pixel_files = [filenames[ii] for ii in idx]
+    return pixel_files, files_basetime[idx]
+
+
+def open_pixelfiles(pixel_files, time_chunksize=24):
+    """
+    Lazily open pixel-level files as a Dask-backed Xarray Dataset.
+
+    Time-invariant variables (e.g., latitude/longitude) are taken from the first file
+    instead of being concatenated and compared across all files.
+
+    Args:
+        pixel_files: list
+            Pixel-level filenames.
+        time_chunksize: int, default=24
+            Number of time frames in each Dask chunk.
+
+    Returns:
+        ds: Xarray Dataset
+            Dask-backed dataset chunked along time.
+    """
+    ds = xr.open_mfdataset(
+        pixel_files,
+        concat_dim="time",
+        combine="nested",
+        data_vars="minimal",
+        coords="minimal",
+        compat="override",
+    )
+    if time_chunksize > 1:
+        ds = ds.chunk({"time": time_chunksize})
+    return ds
+
+
+def calc_mcs_rainmap(
+        pixel_files,
+        month_basetime,
+        pcp_varname="precipitation",
+        time_chunksize=24,
+):
+    """
+    Calculate monthly total and MCS precipitation amount and frequency.
+
+    All reductions are lazy and evaluated chunk by chunk along time,
+    memory usage is bounded by time_chunksize regardless of the number of files.
+
+    Args:
+        pixel_files: list
+            Pixel-level filenames within the month.
+        month_basetime: int
+            Epoch time for the beginning of the month.
+        pcp_varname: string, default="precipitation"
+            Precipitation variable name in the pixel-level files.
+        time_chunksize: int, default=24
+            Number of time frames in each Dask chunk.
+
+    Returns:
+        dsout: Xarray Dataset
+            Dask-backed dataset containing monthly precipitation maps.
+    """
+    ds = open_pixelfiles(pixel_files, time_chunksize=time_chunksize)
+    ntimes = ds.sizes["time"]
+    longitude = ds["longitude"]
+    latitude = ds["latitude"]
+
+    # Sum MCS precipitation over time, use cloudtracknumber > 0 as mask
+    mcsprecip = ds[pcp_varname].where(ds["cloudtracknumber"] > 0).sum(dim="time")
+    # Sum total precipitation over time
+    totprecip = ds[pcp_varname].sum(dim="time")
+    # Sum MCS PF counts over time to get number of hours
+    mcspcpct = (ds["pcptracknumber"] > 0).sum(dim="time")
+
+    var_dict = {
+        "longitude": (["lat", "lon"], longitude.data, longitude.attrs),
+        "latitude": (["lat", "lon"], latitude.data, latitude.attrs),
+        "precipitation": (["time", "lat", "lon"], totprecip.expand_dims("time", axis=0).data),
+        "mcs_precipitation": (["time", "lat", "lon"], mcsprecip.expand_dims("time", axis=0).data),
+        "mcs_precipitation_count": (["time", "lat", "lon"], mcspcpct.expand_dims("time", axis=0).data),
+        "ntimes": (["time"], np.array([ntimes])),
+    }
+    coord_dict = {
+        "time": (["time"], np.array([month_basetime])),
+        "lat": (["lat"], ds["lat"].data),
+        "lon": (["lon"], ds["lon"].data),
+    }
+    gattr_dict = {
+        "title": "MCS precipitation accumulation",
+        "contact": "Zhe Feng, zhe.feng@pnnl.gov",
+        "created_on": time.ctime(time.time()),
+    }
+    dsout = xr.Dataset(var_dict, coords=coord_dict, attrs=gattr_dict)
+    dsout["time"].attrs["long_name"] = "Epoch Time (since 1970-01-01T00:00:00)"
+    dsout["time"].attrs["units"] = "Seconds since 1970-1-1 0:00:00 0:00"
+    dsout["lon"].attrs["long_name"] = "Longitude"
+    dsout["lon"].attrs["units"] = "degree"
+    dsout["lat"].attrs["long_name"] = "Latitude"
+    dsout["lat"].attrs["units"] = "degree"
+    dsout["ntimes"].attrs["long_name"] = "Number of times in the month"
+    dsout["ntimes"].attrs["units"] = "count"
+    dsout["precipitation"].attrs["long_name"] = "Total precipitation"
+    dsout["precipitation"].attrs["units"] = "mm"
+    dsout["mcs_precipitation"].attrs["long_name"] = "MCS precipitation"
+    dsout["mcs_precipitation"].attrs["units"] = "mm"
+    dsout["mcs_precipitation_count"].attrs["long_name"] = "Number of hours MCS precipitation is recorded"
+    dsout["mcs_precipitation_count"].attrs["units"] = "hour"
+    return dsout
+
+
+def calc_mcs_rainhov(
+        pixel_files,
+        lat_bounds,
+        lon_bounds,
+        pcp_varname="precipitation",
+        time_chunksize=24,
+):
+    """
+    Calculate total and MCS precipitation Hovmoller (time-longitude) diagram.
+
+    Args:
+        pixel_files: list
+            Pixel-level filenames.
+        lat_bounds: list
+            [startlat, endlat] latitude band to average over.
+        lon_bounds: list
+            [startlon, endlon] longitude range.
+        pcp_varname: string, default="precipitation"
+            Precipitation variable name in the pixel-level files.
+        time_chunksize: int, default=24
+            Number of time frames in each Dask chunk.
+
+    Returns:
+        dsout: Xarray Dataset
+            Dask-backed dataset containing Hovmoller diagrams.
+    """
+    ds = open_pixelfiles(pixel_files, time_chunksize=time_chunksize)
+    subset = {"lat": slice(lat_bounds[0], lat_bounds[1]), "lon": slice(lon_bounds[0], lon_bounds[1])}
+    pcp = ds[pcp_varname].sel(subset)
+    # Mask out non-MCS precipitation as 0 for averaging Hovmoller purpose
+    mcspcp = pcp.where(ds["pcptracknumber"].sel(subset) > 0, other=0)
+    mcspreciphov = mcspcp.mean(dim="lat")
+    totpreciphov = pcp.mean(dim="lat")
+    # Convert decoded time back to Epoch Time in seconds
+    basetime = ds["time"].values.astype("datetime64[s]").astype(float)
+
+    var_dict = {
+        "precipitation": (["time", "lon"], totpreciphov.data),
+        "mcs_precipitation": (["time", "lon"], mcspreciphov.data),
+    }
+    coord_dict = {
+        "lon": (["lon"], pcp["lon"].data),
+        "time": (["time"], basetime),
+    }
+    gattr_dict = {
+        "title": "MCS precipitation Hovmoller",
+        "startlat": lat_bounds[0],
+        "endlat": lat_bounds[1],
+        "startlon": lon_bounds[0],
+        "endlon": lon_bounds[1],
+        "contact": "Zhe Feng, zhe.feng@pnnl.gov",
+        "created_on": time.ctime(time.time()),
+    }
+    dsout = xr.Dataset(var_dict, coords=coord_dict, attrs=gattr_dict)
+    dsout["lon"].attrs["long_name"] = "Longitude"
+    dsout["lon"].attrs["units"] = "degree"
+    dsout["time"].attrs["long_name"] = "Epoch Time (since 1970-01-01T00:00:00)"
+    dsout["time"].attrs["units"] = "seconds since 1970-01-01T00:00:00"
+    dsout["precipitation"].attrs["long_name"] = "Total precipitation"
+    dsout["precipitation"].attrs["units"] = "mm/h"
+    dsout["mcs_precipitation"].attrs["long_name"] = "MCS precipitation"
+    dsout["mcs_precipitation"].attrs["units"] = "mm/h"
+    return dsout
+
+
+def load_statsmap_lookup(
+        stats_file,
+        statsmap_vars,
+        tracks_dimname="tracks",
+        times_dimname="times",
+        pf_dimname="nmaxpf",
+):
+    """
+    Load track statistics needed for mapping onto pixel-level files.
+
+    Args:
+        stats_file: string
+            Track statistics file name.
+        statsmap_vars: dictionary
+            Key: output variable name, value: (track stats variable name, pixel mask name).
+        tracks_dimname: string, default="tracks"
+            Tracks dimension name.
+        times_dimname: string, default="times"
+            Times dimension name.
+        pf_dimname: string, default="nmaxpf"
+            PF dimension name, only the largest PF is used.
+
+    Returns:
+        lookup: dictionary
+            Dictionary containing 2D (tracks, times) arrays:
+                'base_time', 'start_split', and one entry per available statsmap variable.
+        statsmap_vars: dictionary
+            Subset of input statsmap_vars available in the stats file.
+    """
+    logger = logging.getLogger(__name__)
+    ds = xr.open_dataset(stats_file, decode_times=False)
+    lookup = {
+        "base_time": ds["base_time"].values,
+        "start_split": np.isfinite(ds["start_split_cloudnumber"].values)
+        if "start_split_cloudnumber" in ds else np.zeros(ds.sizes[tracks_dimname], dtype=bool),
+    }
+    available_vars = {}
+    for key, (varname, maskname) in statsmap_vars.items():
+        if varname not in ds:
+            logger.warning(f"{varname} not in {stats_file}, skip mapping {key}.")
+            continue
+        var = ds[varname]
+        if pf_dimname in var.dims:
+            var = var.isel({pf_dimname: 0})
+        lookup[key] = var.transpose(tracks_dimname, times_dimname).values
+        available_vars[key] = (varname, maskname)
+    ds.close()
+    return lookup, available_vars
+
+
+def _statsmap_chunk(
+        pixel_files,
+        files_basetime,
+        lookup,
+        statsmap_vars,
+        match_pixel_dt_thresh,
+):
+    """
+    Accumulate track statistics onto pixel masks for a chunk of pixel-level files.
+
+    Track numbers on each frame are used to index per-time lookup tables,
+    so each frame is processed with array operations regardless of the number of tracks.
+
+    Returns:
+        accum: dictionary
+            Sums and counts with the same shape as the pixel-level grid.
+    """
+    base_time = lookup["base_time"]
+    ntracks, ntimes = base_time.shape
+    accum = None
+    for filename, file_basetime in zip(pixel_files, files_basetime):
+        # Track indices and times at this frame
+        itrack, itime = np.where(np.abs(base_time - file_basetime) < match_pixel_dt_thresh)
+
+        # Read with Xarray, which serializes netCDF access when tasks run in threads
+        with xr.open_dataset(filename) as ds:
+            masks = {
+                "cloudtracknumber": ds["cloudtracknumber"][0].fillna(0).values.astype(np.int64),
+                "pcptracknumber": ds["pcptracknumber"][0].fillna(0).values.astype(np.int64),
+            }
+
+        if accum is None:
+            shape = masks["cloudtracknumber"].shape
+            accum = {"nhour_ccs": np.zeros(shape), "nhour_pf": np.zeros(shape), "initiation_ccs": np.zeros(shape)}
+            for key in statsmap_vars.keys():
+                accum[f"{key}_sum"] = np.zeros(shape)
+                accum[f"{key}_count"] = np.zeros(shape)
+
+        # Track numbers are track indices + 1, clip values outside the stats file to 0
+        for maskname in masks.keys():
+            imask = masks[maskname]
+            imask[(imask < 0) | (imask > ntracks)] = 0
+        accum["nhour_ccs"] += masks["cloudtracknumber"] > 0
+        accum["nhour_pf"] += masks["pcptracknumber"] > 0
+
+        # Initiation: first time of a track that does not start as a split
+        init_table = np.zeros(ntracks + 1, dtype=bool)
+        init_table[itrack + 1] = (itime == 0) & ~lookup["start_split"][itrack]
+        accum["initiation_ccs"] += init_table[masks["cloudtracknumber"]]
+
+        for key, (varname, maskname) in statsmap_vars.items():
+            # Build a lookup table indexed by track number, NaN for no track
+            table = np.full(ntracks + 1, np.nan)
+            table[itrack + 1] = lookup[key][itrack, itime]
+            values = table[masks[maskname]]
+            valid = np.isfinite(values)
+            accum[f"{key}_sum"][valid] += values[valid]
+            accum[f"{key}_count"] += valid
+    return accum
+
+
+def _sum_accum(accum_list):
+    """
+    Sum a list of accumulator dictionaries.
+    """
+    accum_list = [acc for acc in accum_list if acc is not None]
+    if len(accum_list) == 0:
+        return None
+    total = accum_list[0]
+    for acc in accum_list[1:]:
+        for key in total.keys():
+            total[key] += acc[key]
+    return total
+
+
+def calc_mcs_statsmap(
+        pixel_files,
+        files_basetime,
+        stats_file,
+        month_basetime,
+        statsmap_vars=None,
+        match_pixel_dt_thresh=60.0,
+        time_chunksize=24,
+        split_every=8,
+        lookup=None,
+):
+    """
+    Map track statistics onto pixel-level grid and calculate monthly conditional mean maps.
+
+    Pixel files are processed in chunks of time_chunksize frames per task,
+    partial sums are combined with a tree reduction so memory usage
+    is bounded by a few 2D accumulators per task.
+
+    Args:
+        pixel_files: list
+            Pixel-level filenames within the month.
+        files_basetime: numpy array
+            Epoch time of each pixel-level file.
+        stats_file: string
+            Track statistics file name.
+        month_basetime: int
+            Epoch time for the beginning of the month.
+        statsmap_vars: dictionary, default=None
+            Key: output variable name, value: (track stats variable name, pixel mask name).
+            If None, default_statsmap_vars is used.
+        match_pixel_dt_thresh: float, default=60.0
+            Time difference threshold [second] to match track stats and pixel files.
+        time_chunksize: int, default=24
+            Number of pixel files processed by each task.
+        split_every: int, default=8
+            Number of partial results combined in each reduction task.
+        lookup: tuple, default=None
+            Output from load_statsmap_lookup, to avoid reading the stats file for every month.
+            The lookup tables can be wrapped with dask.delayed by the caller, so that
+            a task graph of many months holds them once.
+
+    Returns:
+        dsout: Dask delayed
+            Delayed Xarray Dataset containing monthly statistics maps.
+    """
+    if statsmap_vars is None:
+        statsmap_vars = default_statsmap_vars
+    if lookup is None:
+        lookup = load_statsmap_lookup(stats_file, statsmap_vars)
+    lookup, statsmap_vars = lookup
+
+    # Put the lookup tables in the graph once, instead of once per task
+    if not dask.is_dask_collection(lookup):
+        lookup = dask.delayed(lookup, traverse=False)
+    partials = []
+    for ii in range(0, len(pixel_files), time_chunksize):
+        partials.append(dask.delayed(_statsmap_chunk)(
+            pixel_files[ii:ii+time_chunksize],
+            files_basetime[ii:ii+time_chunksize],
+            lookup,
+            statsmap_vars,
+            match_pixel_dt_thresh,
+        ))
+    # Tree reduction of partial sums
+    while len(partials) > 1:
+        partials = [
+            dask.delayed(_sum_accum)(partials[ii:ii+split_every])
+            for ii in range(0, len(partials), split_every)
+        ]
+
+    # Get coordinates from the first file
+    with xr.open_dataset(pixel_files[0]) as dspix:
+        lat = dspix["lat"].values
+        lon = dspix["lon"].values
+    return dask.delayed(_make_statsmap_dataset)(
+        partials[0], statsmap_vars, month_basetime, lat, lon,
+    )
+
+
+def _make_statsmap_dataset(accum, statsmap_vars, month_basetime, lat, lon):
+    """
+    Convert accumulated sums and counts to a monthly statistics map Dataset.
+    """
+    dims = ["time", "lat", "lon"]
+    var_dict = {
+        "mcs_nhour_ccs": (dims, np.expand_dims(accum["nhour_ccs"], 0), {
+            "long_name": "Number of hours MCS cloud shield is recorded", "units": "hour"}),
+        "mcs_nhour_pf": (dims, np.expand_dims(accum["nhour_pf"], 0), {
+            "long_name": "Number of hours MCS PF is recorded", "units": "hour"}),
+        "initiation_ccs": (dims, np.expand_dims(accum["initiation_ccs"], 0), {
+            "long_name": "Number of MCS initiation", "units": "count"}),
+    }
+    # Calculate conditional mean (divide sum by total number of hours at each pixel)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for key, (varname, maskname) in statsmap_vars.items():
+            mean = accum[f"{key}_sum"] / accum[f"{key}_count"]
+            var_dict[f"{key}_mean"] = (dims, np.expand_dims(mean, 0), {
+                "long_name": f"Conditional mean {varname} on {maskname} mask"})
+    coord_dict = {
+        "time": (["time"], np.array([month_basetime]), {
+            "long_name": "Epoch Time (since 1970-01-01T00:00:00)",
+            "units": "Seconds since 1970-1-1 0:00:00 0:00"}),
+        "lat": (["lat"], lat, {"long_name": "Latitude", "units": "degree"}),
+        "lon": (["lon"], lon, {"long_name": "Longitude", "units": "degree"}),
+    }
+    gattr_dict = {
+        "title": "MCS statistics map",
+        "contact": "Zhe Feng, zhe.feng@pnnl.gov",
+        "created_on": time.ctime(time.time()),
+    }
+    return xr.Dataset(var_dict, coords=coord_dict, attrs=gattr_dict)
+
+
+def write_climatology_netcdf(dsout, output_filename):
+    """
+    Write a monthly climatology Dataset to a netCDF file.
+
+    Args:
+        dsout: Xarray Dataset
+            Computed (in-memory) dataset.
+        output_filename: string
+            Output netCDF filename.
+
+    Returns:
+        output_filename: string
+            Output netCDF filename.
+    """
+    logger = logging.getLogger(__name__)
+    fillvalue = np.nan
+    # Set encoding/compression for all variables
+    comp = dict(zlib=True, _FillValue=fillvalue, dtype="float32")
+    encoding = {var: comp for var in dsout.data_vars}
+    dsout.to_netcdf(path=output_filename, mode="w", format="NETCDF4", unlimited_dims="time", encoding=encoding)
+    logger.info(f"Output saved: {output_filename}")
+    return output_filename
+
+
+def get_month_list(start_yearmonth, end_yearmonth):
+    """
+    Get a list of (year, month) between two months (inclusive).
+
+    Args:
+        start_yearmonth: string (yyyymo)
+        end_yearmonth: string (yyyymo)
+
+    Returns:
+        month_list: list
+            List of (year, month) tuples.
+    """
+    year, month = int(start_yearmonth[0:4]), int(start_yearmonth[4:6])
+    end_year, end_month = int(end_yearmonth[0:4]), int(end_yearmonth[4:6])
+    month_list = []
+    while (year, month) <= (end_year, end_month):
+        month_list.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return month_list
+
+
+def mcs_climatology_driver(config, start_yearmonth=None, end_yearmonth=None):
+    """
+    Driver for monthly MCS climatology calculations over many months.
+
+    All requested months are built as lazy reductions and evaluated in one Dask session.
+    Tasks run with the scheduler matching parallel_backend (see ft_executor).
+    The products are controlled by config:
+        climo_rainmap: bool, default=True
+        climo_rainhov: bool, default=False (requires climo_hov_latlon: [startlat, endlat, startlon, endlon])
+        climo_statsmap: bool, default=False
+        climo_time_chunksize: int, default=24
+        climo_month_batch: int, default=12, number of months computed at once
+
+    Args:
+        config: dictionary
+            Dictionary containing config parameters.
+        start_yearmonth: string, default=None
+            Start month (yyyymo). If None, use config["startdate"].
+        end_yearmonth: string, default=None
+            End month (yyyymo). If None, use config["enddate"].
+
+    Returns:
+        output_files: list
+            Output netCDF filenames.
+    """
+    logger = logging.getLogger(__name__)
+    logger.info('Calculating monthly MCS climatology')
+
+    pixel_dir = config["pixeltracking_outpath"]
+    pixel_filebase = config.get("pixeltracking_filebase", "mcstrack_")
+    output_monthly_dir = config["stats_outpath"] + "monthly/"
+    compute_kwargs = get_dask_compute_kwargs(config)
+    pcp_varname = config.get("climo_pcp_varname", "precipitation")
+    time_chunksize = config.get("climo_time_chunksize", 24)
+    month_batch = config.get("climo_month_batch", 12)
+    run_rainmap = config.get("climo_rainmap", True)
+    run_rainhov = config.get("climo_rainhov", False)
+    run_statsmap = config.get("climo_statsmap", False)
+    match_pixel_dt_thresh = config.get("match_pixel_dt_thresh", 60.0)
+    if start_yearmonth is None:
+        start_yearmonth = config["startdate"][0:6]
+    if end_yearmonth is None:
+        end_yearmonth = config["enddate"][0:6]
+    if run_rainhov:
+        hov_latlon = config["climo_hov_latlon"]
+    if run_statsmap:
+        stats_file = f"{config['stats_outpath']}{config['mcsfinal_filebase']}" + \
+                     f"{config['startdate']}_{config['enddate']}.nc"
+        lookup_tables, statsmap_vars = load_statsmap_lookup(stats_file, default_statsmap_vars)
+        # Wrap the lookup tables once for all months
+        statsmap_lookup = (dask.delayed(lookup_tables, traverse=False), statsmap_vars)
+    os.makedirs(output_monthly_dir, exist_ok=True)
+
+    # Build lazy write tasks for all months
+    month_tasks = []
+    for year, month in get_month_list(start_yearmonth, end_yearmonth):
+        pixel_files, files_basetime = get_month_pixelfiles(pixel_dir, pixel_filebase, year, month)
+        logger.info(f"{year}{month:02d} number of files: {len(pixel_files)}")
+        if len(pixel_files) == 0:
+            continue
+        month_basetime = calendar.timegm(datetime.datetime(year, month, 1, 0, 0, 0, tzinfo=utc).timetuple())
+        yyyymo = f"{year}{month:02d}"
+        tasks = []
+        if run_rainmap:
+            dsout = calc_mcs_rainmap(pixel_files, month_basetime,
+                                     pcp_varname=pcp_varname, time_chunksize=time_chunksize)
+            tasks.append(dask.delayed(write_climatology_netcdf)(
+                dsout, f"{output_monthly_dir}mcs_rainmap_{yyyymo}.nc"))
+        if run_rainhov:
+            dsout = calc_mcs_rainhov(pixel_files, hov_latlon[0:2], hov_latlon[2:4],
+                                     pcp_varname=pcp_varname, time_chunksize=time_chunksize)
+            tasks.append(dask.delayed(write_climatology_netcdf)(
+                dsout, f"{output_monthly_dir}mcs_rainhov_{yyyymo}.nc"))
+        if run_statsmap:
+            dsout = calc_mcs_statsmap(pixel_files, files_basetime, stats_file, month_basetime,
+                                      match_pixel_dt_thresh=match_pixel_dt_thresh,
+                                      time_chunksize=time_chunksize,
+                                      lookup=statsmap_lookup)
+            tasks.append(dask.delayed(write_climatology_netcdf)(
+                dsout, f"{output_monthly_dir}mcs_statsmap_{yyyymo}.nc"))
+        month_tasks.append(tasks)
+
+    # Compute batches of months together to keep the task graph and client memory bounded
+    output_files = []
+    for ii in range(0, len(month_tasks), month_batch):
+        tasks = [task for tasks in month_tasks[ii:ii+month_batch] for task in tasks]
+        output_files.extend(dask.compute(*tasks, **compute_kwargs))
+
+    logger.info('Done with monthly MCS climatology')
+    return output_files
@@ -1,17 +1,20 @@
 from __future__ import division, print_function
-import sys
 import os
 import time
 import logging
+from functools import partial
 import numpy as np
 from netCDF4 import Dataset
 import xarray as xr
 from scipy.signal import fftconvolve
 from scipy.interpolate import interp1d
-import dask
-from dask.distributed import wait
 from pyflextrkr.ft_utilities import subset_files_timerange
+from pyflextrkr.ft_executor import get_executor
+from pyflextrkr.ft_framepairs import map_frame_pairs
+from pyflextrkr.ft_gridmetrics import get_grid_metrics
+from pyflextrkr.ft_telemetry import telemetry_stage
 
+@telemetry_stage("speed")
 def movement_speed(
         config,
         trackstats_filebase=None,
@@ -50,11 +53,11 @@ def movement_speed(
     end_basetime = config["end_basetime"]
     tracks_dimname = config["tracks_dimname"]
     times_dimname = config["times_dimname"]
-    run_parallel = config["run_parallel"]
     feature_type = config["feature_type"]
     pixel_radius = config["pixel_radius"]
     lag = config["lag_for_speed"]
     max_speed_thresh = config["max_speed_thresh"]
+    use_grid_metrics = config.get("use_grid_metrics", False)
 
     logger = logging.getLogger(__name__)
     logger.info('Calculating movement speed using pixel-level tracked feature')
@@ -101,32 +104,14 @@ def movement_speed(
     stats_basetime = ds_stats.variables['base_time'].values
     ds_stats.close()
 
-    # Make file pairs
-    filepairs = list(zip(filelist[0:-lag], filelist[lag::]))
-
-
-    results = []
-    # Serial
-    if run_parallel == 0:
-        for ifile in range(0, nfiles-1):
-            result = movement_of_feature_fft(
-                filepairs[ifile], ntracks,
-                config,
-            )
-            results.append(result)
-        final_result = results
-    # Parallel
-    elif run_parallel >= 1:
-        for ifile in range(0, nfiles-1):
-            result = dask.delayed(movement_of_feature_fft)(
-                filepairs[ifile], ntracks,
-                config,
-            )
-            results.append(result)
-        final_result = dask.compute(*results)
-        wait(final_result)
-    else:
-        sys.exit('Valid parallelization flag not provided')
+    # Run with the executor selected by config on pairs of files lag apart,
+    # each pixel file is read once and used for all pairs it belongs to
+    loader = partial(load_movement_frame, ntracks=ntracks, config=config)
+    shared_kwargs = {"ntracks": ntracks, "config": config}
+    with get_executor(config, shared_kwargs=shared_kwargs) as executor:
+        final_result = map_frame_pairs(
+            executor, movement_of_feature_frames, loader, filelist, config, lag=lag,
+        )
 
     move_y, move_x, time_lag, base_time = zip(*final_result)
     move_y = np.array(move_y)
@@ -137,12 +122,14 @@ def movement_speed(
     (r_mag, r_dir, r_speed) = offset_to_speed(move_x, move_y, time_lag)
 
     # Convert distance to physical units
+    # With grid metrics, movement is already in [km] using the local grid spacing of each feature
+    length_scale = 1.0 if use_grid_metrics else pixel_radius
     # Movement magnitude [km]
-    movement_mag = r_mag * pixel_radius / lag
-    movement_x = move_x * pixel_radius / lag
-    movement_y = move_y * pixel_radius / lag
+    movement_mag = r_mag * length_scale / lag
+    movement_x = move_x * length_scale / lag
+    movement_y = move_y * length_scale / lag
     # Movement speed [m/s]
-    movement_speed = r_speed * pixel_radius * 1000.
+    movement_speed = r_speed * length_scale * 1000.
     # Movement direction
     # theta is not the same with traditional direction definition in meteorology
     # TODO: convert the direction to 0 deg = North
@@ -184,6 +171,50 @@ def movement_speed(
 
 
 
+def load_movement_frame(filename, ntracks, config):
+    """
+    Read the tracked feature fields needed for movement calculation from a pixel file.
+
+    Args:
+        filename: string
+            Pixel file name.
+        ntracks: int
+            Number of tracks.
+        config: dictionary
+            Dictionary containing config parameters.
+
+    Returns:
+        frame: dictionary
+            Keys: 'tracknumber', 'field', 'cloud_size', 'time'.
+            If use_grid_metrics is set, also 'track_dx', 'track_dy':
+            mean grid spacing [km] over the pixels of each track.
+    """
+    tracknumber = config["track_number_for_speed"]
+    track_field = config["track_field_for_speed"]
+
+    logger = logging.getLogger(__name__)
+    logger.debug("Reading Storm File: %s" % filename)
+
+    dset = Dataset(filename, 'r')
+    frame = {
+        "cloud_size": get_pixel_size_of_clouds(dset, ntracks, tracknumber),
+        "tracknumber": dset.variables[tracknumber][:].squeeze(),
+        "field": dset.variables[track_field][:].squeeze(),
+        "time": dset.variables['time'][0].copy(),
+    }
+    if config.get("use_grid_metrics", False):
+        grid_metrics = get_grid_metrics(
+            config,
+            lat2d=dset.variables["latitude"][:].squeeze(),
+            lon2d=dset.variables["longitude"][:].squeeze(),
+        )
+        frame["track_dx"], frame["track_dy"] = get_track_grid_spacing(
+            frame["tracknumber"], ntracks, grid_metrics,
+        )
+    dset.close()
+    return frame
+
+
 def movement_of_feature_fft(
         filepairs,
         ntracks,
@@ -213,29 +244,60 @@ def movement_of_feature_fft(
         base_time: float
             Base time for the first pixel file.
     """
+    frame_1 = load_movement_frame(filepairs[0], ntracks, config)
+    frame_2 = load_movement_frame(filepairs[1], ntracks, config)
+    return movement_of_feature_frames(frame_1, frame_2, ntracks, config, optimize_sub_array=optimize_sub_array)
+
+
+def movement_of_feature_frames(
+        frame_1,
+        frame_2,
+        ntracks,
+        config,
+        optimize_sub_array=True,
+):
+    """
+    Calculate movement of tracked features between two frames from load_movement_frame.
+
+    Args:
+        frame_1: dictionary
+            Frame of the first pixel file.
+        frame_2: dictionary
+            Frame of the second pixel file.
+        ntracks: int
+            Number of tracks.
+        config: dictionary
+            Dictionary containing config parameters.
+        optimize_sub_array: boolean
+            Flag to subset each tracked feature from the full image.
+
+    Returns:
+        y_lag: np.array
+            Movement magnitude in y-direction [number of grids],
+            or [km] if the frames have grid spacing from grid metrics.
+        x_lag: np.array
+            Movement magnitude in x-direction [number of grids],
+            or [km] if the frames have grid spacing from grid metrics.
+        time_lag: float
+            Time difference between two pixel files.
+        base_time: float
+            Base time for the first pixel file.
+    """
 
-    tracknumber = config["track_number_for_speed"]
-    track_field = config["track_field_for_speed"]
     min_size_thresh = config["min_size_thresh_for_speed"]
+    periodic_x = config.get("periodic_x", False)
     # storm_buffer = None
 
-    logger = logging.getLogger(__name__)
-    logger.debug("Starting Storm File: %s" % filepairs[0])
-    sys.stdout.flush()
-
-    dset1 = Dataset(filepairs[0], 'r')
-    dset2 = Dataset(filepairs[1], 'r')
     y_lag = np.zeros(ntracks)
     x_lag = np.zeros(ntracks)
 
     # Get minimum size of feature from pixel files
-    min_cloud_size = np.minimum(get_pixel_size_of_clouds(dset1, ntracks, tracknumber),
-                                get_pixel_size_of_clouds(dset2, ntracks, tracknumber))
+    min_cloud_size = np.minimum(frame_1["cloud_size"], frame_2["cloud_size"])
     # Get tracknumber and field values
-    tracknumber_1 = dset1.variables[tracknumber][:].squeeze()
-    tracknumber_2 = dset2.variables[tracknumber][:].squeeze()
-    field_1 = dset1.variables[track_field][:].squeeze()
-    field_2 = dset2.variables[track_field][:].squeeze()
+    tracknumber_1 = frame_1["tracknumber"]
+    tracknumber_2 = frame_2["tracknumber"]
+    field_1 = frame_1["field"]
+    field_2 = frame_2["field"]
 
     # Loop over each track number
     for track_number in np.arange(0, ntracks):
@@ -246,13 +308,19 @@ def movement_of_feature_fft(
             if optimize_sub_array:
                 # Calculate size of bounding box
                 ymin, ymax, xmin, xmax = get_bounding_box_for_fft(tracknumber_1, tracknumber_2, track_number)
-                masked_field_1 = field_1[ymin:ymax, xmin:xmax].copy()
-                masked_field_2 = field_2[ymin:ymax, xmin:xmax].copy()
-
-                masked_field_1[tracknumber_1[ymin:ymax, xmin:xmax] != track_number] = 0
+                xcols = None
+                if periodic_x:
+                    xcols = get_periodic_columns_for_fft(tracknumber_1, tracknumber_2, track_number)
+                if xcols is None:
+                    xcols = slice(xmin, xmax)
+                # Features crossing the x boundary are subset with wrapped column indices
+                masked_field_1 = field_1[ymin:ymax][:, xcols].copy()
+                masked_field_2 = field_2[ymin:ymax][:, xcols].copy()
+
+                masked_field_1[tracknumber_1[ymin:ymax][:, xcols] != track_number] = 0
                 masked_field_1[np.isnan(masked_field_1)] = 0
 
-                masked_field_2[tracknumber_2[ymin:ymax, xmin:xmax] != track_number] = 0
+                masked_field_2[tracknumber_2[ymin:ymax][:, xcols] != track_number] = 0
                 masked_field_2[np.isnan(masked_field_2)] = 0
             else:
                 masked_field_1 = field_1.copy()
@@ -275,12 +343,14 @@ def movement_of_feature_fft(
             y_lag[track_number] = np.floor(y_dim/2) - y_step
             x_lag[track_number] = np.floor(x_dim/2) - x_step
 
-    # Get time difference between the file pair
-    time_lag = dset2.variables['time'][0] - dset1.variables['time'][0]
-    base_time = dset1.variables['time'][0].copy()
+    # Convert movement to [km] with the local grid spacing of each track in the first frame
+    if "track_dx" in frame_1:
+        y_lag = y_lag * frame_1["track_dy"]
+        x_lag = x_lag * frame_1["track_dx"]
 
-    dset1.close()
-    dset2.close()
+    # Get time difference between the file pair
+    time_lag = frame_2["time"] - frame_1["time"]
+    base_time = frame_1["time"]
     return y_lag, x_lag, time_lag, base_time
 
 
@@ -310,6 +380,34 @@ def get_pixel_size_of_clouds(
     return storm_sizes
 
 
+def get_track_grid_spacing(tracknumber, ntracks, grid_metrics):
+    """
+    Calculate mean grid spacing over the pixels of each track.
+
+    Args:
+        tracknumber: np.array
+            2D track number of each pixel.
+        ntracks: int
+            Number of tracks.
+        grid_metrics: dictionary
+            Grid metrics from get_grid_metrics.
+
+    Returns:
+        track_dx: np.array
+            Mean grid spacing in x-direction [km] for each track number, NaN if no pixels.
+        track_dy: np.array
+            Mean grid spacing in y-direction [km] for each track number, NaN if no pixels.
+    """
+    tracknumber = np.nan_to_num(np.ma.filled(tracknumber, 0)).astype(int).ravel()
+    valid = (tracknumber > 0) & (tracknumber < ntracks)
+    tracknumber = tracknumber[valid]
+    npix = np.bincount(tracknumber, minlength=ntracks).astype(float)
+    npix[npix == 0] = np.nan
+    track_dx = np.bincount(tracknumber, weights=grid_metrics["dx"].ravel()[valid], minlength=ntracks) / npix
+    track_dy = np.bincount(tracknumber, weights=grid_metrics["dy"].ravel()[valid], minlength=ntracks) / npix
+    return track_dx, track_dy
+
+
 def get_bounding_box_for_fft(in1, in2, track_number):
     """
     Given two masks and a track number, calculate the maximum bounding box to fit both
@@ -346,6 +444,39 @@ def get_bounding_box_for_fft(in1, in2, track_number):
     xmax = max(cmax1, cmax2)
     return ymin, ymax, xmin, xmax
 
+def get_periodic_columns_for_fft(in1, in2, track_number):
+    """
+    Given two masks and a track number, get the column indices of the bounding box
+    for a feature crossing the periodic x boundary.
+
+    The box starts after the largest gap of columns without the feature, so it is
+    contiguous across the boundary. Same convention as get_bounding_box_for_fft
+    (the last column is excluded).
+
+    Args:
+        in1: np.array
+            First mask array
+        in2: np.array
+            Second mask array
+        track_number: int
+            Track number for masking.
+
+    Returns:
+        xcols: np.array or None
+            Wrapped column indices, None if the feature does not cross the boundary.
+    """
+    nx = in1.shape[1]
+    cols = np.any(in1 == track_number, axis=0) | np.any(in2 == track_number, axis=0)
+    if not (cols[0] and cols[-1]) or np.all(cols):
+        return None
+    icols = np.nonzero(cols)[0]
+    # Gaps between consecutive columns with the feature (no wrap gap since both edges are occupied)
+    gaps = np.diff(icols)
+    igap = np.argmax(gaps)
+    xstart = icols[igap + 1]
+    xend = icols[igap] + nx
+    return np.arange(xstart, xend) % nx
+
 def offset_to_speed(x, y, time_lag):
     """
     Return normalized speed assuming uniform grid.
@@ -260,7 +260,7 @@ def write_radar_cellid(
         'time': (['time'], file_basetime),
         'lon': (['lon'], np.squeeze(out_lon.data[0, :])),
         'lat': (['lat'], np.squeeze(out_lat.data[:, 0])),
-        'features': (['features'], np.arange(1, nfeatures + 1),),
+        'features': (['features'], np.arange(1, nfeatures[0] + 1),),
     }
     # Output global attributes
     gattr_dict = {
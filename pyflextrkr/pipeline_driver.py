@@ -0,0 +1,139 @@
+import os
+import sys
+import time
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pyflextrkr.ft_utilities import subset_files_timerange, get_basetime_from_string
+from pyflextrkr.ft_executor import get_executor, get_backend_name
+from pyflextrkr.idfeature_driver import idfeature_driver
+from pyflextrkr.tracksingle_driver import tracksingle_driver
+from pyflextrkr.tracksingle_drift import trackclouds
+from pyflextrkr.ft_telemetry import telemetry_stage
+
+
+def _idfeature_frame_task(filename, config=None):
+    """
+    Run feature identification on one file and return a list of (cloudid_outfile, frame),
+    one for each time in the file.
+    """
+    feature_type = config["feature_type"]
+    if "tb_pf" in feature_type:
+        from pyflextrkr.idclouds_tbpf import idclouds_tbpf
+        return [idclouds_tbpf(filename, config, return_frame=True)]
+    elif feature_type == "generic":
+        from pyflextrkr.idfeature_generic import idfeature_generic
+        cloudid_outfiles, frames = idfeature_generic(filename, config, return_all=True, return_frame=True)
+    elif feature_type == "vorticity":
+        from pyflextrkr.idvorticity_era5 import idvorticity_era5
+        cloudid_outfiles, frames = idvorticity_era5(filename, config, return_all=True, return_frame=True)
+    elif feature_type == "radar_cells":
+        from pyflextrkr.idcells_reflectivity import idcells_reflectivity
+        return [idcells_reflectivity(filename, config, return_frame=True)]
+    else:
+        sys.exit(f"ERROR: Unknown feature_type: {feature_type}")
+    return list(zip(cloudid_outfiles, frames))
+
+
+def _get_cloudid_basetime(cloudid_file, cloudid_filebase):
+    """
+    Get cloudid file base time from its filename (same as tracksingle_driver).
+    """
+    nleadingchar = len(cloudid_filebase)
+    datetimestring = os.path.basename(cloudid_file)[nleadingchar:nleadingchar+13]
+    return get_basetime_from_string(datetimestring)
+
+
+@telemetry_stage("pipeline")
+def idfeature_tracksingle_pipeline(config):
+    """
+    Run feature identification and single-pair tracking as one pipelined step.
+
+    Frames are identified by the executor selected by config and streamed in time order
+    to a thread pool that links each pair of consecutive frames while the next frames
+    are still being identified. The labeled frames are passed in memory, so the linking
+    does not re-read the cloudid files. Cloudid and track files are still written
+    since they are needed by the following steps.
+    With the serial backend, identification runs in this process and reads/writes
+    netCDF files, which is not thread-safe, so the pairs are linked in turn instead.
+
+    Config parameters:
+        pipeline_link_workers: int, optional, default=1
+            Number of threads linking frame pairs.
+        pipeline_queue_size: int, optional, default=4
+            Maximum number of frame pairs waiting to be linked.
+            Identification pauses when the queue is full.
+
+    Args:
+        config: dictionary
+            Dictionary containing config parameters.
+
+    Returns:
+        Feature identification and track data are written to netCDF files.
+    """
+    logger = logging.getLogger(__name__)
+
+    # Drift data is computed from the cloudid files before tracking
+    if config.get("driftfile", None) is not None:
+        logger.info("Pipeline mode does not support driftfile, running steps sequentially.")
+        idfeature_driver(config)
+        tracksingle_driver(config)
+        return
+
+    logger.info('Identifying features and tracking sequential pairs in pipeline mode')
+
+    clouddata_path = config["clouddata_path"]
+    databasename = config["databasename"]
+    start_basetime = config["start_basetime"]
+    end_basetime = config["end_basetime"]
+    time_format = config["time_format"]
+    cloudid_filebase = config["cloudid_filebase"]
+    nlink_workers = config.get("pipeline_link_workers", 1)
+    link_inline = get_backend_name(config) == "serial"
+    queue_size = config.get("pipeline_queue_size", 4)
+
+    # Identify files to process
+    infiles_info = subset_files_timerange(
+        clouddata_path,
+        databasename,
+        start_basetime,
+        end_basetime,
+        time_format=time_format,
+    )
+    rawdatafiles = infiles_info[0]
+    nfiles = len(rawdatafiles)
+    logger.info(f"Total number of files to process: {nfiles}")
+
+    t0 = time.time()
+    link_futures = deque()
+    # Previous frame: (cloudid_file, basetime, frame)
+    prev = None
+    nlinks = 0
+    with ThreadPoolExecutor(max_workers=nlink_workers) as link_pool, \
+            get_executor(config, shared_kwargs={"config": config}) as executor:
+        # Frames come back in time order as soon as they (and all earlier frames) are done,
+        # files with several times give one frame per time
+        for frames in executor.imap(_idfeature_frame_task, [(ifile,) for ifile in rawdatafiles]):
+            for cloudid_outfile, frame in frames:
+                # Files without features are not written, skip them as tracksingle_driver does
+                if frame is None:
+                    continue
+                file_basetime = _get_cloudid_basetime(cloudid_outfile, cloudid_filebase)
+                if prev is not None:
+                    # Wait for the oldest pair if the queue is full
+                    while len(link_futures) >= queue_size:
+                        link_futures.popleft().result()
+                    pair_args = ((prev[0], cloudid_outfile), (prev[1], file_basetime), config)
+                    if link_inline:
+                        trackclouds(*pair_args, frame_pair=(prev[2], frame))
+                    else:
+                        link_futures.append(link_pool.submit(trackclouds, *pair_args, frame_pair=(prev[2], frame)))
+                    nlinks += 1
+                prev = (cloudid_outfile, file_basetime, frame)
+        # Finish the remaining pairs
+        while len(link_futures) > 0:
+            link_futures.popleft().result()
+
+    logger.info(f"Linked {nlinks} frame pairs, pipeline time (min): {(time.time() - t0) / 60.0:.2f}")
+    logger.info('Done with identifying and tracking sequential pairs of features')
+    return
@@ -1,19 +1,25 @@
 import numpy as np
 import time
-import os, sys, glob
+import os, glob
 import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import xarray as xr
 import pandas as pd
-from netCDF4 import Dataset
-from wrf import getvar, ALL_TIMES
-from itertools import repeat
-from multiprocessing import Pool
+from pyflextrkr.ft_executor import get_executor, netcdf_lock
+from pyflextrkr.ft_framepairs import map_file_segments
 from pyflextrkr.ftfunctions import olr_to_tb
 
 def preprocess_wrf_tb_rainrate(config):
     """
     Preprocess WRF output file to get Tb and rain rate.
 
+    Config parameters:
+        preprocess_block_size: int, optional, default=8
+            Number of output frames computed together by each worker.
+        preprocess_write_queue: int, optional, default=2
+            Maximum number of output files waiting to be written by each worker.
+
     Args:
         config: dictionary
             Dictionary containing config parameters
@@ -26,8 +32,6 @@ def preprocess_wrf_tb_rainrate(config):
     logger = logging.getLogger(__name__)
     
     # Get inputs from config
-    run_parallel = config['run_parallel']
-    n_workers = config['nprocesses']
     indir = config['wrfout_path']
     outdir = config['clouddata_path']
     inbasename = config['wrfout_basename']
@@ -41,34 +45,244 @@ def preprocess_wrf_tb_rainrate(config):
     nfiles = len(filelist)
     logger.info(f'Number of WRF files: {nfiles}')
 
-    # Create a list with a pair of WRF filenames that are adjacent in time
-    filepairlist = []
-    for ii in range(0, nfiles-1):
-        ipair = [filelist[ii], filelist[ii+1]]
-        filepairlist.append(ipair)
-    nfilepairs = len(filepairlist)
-    
-    if run_parallel == 0:
-        # Serial version
-        for ifile in range(0, nfilepairs):
-            status = calc_rainrate_tb(filepairlist[ifile], outdir, inbasename, outbasename)
-    elif run_parallel == 1:
-        # Parallel version
-        # Use starmap to unpack the iterables as arguments
-        # For arguments that are the same for each iterable, use itertools "repeat" to duplicate those
-        # Example follows this stackoverflow post
-        # https://stackoverflow.com/questions/5442910/python-multiprocessing-pool-map-for-multiple-arguments
-        # Refer to Pool.starmap:
-        # https://docs.python.org/dev/library/multiprocessing.html#multiprocessing.pool.Pool.starmap
-        pool = Pool(n_workers)
-        pool.starmap(calc_rainrate_tb, zip(filepairlist, repeat(outdir), repeat(inbasename), repeat(outbasename)) )
-        pool.close()
-    else:
-        sys.exit('Valid parallelization flag not set.')
+    # Run with the executor selected by config on segments of consecutive WRF files,
+    # each worker streams its files once and computes the pairs adjacent in time
+    shared_kwargs = {
+        "outdir": outdir,
+        "inbasename": inbasename,
+        "outbasename": outbasename,
+        "block_size": config.get("preprocess_block_size", 8),
+        "write_queue": config.get("preprocess_write_queue", 2),
+    }
+    with get_executor(config, shared_kwargs=shared_kwargs) as executor:
+        map_file_segments(executor, calc_rainrate_tb_segment, filelist, config)
         
     return
 
     
+def load_wrf_frame(filein):
+    """
+    Read times, accumulated precipitation and OLR from a WRF output file.
+
+    The file is opened once and the variables are read directly.
+    Each output frame is computed from a pair of consecutive files,
+    so the WRF files must have one time per file.
+
+    Args:
+        filein: string
+            WRF file name.
+
+    Returns:
+        frame: dictionary
+            Variables read from the WRF file, with a leading time dimension.
+    """
+    logger = logging.getLogger(__name__)
+    logger.debug(f'Reading input: {filein}')
+
+    # Files are written by a writer thread while the next ones are read
+    with netcdf_lock:
+        ds = xr.open_dataset(filein, decode_times=False, mask_and_scale=False, concat_characters=False)
+        times_char = ds['Times'].values
+        # Convert WRF time strings (yyyy-mo-dd_hh:mm:ss) to np.datetime64
+        times_str = np.char.replace(np.char.decode(times_char.view(f'S{times_char.shape[1]}').ravel()), '_', 'T')
+        wrftimes = times_str.astype('datetime64[ns]')
+        # Convert np.datetime64 to Epoch time in seconds since 1970-01-01T00:00:00
+        basetimes = wrftimes.astype(np.int64) / 1e9
+        frame = {
+            'filename': filein,
+            'times_char': times_char,
+            'DX': ds.attrs['DX'],
+            'DY': ds.attrs['DY'],
+            'XLONG': ds['XLONG'].values[0],
+            'XLAT': ds['XLAT'].values[0],
+            'wrftimes': wrftimes,
+            'basetimes': basetimes,
+            # Add grid-scale and convective precipitation
+            'RAINALL': ds['RAINNC'].values + ds['RAINC'].values,
+            'OLR': ds['OLR'].values,
+        }
+        ds.close()
+    ntimes = len(frame['basetimes'])
+    if ntimes != 1:
+        raise ValueError(f'{filein} has {ntimes} times, only WRF files with one time per file are supported.')
+    return frame
+
+
+def calc_rainrate_tb_segment(filenames, outdir, inbasename, outbasename, block_size=8, write_queue=2):
+    """
+    Calculates rain rates and Tb for all pairs of consecutive WRF files in a segment.
+
+    Each WRF file is read once, the previous frame is kept in memory for the next pair.
+    Rain rates and Tb are computed for blocks of pairs at once, and the output files
+    are written by a background thread while the next files are read.
+
+    Args:
+        filenames: list
+            Consecutive WRF file names.
+        outdir: string
+            Output file directory.
+        inbasename: string
+            Input file basename.
+        outbasename: string
+            Output file basename.
+        block_size: int, default=8
+            Number of pairs computed together.
+        write_queue: int, default=2
+            Maximum number of output files waiting to be written.
+
+    Returns:
+        status: list
+            Status of each pair, 1 if success.
+    """
+    status = []
+    write_futures = deque()
+    block = []
+    with ThreadPoolExecutor(max_workers=1) as writer:
+        frame_t1 = load_wrf_frame(filenames[0])
+        for ifile in filenames[1:]:
+            frame_t2 = load_wrf_frame(ifile)
+            block.append((frame_t1, frame_t2))
+            frame_t1 = frame_t2
+            if (len(block) < block_size) and (ifile != filenames[-1]):
+                continue
+            # Compute the block and send the outputs to the writer
+            for out_args in calc_rainrate_tb_block(block, outdir, inbasename, outbasename):
+                while len(write_futures) >= write_queue:
+                    status.append(write_futures.popleft().result())
+                write_futures.append(writer.submit(write_rainrate_tb, *out_args))
+            block = []
+        while len(write_futures) > 0:
+            status.append(write_futures.popleft().result())
+    return status
+
+
+def calc_rainrate_tb_block(frame_pairs, outdir, inbasename, outbasename):
+    """
+    Calculates rain rates and Tb for a block of WRF frame pairs at once.
+
+    Args:
+        frame_pairs: list
+            List of (frame_t1, frame_t2) from load_wrf_frame.
+        outdir: string
+            Output file directory.
+        inbasename: string
+            Input file basename.
+        outbasename: string
+            Output file basename.
+
+    Returns:
+        out_args: list
+            List of arguments to write_rainrate_tb for each pair.
+    """
+    logger = logging.getLogger(__name__)
+
+    # Each frame has one time (see load_wrf_frame): the output of a pair is
+    # the rain rate between the two times and Tb at the second time
+    basetimes = np.stack([(f1['basetimes'][0], f2['basetimes'][0]) for f1, f2 in frame_pairs])
+    RAINALL = np.stack([(f1['RAINALL'][0], f2['RAINALL'][0]) for f1, f2 in frame_pairs])
+    OLR = np.stack([f2['OLR'][0] for f1, f2 in frame_pairs])
+
+    # Calculate rainrate [mm/h] and convert OLR to IR brightness temperature
+    delta_times = basetimes[:, 1] - basetimes[:, 0]
+    rainrate = 3600. * (RAINALL[:, 1] - RAINALL[:, 0]) / delta_times[:, None, None]
+    tb = olr_to_tb(OLR.astype(float))
+
+    out_args = []
+    for ii, (frame_t1, frame_t2) in enumerate(frame_pairs):
+        # Get basename string position
+        fname_t1 = os.path.basename(frame_t1['filename'])
+        fname_t2 = os.path.basename(frame_t2['filename'])
+        idx0 = fname_t1.find(inbasename)
+        ftime_t2 = fname_t2[idx0+len(inbasename):]
+        fileout = f'{outdir}/{outbasename}{ftime_t2}.nc'
+        logger.info(pd.to_datetime(frame_t1['wrftimes'][0]).strftime('%Y-%m-%d_%H:%M:%S'))
+        out_args.append((fileout, frame_t1, frame_t2, basetimes[ii, 0], tb[ii], rainrate[ii]))
+    return out_args
+
+
+def write_rainrate_tb(fileout, frame_t1, frame_t2, basetime, tb, rainrate):
+    """
+    Write rain rate and Tb of one time to netCDF.
+
+    Args:
+        fileout: string
+            Output file name.
+        frame_t1: dictionary
+            Frame of the first WRF file.
+        frame_t2: dictionary
+            Frame of the second WRF file.
+        basetime: float
+            Output time (Epoch time).
+        tb: np.array
+            Brightness temperature [lat, lon].
+        rainrate: np.array
+            Rain rate [lat, lon].
+
+    Returns:
+        status: 1
+            Returns status = 1 if success.
+    """
+    logger = logging.getLogger(__name__)
+
+    # Read time as characters
+    times_char_t1 = frame_t1['times_char']
+    strlen_t1 = times_char_t1.shape[1]
+
+    # Define xarray dataset
+    var_dict = {
+        'Times': (['time','char'], times_char_t1),
+        'lon2d': (['lat','lon'], frame_t1['XLONG']),
+        'lat2d': (['lat','lon'], frame_t1['XLAT']),
+        'tb': (['time','lat','lon'], np.expand_dims(tb, axis=0)),
+        'rainrate': (['time','lat','lon'], np.expand_dims(rainrate, axis=0)),
+    }
+    coord_dict = {
+        'time': (['time'], np.expand_dims(basetime, axis=0)),
+        'char': (['char'], np.arange(0, strlen_t1)),
+    }
+    gattr_dict = {
+        'Title': 'WRF calculated rainrate and brightness temperature',
+        'Contact': 'Zhe Feng: zhe.feng@pnnl.gov',
+        'Institution': 'Pacific Northwest National Laboratory',
+        'created on': time.ctime(time.time()),
+        'Original_File1': frame_t1['filename'],
+        'Original_File2': frame_t2['filename'],
+        'DX': frame_t1['DX'],
+        'DY': frame_t1['DY'],
+    }
+    dsout = xr.Dataset(var_dict, coords=coord_dict, attrs=gattr_dict)
+
+    # Specify attributes
+    dsout['time'].attrs['long_name'] = 'Epoch time (seconds since 1970-01-01 00:00:00)'
+    dsout['time'].attrs['units'] = 'seconds since 1970-01-01 00:00:00'
+    dsout['time'].attrs['_FillValue'] = np.NaN
+    dsout['Times'].attrs['long_name'] = 'WRF-based time'
+    dsout['lon2d'].attrs['long_name'] = 'Longitude'
+    dsout['lon2d'].attrs['units'] = 'degrees_east'
+    dsout['lat2d'].attrs['long_name'] = 'Latitude'
+    dsout['lat2d'].attrs['units'] = 'degrees_north'
+    dsout['tb'].attrs['long_name'] = 'Brightness temperature'
+    dsout['tb'].attrs['units'] = 'K'
+    dsout['rainrate'].attrs['long_name'] = 'rainrate'
+    dsout['rainrate'].attrs['units'] = 'mm hr-1'
+
+    # Write to netcdf file
+    encoding_dict = {
+        # 'base_time': {'zlib':True, 'dtype':'int64'},
+        'time':{'zlib':True, 'dtype':'float'},
+        'Times':{'zlib':True},
+        'lon2d':{'zlib':True, 'dtype':'float32'},
+        'lat2d':{'zlib':True, 'dtype':'float32'},
+        'tb':{'zlib':True, 'dtype':'float32'},
+        'rainrate': {'zlib':True, 'dtype':'float32'},
+    }
+    # Called from a writer thread while the next files are read
+    with netcdf_lock:
+        dsout.to_netcdf(path=fileout, mode='w', format='NETCDF4', unlimited_dims='time', encoding=encoding_dict)
+    logger.info(f'{fileout}')
+    return 1
+
+
 def calc_rainrate_tb(filepairnames, outdir, inbasename, outbasename):
     """
     Calculates rain rates from a pair of WRF output files and write to netCDF
@@ -87,142 +301,30 @@ def calc_rainrate_tb(filepairnames, outdir, inbasename, outbasename):
     status: 0 or 1
         Returns status = 1 if success.
     """
-
-    logger = logging.getLogger(__name__)
-    status = 0
-    
-    # Filenames with full path
-    filein_t1 = filepairnames[0]
-    logger.debug(f'Reading input f1: {filein_t1}')
-
-    filein_t2 = filepairnames[1]
-    logger.debug(f'Reading input f2: {filein_t2}')
-
-    # Get filename
-    fname_t1 = os.path.basename(filein_t1)
-    fname_t2 = os.path.basename(filein_t2)
-
-    # Get basename string position
-    idx0 = fname_t1.find(inbasename)
-    ftime_t2 = fname_t2[idx0+len(inbasename):]
-
-    fileout = f'{outdir}/{outbasename}{ftime_t2}.nc'
-
-    # Read WRF files
-    ncfile_t1 = Dataset(filein_t1)
-    ncfile_t2 = Dataset(filein_t2)
-    # Read time as characters
-    times_char_t1 = ncfile_t1.variables['Times'][:]
-    times_char_t2 = ncfile_t2.variables['Times'][:]
-
-    # Read WRF lat/lon
-    DX = getattr(ncfile_t1, 'DX')
-    DY = getattr(ncfile_t1, 'DY')
-    XLONG = getvar(ncfile_t1, 'XLONG')
-    XLAT = getvar(ncfile_t1, 'XLAT')
-    ny, nx = np.shape(XLAT)
-
-    # Create a list with the file pairs
-    wrflist = [Dataset(filein_t1), Dataset(filein_t2)]
-
-    # Extract the 'Times' variable
-    wrftimes = getvar(wrflist, 'Times', timeidx=ALL_TIMES, method='cat')
-
-    # Convert datetime object to WRF string format
-    Times_str_t1 = pd.to_datetime(wrftimes[0].data).strftime('%Y-%m-%d_%H:%M:%S')
-    logger.info(Times_str_t1)
-    # Get the length of the string
-    strlen_t1 = len(Times_str_t1)
-
-    # Convert np.datetime64 to Epoch time in seconds since 1970-01-01T00:00:00 and put into a numpy array
-    ntimes = len(wrftimes)
-    basetimes = np.full(ntimes, np.NAN, dtype=float)
-    # Loop over each time
-    for tt in range(0, ntimes):
-        basetimes[tt] = wrftimes[tt].values.tolist()/1e9
-
-    # Calculate basetime difference in [seconds]
-    delta_times = np.diff(basetimes)
-
-    # Read accumulated precipitation and OLR
-    RAINNC = getvar(wrflist, 'RAINNC', timeidx=ALL_TIMES, method='cat')
-    RAINC = getvar(wrflist, 'RAINC', timeidx=ALL_TIMES, method='cat')
-    OLR_orig = getvar(wrflist, 'OLR', timeidx=ALL_TIMES, method='cat')
-    # Add grid-scale and convective precipitation
-    RAINALL = RAINNC + RAINC
-
-    # Create an array to store rainrates and brightness temperature
-    rainrate = np.zeros((ntimes-1,ny,nx), dtype=float)
-    OLR = np.zeros((ntimes-1,ny,nx), dtype = float)
-
-    # Loop over all times-1
-    for tt in range(0, ntimes-1):
-        # Calculate rainrate, convert unit to [mm/h]
-        rainrate[tt,:,:] = 3600. * (RAINALL.isel(Time=tt+1).data - RAINALL.isel(Time=tt).data) / delta_times[tt]
-        OLR[tt,:,:] = OLR_orig.isel(Time=tt+1).data
-
-    ncfile_t1.close()
-    ncfile_t2.close()
-    
-    # Convert OLR to IR brightness temperature
-    tb = olr_to_tb(OLR)
-
-    # Write single time frame to netCDF output
-    for tt in range(0, ntimes-1):
-
-        # Define xarray dataset
-        var_dict = {
-            'Times': (['time','char'], times_char_t1),
-            'lon2d': (['lat','lon'], XLONG.data),
-            'lat2d': (['lat','lon'], XLAT.data),
-            'tb': (['time','lat','lon'], np.expand_dims(tb[tt,:,:], axis=0)),
-            'rainrate': (['time','lat','lon'], np.expand_dims(rainrate[tt,:,:], axis=0)),
-        }
-        coord_dict = {
-            'time': (['time'], np.expand_dims(basetimes[tt], axis=0)),
-            'char': (['char'], np.arange(0, strlen_t1)),
-        }
-        gattr_dict = {
-            'Title': 'WRF calculated rainrate and brightness temperature',
-            'Contact': 'Zhe Feng: zhe.feng@pnnl.gov',
-            'Institution': 'Pacific Northwest National Laboratory',
-            'created on': time.ctime(time.time()),
-            'Original_File1': filein_t1,
-            'Original_File2': filein_t2,
-            'DX': DX,
-            'DY': DY,
-        }
-        dsout = xr.Dataset(var_dict, coords=coord_dict, attrs=gattr_dict)
-
-        # Specify attributes
-        dsout['time'].attrs['long_name'] = 'Epoch time (seconds since 1970-01-01 00:00:00)'
-        dsout['time'].attrs['units'] = 'seconds since 1970-01-01 00:00:00'
-        dsout['time'].attrs['_FillValue'] = np.NaN
-        dsout['Times'].attrs['long_name'] = 'WRF-based time'
-        dsout['lon2d'].attrs['long_name'] = 'Longitude'
-        dsout['lon2d'].attrs['units'] = 'degrees_east'
-        dsout['lat2d'].attrs['long_name'] = 'Latitude'
-        dsout['lat2d'].attrs['units'] = 'degrees_north'
-        dsout['tb'].attrs['long_name'] = 'Brightness temperature'
-        dsout['tb'].attrs['units'] = 'K'
-        dsout['rainrate'].attrs['long_name'] = 'rainrate'
-        dsout['rainrate'].attrs['units'] = 'mm hr-1'
-
-        # Write to netcdf file
-        encoding_dict = {
-            # 'base_time': {'zlib':True, 'dtype':'int64'},
-            'time':{'zlib':True, 'dtype':'float'},
-            'Times':{'zlib':True},
-            'lon2d':{'zlib':True, 'dtype':'float32'},
-            'lat2d':{'zlib':True, 'dtype':'float32'},
-            'tb':{'zlib':True, 'dtype':'float32'},
-            'rainrate': {'zlib':True, 'dtype':'float32'},
-        }
-        dsout.to_netcdf(path=fileout, mode='w', format='NETCDF4', unlimited_dims='time', encoding=encoding_dict)
-        logger.info(f'{fileout}')
-        status = 1
-        return (status)
-
+    frame_t1 = load_wrf_frame(filepairnames[0])
+    frame_t2 = load_wrf_frame(filepairnames[1])
+    return calc_rainrate_tb_frames(frame_t1, frame_t2, outdir, inbasename, outbasename)
 
 
+def calc_rainrate_tb_frames(frame_t1, frame_t2, outdir, inbasename, outbasename):
+    """
+    Calculates rain rates from a pair of WRF frames (from load_wrf_frame) and write to netCDF
+    ----------
+    frame_t1: dictionary
+        Frame of the first WRF file.
+    frame_t2: dictionary
+        Frame of the second WRF file.
+    outdir: string
+        Output file directory.
+    inbasename: string
+        Input file basename.
+    outbasename: string
+        Output file basename.
 
+    Returns
+    ----------
+    status: 0 or 1
+        Returns status = 1 if success.
+    """
+    out_args = calc_rainrate_tb_block([(frame_t1, frame_t2)], outdir, inbasename, outbasename)
+    return write_rainrate_tb(*out_args[0])
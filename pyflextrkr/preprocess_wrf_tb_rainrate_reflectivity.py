@@ -1,13 +1,14 @@
 import numpy as np
 import time
-import os, sys, glob
+import os, glob
 import logging
+from functools import partial
 from netCDF4 import Dataset
 import xarray as xr
 import pandas as pd
 from wrf import (getvar, vinterp, ALL_TIMES)
-from itertools import repeat
-from multiprocessing import Pool
+from pyflextrkr.ft_executor import get_executor
+from pyflextrkr.ft_framepairs import map_frame_pairs
 from pyflextrkr.ftfunctions import olr_to_tb
 
 def preprocess_wrf(config):
@@ -27,8 +28,6 @@ def preprocess_wrf(config):
     logger = logging.getLogger(__name__)
 
     # Get inputs from config
-    run_parallel = config['run_parallel']
-    n_workers = config['nprocesses']
     indir = config['wrfout_path']
     outdir = config['clouddata_path']
     inbasename = config['wrfout_basename']
@@ -42,36 +41,91 @@ def preprocess_wrf(config):
     nfiles = len(filelist)
     logger.info(f'Number of WRF files: {nfiles}')
 
-    # Create a list with a pair of WRF filenames that are adjacent in time
-    filepairlist = []
-    for ii in range(0, nfiles-1):
-        ipair = [filelist[ii], filelist[ii+1]]
-        filepairlist.append(ipair)
-    nfilepairs = len(filepairlist)
-
-    if run_parallel == 0:
-        # Serial version
-        for ifile in range(0, nfilepairs):
-            status = calc_rainrate_tb_ze(filepairlist[ifile], outdir, inbasename, outbasename, config)
-    elif run_parallel == 1:
-        # Parallel version
-        # Use starmap to unpack the iterables as arguments
-        # For arguments that are the same for each iterable, use itertools "repeat" to duplicate those
-        # Example follows this stackoverflow post
-        # https://stackoverflow.com/questions/5442910/python-multiprocessing-pool-map-for-multiple-arguments
-        # Refer to Pool.starmap:
-        # https://docs.python.org/dev/library/multiprocessing.html#multiprocessing.pool.Pool.starmap
-        pool = Pool(n_workers)
-        pool.starmap(calc_rainrate_tb_ze, 
-            zip(filepairlist, repeat(outdir), repeat(inbasename), repeat(outbasename), repeat(config)))
-        pool.close()
-    else:
-        sys.exit('Valid parallelization flag not set.')
+    # Run with the executor selected by config on pairs of WRF files adjacent in time,
+    # each WRF file is read once and used for both pairs it belongs to
+    loader = partial(load_wrf_frame, config=config)
+    shared_kwargs = {
+        "outdir": outdir,
+        "inbasename": inbasename,
+        "outbasename": outbasename,
+        "config": config,
+    }
+    with get_executor(config, shared_kwargs=shared_kwargs) as executor:
+        map_frame_pairs(executor, calc_rainrate_tb_ze_frames, loader, filelist, config)
 
     return
 
 
 #---------------------------------------------------------------------------------
+def load_wrf_frame(filein, config):
+    """
+    Read a WRF output file and regrid reflectivity to constant altitude.
+
+    Args:
+        filein: string
+            WRF file name
+        config: dictionary
+            Dictionary containing config parameters.
+
+    Returns:
+        frame: dictionary
+            Variables read from the WRF file, with a leading time dimension.
+    """
+    logger = logging.getLogger(__name__)
+    logger.debug(f'Reading input: {filein}')
+
+    # Get vertical interpolation levels
+    interp_levels = np.asarray(config['interp_levels'], dtype=float)
+
+    ncfile = Dataset(filein)
+    # Extract the 'Times' variable
+    wrftimes = getvar(ncfile, 'Times', timeidx=ALL_TIMES, squeeze=False)
+    # Convert np.datetime64 to Epoch time in seconds since 1970-01-01T00:00:00 and put into a numpy array
+    ntimes = len(wrftimes)
+    basetimes = np.full(ntimes, np.NAN, dtype=np.float64)
+    for tt in range(0, ntimes):
+        basetimes[tt] = wrftimes[tt].values.tolist()/1.e9
+
+    # Read accumulated grid scale precipitation and OLR
+    RAINNC = getvar(ncfile, 'RAINNC', timeidx=ALL_TIMES, squeeze=False)
+    RAINC = getvar(ncfile, 'RAINC', timeidx=ALL_TIMES, squeeze=False)
+    OLR = getvar(ncfile, 'OLR', timeidx=ALL_TIMES, squeeze=False)
+    REFL_10CM = getvar(ncfile, 'REFL_10CM', timeidx=ALL_TIMES, squeeze=False)
+    # Get temperature in celsius, model height ASL for mass grid
+    TC = getvar(ncfile, 'tc', timeidx=ALL_TIMES, squeeze=False)
+    HASL = getvar(ncfile, 'height', timeidx=ALL_TIMES, squeeze=False, units="km")
+
+    # Reflectivity interpolation
+    nx = ncfile.dimensions['west_east'].size
+    ny = ncfile.dimensions['south_north'].size
+    dbz_regrid = np.zeros((ntimes,len(interp_levels),ny,nx), dtype=float)
+    for tt in range(0, ntimes):
+        dbz_linear = 10.0**(REFL_10CM.isel(Time=tt).data/10.0)
+        refl_reg = vinterp(ncfile, field=dbz_linear, vert_coord='ght_msl', timeidx=tt,
+                           interp_levels=interp_levels, extrapolate=False)
+        dbz_regrid[tt,:,:,:] = 10.0 * np.log10(refl_reg)
+        del dbz_linear, refl_reg
+
+    frame = {
+        'filename': filein,
+        'DX': getattr(ncfile, 'DX'),
+        'DY': getattr(ncfile, 'DY'),
+        'XLONG': getvar(ncfile, 'XLONG').data,
+        'XLAT': getvar(ncfile, 'XLAT').data,
+        'nz': ncfile.dimensions['bottom_top'].size,
+        'wrftimes': wrftimes.data,
+        'basetimes': basetimes,
+        # Add grid-scale and convective precipitation
+        'RAINALL': (RAINNC + RAINC).data,
+        'OLR': OLR.data,
+        'dbz_regrid': dbz_regrid,
+        'TC': TC.data,
+        'HASL': HASL.data,
+    }
+    ncfile.close()
+    return frame
+
+
 def calc_rainrate_tb_ze(filepairnames, outdir, inbasename, outbasename, config):
     """
     Process a pair of WRF output files and write to netCDF
@@ -86,6 +140,31 @@ def calc_rainrate_tb_ze(filepairnames, outdir, inbasename, outbasename, config):
         config: dictionary
             Dictionary containing config parameters.
 
+    Returns:
+        fileout: string
+            Output filename
+    """
+    frame_t1 = load_wrf_frame(filepairnames[0], config)
+    frame_t2 = load_wrf_frame(filepairnames[1], config)
+    return calc_rainrate_tb_ze_frames(frame_t1, frame_t2, outdir, inbasename, outbasename, config)
+
+
+def calc_rainrate_tb_ze_frames(frame_t1, frame_t2, outdir, inbasename, outbasename, config):
+    """
+    Process a pair of WRF frames (from load_wrf_frame) and write to netCDF
+
+    Args:
+        frame_t1: dictionary
+            Frame of the first WRF file
+        frame_t2: dictionary
+            Frame of the second WRF file
+        outdir: string
+            Output file directory
+        outbasename: string
+            Output file basename
+        config: dictionary
+            Dictionary containing config parameters.
+
     Returns:
         fileout: string
             Output filename
@@ -97,10 +176,8 @@ def calc_rainrate_tb_ze(filepairnames, outdir, inbasename, outbasename, config):
     interp_levels = np.asarray(config['interp_levels'], dtype=float)
     
     # Filenames with full path
-    filein_t1 = filepairnames[0]
-    logger.debug(f'Reading input f1: {filein_t1}')
-    filein_t2 = filepairnames[1]
-    logger.debug(f'Reading input f2: {filein_t2}')
+    filein_t1 = frame_t1['filename']
+    filein_t2 = frame_t2['filename']
 
     # Get the time and data string from filename (wrfout_d0x_yyyy-mm-dd_hh:mm:ss)
     fname_t1 = os.path.basename(filein_t1)
@@ -112,84 +189,48 @@ def calc_rainrate_tb_ze(filepairnames, outdir, inbasename, outbasename, config):
 
     fileout = f'{outdir}/{outbasename}{ftime_t2}.nc'
 
-    # Read WRF files
-    ncfile_t1 = Dataset(filein_t1)
-    ncfile_t2 = Dataset(filein_t2)
-    # Read time as characters
-    times_char_t1 = ncfile_t1.variables['Times'][:]
-    times_char_t2 = ncfile_t2.variables['Times'][:]
-
-    # Read WRF lat/lon
-    DX = getattr(ncfile_t1, 'DX')
-    DY = getattr(ncfile_t1, 'DY')
-    XLONG = getvar(ncfile_t1, 'XLONG')
-    XLAT = getvar(ncfile_t1, 'XLAT')
-    nx = ncfile_t1.dimensions['west_east'].size
-    ny = ncfile_t1.dimensions['south_north'].size
-    nz = ncfile_t1.dimensions['bottom_top'].size
-
-    # Create a list with the file pairs
-    wrflist = [Dataset(filein_t1), Dataset(filein_t2)]
-
-    # Extract the 'Times' variable
-    wrftimes = getvar(wrflist, 'Times', timeidx=ALL_TIMES, method='cat')
+    # WRF lat/lon
+    DX = frame_t1['DX']
+    DY = frame_t1['DY']
+    XLONG = frame_t1['XLONG']
+    XLAT = frame_t1['XLAT']
+    ny, nx = np.shape(XLAT)
+    nz = frame_t1['nz']
 
     # Convert datetime object to WRF string format
-    Times_str_t1 = pd.to_datetime(wrftimes[0].data).strftime('%Y-%m-%d_%H:%M:%S')
+    Times_str_t1 = pd.to_datetime(frame_t1['wrftimes'][0]).strftime('%Y-%m-%d_%H:%M:%S')
     logger.info(Times_str_t1)
     # Get the length of the string
     strlen_t1 = len(Times_str_t1)
 
-    # Convert np.datetime64 to Epoch time in seconds since 1970-01-01T00:00:00 and put into a numpy array
-    ntimes = len(wrftimes)
-    basetimes = np.full(ntimes, np.NAN, dtype=np.float64)
-    # Loop over each time
-    for tt in range(0, ntimes):
-        basetimes[tt] = wrftimes[tt].values.tolist()/1.e9
+    # Concatenate times of the file pair
+    basetimes = np.concatenate((frame_t1['basetimes'], frame_t2['basetimes']))
+    ntimes = len(basetimes)
 
     # Calculate basetime difference in [seconds]
     delta_times = np.diff(basetimes)
 
-    # Read accumulated grid scale precipitation and OLR
-    RAINNC = getvar(wrflist, 'RAINNC', timeidx=ALL_TIMES, method='cat')
-    RAINC = getvar(wrflist, 'RAINC', timeidx=ALL_TIMES, method='cat')
-    OLR_orig = getvar(wrflist,'OLR', timeidx=ALL_TIMES, method='cat')
-    REFL_10CM = getvar(wrflist, 'REFL_10CM', timeidx=ALL_TIMES, method='cat')
-    # Get temperature in celsius, model height ASL for mass grid
-    TC = getvar(wrflist, 'tc', timeidx=ALL_TIMES, method='cat')
-    HASL = getvar(wrflist, 'height', timeidx=ALL_TIMES, method='cat', units="km")
-    # Add grid-scale and convective precipitation
-    RAINALL = RAINNC + RAINC
+    # Concatenate variables of the file pair
+    RAINALL = np.concatenate((frame_t1['RAINALL'], frame_t2['RAINALL']), axis=0)
+    OLR_orig = np.concatenate((frame_t1['OLR'], frame_t2['OLR']), axis=0)
+    dbz_regrid = np.concatenate((frame_t1['dbz_regrid'], frame_t2['dbz_regrid']), axis=0)[1:,:,:,:]
+    temperature_c = np.concatenate((frame_t1['TC'], frame_t2['TC']), axis=0)[1:,:,:,:]
+    height_asl = np.concatenate((frame_t1['HASL'], frame_t2['HASL']), axis=0)[1:,:,:,:]
 
     # Create an array to store variables
     rainrate = np.zeros((ntimes-1,ny,nx), dtype=float)
     OLR = np.zeros((ntimes-1,ny,nx), dtype=float)
-    nz_regrid = len(interp_levels)
-    dbz_regrid = np.zeros((ntimes-1,nz_regrid,ny,nx), dtype=float)
-    temperature_c = np.zeros((ntimes-1,nz,ny,nx), dtype=float)
-    height_asl = np.zeros((ntimes-1,nz,ny,nx), dtype=float)
 
     # Loop over all times-1
     for tt in range(0, ntimes-1):
         # Calculate rainrate, convert unit to [mm/h]
-        rainrate[tt,:,:] = 3600. * (RAINALL.isel(Time=tt+1).data - RAINALL.isel(Time=tt).data) / delta_times[tt]
-        OLR[tt,:,:] = OLR_orig.isel(Time=tt+1).data
-
-        # reflectivity interpolation
-        dbz = np.zeros((nz,ny,nx), dtype = float)
-        dbz = REFL_10CM.isel(Time=tt+1).data
-        dbz_linear = 10.0**(dbz/10.0)
-        refl_reg = vinterp(ncfile_t2, field=dbz_linear, vert_coord='ght_msl', interp_levels=interp_levels, extrapolate=False)
-        dbz_regrid[tt,:,:,:] = 10.0 * np.log10(refl_reg)
-        del dbz, dbz_linear, refl_reg
-
-        temperature_c[tt,:,:,:] = TC.isel(Time=tt+1).data
-        height_asl[tt,:,:,:] = HASL.isel(Time=tt+1).data
+        rainrate[tt,:,:] = 3600. * (RAINALL[tt+1,:,:] - RAINALL[tt,:,:]) / delta_times[tt]
+        OLR[tt,:,:] = OLR_orig[tt+1,:,:]
 
     # Set nan to -35, which is the default value of WRF
     dbz_regrid[np.isnan(dbz_regrid)] = -35.
 
-    del TC, HASL, REFL_10CM, RAINALL, OLR_orig
+    del RAINALL, OLR_orig
 
     # find melting level heights
     melting_height = get_melting_height(height_asl, temperature_c, ntimes, nx, ny, nz)
@@ -197,10 +238,6 @@ def calc_rainrate_tb_ze(filepairnames, outdir, inbasename, outbasename, config):
     # Convert OLR to Tb
     tb = olr_to_tb(OLR)
 
-    # Close WRF files
-    ncfile_t1.close()
-    ncfile_t2.close()
-
     # Make a map of good data (model data is all good so set to 1)
     # mask = np.ones((ny,nx))
 
@@ -211,8 +248,8 @@ def calc_rainrate_tb_ze(filepairnames, outdir, inbasename, outbasename, config):
         var_dict = {
             'base_time': (['time'], np.expand_dims(basetimes[tt+1], axis=0)),
             # 'Times': (['time','char'], times_char_t1),
-            'lon2d': (['lat','lon'], XLONG.data),
-            'lat2d': (['lat','lon'], XLAT.data),
+            'lon2d': (['lat','lon'], XLONG),
+            'lat2d': (['lat','lon'], XLAT),
             # 'mask': (['lat','lon'], mask),
             'tb': (['time','lat','lon'], np.expand_dims(tb[tt,:,:], axis=0)),
             'reflectivity': (['time',"level",'lat','lon'], np.expand_dims(dbz_regrid[tt,:,:,:], axis=0)),
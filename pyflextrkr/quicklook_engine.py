@@ -0,0 +1,551 @@
+"""
+Cached quicklook rendering engine for track snapshots.
+
+The static part of a figure (map projection, coastlines/borders, gridlines, colorbars)
+is created once per worker process. Each frame only updates the image data
+and the track overlays, then saves the figure.
+Track paths for all frames are computed from the track stats file in one pass.
+"""
+import time
+import logging
+import numpy as np
+import xarray as xr
+from multiprocessing import Pool
+from scipy import ndimage
+import matplotlib as mpl
+mpl.use('agg')
+import matplotlib.pyplot as plt
+import matplotlib.gridspec as gridspec
+from matplotlib.collections import LineCollection
+
+# Renderer for each worker process, created by _init_worker
+_worker_renderer = None
+
+
+def label_perimeter(tracknumber, footprint_size=5):
+    """
+    Labels the perimeter of all objects on a 2D map at once.
+
+    A pixel is on the perimeter if any pixel within the footprint has a different track number,
+    this is the same as eroding each object mask separately and subtracting the eroded mask.
+
+    Args:
+        tracknumber: np.ndarray
+            Track number mask, NaN or 0 for no object.
+        footprint_size: int, default=5
+            Size of the square erosion footprint (larger values make thicker outlines).
+
+    Returns:
+        tracknumber_perim: np.ndarray(int)
+            Perimeter pixels labeled with the track number.
+    """
+    tn = np.nan_to_num(tracknumber, nan=0).astype(np.int32)
+    footprint = np.ones((footprint_size, footprint_size), dtype=bool)
+    tn_min = ndimage.minimum_filter(tn, footprint=footprint, mode='constant', cval=0)
+    tn_max = ndimage.maximum_filter(tn, footprint=footprint, mode='constant', cval=0)
+    perim = (tn > 0) & ((tn_min != tn) | (tn_max != tn))
+    return np.where(perim, tn, 0)
+
+
+def get_subset_slices(lon, lat, map_extent):
+    """
+    Get y/x index slices of the bounding box covering a map extent.
+
+    Args:
+        lon: np.ndarray
+            2D longitude.
+        lat: np.ndarray
+            2D latitude.
+        map_extent: list
+            [lonmin, lonmax, latmin, latmax].
+
+    Returns:
+        yslice: slice
+        xslice: slice
+    """
+    mask = (lon >= map_extent[0]) & (lon <= map_extent[1]) & \
+           (lat >= map_extent[2]) & (lat <= map_extent[3])
+    iy, ix = np.where(mask)
+    return slice(iy.min(), iy.max() + 1), slice(ix.min(), ix.max() + 1)
+
+
+def precompute_track_segments(
+        trackstats_file,
+        frames_basetime,
+        dt_thres,
+        dt_match=60.0,
+        lon_varname='meanlon',
+        lat_varname='meanlat',
+        pf_lon_varname=None,
+        pf_lat_varname=None,
+        pf_area_varname=None,
+        lifetime_varname='track_duration',
+        tracks_dimname='tracks',
+        times_dimname='times',
+):
+    """
+    Compute track overlays for all frames from the track stats file in one pass.
+
+    Args:
+        trackstats_file: string
+            Track statistics file name.
+        frames_basetime: np.ndarray
+            Epoch time of each frame.
+        dt_thres: float
+            [second] Tracks that ended longer than this before a frame are not plotted.
+        dt_match: float, default=60.0
+            [second] Time difference threshold to match track times with a frame.
+        lon_varname: string, default='meanlon'
+            Track longitude variable name.
+        lat_varname: string, default='meanlat'
+            Track latitude variable name.
+        pf_lon_varname: string, default=None
+            PF longitude variable name (optional, first PF is used).
+        pf_lat_varname: string, default=None
+            PF latitude variable name (optional, first PF is used).
+        pf_area_varname: string, default=None
+            PF area variable name (optional, first PF is used).
+        lifetime_varname: string, default='track_duration'
+            Track duration variable name, converted to lifetime [hour] with the
+            'time_resolution_hour' attribute (NaN if the variable does not exist).
+        tracks_dimname: string, default='tracks'
+        times_dimname: string, default='times'
+
+    Returns:
+        frame_segments: list
+            Dictionary for each frame containing:
+                'paths': list of (n, 2) lon/lat arrays,
+                'init': (k, 2) initiation lon/lat,
+                'points': (n, 2) lon/lat of all track path points,
+                'points_start': (n,) True for the first point of each path,
+                'points_lifetime': (n,) track lifetime [hour] of each point,
+                'current': (m, 2) lon/lat matching the frame time,
+                'tracknumber': (m,) track numbers matching the frame time,
+                'pf': (j, 3) PF lon/lat/radius [km] matching the frame time.
+    """
+    frames_basetime = np.asarray(frames_basetime, dtype=float)
+    ds = xr.open_dataset(trackstats_file, decode_times=False)
+    base_time = ds['base_time'].transpose(tracks_dimname, times_dimname).values
+    # Only keep tracks overlapping the frame time window
+    track_start = np.nanmin(np.where(np.isfinite(base_time), base_time, np.inf), axis=1)
+    track_end = np.nanmax(np.where(np.isfinite(base_time), base_time, -np.inf), axis=1)
+    tidx = np.where(
+        (track_start <= frames_basetime.max()) & (track_end >= frames_basetime.min() - dt_thres)
+    )[0]
+
+    def _get_var(varname):
+        var = ds[varname].isel({tracks_dimname: tidx})
+        # Use the first (largest) PF if there is an extra dimension
+        extra_dims = [dim for dim in var.dims if dim not in (tracks_dimname, times_dimname)]
+        if len(extra_dims) > 0:
+            var = var.isel({dim: 0 for dim in extra_dims})
+        return var.transpose(tracks_dimname, times_dimname).values
+
+    base_time = base_time[tidx]
+    track_start = track_start[tidx]
+    track_end = track_end[tidx]
+    tracknumbers = ds[tracks_dimname].values[tidx] + 1 if tracks_dimname in ds.coords else tidx + 1
+    track_lon = _get_var(lon_varname)
+    track_lat = _get_var(lat_varname)
+    has_pf = (pf_lon_varname is not None) & (pf_lat_varname is not None) & (pf_area_varname is not None)
+    if has_pf:
+        pf_lon = _get_var(pf_lon_varname)
+        pf_lat = _get_var(pf_lat_varname)
+        pf_rad = np.sqrt(_get_var(pf_area_varname) / np.pi)
+    if lifetime_varname in ds:
+        track_lifetime = ds[lifetime_varname].isel({tracks_dimname: tidx}).values * \
+                         ds.attrs.get('time_resolution_hour', 1)
+    else:
+        track_lifetime = np.full(len(tidx), np.nan, dtype=float)
+    ds.close()
+    # Number of valid times in each track
+    track_ntimes = np.sum(np.isfinite(base_time), axis=1)
+
+    frame_segments = []
+    for fbt in frames_basetime:
+        iactive = np.where((track_start <= fbt) & (track_end >= fbt - dt_thres))[0]
+        paths = []
+        init = []
+        lifetime = []
+        current = []
+        tracknumber = []
+        pf = []
+        for itrack in iactive:
+            ibt = base_time[itrack, :track_ntimes[itrack]]
+            # Track times <= current frame time
+            ncut = np.searchsorted(ibt, fbt + dt_match, side='left')
+            if ncut > 0:
+                paths.append(np.stack([track_lon[itrack, :ncut], track_lat[itrack, :ncut]], axis=1))
+                init.append([track_lon[itrack, 0], track_lat[itrack, 0]])
+                lifetime.append(track_lifetime[itrack])
+            # Track time matching the current frame
+            imatch = np.argmin(np.abs(ibt - fbt))
+            if np.abs(ibt[imatch] - fbt) < dt_match:
+                current.append([track_lon[itrack, imatch], track_lat[itrack, imatch]])
+                tracknumber.append(tracknumbers[itrack])
+                if has_pf and np.isfinite(pf_rad[itrack, imatch]):
+                    pf.append([pf_lon[itrack, imatch], pf_lat[itrack, imatch], pf_rad[itrack, imatch]])
+        npoints = [len(path) for path in paths]
+        points_start = np.zeros(np.sum(npoints, dtype=int), dtype=bool)
+        points_start[np.cumsum([0] + npoints[:-1], dtype=int)[:len(paths)]] = True
+        frame_segments.append({
+            'paths': paths,
+            'init': np.array(init).reshape(-1, 2),
+            'points': np.concatenate(paths).reshape(-1, 2) if len(paths) > 0 else np.zeros((0, 2)),
+            'points_start': points_start,
+            'points_lifetime': np.repeat(np.array(lifetime, dtype=float), npoints),
+            'current': np.array(current).reshape(-1, 2),
+            'tracknumber': np.array(tracknumber, dtype=int),
+            'pf': np.array(pf).reshape(-1, 3),
+        })
+    return frame_segments
+
+
+def _circle_paths(pf, scale=2, n_samples=60):
+    """
+    Approximate circles of radius [km] around lon/lat centers as lon/lat polylines.
+    """
+    theta = np.linspace(0, 2 * np.pi, n_samples)
+    paths = []
+    for ilon, ilat, irad in pf:
+        dlat = scale * irad / 111.2
+        dlon = dlat / max(np.cos(np.deg2rad(ilat)), 0.01)
+        paths.append(np.stack([ilon + dlon * np.cos(theta), ilat + dlat * np.sin(theta)], axis=1))
+    return paths
+
+
+class QuicklookRenderer(object):
+    """
+    Reusable quicklook figure.
+
+    The figure, map background and image artists are created once.
+    Calling render() updates the image data and track overlays, then saves the figure.
+
+    Args:
+        lon: np.ndarray
+            2D longitude of the (subset) pixel grid.
+        lat: np.ndarray
+            2D latitude of the (subset) pixel grid.
+        panels: list
+            Dictionary for each panel containing:
+                'varname': variable name in the pixel file,
+                'cmap': colormap,
+                'levels': color levels,
+                'title': panel title,
+                'cblabel': colorbar label,
+                'cbticks': colorbar ticks,
+                'mask_below_min': bool, mask values below min(levels),
+                'tracknumber_shade': dictionary (optional), {'varname', 'cmap', 'levels', 'alpha'}
+                    to shade track number masks below the field,
+                'perimeter': dictionary (optional), {'varname', 'color', 'footprint_size'}
+                    to draw object perimeters,
+                'pf_circles': bool (optional), draw PF diameter circles,
+                'track_points': bool (optional), draw a marker at every track point
+                    instead of only the initiation point,
+                'static_lines': dictionary (optional), {'lines', 'color', 'linewidth'}
+                    to draw fixed lon/lat polylines (e.g., radar range rings) once,
+                'legend_elements': list (optional), legend handles.
+        map_info: dictionary
+            Dictionary containing 'map_extent', optional 'lonv', 'latv', 'draw_coastline',
+            'draw_border', 'draw_state'.
+        plot_info: dictionary
+            Dictionary containing figure settings (see the plot_subset_*_tracks_demo.py scripts),
+            optional 'figure_margins' is a dictionary of left/right/bottom/top passed to the GridSpec.
+            Track point markers are colored by track lifetime if 'trackpoint_cmap' and
+            'trackpoint_levels' are provided.
+    """
+
+    def __init__(self, lon, lat, panels, map_info, plot_info):
+        import cartopy.crs as ccrs
+        import cartopy.feature as cfeature
+        from cartopy.mpl.ticker import LongitudeFormatter, LatitudeFormatter
+
+        self.lon = lon
+        self.lat = lat
+        self.panels = panels
+        self.plot_info = plot_info
+        self.map_extent = map_info['map_extent']
+        self.data_proj = ccrs.PlateCarree(central_longitude=0)
+        proj = ccrs.PlateCarree(central_longitude=plot_info.get('map_central_lon', 180))
+        map_resolution = plot_info.get('map_resolution', '50m')
+        map_edgecolor = plot_info.get('map_edgecolor', 'k')
+        fontsize = plot_info.get('fontsize', 10)
+        panel_orientation = plot_info.get('panel_orientation', 'horizontal')
+        npanels = len(panels)
+        land = cfeature.NaturalEarthFeature('physical', 'land', map_resolution)
+        borders = cfeature.NaturalEarthFeature('cultural', 'admin_0_boundary_lines_land', map_resolution)
+        states = cfeature.NaturalEarthFeature('cultural', 'admin_1_states_provinces_lakes', map_resolution)
+
+        mpl.rcParams['font.size'] = fontsize
+        self.fig = plt.figure(figsize=plot_info['figsize'], dpi=plot_info.get('dpi', 300), facecolor='w')
+        if panel_orientation == 'vertical':
+            gs = gridspec.GridSpec(2, npanels, height_ratios=[1, 0.02])
+            gs.update(**plot_info.get('figure_margins', dict(left=0.05, right=0.95, bottom=0.1, top=0.9)),
+                      wspace=0.15, hspace=0.15)
+            axes_spec = [(gs[0, ii], gs[1, ii]) for ii in range(npanels)]
+            cb_orientation = 'horizontal'
+        else:
+            gs = gridspec.GridSpec(npanels, 2, width_ratios=[1, 0.02])
+            gs.update(**plot_info.get('figure_margins', dict(left=0.05, right=0.93, bottom=0.05, top=0.9)),
+                      wspace=0.03, hspace=0.2)
+            axes_spec = [(gs[ii, 0], gs[ii, 1]) for ii in range(npanels)]
+            cb_orientation = 'vertical'
+        self.title = self.fig.text(0.5, 0.96, '', fontsize=fontsize * 1.4, ha='center')
+
+        trackpath_color = plot_info.get('trackpath_color', 'purple')
+        if (plot_info.get('trackpoint_cmap') is not None) & (plot_info.get('trackpoint_levels') is not None):
+            self.point_cmap = plt.get_cmap(plot_info['trackpoint_cmap'])
+            self.point_norm = mpl.colors.BoundaryNorm(
+                plot_info['trackpoint_levels'], ncolors=self.point_cmap.N, clip=True)
+        else:
+            self.point_cmap = None
+            self.point_norm = None
+        self.axes = []
+        self.artists = []
+        ny, nx = lon.shape
+        for ipanel, (panel, (ax_spec, cax_spec)) in enumerate(zip(panels, axes_spec)):
+            ax = self.fig.add_subplot(ax_spec, projection=proj)
+            ax.set_extent(self.map_extent, crs=self.data_proj)
+            if map_info.get('draw_coastline', True):
+                ax.add_feature(land, facecolor='none', edgecolor=map_edgecolor, zorder=3)
+            if map_info.get('draw_border', False):
+                ax.add_feature(borders, edgecolor=map_edgecolor, facecolor='none', linewidth=0.8, zorder=3)
+            if map_info.get('draw_state', False):
+                ax.add_feature(states, edgecolor=map_edgecolor, facecolor='none', linewidth=0.8, zorder=3)
+            ax.set_aspect('auto', adjustable=None)
+            ax.set_title(panel.get('title', ''), loc='left')
+            gl = ax.gridlines(crs=self.data_proj, draw_labels=True, linestyle='--', linewidth=0.5)
+            gl.right_labels = False
+            gl.top_labels = False
+            if (map_info.get('lonv') is not None) & (map_info.get('latv') is not None):
+                gl.xlocator = mpl.ticker.FixedLocator(map_info['lonv'])
+                gl.ylocator = mpl.ticker.FixedLocator(map_info['latv'])
+            ax.xaxis.set_major_formatter(LongitudeFormatter(zero_direction_label=True))
+            ax.yaxis.set_major_formatter(LatitudeFormatter())
+
+            empty = np.ma.masked_all((ny, nx))
+            artists = {}
+            # Track number shading below the field
+            if panel.get('tracknumber_shade') is not None:
+                tshade = panel['tracknumber_shade']
+                tcmap = plt.get_cmap(tshade['cmap'])
+                tnorm = mpl.colors.BoundaryNorm(tshade['levels'], ncolors=tcmap.N, clip=True)
+                artists['tracknumber_shade'] = ax.pcolormesh(
+                    lon, lat, empty, norm=tnorm, cmap=tcmap, transform=self.data_proj,
+                    zorder=2, alpha=tshade.get('alpha', 0.7), shading='auto')
+            # Field
+            cmap = plt.get_cmap(panel['cmap'])
+            norm = mpl.colors.BoundaryNorm(panel['levels'], ncolors=cmap.N, clip=True)
+            artists['field'] = ax.pcolormesh(
+                lon, lat, empty, norm=norm, cmap=cmap, transform=self.data_proj, zorder=2, shading='auto')
+            cax = self.fig.add_subplot(cax_spec)
+            self.fig.colorbar(artists['field'], cax=cax, label=panel.get('cblabel'),
+                              ticks=panel.get('cbticks'), extend='both', orientation=cb_orientation)
+            # Object perimeters
+            if panel.get('perimeter') is not None:
+                pcmap = mpl.colors.ListedColormap([panel['perimeter'].get('color', 'magenta')])
+                artists['perimeter'] = ax.pcolormesh(
+                    lon, lat, empty, cmap=pcmap, transform=self.data_proj, zorder=3, shading='auto')
+            # Track overlays
+            artists['paths'] = LineCollection(
+                [], colors=trackpath_color, linewidths=plot_info.get('trackpath_linewidth', 1.5),
+                transform=self.data_proj, zorder=3)
+            ax.add_collection(artists['paths'])
+            if panel.get('track_points', False):
+                if self.point_norm is not None:
+                    artists['points'] = ax.scatter(
+                        np.zeros(0), np.zeros(0), c=np.zeros(0), norm=self.point_norm, cmap=self.point_cmap,
+                        edgecolor='k', marker='o', transform=self.data_proj, zorder=4)
+                    cax_inset = ax.inset_axes([0.04, 0.97, 0.3, 0.03])
+                    self.fig.colorbar(artists['points'], cax=cax_inset, orientation='horizontal',
+                                      label=plot_info.get('trackpoint_cblabel'),
+                                      ticks=plot_info.get('trackpoint_cbticks'))
+                else:
+                    artists['points'] = ax.scatter(
+                        [], [], edgecolor=trackpath_color, facecolor=trackpath_color, marker='o',
+                        transform=self.data_proj, zorder=4)
+            else:
+                artists['init'] = ax.scatter(
+                    [], [], s=plot_info.get('marker_size', 10) * 2, edgecolor=trackpath_color,
+                    facecolor=trackpath_color, marker='o', transform=self.data_proj, zorder=4)
+            # Fixed overlays are drawn once
+            if panel.get('static_lines') is not None:
+                ax.add_collection(LineCollection(
+                    panel['static_lines']['lines'], colors=panel['static_lines'].get('color', 'k'),
+                    linewidths=panel['static_lines'].get('linewidth', 0.4), transform=self.data_proj, zorder=5))
+            if panel.get('pf_circles', False):
+                artists['pf'] = LineCollection(
+                    [], colors=plot_info.get('pfdiam_color', 'magenta'),
+                    linewidths=plot_info.get('pfdiam_linewidth', 1), transform=self.data_proj, zorder=3)
+                ax.add_collection(artists['pf'])
+            artists['texts'] = []
+            if panel.get('legend_elements') is not None:
+                ax.legend(handles=panel['legend_elements'], loc='lower right')
+            self.axes.append(ax)
+            self.artists.append(artists)
+
+    def render(self, fields, segments, timestr, figname):
+        """
+        Update the figure with a new frame and save it.
+
+        Args:
+            fields: dictionary
+                2D arrays keyed by the variable names in panels.
+            segments: dictionary
+                Track overlays for this frame (from precompute_track_segments).
+            timestr: string
+                Figure title.
+            figname: string
+                Output figure name.
+
+        Returns:
+            figname: string
+        """
+        self.title.set_text(timestr)
+        map_extent = self.map_extent
+        label_size = self.plot_info.get('label_size', 8)
+        label_offset = self.plot_info.get('label_offset', 0.05)
+        current = segments['current']
+        in_domain = (current[:, 0] > map_extent[0]) & (current[:, 0] < map_extent[1]) & \
+                    (current[:, 1] > map_extent[2]) & (current[:, 1] < map_extent[3])
+        for ax, panel, artists in zip(self.axes, self.panels, self.artists):
+            if 'tracknumber_shade' in artists:
+                tn = fields[panel['tracknumber_shade']['varname']]
+                artists['tracknumber_shade'].set_array(np.ma.masked_invalid(np.where(tn > 0, tn, np.nan)).ravel())
+            data = fields[panel['varname']]
+            if panel.get('mask_below_min', False):
+                data = np.ma.masked_where(data < min(panel['levels']), data)
+            else:
+                data = np.ma.masked_invalid(data)
+            artists['field'].set_array(data.ravel())
+            if 'perimeter' in artists:
+                perim = label_perimeter(fields[panel['perimeter']['varname']],
+                                        footprint_size=panel['perimeter'].get('footprint_size', 5))
+                artists['perimeter'].set_array(np.ma.masked_where(perim == 0, perim).ravel())
+            artists['paths'].set_segments(segments['paths'])
+            if 'points' in artists:
+                marker_size = self.plot_info.get('marker_size', 10)
+                artists['points'].set_offsets(segments['points'])
+                artists['points'].set_sizes(np.where(segments['points_start'], marker_size * 2, marker_size))
+                if self.point_norm is not None:
+                    artists['points'].set_array(segments['points_lifetime'])
+            else:
+                artists['init'].set_offsets(segments['init'])
+            if 'pf' in artists:
+                artists['pf'].set_segments(_circle_paths(segments['pf']))
+            # Track number labels change every frame
+            for txt in artists['texts']:
+                txt.remove()
+            artists['texts'] = [
+                ax.text(ilon + label_offset, ilat + label_offset, f'{itn:.0f}', color='k', size=label_size,
+                        weight='bold', ha='left', va='center', transform=self.data_proj, zorder=3)
+                for (ilon, ilat), itn in zip(current[in_domain], segments['tracknumber'][in_domain])
+            ]
+        self.fig.savefig(figname, dpi=self.fig.dpi)
+        return figname
+
+
+def _init_worker(lon, lat, panels, map_info, plot_info):
+    """
+    Create the renderer once for each worker process.
+    """
+    global _worker_renderer
+    _worker_renderer = QuicklookRenderer(lon, lat, panels, map_info, plot_info)
+
+
+def _render_frame(args):
+    """
+    Read one pixel-level file and render it with the worker renderer.
+    """
+    datafile, segments, figname, timestr, varnames, yslice, xslice = args
+    ds = xr.open_dataset(datafile, mask_and_scale=True)
+    fields = {var: ds[var].squeeze().values[yslice, xslice] for var in varnames}
+    ds.close()
+    return _worker_renderer.render(fields, segments, timestr, figname)
+
+
+def render_quicklooks(
+        datafiles,
+        frame_segments,
+        fignames,
+        timestrs,
+        panels,
+        map_info,
+        plot_info,
+        nprocesses=1,
+        chunksize=4,
+):
+    """
+    Render quicklook frames in a process pool.
+
+    Args:
+        datafiles: list
+            Pixel-level file names.
+        frame_segments: list
+            Track overlays for each frame (from precompute_track_segments).
+        fignames: list
+            Output figure name for each frame.
+        timestrs: list
+            Figure title for each frame.
+        panels: list
+            Panel specifications (see QuicklookRenderer).
+        map_info: dictionary
+            Dictionary containing map boundary info. If 'map_extent' is None, the full domain is used.
+        plot_info: dictionary
+            Dictionary containing figure settings.
+        nprocesses: int, default=1
+            Number of worker processes.
+        chunksize: int, default=4
+            Number of frames sent to a worker at a time.
+
+    Returns:
+        fignames: list
+            Output figure names in the order they were completed.
+    """
+    logger = logging.getLogger(__name__)
+    nframes = len(datafiles)
+    if nframes == 0:
+        return []
+
+    # Get the pixel grid once and the subset indices for the map extent
+    ds = xr.open_dataset(datafiles[0])
+    lon2d = ds['longitude'].values
+    lat2d = ds['latitude'].values
+    ds.close()
+    if map_info.get('map_extent') is None:
+        map_info['map_extent'] = [np.nanmin(lon2d), np.nanmax(lon2d), np.nanmin(lat2d), np.nanmax(lat2d)]
+    if map_info.get('subset', 0) == 1:
+        yslice, xslice = get_subset_slices(lon2d, lat2d, map_info['map_extent'])
+    else:
+        yslice, xslice = slice(None), slice(None)
+    lon2d = lon2d[yslice, xslice]
+    lat2d = lat2d[yslice, xslice]
+
+    # Collect all variable names needed from the pixel files
+    varnames = set()
+    for panel in panels:
+        varnames.add(panel['varname'])
+        for key in ['tracknumber_shade', 'perimeter']:
+            if panel.get(key) is not None:
+                varnames.add(panel[key]['varname'])
+    varnames = sorted(varnames)
+
+    tasks = [
+        (datafiles[ii], frame_segments[ii], fignames[ii], timestrs[ii], varnames, yslice, xslice)
+        for ii in range(nframes)
+    ]
+    initargs = (lon2d, lat2d, panels, map_info, plot_info)
+    t0 = time.time()
+    results = []
+    if nprocesses <= 1:
+        _init_worker(*initargs)
+        for task in tasks:
+            results.append(_render_frame(task))
+    else:
+        with Pool(nprocesses, initializer=_init_worker, initargs=initargs) as pool:
+            for figname in pool.imap_unordered(_render_frame, tasks, chunksize=chunksize):
+                results.append(figname)
+    elapsed = time.time() - t0
+    logger.info(f"Rendered {nframes} frames in {elapsed:.1f} s ({nframes / elapsed:.2f} frames/s, "
+                f"{nprocesses} processes)")
+    return results
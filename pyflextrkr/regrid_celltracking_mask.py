@@ -1,17 +1,28 @@
 import os
-import sys
 import time
 import logging
 import numpy as np
 import xarray as xr
-import dask
-from dask.distributed import wait
 from pyflextrkr.ft_utilities import subset_files_timerange
+from pyflextrkr.ft_executor import get_executor
+
+# Pixel level variables regridded to the full grid
+regrid_varnames = [
+    'comp_ref', 'dbz_lowlevel', 'conv_core', 'conv_mask',
+    'tracknumber', 'tracknumber_cmask', 'track_status', 'cloudnumber',
+    'merge_tracknumber', 'split_tracknumber', 'echotop10',
+]
 
 def regrid_celltracking_mask(config):
     """
     Driver to regrid pixel level files to a highger resolution.
 
+    Config parameters:
+        regrid_ratio: int, optional, default=5
+            Integer ratio of the output to input grid resolution.
+        regrid_offset: int or list, optional, default=2
+            Position of the first input pixel on the output grid ([y, x] or same for both).
+
     Args:
         config: dictionary
             Dictionary containing config parameters.
@@ -27,7 +38,6 @@ def regrid_celltracking_mask(config):
     in_basename = config['pixeltracking_filebase']
     out_basename = f'regrid_{in_basename}'
     out_dir = in_dir
-    run_parallel = config['run_parallel']
     start_basetime = config["start_basetime"]
     end_basetime = config["end_basetime"]
 
@@ -41,28 +51,67 @@ def regrid_celltracking_mask(config):
         )
     logger.info(f'Number of files to process: {len(in_files)}')
 
-    results = []
-    for ifile in in_files:
-        # Serial
-        if run_parallel == 0:
-            result = regrid_file(ifile, in_basename, out_dir, out_basename)
-        # Parallel
-        elif run_parallel >= 1:
-            result = dask.delayed(regrid_file)(ifile, in_basename, out_dir, out_basename)
-            results.append(result)
-        else:
-            sys.exit('Valid parallelization flag not provided')
-
-    if run_parallel >= 1:
-        # Trigger dask computation
-        final_result = dask.compute(*results)
-        wait(final_result)
+    # Run with the executor selected by config
+    shared_kwargs = {
+        "in_basename": in_basename,
+        "out_dir": out_dir,
+        "out_basename": out_basename,
+        "ratio": config.get("regrid_ratio", 5),
+        "offset": config.get("regrid_offset", 2),
+    }
+    with get_executor(config, shared_kwargs=shared_kwargs) as executor:
+        executor.map(regrid_file, [(ifile,) for ifile in in_files])
 
     logger.info('Done with regridding pixel-level files')
     return
 
 
-def regrid_file(in_filename, in_basename, out_dir, out_basename):
+def get_nearest_index(n, ratio, offset):
+    """
+    Get the nearest input pixel index for each pixel of a grid refined by an integer ratio.
+
+    Input pixel i is located at offset + i * ratio on the full grid. Full grid pixels
+    halfway between two input pixels take the lower one, pixels beyond the first/last
+    input pixels take the first/last one.
+
+    Args:
+        n: int
+            Number of input pixels.
+        ratio: int
+            Integer refinement ratio.
+        offset: int
+            Position of the first input pixel on the full grid.
+
+    Returns:
+        index: np.array
+            Input pixel index for each of the n * ratio full grid pixels.
+    """
+    jj = np.arange(n * ratio) - offset
+    # ceil((jj - ratio/2) / ratio) with integer arithmetic
+    index = -((ratio - 2 * jj) // (2 * ratio))
+    return np.clip(index, 0, n - 1)
+
+
+def upsample_nearest(data, yindex, xindex):
+    """
+    Upsample the last two dimensions of an array by nearest-neighbor block replication.
+
+    Args:
+        data: np.array
+            Input array [..., y, x].
+        yindex: np.array
+            Input pixel index for each output pixel in y (from get_nearest_index).
+        xindex: np.array
+            Input pixel index for each output pixel in x (from get_nearest_index).
+
+    Returns:
+        data_out: np.array
+            Upsampled array [..., len(yindex), len(xindex)], same dtype as data.
+    """
+    return np.take(np.take(data, yindex, axis=-2), xindex, axis=-1)
+
+
+def regrid_file(in_filename, in_basename, out_dir, out_basename, ratio=5, offset=2):
     """
     Regrid pixel level masks for a given input file.
 
@@ -75,6 +124,10 @@ def regrid_file(in_filename, in_basename, out_dir, out_basename):
             Output file directory.
         out_basename: string
             Output file basename.
+        ratio: int, optional, default=5
+            Integer ratio of the output to input grid resolution.
+        offset: int or list, optional, default=2
+            Position of the first input pixel on the output grid ([y, x] or same for both).
 
     Returns:
         out_filename: string
@@ -87,77 +140,19 @@ def regrid_file(in_filename, in_basename, out_dir, out_basename):
     ds = xr.open_dataset(in_filename, decode_times=False, mask_and_scale=False)
     time_coord = ds['time']
     ny, nx = ds.sizes['lat'], ds.sizes['lon']
-    # Create a coordinate to mimic subsampling a 5:1 ratio of the full coordinate
-    ratio = 5
-    xcoord = (np.linspace(2, nx*ratio+2, nx, endpoint=False, dtype=int))
-    ycoord = (np.linspace(2, ny*ratio+2, ny, endpoint=False, dtype=int))
-    # Replace the input data coordinate
-    ds = ds.assign_coords({'lat':ycoord, 'lon':xcoord})    
 
+    # Index of the nearest input pixel for each pixel of the full grid
+    yoffset, xoffset = offset if np.ndim(offset) > 0 else (offset, offset)
+    yindex = get_nearest_index(ny, ratio, yoffset)
+    xindex = get_nearest_index(nx, ratio, xoffset)
     # Create a full coordinate
     xcoord_out = np.arange(0, nx*ratio, 1)
     ycoord_out = np.arange(0, ny*ratio, 1)
 
-    # Get variables for regridding
-    tracknumber = ds['tracknumber']
-    tracknumber_cmask = ds['tracknumber_cmask']
-    track_status = ds['track_status']
-    cloudnumber = ds['cloudnumber']
-    merge_tracknumber = ds['merge_tracknumber']
-    split_tracknumber = ds['split_tracknumber']
-    conv_core = ds['conv_core']
-    conv_mask = ds['conv_mask']
-    comp_ref = ds['comp_ref']
-    dbz_lowlevel = ds['dbz_lowlevel']
-    echotop10 = ds['echotop10']
-
-    # Remap to the full coordinate
-    # Mask variables
-    tracknumber_out = tracknumber.interp(
-        lon=xcoord_out, lat=ycoord_out, method='nearest', 
-        assume_sorted=True, kwargs={"fill_value": "extrapolate"},
-    ).data.astype(int)
-    tracknumber_cmask_out = tracknumber_cmask.interp(
-        lon=xcoord_out, lat=ycoord_out, method='nearest', 
-        assume_sorted=True, kwargs={"fill_value": "extrapolate"},
-    ).data.astype(int)
-    track_status_out = track_status.interp(
-        lon=xcoord_out, lat=ycoord_out, method='nearest', 
-        assume_sorted=True, kwargs={"fill_value": "extrapolate"},
-    ).data.astype(int)
-    cloudnumber_out = cloudnumber.interp(
-        lon=xcoord_out, lat=ycoord_out, method='nearest', 
-        assume_sorted=True, kwargs={"fill_value": "extrapolate"},
-    ).data.astype(int)
-    merge_tracknumber_out = merge_tracknumber.interp(
-        lon=xcoord_out, lat=ycoord_out, method='nearest', 
-        assume_sorted=True, kwargs={"fill_value": "extrapolate"},
-    ).data.astype(int)
-    split_tracknumber_out = split_tracknumber.interp(
-        lon=xcoord_out, lat=ycoord_out, method='nearest', 
-        assume_sorted=True, kwargs={"fill_value": "extrapolate"},
-    ).data.astype(int)
-    conv_core_out = conv_core.interp(
-        lon=xcoord_out, lat=ycoord_out, method='nearest', 
-        assume_sorted=True, kwargs={"fill_value": "extrapolate"},
-    ).data.astype(int)
-    conv_mask_out = conv_mask.interp(
-        lon=xcoord_out, lat=ycoord_out, method='nearest', 
-        assume_sorted=True, kwargs={"fill_value": "extrapolate"},
-    ).data.astype(int)
-    # Radar variables
-    comp_ref_out = comp_ref.interp(
-        lon=xcoord_out, lat=ycoord_out, method='nearest', 
-        assume_sorted=True, kwargs={"fill_value": "extrapolate"},
-    ).data
-    dbz_lowlevel_out = dbz_lowlevel.interp(
-        lon=xcoord_out, lat=ycoord_out, method='nearest', 
-        assume_sorted=True, kwargs={"fill_value": "extrapolate"},
-    ).data
-    echotop10_out = echotop10.interp(
-        lon=xcoord_out, lat=ycoord_out, method='nearest', 
-        assume_sorted=True, kwargs={"fill_value": "extrapolate"},
-    ).data
+    # Remap mask and radar variables to the full coordinate
+    var_out = {}
+    for varname in regrid_varnames:
+        var_out[varname] = upsample_nearest(ds[varname].values, yindex, xindex)
 
     # Make output filename
     nleadingchar = len(f'{in_basename}')
@@ -171,17 +166,10 @@ def regrid_file(in_filename, in_basename, out_dir, out_basename):
         # "longitude": (["lat", "lon"], longitude),
         # "latitude": (["lat", "lon"], latitude),
         "nclouds": (["time"], ds['nclouds'].data, ds['nclouds'].attrs),
-        "comp_ref": (["time", "lat", "lon"], comp_ref_out, comp_ref.attrs),
-        "dbz_lowlevel": (["time", "lat", "lon"], dbz_lowlevel_out, dbz_lowlevel.attrs),
-        "conv_core": (["time", "lat", "lon"], conv_core_out, conv_core.attrs),
-        "conv_mask": (["time", "lat", "lon"], conv_mask_out, conv_mask.attrs),
-        "tracknumber": (["time", "lat", "lon"], tracknumber_out, tracknumber.attrs),
-        "tracknumber_cmask": (["time", "lat", "lon"], tracknumber_cmask_out, tracknumber_cmask.attrs),
-        "track_status": (["time", "lat", "lon"], track_status_out, track_status.attrs),
-        "cloudnumber": (["time", "lat", "lon"], cloudnumber_out, cloudnumber.attrs),
-        "merge_tracknumber": (["time", "lat", "lon"], merge_tracknumber_out, merge_tracknumber.attrs),
-        "split_tracknumber": (["time", "lat", "lon"], split_tracknumber_out, split_tracknumber.attrs),
-        "echotop10": (["time", "lat", "lon"], echotop10_out, echotop10.attrs),
+        **{
+            varname: (["time", "lat", "lon"], var_out[varname], ds[varname].attrs)
+            for varname in regrid_varnames
+        },
         # "echotop20": (["time", "lat", "lon"], echotop20),
         # "echotop30": (["time", "lat", "lon"], echotop30),
         # "echotop40": (["time", "lat", "lon"], echotop40),
@@ -1,14 +1,12 @@
 import glob
 import os
-import sys
 import time
 import logging
 import numpy as np
 from scipy import ndimage
 import xarray as xr
-import dask
-from dask.distributed import wait
 from pyflextrkr.ft_utilities import subset_files_timerange
+from pyflextrkr.ft_executor import get_executor
 
 def regrid_csapr_reflectivity(config):
     """
@@ -29,7 +27,6 @@ def regrid_csapr_reflectivity(config):
     in_basename = config['rawdatabasename']
     out_dir = config["clouddata_path"]
     out_basename = config['databasename']
-    run_parallel = config['run_parallel']
     start_basetime = config["start_basetime"]
     end_basetime = config["end_basetime"]
     time_format = config["time_format"]
@@ -50,22 +47,15 @@ def regrid_csapr_reflectivity(config):
     nfiles = len(in_files)
     logger.info(f"Total number of files to process: {nfiles}")
 
-    results = []
-    for ifile in in_files:
-        # Serial
-        if run_parallel == 0:
-            result = regrid_file(ifile, in_basename, out_dir, out_basename, config)
-        # Parallel
-        elif run_parallel >= 1:
-            result = dask.delayed(regrid_file)(ifile, in_basename, out_dir, out_basename, config)
-            results.append(result)
-        else:
-            sys.exit('Valid parallelization flag not provided')
-
-    if run_parallel >= 1:
-        # Trigger dask computation
-        final_result = dask.compute(*results)
-        wait(final_result)
+    # Run with the executor selected by config
+    shared_kwargs = {
+        "in_basename": in_basename,
+        "out_dir": out_dir,
+        "out_basename": out_basename,
+        "config": config,
+    }
+    with get_executor(config, shared_kwargs=shared_kwargs) as executor:
+        executor.map(regrid_file, [(ifile,) for ifile in in_files])
 
     logger.info('Done with regridding reflectivity files')
     return
@@ -1,14 +1,12 @@
 import glob
 import os
-import sys
 import time
 import logging
 import numpy as np
 from scipy import ndimage
 import xarray as xr
 import pandas as pd
-import dask
-from dask.distributed import wait
+from pyflextrkr.ft_executor import get_executor
 
 def regrid_lasso_reflectivity(config):
     """
@@ -29,7 +27,6 @@ def regrid_lasso_reflectivity(config):
     in_basename = config['rawdatabasename']
     out_dir = config["clouddata_path"]
     out_basename = config['databasename']
-    run_parallel = config['run_parallel']
     start_basetime = config["start_basetime"]
     end_basetime = config["end_basetime"]
     sample_time_freq = config['sample_time_freq']
@@ -49,22 +46,14 @@ def regrid_lasso_reflectivity(config):
         in_files.extend(sorted(glob.glob(f'{in_dir}{in_basename}{file_datetimes[tt]}.nc')))
     logger.info(f'Number of files to process: {len(in_files)}')
 
-    results = []
-    for ifile in in_files:
-        # Serial
-        if run_parallel == 0:
-            result = regrid_file(ifile, in_basename, out_dir, out_basename)
-        # Parallel
-        elif run_parallel >= 1:
-            result = dask.delayed(regrid_file)(ifile, in_basename, out_dir, out_basename)
-            results.append(result)
-        else:
-            sys.exit('Valid parallelization flag not provided')
-
-    if run_parallel >= 1:
-        # Trigger dask computation
-        final_result = dask.compute(*results)
-        wait(final_result)
+    # Run with the executor selected by config
+    shared_kwargs = {
+        "in_basename": in_basename,
+        "out_dir": out_dir,
+        "out_basename": out_basename,
+    }
+    with get_executor(config, shared_kwargs=shared_kwargs) as executor:
+        executor.map(regrid_file, [(ifile,) for ifile in in_files])
 
     logger.info('Done with regridding reflectivity files')
     return
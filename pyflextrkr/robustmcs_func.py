@@ -0,0 +1,269 @@
+import numpy as np
+import warnings
+import logging
+
+
+def get_track_groups(mask, gap):
+    """
+    Find groups of times of each track where a mask is True, allowing gaps.
+
+    Times of a track are split into a new group where the time index difference to
+    the previous True time is larger than gap, same as
+    np.split(idx, np.where(np.diff(idx) > gap)[0] + 1) for each track.
+
+    Args:
+        mask: np.array(bool)
+            Mask [tracks, times].
+        gap: int
+            Maximum time index difference within a group.
+
+    Returns:
+        track: np.array
+            Track index of each True element (sorted by track, time).
+        times: np.array
+            Time index of each True element.
+        element_group: np.array
+            Group index of each True element.
+        groups: dictionary
+            Group arrays: 'track', 'first' and 'last' time index, 'count' (number of elements),
+            'start_element' (index of the first element of the group).
+    """
+    track, times = np.nonzero(mask)
+    nelements = len(track)
+    newgroup = np.ones(nelements, dtype=bool)
+    newgroup[1:] = (track[1:] != track[:-1]) | (np.diff(times) > gap)
+    element_group = np.cumsum(newgroup) - 1
+    start_element = np.flatnonzero(newgroup)
+    end_element = np.append(start_element[1:], nelements)
+    groups = {
+        "track": track[start_element],
+        "first": times[start_element],
+        "last": times[end_element - 1],
+        "count": end_element - start_element,
+        "start_element": start_element,
+    }
+    return track, times, element_group, groups
+
+
+def get_pf_mcs_status(pf_mask, time_res, duration_thresh, gap, fillval, group_conditions=None):
+    """
+    Flag times of each track that belong to a robust MCS period, for all tracks at once.
+
+    A track needs more than duration_thresh hours where pf_mask is True. Each period of
+    True times (split at gaps larger than gap) lasting at least duration_thresh
+    (last - first + 1 times) is flagged. Optional group conditions require a minimum
+    duration of other criteria within the period.
+
+    Args:
+        pf_mask: np.array(bool)
+            PF MCS criteria mask [tracks, times], False beyond the track duration.
+        time_res: float
+            Time resolution [hour].
+        duration_thresh: float
+            Minimum MCS duration [hour].
+        gap: int
+            Maximum time index gap within a period.
+        fillval: int
+            Fill value for times not flagged.
+        group_conditions: list, optional, default=None
+            List of (mask [tracks, times], minimum duration [hour]) evaluated on the
+            True times of each period.
+
+    Returns:
+        pf_mcsstatus: np.array(int)
+            1 for robust MCS times, fillval otherwise [tracks, times].
+    """
+    ntracks = pf_mask.shape[0]
+    pf_mcsstatus = np.full(pf_mask.shape, fillval, dtype=int)
+    track, times, element_group, groups = get_track_groups(pf_mask, gap)
+    ngroups = len(groups["track"])
+
+    # Apply duration threshold to entire time period of the track, then to each period
+    nmcs_times = np.bincount(track, minlength=ntracks)
+    keep = (nmcs_times[groups["track"]] * time_res > duration_thresh) & \
+           ((groups["last"] - groups["first"] + 1) * time_res >= duration_thresh)
+    # Duration of other criteria within each period
+    for imask, iduration_thresh in (group_conditions or []):
+        count = np.bincount(element_group, weights=imask[track, times], minlength=ngroups)
+        keep &= (count * time_res >= iduration_thresh)
+
+    # Label these periods as MCS
+    iselect = keep[element_group]
+    pf_mcsstatus[track[iselect], times[iselect]] = 1
+    return pf_mcsstatus
+
+
+def get_longest_group(mask, gap):
+    """
+    Get the longest period of True times of each track (periods split at gaps larger than gap).
+
+    Follows the per-track definition used for lifecycle stages: with a single period,
+    its times are the continuous range from the first to the last True time. With several
+    periods, the first longest one (most True times) is used with only its True times.
+
+    Args:
+        mask: np.array(bool)
+            Mask [tracks, times].
+        gap: int
+            Maximum time index gap within a period.
+
+    Returns:
+        period: dictionary
+            Arrays [tracks]: 'n' (number of times, 0 if none), 'first', 'second' and 'last'
+            time index, 'single' (True if the track has a single period).
+    """
+    ntracks = mask.shape[0]
+    track, times, element_group, groups = get_track_groups(mask, gap)
+    ngroups_track = np.bincount(groups["track"], minlength=ntracks)
+
+    # First longest group of each track (lexsort is stable, ties keep time order)
+    order = np.lexsort((-groups["count"], groups["track"]))
+    _, ifirst = np.unique(groups["track"][order], return_index=True)
+    best = order[ifirst]
+    itrack = groups["track"][best]
+
+    period = {
+        "n": np.zeros(ntracks, dtype=int),
+        "first": np.full(ntracks, -1, dtype=int),
+        "second": np.full(ntracks, -1, dtype=int),
+        "last": np.full(ntracks, -1, dtype=int),
+        "single": np.zeros(ntracks, dtype=bool),
+    }
+    if len(best) == 0:
+        return period
+    single = ngroups_track[itrack] == 1
+    first = groups["first"][best]
+    last = groups["last"][best]
+    second_element = np.minimum(groups["start_element"][best] + 1, len(times) - 1)
+    period["single"][itrack] = single
+    period["first"][itrack] = first
+    period["last"][itrack] = last
+    period["n"][itrack] = np.where(single, last - first + 1, groups["count"][best])
+    period["second"][itrack] = np.where(single, first + 1, times[second_element])
+    return period
+
+
+def get_mcs_lifecycle(
+        trackduration,
+        pf_coremajoraxis,
+        pf_corearea,
+        pf_sfarea,
+        ntimes,
+        fillval,
+        track_index=None,
+):
+    """
+    Define MCS life cycle stages for all tracks at once. Based on Coniglio et al. (2010) MWR.
+
+    Stages: 1 = Cloud only, 2 = Isolated convective cores, 3 = MCS genesis,
+    4 = MCS maturation, 5 = MCS decay.
+
+    Args:
+        trackduration: np.array
+            Track duration (number of times) [tracks].
+        pf_coremajoraxis: np.array
+            PF convective core major axis length [tracks, times, pfs].
+        pf_corearea: np.array
+            PF convective core area [tracks, times, pfs].
+        pf_sfarea: np.array
+            PF stratiform area [tracks, times, pfs].
+        ntimes: int
+            Number of times in the output arrays.
+        fillval: int
+            Fill value.
+        track_index: np.array, optional, default=None
+            Track index reported in warnings [tracks], default is the position in the input.
+
+    Returns:
+        cycle_complete: np.array
+            1 if the track has at least 4 stages [tracks].
+        cycle_stage: np.array
+            Life cycle stage of each time [tracks, times].
+        cycle_index: np.array
+            Time index when each stage starts [tracks, 5].
+    """
+    logger = logging.getLogger(__name__)
+    ntracks = len(trackduration)
+    trackduration = np.asarray(trackduration).astype(int)
+    cycle_complete = np.full(ntracks, fillval, dtype=int)
+    cycle_stage = np.full((ntracks, ntimes), fillval, dtype=int)
+    cycle_index = np.full((ntracks, 5), fillval, dtype=int)
+    if ntracks == 0:
+        return cycle_complete, cycle_stage, cycle_index
+
+    ntimes_pf = pf_corearea.shape[1]
+    valid = np.arange(ntimes_pf)[None, :] < trackduration[:, None]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        maxpfccmajoraxis = np.nanmax(pf_coremajoraxis, axis=2)
+        maxpfccarea = np.nanmax(pf_corearea, axis=2)
+        meansfarea = np.sum(pf_sfarea, axis=2)
+        track_meansfarea = np.nanmean(np.where(valid, meansfarea, np.nan), axis=1)
+
+    # Times with convective core area > 0
+    ccarea = get_longest_group(valid & (maxpfccarea > 0), 2)
+    # Times with convective major axis length greater than 100 km
+    ccline = get_longest_group(valid & (maxpfccmajoraxis > 100), 2)
+    # Times with convective major axis length greater than 100 km
+    # and stratiform area greater than the mean amount of stratiform
+    sfmask = valid & (maxpfccmajoraxis > 100) & (meansfarea > track_meansfarea[:, None])
+    sfarea = get_longest_group(sfmask, 2)
+
+    cycle = np.full((ntracks, ntimes), fillval, dtype=int)
+    index = np.full((ntracks, 5), fillval, dtype=int)
+    tt = np.arange(ntimes)[None, :]
+
+    def set_stage(flag, start, end, stage):
+        cycle[flag[:, None] & (tt >= start[:, None]) & (tt < end[:, None])] = stage
+
+    # Cloud only stage: all times before the convective core appearance time
+    has_cc = ccarea["n"] > 0
+    flag = has_cc & (ccarea["first"] > 0) & (ccarea["first"] < trackduration - 1)
+    index[flag, 0] = 0
+    set_stage(flag, np.zeros(ntracks, dtype=int), ccarea["first"], 1)
+    # Start of unorganized convective cells
+    index[has_cc, 1] = ccarea["first"][has_cc]
+
+    # If convective line exists (use second index since convective line must be around
+    # for one hour prior to classifying as genesis)
+    has_line = ccline["n"] > 1
+    iline = ccline["second"]
+    flag = has_line & has_cc & (iline > ccarea["first"])
+    # Start of organized convection, time period of unorganized convective cells
+    index[flag, 2] = iline[flag]
+    set_stage(flag, ccarea["first"], iline, 2)
+    if track_index is None:
+        track_index = np.arange(ntracks)
+    for itrack in np.flatnonzero(has_line & ~flag):
+        logger.warning(f"Lifecycle cannot be properly defined for track: {int(track_index[itrack])}")
+
+    # Label MCS genesis and maturation, if stratiform area time is two time steps after the convective line
+    has_sf = has_line & (sfarea["n"] > 0)
+    flag = has_sf & (sfarea["first"] > iline + 2)
+    index[flag, 3] = sfarea["first"][flag]
+    set_stage(flag, iline, sfarea["first"], 3)
+    set_stage(flag, sfarea["first"], sfarea["last"] + 1, 4)
+    # Otherwise maturation starts two time steps after the convective line, if it has stratiform area
+    imature = iline + 2
+    imature_in = np.clip(imature, 0, ntimes_pf - 1)
+    mature_present = (imature >= sfarea["first"]) & (imature <= sfarea["last"]) & \
+                     (sfarea["single"] | sfmask[np.arange(ntracks), imature_in])
+    flag = has_sf & ~(sfarea["first"] > iline + 2) & mature_present
+    index[flag, 3] = imature[flag]
+    set_stage(flag, iline, imature, 3)
+    set_stage(flag, imature, sfarea["last"] + 1, 4)
+    # Dissipation: all times after the mature stage
+    flag = has_sf & (sfarea["last"] < trackduration - 1)
+    index[flag, 4] = sfarea["last"][flag] + 1
+    set_stage(flag, sfarea["last"] + 1, trackduration, 5)
+
+    # Final life cycle processing: save tracks with any stage
+    stage_present = np.any(cycle >= 0, axis=1)
+    nstages = np.zeros(ntracks, dtype=int)
+    for stage in np.unique(cycle[cycle >= 0]):
+        nstages += np.any(cycle == stage, axis=1)
+    # Label as complete cycle if 4 stages present
+    cycle_complete[stage_present & (nstages >= 4)] = 1
+    cycle_stage[stage_present] = cycle[stage_present]
+    cycle_index[stage_present] = index[stage_present]
+    return cycle_complete, cycle_stage, cycle_index
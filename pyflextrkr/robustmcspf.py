@@ -5,7 +5,9 @@ import sys
 import time
 import warnings
 import logging
+from pyflextrkr.ft_telemetry import telemetry_stage
 
+@telemetry_stage("robustmcs")
 def define_robust_mcs_pf(config):
     """
     Identify robust MCS based on PF statistics.
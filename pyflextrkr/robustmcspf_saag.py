@@ -5,6 +5,7 @@ import sys
 import time
 import warnings
 import logging
+from pyflextrkr.robustmcs_func import get_pf_mcs_status
 
 def define_robust_mcs_pf(config):
     """
@@ -57,7 +58,6 @@ def define_robust_mcs_pf(config):
     ds_pf = xr.open_dataset(mcspfstats_file,
                             mask_and_scale=False,
                             decode_times=False,)
-    ntracks = ds_pf.dims[tracks_dimname]
     ntimes = ds_pf.dims[times_dimname]
 
     ir_trackduration = ds_pf["track_duration"].data
@@ -72,104 +72,26 @@ def define_robust_mcs_pf(config):
 
 
     ##################################################
-    # Initialize matrices
-    trackid_mcs = []
-    trackid_nonmcs = []
-
-    pf_mcsstatus = np.full((ntracks, ntimes), fillval, dtype=int)
-
-    ###################################################
-    # Loop through each track
-    for nt in range(0, ntracks):
-        logger.debug(("Track # " + str(nt)))
-
-        ############################################
-        # Isolate data from this track
-        ilength = np.copy(ir_trackduration[nt]).astype(int)
-
-        # Get the largest precipitation (1st entry in 3rd dimension)
-        ipf_majoraxis = np.copy(pf_majoraxis[nt, 0:ilength, 0])
-        # SAAG simplified variables
-        ipf_maxrainrate = np.copy(pf_maxrainrate[nt, 0:ilength])
-        ipf_volrainall = np.copy(pf_volrain_all[nt, 0:ilength])
-
-        ######################################################
-        # Apply PF major axis length criteria
-        ipfmcs = np.array(
-            np.where(
-                (ipf_majoraxis >= mcs_pf_majoraxis_thresh)
-                & (ipf_majoraxis <= max_pf_majoraxis_thresh)
-            )[0]
-        )
-        nipfmcs = len(ipfmcs)
-
-        if nipfmcs > 0:
-            # Apply duration threshold to entire time period
-            if nipfmcs * time_res > mcs_pf_durationthresh:
-
-                # Find continuous duration indices
-                groups = np.split(
-                    ipfmcs, np.where(np.diff(ipfmcs) > mcs_pf_gap)[0] + 1
-                )
-                nbreaks = len(groups)
-
-                # Loop over each sub-period "group"
-                for igroup in range(0, nbreaks):
-
-                    ############################################################
-                    # Determine if each group satisfies duration threshold
-                    igroup_indices = np.array(np.copy(groups[igroup][:]))
-                    nigroup = len(igroup_indices)
-
-                    # Duration length should be group's last index - first index + 1
-                    igroup_duration = np.multiply(
-                        (groups[igroup][-1] - groups[igroup][0] + 1), time_res
-                    )
-
-                    # Group satisfies duration threshold
-                    if igroup_duration >= mcs_pf_durationthresh:
-
-                        # Get PF variables for this group                        
-                        # SAAG:
-                        # Peak rain rate (10 mm/h) > 4 hours
-                        # Minimum rainfall volume 
-                        igroup_maxrainrate = np.copy(ipf_maxrainrate[igroup_indices])
-                        igroup_volrainall = np.copy(ipf_volrainall[igroup_indices])
-
-                        # Count number of times max rain rate > threshold
-                        ct_maxrrtimes = np.count_nonzero(igroup_maxrainrate > heavy_rainrate_thresh)
-                        # Count number of times volume rain > threshold
-                        ct_volrain = np.count_nonzero(igroup_volrainall > mcs_min_rainvol_thresh)
-                        # Convert counts to duration [hour]
-                        dur_maxrr = float(ct_maxrrtimes) * time_res
-                        dur_volrain = float(ct_volrain) * time_res
-
-                        # Duration of max rain rate >= pf_mcs_dur [hour] and
-                        # Duration of volume rain >= mcs_volrain_durationthresh
-                        if (dur_maxrr >= mcs_pf_durationthresh) & (
-                            dur_volrain >= mcs_volrain_durationthresh
-                        ):
-                            # Label this period as an mcs
-                            pf_mcsstatus[nt, igroup_indices] = 1
-                            logger.debug("MCS")
-                        else:
-                            trackid_nonmcs = np.append(trackid_nonmcs, int(nt))
-
-                    else:
-                        logger.debug("Not MCS")
-
-            # Group does not satistfy duration threshold
-            else:
-                trackid_nonmcs = np.append(trackid_nonmcs, int(nt))
-                logger.debug("Not MCS")
-        else:
-            logger.debug("Not MCS")
+    # Apply PF major axis length criteria to all tracks at once
+    # Get the largest precipitation (1st entry in 3rd dimension)
+    valid_times = np.arange(ntimes)[None, :] < ir_trackduration.astype(int)[:, None]
+    pf_mcsmask = valid_times & \
+                 (pf_majoraxis[:, :, 0] >= mcs_pf_majoraxis_thresh) & \
+                 (pf_majoraxis[:, :, 0] <= max_pf_majoraxis_thresh)
+    # SAAG: within each period satisfying the duration threshold,
+    # duration of max rain rate > heavy_rainrate_thresh >= mcs_pf_durationthresh [hour] and
+    # duration of volume rain > mcs_min_rainvol_thresh >= mcs_volrain_durationthresh [hour]
+    group_conditions = [
+        (pf_maxrainrate > heavy_rainrate_thresh, mcs_pf_durationthresh),
+        (pf_volrain_all > mcs_min_rainvol_thresh, mcs_volrain_durationthresh),
+    ]
+    pf_mcsstatus = get_pf_mcs_status(
+        pf_mcsmask, time_res, mcs_pf_durationthresh, mcs_pf_gap, fillval,
+        group_conditions=group_conditions,
+    )
 
     # Find track indices that are robust MCS
-    TEMP_mcsstatus = np.copy(pf_mcsstatus).astype(float)
-    TEMP_mcsstatus[TEMP_mcsstatus == fillval] = np.nan
-    # trackid_mcs = np.array(np.where(np.nansum(TEMP_mcsstatus, axis=1) > 0))[0, :]
-    trackid_mcs = np.where(np.nansum(TEMP_mcsstatus, axis=1) > 0)[0]
+    trackid_mcs = np.where(np.any(pf_mcsstatus == 1, axis=1))[0]
     nmcs = len(trackid_mcs)
 
     # Stop code if not robust MCS present
@@ -250,13 +250,13 @@ def gridrad_sl3d(data, config, **kwargs):
     # Compute number of points in the box
     nsearch = 2 * ngrids + 1
 
-    # Convert y, z to 3D arrays [z, y, x]
-    # yyy is only used if no melting level height is provided
+    # Get y [y, x] and z [z, 1, 1] as views that broadcast to 3D arrays [z, y, x]
+    # yy is only used if no melting level height is provided
     if data['y']['values'].ndim == 1:
-        yyy = data['y']['values'].reshape(1, ny, 1).repeat(nz,axis=0).repeat(nx, axis=2)
+        yy = data['y']['values'].reshape(ny, 1)
     if data['y']['values'].ndim == 2:
-        yyy = np.repeat(data['y']['values'][np.newaxis, :, :], nz, axis=0)
-    zzz = data['z']['values'].reshape(nz, 1, 1).repeat(ny,axis=1).repeat(nx, axis=2)
+        yy = data['y']['values']
+    zzz = data['z']['values'].reshape(nz, 1, 1)
 
     # Find index of 3, 4, 5, and 9 km altitude
     if (data['z']['values'][0] > 3.0) : k3km = -1
@@ -282,27 +282,28 @@ def gridrad_sl3d(data, config, **kwargs):
     # Extract file month from GridRad data structure
     month = int(data['Analysis_month'])
 
+    # Melting level is kept 2D [y, x] (or [1, 1]) and broadcast against z
     if ('zmelt' not in kwargs):
         # If no melting level provided, compute expected melting level for domain based on climatology
-        zml = a[month-1] + b[month-1]*yyy
+        zml = a[month-1] + b[month-1]*yy
     else:
         zmelt = kwargs['zmelt']
         # For single value melting level
         if (zmelt.size == 1):
             if (zmelt > 0.0):
-                # Copy constant melting level to three dimensions
-                zml = np.full((nz, ny, nx), zmelt)
+                # Constant melting level
+                zml = np.full((1, 1), zmelt)
             else:
                 # Else, revert to melting level climatology
-                zml = a[month-1] + b[month-1]*yyy
+                zml = a[month-1] + b[month-1]*yy
         # For 2D melting level
         else:
             if (zmelt.ndim == 2):
-                # Copy 2-D melting level to 3-D
-                zml = zmelt.reshape(1, ny, nx).repeat(nz, axis=0)
+                # 2-D melting level
+                zml = zmelt
             else:
                 # Else, revert to melting level climatology
-                zml = a[month-1] + b[month-1]*yyy
+                zml = a[month-1] + b[month-1]*yy
 
 
     # Find points with high reflectivity at 4 km and no echo at 3 km (potential gaps in coverage)
@@ -330,7 +331,7 @@ def gridrad_sl3d(data, config, **kwargs):
         warnings.simplefilter("ignore", category=RuntimeWarning)
         # Get 25.0 dBZ echo top
         tmp = (data['Z_H'])['values']
-        etop25dBZ = np.nanmax(((~np.isnan(tmp)) & (tmp >=25.0)) * zzz, axis=0)
+        etop25dBZ = np.nanmax(np.where(tmp >= 25.0, zzz, 0), axis=0)
 
         # Get column-maximum reflectivity
         dbz_comp = np.nanmax(tmp, axis=0)
@@ -338,27 +339,18 @@ def gridrad_sl3d(data, config, **kwargs):
         # Get column-maximum reflectivity for above melting level altitudes
         dbz_aml = np.nanmax(tmp * (zzz > (zml + 1.0)), axis=0)
 
-    # Create array to compute peakedness in lowest 9 km altitude layer
-    peak = np.full((k9km+1,ny,nx), np.NaN, dtype=data['Z_H']['values'].dtype)
+    # Compute peakedness in lowest 9 km altitude layer
+    # Median filter each level with the same nsearch x nsearch box in a single call
+    # According to this thread: 
+    # https://forum.image.sc/t/skimage-filters-median-using-mask-for-floating-point-image-with-nans/57289
+    # scipy.ndimage.median_filter v1.7 (same as skimage.filters.median v0.17) above ignores NaN
+    # But it produces incorrect values at the edge of the domain
+    # These values will be removed at the end of the code
+    tmp = data['Z_H']['values'][0:k9km+1,:,:]
+    peak = tmp - ndimage.median_filter(tmp, size=(1, nsearch, nsearch))
 
-    # Loop over the lowest 9 km levels
-    for k in range(0, k9km+1):
-        tmp = data['Z_H']['values'][k,:,:]
-
-        # According to this thread: 
-        # https://forum.image.sc/t/skimage-filters-median-using-mask-for-floating-point-image-with-nans/57289
-        # scipy.ndimage.median_filter v1.7 (same as skimage.filters.median v0.17) above ignores NaN
-        # But it produces incorrect values at the edge of the domain
-        # These values will be removed at the end of the code
-        peak[k,:,:] = tmp - ndimage.median_filter(tmp, size=nsearch)
-
-    # Compute peakedness threshold for reflectivity value
-    tmp = 10.0 - ((data['Z_H']['values'][0:k9km+1,:,:])**2) / 337.5
-    peak_thresh = np.full(peak.shape, np.NaN, dtype=peak.dtype)
-    largeindex = (~np.isnan(tmp)) & (tmp > 4.0)
-    smallindex = (~np.isnan(tmp)) & (tmp <= 4.0)
-    peak_thresh[largeindex] = tmp[largeindex]
-    peak_thresh[smallindex] = 4.0
+    # Compute peakedness threshold for reflectivity value (minimum of 4.0, NaN is kept)
+    peak_thresh = np.maximum(10.0 - (tmp**2) / 337.5, 4.0).astype(peak.dtype, copy=False)
 
     # Compute column-mean peakedness fraction > peak_thresh
     with warnings.catch_warnings():
@@ -421,15 +413,16 @@ def gridrad_sl3d(data, config, **kwargs):
     # Flag anvil
     if (nanvil > 0): sl3dclass[ianvil] = 5
 
-    # Compute reflectivity altitude gradient
-    ddbzdz = np.roll(data['Z_H']['values'], -1, axis=0) - (data['Z_H'])['values']
+    # Only levels below updraft_ReflGradiant_MaxHeight are used in the weak echo region search
+    kupdraft = np.nonzero(data['z']['values'] <= updraft_ReflGradiant_MaxHeight)[0]
+    # Compute reflectivity altitude gradient (next level minus current level, wrapping at the top)
+    ddbzdz = data['Z_H']['values'][(kupdraft + 1) % nz] - data['Z_H']['values'][kupdraft]
     # Compute fraction of neighborhood with echo
-    tmp = 1.0 * (np.isfinite(data['Z_H']['values']))
+    tmp = 1.0 * (np.isfinite(data['Z_H']['values'][kupdraft]))
     fin_test = ndimage.uniform_filter(tmp, size=[1,3,3])
 
     # Search for weak echo regions
-    iupdraft = (np.sum((ddbzdz >= updraft_ReflGradiant_Thresh) * \
-        (fin_test >= 0.7) * (zzz <= updraft_ReflGradiant_MaxHeight), axis=0) > 0.0) & \
+    iupdraft = np.any((ddbzdz >= updraft_ReflGradiant_Thresh) & (fin_test >= 0.7), axis=0) & \
         (dbz_comp >= updraft_CompRefl_Thresh) & (sl3dclass == 2)
     nupdraft = np.count_nonzero(iupdraft)
     # Flag updrafts
@@ -1,27 +1,24 @@
 import numpy as np
-from scipy import ndimage, signal
+from functools import lru_cache
+from scipy import ndimage, signal, fft
 
-def background_intensity(refl, mask_goodvalues, dx, dy, bkg_rad, convolve_method):
+@lru_cache(maxsize=8)
+def get_bkg_kernel(dx, dy, bkg_rad):
     """
-    Calculate background reflectivity intensity
+    Get the circular background radius kernel (cached).
     ----------
-    refl: np.ndarray(float)
-        Radar reflectivity PPI (2D)
     dx: float
         Resolution on x-direction (meters)
     dy: float
         Resolution on y-direction (meters)
     bkg_rad: float
-        Background radius value to calculate reflectivity intensity (meters)
-    convolve_method: string, optional
-        Choose which convolution method to use in Scipy: 'ndimage' (default), or 'signal'
+        Background radius (meters)
 
     Returns
     ----------
-    refl_bkg: np.ndarray(2D)
-        Background reflectivity intensity.
+    mask: np.ndarray(bool)
+        Circular kernel, read-only.
     """
-
     # Convert background bkg_radius to number of grid points
     bkg_rad_x = int(bkg_rad / dx)
     bkg_rad_y = int(bkg_rad / dy)
@@ -29,11 +26,102 @@ def background_intensity(refl, mask_goodvalues, dx, dy, bkg_rad, convolve_method
     # Get a background radius mask
     ygrd, xgrd = np.ogrid[-bkg_rad_y:bkg_rad_y+1, -bkg_rad_x:bkg_rad_x+1]
     mask = xgrd*xgrd + ygrd*ygrd <= (bkg_rad/dx)*(bkg_rad/dy)
+    mask.flags.writeable = False
 
     ## another way to mask
     # mask = np.zeros((bkg_rad_x*2+1, bkg_rad_y*2+1))
     # mask[bkg_rad_x,bkg_rad_y]=1
     # mask = ndimage.binary_dilation(mask,iterations=bkg_rad_x)
+    return mask
+
+@lru_cache(maxsize=8)
+def get_bkg_kernel_fft(shape, dx, dy, bkg_rad):
+    """
+    Get the FFT of the background radius kernel for a grid shape (cached).
+    ----------
+    shape: tuple
+        Grid shape (ny, nx)
+    dx: float
+        Resolution on x-direction (meters)
+    dy: float
+        Resolution on y-direction (meters)
+    bkg_rad: float
+        Background radius (meters)
+
+    Returns
+    ----------
+    kernel_fft: np.ndarray(complex)
+        Real FFT of the zero-padded kernel, read-only.
+    fftshape: tuple
+        Padded FFT shape, large enough to avoid wrap-around (same as zero boundary).
+    """
+    mask = get_bkg_kernel(dx, dy, bkg_rad)
+    fftshape = tuple(fft.next_fast_len(shape[ii] + mask.shape[ii] - 1, real=True) for ii in range(2))
+    kernel_fft = fft.rfft2(mask.astype(np.float64), s=fftshape)
+    kernel_fft.flags.writeable = False
+    return kernel_fft, fftshape
+
+def fft_convolve_pair(linrefl, mask_goodvalues, dx, dy, bkg_rad):
+    """
+    Convolve linear reflectivity and good value mask with the background kernel in one FFT pass.
+    Equivalent to ndimage.convolve(mode='constant', cval=0.0) within floating point round-off.
+    ----------
+    linrefl: np.ndarray(float)
+        Linear reflectivity (2D)
+    mask_goodvalues: np.ndarray(int)
+        Good value mask (2D), 0 or 1
+    dx: float
+        Resolution on x-direction (meters)
+    dy: float
+        Resolution on y-direction (meters)
+    bkg_rad: float
+        Background radius (meters)
+
+    Returns
+    ----------
+    bkg_linrefl: np.ndarray(float)
+        Sum of linear reflectivity within the background radius.
+    numPixs: np.ndarray(float)
+        Number of good pixels within the background radius.
+    """
+    ny, nx = linrefl.shape
+    kernel_fft, fftshape = get_bkg_kernel_fft((ny, nx), dx, dy, bkg_rad)
+    ky, kx = get_bkg_kernel(dx, dy, bkg_rad).shape
+    # Stack both fields to transform them together
+    fields = np.stack([linrefl, mask_goodvalues]).astype(np.float64)
+    conv = fft.irfft2(fft.rfft2(fields, s=fftshape) * kernel_fft, s=fftshape)
+    # Crop to the input grid (same as a centered kernel)
+    conv = conv[:, ky//2:ky//2+ny, kx//2:kx//2+nx]
+    # Remove round-off: sums of non-negative values are non-negative, pixel counts are integers
+    bkg_linrefl = np.maximum(conv[0], 0)
+    numPixs = np.rint(conv[1])
+    return bkg_linrefl, numPixs
+
+def background_intensity(refl, mask_goodvalues, dx, dy, bkg_rad, convolve_method):
+    """
+    Calculate background reflectivity intensity
+    ----------
+    refl: np.ndarray(float)
+        Radar reflectivity PPI (2D)
+    dx: float
+        Resolution on x-direction (meters)
+    dy: float
+        Resolution on y-direction (meters)
+    bkg_rad: float
+        Background radius value to calculate reflectivity intensity (meters)
+    convolve_method: string, optional
+        Choose which convolution method to use in Scipy: 'ndimage' (default), 'signal', or 'fft'.
+        'fft' uses a cached kernel FFT and transforms reflectivity and pixel count together,
+        results match 'ndimage' within 1e-6 dB.
+
+    Returns
+    ----------
+    refl_bkg: np.ndarray(2D)
+        Background reflectivity intensity.
+    """
+
+    # Get a background radius mask
+    mask = get_bkg_kernel(dx, dy, bkg_rad)
 
     # Convert to linear unit
     linrefl = np.zeros(refl.shape)
@@ -48,6 +136,9 @@ def background_intensity(refl, mask_goodvalues, dx, dy, bkg_rad, convolve_method
         # it automatically chooses direct or Fourier method based on an estimate of which is faster (default)
         bkg_linrefl = signal.convolve(linrefl, mask, mode='same', method='auto')
         numPixs = signal.convolve(mask_goodvalues, mask, mode='same', method='auto')
+    if convolve_method == 'fft':
+        # Use cached kernel FFT, both convolutions in one batched transform
+        bkg_linrefl, numPixs = fft_convolve_pair(linrefl, mask_goodvalues, dx, dy, bkg_rad)
     # Mask bad values
     bkg_linrefl[mask_goodvalues==0] = 0
     numPixs[mask_goodvalues==0] = 0
@@ -315,15 +406,10 @@ def label_cells(convmask, min_cellpix):
     # Check if there is any cells identified
     if (nlabelcells > 0):
 
-        labelcell_npix = np.full(nlabelcells, -999, dtype=int)
-
-        # Loop over each labeled cell
-        for ilabelcell in range(1, nlabelcells + 1):
-            # Count number of pixels for the cell
-            ilabelcell_npix = np.count_nonzero(labelcell_number2d == ilabelcell)
-            # Check if cell satisfies size threshold
-            if (ilabelcell_npix > min_cellpix):
-                labelcell_npix[ilabelcell - 1] = ilabelcell_npix
+        # Count number of pixels for all cells at once
+        labelcell_npix = np.bincount(labelcell_number2d.ravel(), minlength=nlabelcells+1)[1:]
+        # Check if cell satisfies size threshold
+        labelcell_npix[labelcell_npix <= min_cellpix] = -999
 
         # Check if any of the cells passes the size threshold test
         ivalidcells = np.array(np.where(labelcell_npix > 0))[0, :]
@@ -343,19 +429,10 @@ def label_cells(convmask, min_cellpix):
             sortedcell_npix = np.copy(labelcell_npix[order])
             sortedcell_number1d = np.copy(labelcell_number1d[order])
 
-            # Loop over the 2D cell number to re-number them by size
-            cellstep = 0
-            for icell in range(0, ncells):
-                # Find 2D indices that match the cell number
-                sortedcell_indices = np.where(labelcell_number2d == sortedcell_number1d[icell])
-                # Get one of the dimensions from the 2D indices to count the size
-                #             nsortedcellindices = np.shape(sortedcell_indices)[1]
-                nsortedcellindices = len(sortedcell_indices[1])
-                # Check if the size matches the sorted cell size
-                if (nsortedcellindices == sortedcell_npix[icell]):
-                    # Renumber the cell in 2D
-                    cellstep += 1
-                    sortedlabelcell_number2d[sortedcell_indices] = np.copy(cellstep)
+            # Re-number the 2D cells by size with a lookup table (0 for removed cells)
+            newlabel = np.zeros(nlabelcells + 1, dtype=int)
+            newlabel[sortedcell_number1d] = np.arange(1, ncells + 1)
+            sortedlabelcell_number2d = newlabel[labelcell_number2d]
 
         else:
             # Return an empty array
@@ -398,31 +475,29 @@ def expand_conv_core(score, radii_expand, dx, dy, min_corenpix=1):
     # Check if a convective core exists
     if (ncores > 0):
 
+        # Core number used for non-core pixels in the minimum filter (larger than all cores)
+        nocore = ncores + 1
+        score_min = np.where(score_sorted > 0, score_sorted, nocore)
+
         # Loop over each radius value
         for iradius in radii_expand:
 
-            # Loop over each core
-            for ic in range(1, ncores+1):
-
-                # Create a binary mask for the current cell
-                coremap = np.zeros(score_sorted.shape, dtype=int)
-                coremap[score_sorted == ic] = 1
-
-                # Make a mask for dilatable region (this gets updated every iteration)
-                mask_dilatable = (score_expand == 0)
+            # Convert radius from [m] to number of grid points
+            conv_rad_gridx = int(iradius * 1000 / dx)
+            conv_rad_gridy = int(iradius * 1000 / dy)
 
-                # Convert radius from [m] to number of grid points
-                conv_rad_gridx = int(iradius * 1000 / dx)
-                conv_rad_gridy = int(iradius * 1000 / dy)
+            # Create a structure for dilation
+            xgrd, ygrd = np.ogrid[-conv_rad_gridx:conv_rad_gridx+1, -conv_rad_gridy:conv_rad_gridy+1]
+            # strc = xgrd*xgrd + ygrd*ygrd <= conv_rad_gridx*conv_rad_gridy
+            strc = xgrd*xgrd + ygrd*ygrd <= (iradius*1000/dx) * (iradius*1000/dy)
 
-                # Create a structure for dilation
-                xgrd, ygrd = np.ogrid[-conv_rad_gridx:conv_rad_gridx+1, -conv_rad_gridy:conv_rad_gridy+1]
-                # strc = xgrd*xgrd + ygrd*ygrd <= conv_rad_gridx*conv_rad_gridy
-                strc = xgrd*xgrd + ygrd*ygrd <= (iradius*1000/dx) * (iradius*1000/dy)
+            # Dilate all cores at once: the minimum core number within the structure
+            # gives the first core (largest) reaching each pixel, same as dilating cores in order
+            core_nearby = ndimage.minimum_filter(score_min, footprint=strc, mode='constant', cval=nocore)
 
-                # Dilate the core, mask with dilatable area, and assign with the core number
-                coremap_dilate = ndimage.binary_dilation(coremap, strc, mask=mask_dilatable)
-                score_expand[coremap_dilate == 1] = ic
+            # Only assign to dilatable area (this gets updated every radius)
+            mask_dilate = (score_expand == 0) & (core_nearby < nocore)
+            score_expand[mask_dilate] = core_nearby[mask_dilate]
 
     return score_expand, score_sorted
 
@@ -477,7 +552,7 @@ def steiner_classification(
     weakEchoThres: float
         Reflectivity threshold to define weak echo (Ze < weakEchoThres is weak echo)
     convolve_method: string, optional
-        Choose which convolution method to use in Scipy: 'ndimage' (default), or 'signal'
+        Choose which convolution method to use: 'ndimage' (default), 'signal', or 'fft'
 
     Returns:
     ========
@@ -579,7 +654,7 @@ def mod_steiner_classification(
     return_diag: bool, optional
         A flag to return more fields for diagnostic purpose (default False)
     convolve_method: string, optional
-        Choose which convolution method to use in Scipy: 'ndimage' (default), or 'signal'
+        Choose which convolution method to use: 'ndimage' (default), 'signal', or 'fft'
 
     Returns:
     ===========
@@ -628,10 +703,11 @@ def mod_steiner_classification(
         # Remove small cores
         # Label connected core pixels as regions
         tmpregions, num_regions = ndimage.label(score_keep)
-        for rr in range(1, num_regions+1):
-            rid = np.where(tmpregions == rr)
-            if (len(rid[0]) < min_corenpix):
-                score_keep[rid] = 0
+        # Count number of pixels for all regions at once, then remove the small ones
+        region_npix = np.bincount(tmpregions.ravel(), minlength=num_regions+1)
+        region_small = region_npix < min_corenpix
+        region_small[0] = False
+        score_keep[region_small[tmpregions]] = 0
 
     # Dilate convective radius
     sclass_new, score_dilate = mod_dilate_conv_rad(
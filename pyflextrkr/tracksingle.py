@@ -109,8 +109,8 @@ def trackclouds(
         times, ny, nx = np.shape(new_convcold_cloudnumber)
 
         # Add 1 to nclouds for both reference and new cloudid files to account for files that have 0 clouds
-        nreference = nreference + 1
-        nnew = nnew + 1
+        nreference = nreference[0] + 1
+        nnew = nnew[0] + 1
 
         #######################################################
         # Initialize matrices
@@ -6,12 +6,40 @@ import pandas as pd
 import time
 import scipy.ndimage as ndi
 import logging
+from pyflextrkr.ft_executor import netcdf_lock
+
+def load_feature_frame(cloudid_file, config):
+    """
+    Read the labeled feature frame used for tracking from a cloudid file.
+
+    Args:
+        cloudid_file: string
+            Cloudid file name.
+        config: dictionary
+            Dictionary containing config parameters.
+
+    Returns:
+        frame: dictionary
+            Keys: 'labels', 'nfeatures', 'base_time'.
+    """
+    feature_varname = config.get("feature_varname", "feature_number")
+    nfeature_varname = config.get("nfeature_varname", "nfeatures")
+    ds = xr.open_dataset(cloudid_file, mask_and_scale=False, decode_times=False)
+    frame = {
+        "labels": ds[feature_varname].values.astype(np.int32),
+        "nfeatures": ds[nfeature_varname].values,
+        "base_time": ds["base_time"].values,
+    }
+    ds.close()
+    return frame
+
 
 def trackclouds(
     cloudid_filepairs,
     cloudid_basetimepairs,
     config,
     drift_data=None,
+    frame_pair=None,
 ):
     """
     Track clouds in successive pairs of cloudid files.
@@ -25,6 +53,10 @@ def trackclouds(
             Dictionary containing config parameters
         drift_data: tuple, optional. Default: None.
             Drift data (datetime_string, xdrift, ydrift)
+        frame_pair: tuple, optional. Default: None.
+            In-memory (reference, new) frames, each a dictionary with keys
+            'labels', 'nfeatures', 'base_time' (see idclouds_tbpf return_frame).
+            If provided, the cloudid files are not read.
 
     Returns:
         track_outfile: string
@@ -47,6 +79,7 @@ def trackclouds(
     nmaxlinks = config["nmaxlinks"]
     othresh = config["othresh"]
     fillval = config["fillval"]
+    periodic_x = config.get("periodic_x", False)
     if drift_data is not None:
         datetime_drift, xdrift, ydrift = drift_data[0], drift_data[1], drift_data[2]
 
@@ -87,25 +120,36 @@ def trackclouds(
         # Load cloudid file from before, called reference file
         logger.debug(reference_filedatetime)
 
-        # Open file
-        reference_data = xr.open_dataset(
-            reference_file, mask_and_scale=False, decode_times=False, chunks=-1,
-        )
-        reference_convcold_cloudnumber = reference_data[feature_varname].load().data
-        nreference = reference_data[nfeature_varname].load().data
-        reference_data.close()
-
-        ##########################################################
-        # Load next cloudid file, called new file
-        logger.debug(f"new_filedattime: {new_filedatetime}")
-
-        # Open file
-        new_data = xr.open_dataset(
-            new_file, mask_and_scale=False, decode_times=False, chunks=-1,
-        )
-        new_convcold_cloudnumber = new_data[feature_varname].load().data
-        nnew = new_data[nfeature_varname].load().data
-        new_data.close()
+        if frame_pair is not None:
+            # Use frames passed in from the identification step
+            reference_convcold_cloudnumber = frame_pair[0]["labels"]
+            nreference = frame_pair[0]["nfeatures"]
+            reference_basetime_data = frame_pair[0]["base_time"]
+            new_convcold_cloudnumber = frame_pair[1]["labels"]
+            nnew = frame_pair[1]["nfeatures"]
+            new_basetime_data = frame_pair[1]["base_time"]
+        else:
+            # Open file
+            reference_data = xr.open_dataset(
+                reference_file, mask_and_scale=False, decode_times=False, chunks=-1,
+            )
+            reference_convcold_cloudnumber = reference_data[feature_varname].load().data
+            nreference = reference_data[nfeature_varname].load().data
+            reference_basetime_data = reference_data["base_time"].load().data
+            reference_data.close()
+
+            ##########################################################
+            # Load next cloudid file, called new file
+            logger.debug(f"new_filedattime: {new_filedatetime}")
+
+            # Open file
+            new_data = xr.open_dataset(
+                new_file, mask_and_scale=False, decode_times=False, chunks=-1,
+            )
+            new_convcold_cloudnumber = new_data[feature_varname].load().data
+            nnew = new_data[nfeature_varname].load().data
+            new_basetime_data = new_data["base_time"].load().data
+            new_data.close()
 
         # Convert float type to int, missing value to 0
         # This should not be needed when setting mask_and_scale=False
@@ -119,9 +163,16 @@ def trackclouds(
             if reference_filedatetime == datetime_drift:
 
                 # Shift the reference cloudnumber and replace the original
-                reference_convcold_cloudnumber = ndi.shift(
-                    reference_convcold_cloudnumber, [0, ydrift, xdrift]
-                )
+                if periodic_x:
+                    # Features leaving one side of the grid in x enter from the other side
+                    reference_convcold_cloudnumber = ndi.shift(
+                        ndi.shift(reference_convcold_cloudnumber, [0, ydrift, 0]),
+                        [0, 0, xdrift], mode="grid-wrap",
+                    )
+                else:
+                    reference_convcold_cloudnumber = ndi.shift(
+                        reference_convcold_cloudnumber, [0, ydrift, xdrift]
+                    )
             else:
                 logger.info(
                     "Warning: datetime_drift does NOT match reference_filedatetime! No shifting is applied."
@@ -135,8 +186,8 @@ def trackclouds(
         times, ny, nx = np.shape(new_convcold_cloudnumber)
 
         # Add 1 to nclouds for both reference and new cloudid files to account for files that have 0 clouds
-        nreference = nreference + 1
-        nnew = nnew + 1
+        nreference = nreference[0] + 1
+        nnew = nnew[0] + 1
 
         #######################################################
         # Initialize matrices
@@ -266,11 +317,11 @@ def trackclouds(
         logger.debug("Writing single tracks")
 
         bt_new = np.array(
-                    [pd.to_datetime(new_data["base_time"].data, unit="s")],
+                    [pd.to_datetime(new_basetime_data, unit="s")],
                     dtype="datetime64[s]",
                 )[0]
         bt_ref = np.array(
-                    [pd.to_datetime(reference_data["base_time"].data, unit="s")],
+                    [pd.to_datetime(reference_basetime_data, unit="s")],
                     dtype="datetime64[s]",
                 )[0]
 
@@ -365,43 +416,45 @@ def trackclouds(
         # Write netcdf files
         # output_data.to_netcdf(path=track_outfile, mode='w', format='NETCDF4_CLASSIC', unlimited_dims='times', \
         zlib = True
-        output_data.to_netcdf(
-            path=track_outfile,
-            mode="w",
-            format="NETCDF4",
-            unlimited_dims="time",
-            encoding={
-                "basetime_new": {
-                    "dtype": "int64",
-                    "zlib": zlib,
-                    "units": "seconds since 1970-01-01",
-                },
-                "basetime_ref": {
-                    "dtype": "int64",
-                    "zlib": zlib,
-                    "units": "seconds since 1970-01-01",
+        # Pipeline mode writes track files from linking threads
+        with netcdf_lock:
+            output_data.to_netcdf(
+                path=track_outfile,
+                mode="w",
+                format="NETCDF4",
+                unlimited_dims="time",
+                encoding={
+                    "basetime_new": {
+                        "dtype": "int64",
+                        "zlib": zlib,
+                        "units": "seconds since 1970-01-01",
+                    },
+                    "basetime_ref": {
+                        "dtype": "int64",
+                        "zlib": zlib,
+                        "units": "seconds since 1970-01-01",
+                    },
+                    "newcloud_backward_index": {
+                        "dtype": "int",
+                        "zlib": zlib,
+                        "_FillValue": fillval,
+                    },
+                    "newcloud_backward_size": {
+                        "dtype": "int",
+                        "zlib": zlib,
+                        "_FillValue": fillval,
+                    },
+                    "refcloud_forward_index": {
+                        "dtype": "int",
+                        "zlib": zlib,
+                        "_FillValue": fillval,
+                    },
+                    "refcloud_forward_size": {
+                        "dtype": "int",
+                        "zlib": zlib,
+                        "_FillValue": fillval,
+                    },
                 },
-                "newcloud_backward_index": {
-                    "dtype": "int",
-                    "zlib": zlib,
-                    "_FillValue": fillval,
-                },
-                "newcloud_backward_size": {
-                    "dtype": "int",
-                    "zlib": zlib,
-                    "_FillValue": fillval,
-                },
-                "refcloud_forward_index": {
-                    "dtype": "int",
-                    "zlib": zlib,
-                    "_FillValue": fillval,
-                },
-                "refcloud_forward_size": {
-                    "dtype": "int",
-                    "zlib": zlib,
-                    "_FillValue": fillval,
-                },
-            },
-        )
+            )
         logger.info(track_outfile)
     return track_outfile
\ No newline at end of file
@@ -1,10 +1,12 @@
-import sys
 import logging
-import dask
-from dask.distributed import wait
+from functools import partial
 from pyflextrkr.ft_utilities import subset_files_timerange, match_drift_times
-from pyflextrkr.tracksingle_drift import trackclouds
+from pyflextrkr.ft_executor import get_executor
+from pyflextrkr.ft_framepairs import map_frame_pairs
+from pyflextrkr.tracksingle_drift import trackclouds, load_feature_frame
+from pyflextrkr.ft_telemetry import telemetry_stage
 
+@telemetry_stage("tracksingle")
 def tracksingle_driver(config):
     """
     Driver for tracking sequential pairs of idfeature files.
@@ -24,7 +26,6 @@ def tracksingle_driver(config):
     cloudid_filebase = config["cloudid_filebase"]
     start_basetime = config["start_basetime"]
     end_basetime = config["end_basetime"]
-    run_parallel = config["run_parallel"]
     driftfile = config.get("driftfile", None)
 
     # Identify files to process
@@ -55,45 +56,26 @@ def tracksingle_driver(config):
     cloudid_filepairs = list(zip(cloudidfiles[0:-1], cloudidfiles[1::]))
     cloudid_basetimepairs = list(zip(cloudidfiles_basetime[0:-1], cloudidfiles_basetime[1::]))
 
-    # Serial version
-    if run_parallel == 0:
-        for ifile in range(0, cloudidfilestep - 1):
-            if driftfile is not None:
-                trackclouds(
-                    cloudid_filepairs[ifile],
-                    cloudid_basetimepairs[ifile],
-                    config,
-                    drift_data=drift_data[ifile]
-                )
-            else:
-                trackclouds(
-                    cloudid_filepairs[ifile],
-                    cloudid_basetimepairs[ifile],
-                    config
-                )
-
-    # Parallel version
-    elif run_parallel >= 1:
-        results = []
-        for ifile in range(0, cloudidfilestep - 1):
-            if driftfile is not None:
-                result = dask.delayed(trackclouds)(
-                    cloudid_filepairs[ifile],
-                    cloudid_basetimepairs[ifile],
-                    config,
-                    drift_data=drift_data[ifile],
-                )
-            else:
-                result = dask.delayed(trackclouds)(
-                    cloudid_filepairs[ifile],
-                    cloudid_basetimepairs[ifile],
-                    config,
-                )
-            results.append(result)
-        final_result = dask.compute(*results)
-        wait(final_result)
+    # Create arguments for each pair
+    if driftfile is not None:
+        pair_args = list(zip(cloudid_filepairs, cloudid_basetimepairs, drift_data))
     else:
-        sys.exit('Valid parallelization flag not provided.')
+        pair_args = list(zip(cloudid_filepairs, cloudid_basetimepairs))
+
+    # Run tracking with the executor selected by config,
+    # each cloudid file is read once and used for both pairs it belongs to
+    loader = partial(load_feature_frame, config=config)
+    with get_executor(config, shared_kwargs={"config": config}) as executor:
+        map_frame_pairs(executor, _trackclouds_task, loader, cloudidfiles, config, pair_args=pair_args)
 
     logger.info('Done with tracking sequential pairs of idfeature files')
-    return
\ No newline at end of file
+    return
+
+def _trackclouds_task(frame_1, frame_2, cloudid_filepair, cloudid_basetimepair, drift_data=None, config=None):
+    """
+    Call trackclouds on a pair of frames with optional drift data as a positional task argument.
+    """
+    return trackclouds(
+        cloudid_filepair, cloudid_basetimepair, config,
+        drift_data=drift_data, frame_pair=(frame_1, frame_2),
+    )
@@ -7,10 +7,13 @@ import time
 import copy
 import gc
 import logging
-import dask
-from dask.distributed import wait
+from pyflextrkr.ft_executor import get_executor
+from pyflextrkr.ft_trackindex import build_track_index, write_track_index, get_track_index_filename
+from pyflextrkr.ft_ragged import get_rowsize_varname, get_rowsize_attrs
 from pyflextrkr.trackstats_func import calc_stats_singlefile, adjust_mergesplit_numbers, get_track_startend_status
+from pyflextrkr.ft_telemetry import telemetry_stage
 
+@telemetry_stage("trackstats")
 def trackstats_driver(config):
     """
     Calculate statistics of track features.
@@ -37,7 +40,6 @@ def trackstats_driver(config):
     enddate = config["enddate"]
     stats_path = config["stats_outpath"]
     duration_range = config["duration_range"]
-    run_parallel = config["run_parallel"]
     fillval = config["fillval"]
     tracks_dimname = config["tracks_dimname"]
     times_dimname = config["times_dimname"]
@@ -72,67 +74,23 @@ def trackstats_driver(config):
     logger.debug("Looping over pixel files and calculating feature statistics")
     t0_files = time.time()
 
-    results = []
-
-    # Serial
-    if run_parallel == 0:
-        for nf in range(0, nfiles):
-            result = calc_stats_singlefile(
-                tracknumbers[nf, :],
-                cloudidfiles[nf],
-                trackstatus[nf, :],
-                trackmerge[nf, :],
-                tracksplit[nf, :],
-                trackreset[nf, :],
-                config,
-            )
-            results.append(result)
-
-        # Serial
-        final_result = results
-
-    # Parallel
-    elif run_parallel >= 1:
-        for nf in range(0, nfiles):
-            result = dask.delayed(calc_stats_singlefile)(
-                tracknumbers[nf, :],
-                cloudidfiles[nf],
-                trackstatus[nf, :],
-                trackmerge[nf, :],
-                tracksplit[nf, :],
-                trackreset[nf, :],
-                config,
-            )
-            results.append(result)
-
-        # Trigger dask computation
-        final_result = dask.compute(*results)
-        wait(final_result)
-
-    else:
-        sys.exit('Valid parallelization flag not provided.')
-
+    # Task arguments for each file
+    task_args = [
+        (
+            tracknumbers[nf, :],
+            cloudidfiles[nf],
+            trackstatus[nf, :],
+            trackmerge[nf, :],
+            tracksplit[nf, :],
+            trackreset[nf, :],
+        )
+        for nf in range(0, nfiles)
+    ]
 
     #########################################################################################
     # Create arrays to store output
-    logger.debug("Collecting track statistics")
-
     max_trackduration = int(max(duration_range))
-    numtracks = int(numtracks)
-
-    # Make a variable list and get attributes from one of the returned dictionaries
-    # Loop over each return results till one that is not None
-    counter = 0
-    while counter < nfiles:
-        if final_result[counter] is not None:
-            var_names = list(final_result[counter][0].keys())
-            # Get variable attributes
-            var_attrs = final_result[counter][1]
-            break
-        counter += 1
-    # Drop variables from the list
-    var_names.remove("uniquetracknumbers")
-    var_names.remove("numtracks")
+    numtracks = int(numtracks.data[0])
 
     # Sparse array indices
     tracks_idx_varname = f"{tracks_dimname}_indices"
@@ -155,26 +113,37 @@ def trackstats_driver(config):
                      "track_interruptions",
                      "merge_tracknumbers",
                      "split_tracknumbers"]
-    # Loop over variable list to create the dictionary entry
-    for ivar in var_names:
-        out_dict[ivar] = np.array([])
-        out_dict_attrs[ivar] = var_attrs[ivar]
-
-    # Initialize row/col indices arrays
-    row_idx = np.array([])
-    col_idx = np.array([])
-
-    # Collect results
-    for nf in range(0, nfiles):
-        # Get the return results for this pixel file
-        # The result is a tuple: (out_dict, out_dict_attrs)
-        # The first entry is the dictionary containing the variables
-        iResult = final_result[nf][0]
-        if iResult is not None:
+    # Variable list is set from the first returned result
+    var_names = None
+    # Lists of per-file values, concatenated once after all files are collected
+    out_list = {}
+    row_idx = []
+    col_idx = []
+
+    # Run with the executor selected by config
+    # Results are streamed in file order into the output arrays as they complete,
+    # track_duration depends on the file order
+    logger.debug("Collecting track statistics")
+    with get_executor(config, shared_kwargs={"config": config}) as executor:
+        for iresult in executor.imap(calc_stats_singlefile, task_args):
+            # The result is a tuple: (out_dict, out_dict_attrs)
+            # The first entry is the dictionary containing the variables
+            if (iresult is None) or (iresult[0] is None):
+                continue
+            iResult = iresult[0]
+            if var_names is None:
+                # Make a variable list and get attributes from the returned dictionaries
+                var_names = list(iResult.keys())
+                var_attrs = iresult[1]
+                # Drop variables from the list
+                var_names.remove("uniquetracknumbers")
+                var_names.remove("numtracks")
+                for ivar in var_names:
+                    out_list[ivar] = []
+                    out_dict_attrs[ivar] = var_attrs[ivar]
+
             # unique tracknumbers in the current file
             tracknumbertmp = iResult["uniquetracknumbers"] - 1
-            # number of tracks in the current file
-            numtrackstmp = iResult["numtracks"]
 
             # Record the current length of the track by adding 1
             out_dict["track_duration"][tracknumbertmp] = (
@@ -183,19 +152,22 @@ def trackstats_driver(config):
 
             # Find track lengths that are within max_trackduration
             # Only record these to avoid array index out of bounds
-            # itracklength = out_tracklength[tracknumbertmp]
             itracklength = out_dict["track_duration"][tracknumbertmp]
             ridx = itracklength <= max_trackduration
-            # Loop over each variable and assign values to output dictionary
+            # Loop over each variable and append values to output list
             for ivar in var_names:
-                # Concatenate arrays for 2D variables
-                out_dict[ivar] = np.concatenate(
-                    (out_dict[ivar], iResult[ivar])
-                )
+                out_list[ivar].append(iResult[ivar])
             # row, column indices for sparse matrix
             # row:tracks, col:times
-            row_idx = np.concatenate((row_idx, tracknumbertmp[ridx])).astype(int)
-            col_idx = np.concatenate((col_idx, itracklength[ridx] - 1)).astype(int)
+            row_idx.append(tracknumbertmp[ridx])
+            col_idx.append(itracklength[ridx] - 1)
+
+    # Concatenate arrays for 2D variables
+    for ivar in var_names:
+        out_dict[ivar] = np.concatenate(out_list[ivar])
+    del out_list
+    row_idx = np.concatenate(row_idx).astype(int)
+    col_idx = np.concatenate(col_idx).astype(int)
 
     #########################################################################################
     # Check data max duration against config set up
@@ -329,6 +301,10 @@ def trackstats_driver(config):
     out_dict_attrs[times_idx_varname] = {
         "long_name": "Times indices for constructing sparse array",
     }
+    # Number of sparse elements of each track, for ragged array access (see ft_ragged)
+    rowsize_varname = get_rowsize_varname(tracks_dimname)
+    out_dict[rowsize_varname] = np.bincount(row_out, minlength=numtracks).astype(np.int32)
+    out_dict_attrs[rowsize_varname] = get_rowsize_attrs()
 
     # Write dense arrays output file
     if trackstats_dense_netcdf == 1:
@@ -340,6 +316,19 @@ def trackstats_driver(config):
     write_trackstats_sparse(config, numtracks, out_dict_attrs, out_dict, row_out, tracks_dimname,
                             trackstats_sparse_outfile)
 
+    # Write spatio-temporal index for region/time queries
+    if config.get("track_index", False):
+        # Sparse arrays are flattened after writing, in the order of row_out/col_out
+        index = build_track_index(
+            row_out, col_out, out_dict["meanlat"], out_dict["meanlon"], out_dict["base_time"],
+            lat_bin=config.get("track_index_lat_bin", 1.0),
+            lon_bin=config.get("track_index_lon_bin", 1.0),
+            time_bin=config.get("track_index_time_bin", 24.0),
+        )
+        index_outfile = trackstats_outfile if trackstats_dense_netcdf == 1 else trackstats_sparse_outfile
+        index["source_file"] = os.path.basename(index_outfile)
+        write_track_index(index, get_track_index_filename(index_outfile))
+
     return trackstats_outfile
 
 
@@ -470,9 +459,10 @@ def write_trackstats_dense(config, fillval, fillval_f,
     for ivar in out_dict_dense.keys():
         if out_dict_dense[ivar].ndim == 2:
             out_dict_dense[ivar] = out_dict_dense[ivar].toarray()
-    # Remove the tracks/times indices variables
+    # Remove the tracks/times indices and row size variables
     out_dict_dense.pop(tracks_idx_varname, None)
     out_dict_dense.pop(times_idx_varname, None)
+    out_dict_dense.pop(get_rowsize_varname(tracks_dimname), None)
 
     # Create a dense mask for no feature
     mask = out_dict_dense['base_time'] == 0
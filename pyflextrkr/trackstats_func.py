@@ -4,6 +4,8 @@ import xarray as xr
 import sys
 import logging
 import warnings
+from pyflextrkr.ft_gridmetrics import get_grid_metrics
+from pyflextrkr.ftfunctions import get_mean_lon, get_mean_x
 
 def calc_stats_singlefile(
         tracknumbers,
@@ -47,6 +49,8 @@ def calc_stats_singlefile(
     terrain_file = config.get("terrain_file", None)
     rangemask_varname = config.get("rangemask_varname", 'None')
     feature_varname = config.get("feature_varname", "feature_number")
+    use_grid_metrics = config.get("use_grid_metrics", False)
+    periodic_x = config.get("periodic_x", False)
 
     # Only process file if that file contains a track
     if np.nanmax(tracknumbers) > 0:
@@ -67,12 +71,21 @@ def calc_stats_singlefile(
         file_corecold_cloudnumber = ds[feature_varname].squeeze().values
         file_basetime = ds["base_time"].squeeze()
 
+        # Per-pixel area from grid metrics, otherwise a constant pixel_radius**2
+        if use_grid_metrics:
+            pixel_area = get_grid_metrics(config, lat2d=latitude, lon2d=longitude)["area"]
+        else:
+            pixel_area = None
+
         # Read feature specific variables
         if feature_type == "radar_cells":
             ref_varname = config["ref_varname"]
             # Convert x,y units to [km]
             x_coords = ds["x"] / 1000.
             y_coords = ds["y"] / 1000.
+            # First column and domain width in x [km] for wrap-aware centers
+            x_start = float(x_coords[0])
+            x_period = float(x_coords[1] - x_coords[0]) * x_coords.size
             file_dbz = ds[ref_varname].squeeze().values
             file_conv_core = ds["conv_core"].squeeze().values
             file_conv_mask = ds["conv_mask"].squeeze().values
@@ -188,7 +201,7 @@ def calc_stats_singlefile(
         # Loop over unique tracknumbers
         for itrack in range(numtracks):
             # Map the tracknumbers in this frame to cloudnumbers
-            cloudnumber_map = np.where(tracknumbers == uniquetracknumbers[itrack])[0] + 1
+            cloudnumber_map = np.where(tracknumbers == uniquetracknumbers[itrack])[0][0] + 1
             cloudindex = cloudnumber_map - 1
 
             # # Get the cloudmask for the current track (this is the slow method!)
@@ -203,10 +216,10 @@ def calc_stats_singlefile(
             )
 
             if corecold_npix > 0:
-                out_area[itrack] = corecold_npix * pixel_radius ** 2
+                out_area[itrack] = get_feature_area(corecold_npix, corecold_indices, pixel_area, pixel_radius)
                 corecold_lat = latitude[corecold_indices[0], corecold_indices[1]]
                 corecold_lon = longitude[corecold_indices[0], corecold_indices[1]]
-                out_meanlon[itrack] = np.nanmean(corecold_lon)
+                out_meanlon[itrack] = get_mean_lon(corecold_lon, periodic_x=periodic_x)
                 out_meanlat[itrack] = np.nanmean(corecold_lat)
 
                 # Calculate feature specific statistics
@@ -226,8 +239,8 @@ def calc_stats_singlefile(
                         cloudnumber_map, nx, ny,
                     )
 
-                    out_core_area[itrack] = core_npix * pixel_radius ** 2
-                    out_cold_area[itrack] = cold_npix * pixel_radius ** 2
+                    out_core_area[itrack] = get_feature_area(core_npix, core_indices, pixel_area, pixel_radius)
+                    out_cold_area[itrack] = get_feature_area(cold_npix, cold_indices, pixel_area, pixel_radius)
                     out_corecold_mintb[itrack] = np.nanmin(file_tb[corecold_indices[0], corecold_indices[1]])
                     out_corecold_meantb[itrack] = np.nanmean(file_tb[corecold_indices[0], corecold_indices[1]])
                     # Get min Tb location
@@ -272,18 +285,18 @@ def calc_stats_singlefile(
 
                     # Core center location
                     out_core_meanlat[itrack] = np.nanmean(core_lat)
-                    out_core_meanlon[itrack] = np.nanmean(core_lon)
+                    out_core_meanlon[itrack] = get_mean_lon(core_lon, periodic_x=periodic_x)
                     out_core_mean_y[itrack] = np.nanmean(core_y)
-                    out_core_mean_x[itrack] = np.nanmean(core_x)
+                    out_core_mean_x[itrack] = get_mean_x(core_x, x_start, x_period, periodic_x=periodic_x)
 
                     # Cell center location
                     out_cell_meanlat[itrack] = np.nanmean(cell_lat)
-                    out_cell_meanlon[itrack] = np.nanmean(cell_lon)
+                    out_cell_meanlon[itrack] = get_mean_lon(cell_lon, periodic_x=periodic_x)
                     out_cell_mean_y[itrack] = np.nanmean(cell_y)
-                    out_cell_mean_x[itrack] = np.nanmean(cell_x)
+                    out_cell_mean_x[itrack] = get_mean_x(cell_x, x_start, x_period, periodic_x=periodic_x)
 
-                    out_core_area[itrack] = core_npix * pixel_radius ** 2
-                    out_cell_area[itrack] = corecold_npix * pixel_radius ** 2
+                    out_core_area[itrack] = get_feature_area(core_npix, core_indices, pixel_area, pixel_radius)
+                    out_cell_area[itrack] = get_feature_area(corecold_npix, corecold_indices, pixel_area, pixel_radius)
 
                     out_cell_max_dbz[itrack] = np.nanmax(
                         file_dbz[corecold_indices[0], corecold_indices[1]]
@@ -781,7 +794,7 @@ def get_loc_indices(
     # Find index of pre-sorted cloudnumber matching the current cloud
     idx = np.where(cloudnumber1d_uniq == cloudnumber_map)[0]
     if len(idx) > 0:
-        corecold_npix = cloudnumber1d_counts[idx]
+        corecold_npix = cloudnumber1d_counts[idx[0]]
 
         # We use this to know where to index into the sorted list
         # idx > 0 excludes background non-cloud area [0]
@@ -806,6 +819,32 @@ def get_loc_indices(
     return (corecold_npix, indices)
 
 
+def get_feature_area(npix, indices, pixel_area, pixel_radius):
+    """
+    Calculate feature area from its pixel location indices.
+
+    Args:
+        npix: int
+            Number of pixels in the feature.
+        indices: tuple
+            Pixel location indices (y, x) of the feature.
+        pixel_area: np.array or None
+            2D area of each pixel [km^2] from grid metrics.
+            If None, each pixel has a constant area of pixel_radius**2.
+        pixel_radius: float
+            Pixel size [km].
+
+    Returns:
+        area: float
+            Feature area [km^2].
+    """
+    if pixel_area is None:
+        return npix * pixel_radius ** 2
+    if npix == 0:
+        return 0.0
+    return np.sum(pixel_area[indices[0], indices[1]])
+
+
 def pre_sort_cloudnumber(cloudnumber_mask):
     """
     Pre-sort cloudnumber image to get pixel location indices for each cloud.
@@ -4,6 +4,7 @@ import logging
 import dask
 from dask.distributed import Client, LocalCluster
 from pyflextrkr.ft_utilities import load_config, setup_logging
+from pyflextrkr.ft_executor import get_backend_name
 # from pyflextrkr.regrid_lasso_reflectivity import regrid_lasso_reflectivity
 from pyflextrkr.idfeature_driver import idfeature_driver
 from pyflextrkr.advection_tiles import calc_mean_advection
@@ -24,7 +25,8 @@ if __name__ == '__main__':
 
     ################################################################################################
     # Parallel processing options
-    if config['run_parallel'] == 1:
+    parallel_backend = get_backend_name(config)
+    if parallel_backend == "dask":
         # Set Dask temporary directory for workers
         dask_tmp_dir = config.get("dask_tmp_dir", "./")
         dask.config.set({'temporary-directory': dask_tmp_dir})
@@ -32,13 +34,13 @@ if __name__ == '__main__':
         cluster = LocalCluster(n_workers=config['nprocesses'], threads_per_worker=1)
         client = Client(cluster)
         client.run(setup_logging)
-    elif config['run_parallel'] == 2:
+    elif parallel_backend == "dask_mpi":
         # Dask-MPI
         scheduler_file = os.path.join(os.environ["SCRATCH"], "scheduler.json")
         client = Client(scheduler_file=scheduler_file)
         client.run(setup_logging)
     else:
-        logger.info(f"Running in serial.")
+        logger.info(f"Running with {parallel_backend} backend.")
 
     # Step 0 - Regrid reflectivity
     if config['run_regridreflectivity']:
@@ -0,0 +1,43 @@
+import os
+import sys
+import logging
+import dask
+from dask.distributed import Client, LocalCluster
+from pyflextrkr.ft_utilities import load_config, setup_logging
+from pyflextrkr.ft_executor import get_backend_name
+from pyflextrkr.mcs_climatology import mcs_climatology_driver
+
+if __name__ == '__main__':
+
+    # Set the logging message level
+    setup_logging()
+    logger = logging.getLogger(__name__)
+
+    # Load configuration file
+    config_file = sys.argv[1]
+    config = load_config(config_file)
+    # Optional start/end month (yyyymo), default to config startdate/enddate
+    start_yearmonth = sys.argv[2] if len(sys.argv) > 2 else None
+    end_yearmonth = sys.argv[3] if len(sys.argv) > 3 else None
+
+    ################################################################################################
+    # Parallel processing options
+    parallel_backend = get_backend_name(config)
+    if parallel_backend == "dask":
+        # Set Dask temporary directory for workers
+        dask_tmp_dir = config.get("dask_tmp_dir", "./")
+        dask.config.set({'temporary-directory': dask_tmp_dir})
+        # Local cluster
+        cluster = LocalCluster(n_workers=config['nprocesses'], threads_per_worker=1)
+        client = Client(cluster)
+        client.run(setup_logging)
+    elif parallel_backend == "dask_mpi":
+        # Dask-MPI
+        scheduler_file = os.path.join(os.environ["SCRATCH"], "scheduler.json")
+        client = Client(scheduler_file=scheduler_file)
+        client.run(setup_logging)
+    else:
+        logger.info(f"Running with {parallel_backend} backend.")
+
+    # Monthly rain maps, Hovmollers and stats maps for all months in one Dask session
+    mcs_climatology_driver(config, start_yearmonth=start_yearmonth, end_yearmonth=end_yearmonth)